@@ -4,17 +4,33 @@ Offline-First API Endpoints for FixItFred
 Handles network drops gracefully with intelligent sync
 """
 
-from fastapi import APIRouter, HTTPException, UploadFile, File
+from fastapi import APIRouter, Header, HTTPException, Request, UploadFile, File
+from fastapi.responses import Response
 from typing import Dict, List, Any, Optional
 import asyncio
 from datetime import datetime
 import uuid
-import base64
 
+from core.offline.media_store import MediaUploadReceiver, UploadOffsetMismatch, parse_content_range
 from core.offline.offline_sync_engine import offline_sync_engine
+from core.offline.sync_payloads import SYNC_BATCH_CONTENT_TYPE, SyncBatchReceiver, encode_batch
 
 router = APIRouter(prefix="/api/offline", tags=["offline"])
 
+# Server copy of synced documents, reassembled from device patches
+sync_batch_receiver = SyncBatchReceiver()
+# Server end of resumable media uploads
+media_upload_receiver = MediaUploadReceiver()
+
+# Started and stopped from the app's lifespan (dashboard.py)
+async def start_background_sync():
+    """Run the offline sync worker on the app's event loop"""
+    await offline_sync_engine.start()
+
+async def stop_background_sync():
+    """Finish the current sync batch and close the sync HTTP session"""
+    await offline_sync_engine.stop()
+
 @router.post("/store-record")
 async def store_offline_record(record_data: Dict[str, Any]):
     """Store any type of record for offline use"""
@@ -97,21 +113,21 @@ async def store_photo_offline(photo_file: UploadFile = File(...),
     """Store photo offline"""
     
     try:
-        photo_data = await photo_file.read()
-        
-        # Store photo using offline photo manager
+        # Streamed from the spooled upload into the media store, never held whole
         photo_id = await offline_sync_engine.photo_manager.store_photo_offline(
-            photo_data=photo_data,
+            photo_data=photo_file.file,
             record_id=record_id,
             worker_id=worker_id
         )
+        media = await asyncio.to_thread(offline_sync_engine.media_store.get_media, photo_id)
         
         # Also store photo metadata as offline record
         photo_metadata = {
             "photo_id": photo_id,
+            "content_hash": media["content_hash"],
             "filename": photo_file.filename,
             "content_type": photo_file.content_type,
-            "file_size": len(photo_data),
+            "file_size": media["size_bytes"],
             "related_record_id": record_id,
             "created_at": datetime.now().isoformat()
         }
@@ -129,36 +145,39 @@ async def store_photo_offline(photo_file: UploadFile = File(...),
             "photo_id": photo_id,
             "metadata_record_id": metadata_record_id,
             "message": "Photo stored offline - will upload when online",
-            "file_size": len(photo_data)
+            "file_size": media["size_bytes"],
+            "content_hash": media["content_hash"]
         }
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/store-voice")
-async def store_voice_offline(voice_data: Dict[str, Any]):
-    """Store voice recording offline"""
+async def store_voice_offline(voice_file: UploadFile = File(...),
+                            worker_id: str = None,
+                            device_id: str = None,
+                            record_id: str = None,
+                            transcript: str = "",
+                            duration: float = 0):
+    """Store voice recording offline (multipart upload, no base64)"""
     
     try:
-        # Decode base64 audio data
-        audio_data = base64.b64decode(voice_data.get("audio_data", ""))
-        transcript = voice_data.get("transcript", "")
-        worker_id = voice_data.get("worker_id")
-        device_id = voice_data.get("device_id")
-        
         # Store voice using offline voice recorder
         voice_id = await offline_sync_engine.voice_recorder.store_voice_offline(
-            audio_data=audio_data,
+            audio_data=voice_file.file,
             worker_id=worker_id,
             transcript=transcript
         )
+        media = await asyncio.to_thread(offline_sync_engine.media_store.get_media, voice_id)
         
         # Store voice metadata as offline record
         voice_metadata = {
             "voice_id": voice_id,
+            "content_hash": media["content_hash"],
             "transcript": transcript,
-            "duration": voice_data.get("duration", 0),
-            "related_record_id": voice_data.get("record_id"),
+            "duration": duration,
+            "file_size": media["size_bytes"],
+            "related_record_id": record_id,
             "created_at": datetime.now().isoformat()
         }
         
@@ -200,6 +219,58 @@ async def sync_offline_data():
             "recommendation": "Will retry automatically when network is stable"
         }
 
+@router.post("/sync-batch")
+async def receive_sync_batch(request: Request):
+    """Apply an encoded batch of device records (whole documents or field-level patches)"""
+    
+    try:
+        payload = await request.body()
+        results = await asyncio.to_thread(sync_batch_receiver.receive, payload)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid sync batch: {e}")
+    
+    return Response(content=encode_batch(results), media_type=SYNC_BATCH_CONTENT_TYPE)
+
+def _upload_headers(offset: int, complete: bool) -> Dict[str, str]:
+    return {"Upload-Offset": str(offset), "Upload-Complete": "1" if complete else "0"}
+
+@router.head("/media/{content_hash}")
+async def get_media_upload_offset(content_hash: str):
+    """How much of a media blob the server holds (Upload-Offset), so a device can resume"""
+    
+    try:
+        status = await asyncio.to_thread(media_upload_receiver.status, content_hash)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if status is None:
+        raise HTTPException(status_code=404, detail="Upload not started")
+    return Response(headers=_upload_headers(*status))
+
+@router.put("/media/{content_hash}")
+async def upload_media_chunk(content_hash: str, request: Request,
+                             content_range: str = Header(..., alias="Content-Range")):
+    """Append one chunk of a media blob at the offset given by Content-Range"""
+    
+    try:
+        start, size, total = parse_content_range(content_range)
+        chunk = await request.body()
+        if len(chunk) != size:
+            raise ValueError(f"Chunk is {len(chunk)} bytes, Content-Range says {size}")
+        offset, complete = await asyncio.to_thread(
+            media_upload_receiver.write_chunk, content_hash, start, total, chunk
+        )
+    except UploadOffsetMismatch as e:
+        return Response(status_code=409, headers=_upload_headers(e.offset, False))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return Response(status_code=201 if complete else 200, headers=_upload_headers(offset, complete))
+
+@router.get("/sync-progress")
+async def get_sync_progress():
+    """Progress of the running (or last) sync and the background worker state"""
+    return {**offline_sync_engine.sync_progress, "background_sync": offline_sync_engine.sync_service.status()}
+
 @router.get("/status/{device_id}")
 async def get_offline_status(device_id: str):
     """Get current offline status for a device"""
@@ -257,7 +328,9 @@ async def resolve_sync_conflict(conflict_id: str, resolution: Dict[str, Any]):
         resolution_strategy = resolution.get("strategy")  # 'local_wins', 'remote_wins', 'merge'
         
         # Apply the resolution
-        await offline_sync_engine._apply_conflict_resolution(conflict_id, resolution_strategy)
+        await offline_sync_engine._apply_conflict_resolution(
+            conflict_id, resolution_strategy, resolved_by=resolution.get("resolved_by", "manual")
+        )
         
         return {
             "status": "success",
@@ -383,4 +456,4 @@ async def simulate_network_drop_scenario():
         "message": "All work saved locally - will sync automatically when network returns",
         "data_protection": "Zero data loss guaranteed",
         "worker_productivity": "No interruption to inspection workflow"
-    }
\ No newline at end of file
+    }
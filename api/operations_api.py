@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Daily Operations API Endpoints for FixItFred
+Client dashboards served from cached snapshots with ETag revalidation
+"""
+
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+from typing import Optional
+
+from data.warehouse.data_warehouse import DailyOperationsManager
+
+router = APIRouter(prefix="/api/operations", tags=["operations"])
+
+# Created on the app's event loop (the warehouse starts tasks on construction)
+operations_manager: Optional[DailyOperationsManager] = None
+
+# Started and stopped from the app's lifespan (dashboard.py)
+async def start_operations_manager():
+    """Create the shared operations manager on the app's event loop"""
+    
+    global operations_manager
+    if operations_manager is None:
+        operations_manager = DailyOperationsManager()
+
+async def stop_operations_manager():
+    """Stop learning and maintenance and flush buffered warehouse writes"""
+    
+    global operations_manager
+    if operations_manager is not None:
+        await operations_manager.shutdown()
+        operations_manager = None
+
+def _parse_etag(header: Optional[str]) -> Optional[str]:
+    """Opaque tag of an If-None-Match header (weak tags compare equal for GET)"""
+    
+    if not header:
+        return None
+    tag = header.split(",")[0].strip()
+    if tag.startswith("W/"):
+        tag = tag[2:]
+    return tag.strip('"')
+
+@router.get("/dashboard/{client_id}")
+async def get_client_dashboard(client_id: str, if_none_match: Optional[str] = Header(None)):
+    """Client dashboard; answers 304 when the client's copy (If-None-Match) is current"""
+    
+    if operations_manager is None:
+        raise HTTPException(status_code=503, detail="Operations manager is not running")
+    
+    data = await operations_manager.get_client_dashboard_data(client_id, if_none_match=_parse_etag(if_none_match))
+    headers = {"ETag": f'"{data["etag"]}"', "Cache-Control": "no-cache"}
+    if data.get("not_modified"):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(content=jsonable_encoder(data), headers=headers)
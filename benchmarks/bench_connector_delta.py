@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Connector Delta Sync Benchmark
+Full re-pull versus cursor + content-hash delta syncs of a mostly unchanged ERP table
+"""
+
+import argparse
+import asyncio
+import json
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+# Add repository root to path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from core.integrations.universal_connector import UniversalConnector
+
+HISTORY_START = datetime(2024, 1, 1)
+
+class MockTableHandler(BaseHTTPRequestHandler):
+    """Serves the shared table; ?modified_after= returns rows changed at or after the mark"""
+    
+    protocol_version = "HTTP/1.1"
+    rows = []
+    
+    def do_GET(self):
+        query = {key: values[0] for key, values in parse_qs(urlsplit(self.path).query).items()}
+        since = query.get("modified_after")
+        rows = self.rows if since is None else [row for row in self.rows if row["updated_at"] >= since]
+        
+        body = json.dumps({"data": rows}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        pass
+
+class MockTableServer(ThreadingHTTPServer):
+    request_queue_size = 128
+    daemon_threads = True
+
+def table_row(i: int, changed_at: int = None) -> dict:
+    """Row ``i``, last modified ``changed_at`` (default ``i``) seconds into the table's history"""
+    
+    changed_at = i if changed_at is None else changed_at
+    return {
+        "item_id": f"ITEM-{i:09d}", "quantity": (i + changed_at) % 500, "cost": round(i * 0.37, 2),
+        "status": "active", "updated_at": (HISTORY_START + timedelta(seconds=changed_at)).isoformat()
+    }
+
+async def timed(label: str, connector: UniversalConnector, integration_id: str, **kwargs):
+    start = time.perf_counter()
+    result = await connector.sync_data(integration_id, **kwargs)
+    elapsed = time.perf_counter() - start
+    endpoint = result["endpoint_results"][0]
+    print(f"{label:<24} fetched: {endpoint.get('records_fetched', 0):8d}   "
+          f"stored: {endpoint['records_processed']:8d}   {elapsed:7.2f} s")
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--changed", type=int, default=2000, help="rows modified between syncs")
+    args = parser.parse_args()
+    
+    MockTableHandler.rows = [table_row(i) for i in range(args.rows)]
+    server = MockTableServer(("127.0.0.1", 0), MockTableHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/items"
+    
+    state_dir = tempfile.mkdtemp()
+    connector = UniversalConnector(sync_state_path=f"{state_dir}/sync_state.db")
+    mappings = connector._get_common_mappings("erp")
+    
+    full = await connector.create_integration("bench_client", {
+        "name": "Full table",
+        "endpoints": [{"name": "items", "type": "api", "url": url}],
+        "data_mappings": mappings
+    })
+    delta = await connector.create_integration("bench_client", {
+        "name": "Delta table",
+        "endpoints": [{
+            "name": "items", "type": "api", "url": url,
+            "delta": {"updated_since_param": "modified_after", "key_fields": ["item_id"]}
+        }],
+        "data_mappings": mappings
+    })
+    
+    await timed("delta, first sync", connector, delta.id)
+    
+    step = max(1, args.rows // max(1, args.changed))
+    for n, i in enumerate(range(0, args.rows, step)[:args.changed]):
+        MockTableHandler.rows[i] = table_row(i, changed_at=args.rows + n)
+    
+    await timed("full re-pull", connector, full.id)
+    await timed("delta", connector, delta.id)
+    await timed("delta, nothing changed", connector, delta.id)
+    
+    await connector.aclose()
+    server.shutdown()
+    shutil.rmtree(state_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    asyncio.run(main())
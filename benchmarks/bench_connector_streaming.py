@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Connector Streaming Benchmark
+Peak memory of eager whole-response sync versus the streaming fetch -> map -> store pipeline
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+# Add repository root to path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from core.integrations.universal_connector import UniversalConnector
+
+def export_record(i: int) -> dict:
+    return {
+        "item_id": f"ITEM-{i:09d}", "quantity": i % 500, "cost": round(i * 0.37, 2),
+        "status": "active", "description": f"Replacement part {i} for line {i % 40}",
+        "plant": f"PLANT-{i % 12:02d}", "updated_at": "2024-03-18T10:00:00"
+    }
+
+class MockExportHandler(BaseHTTPRequestHandler):
+    """Chunked JSON export of ?total= records, optionally paged with ?offset=&limit="""
+    
+    protocol_version = "HTTP/1.1"
+    
+    def do_GET(self):
+        query = {key: int(values[0]) for key, values in parse_qs(urlsplit(self.path).query).items()}
+        total = query.get("total", 0)
+        offset = query.get("offset", 0)
+        end = min(total, offset + query["limit"]) if "limit" in query else total
+        
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        
+        def send(text: str):
+            data = text.encode()
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        
+        send('{"total": %d, "data": [' % total)
+        for start in range(offset, end, 1000):
+            rows = ",".join(json.dumps(export_record(i)) for i in range(start, min(start + 1000, end)))
+            send(("," if start > offset else "") + rows)
+        send("]}")
+        self.wfile.write(b"0\r\n\r\n")
+    
+    def log_message(self, format, *args):
+        pass
+
+class MockExportServer(ThreadingHTTPServer):
+    request_queue_size = 128
+    daemon_threads = True
+
+async def eager_sync(connector: UniversalConnector, integration):
+    """The previous path: whole body -> json() -> map everything -> store"""
+    
+    endpoint = integration.endpoints[0]
+    response = await connector.http.request('GET', endpoint.url, params=endpoint.parameters)
+    data = response.json()["data"]
+    mapped = await connector._map_data(data, integration.data_mappings)
+    await connector._store_mapped_data(mapped, integration.client_id)
+    return len(mapped)
+
+async def streaming_sync(connector: UniversalConnector, integration):
+    result = await connector.sync_data(integration.id)
+    return result["total_records"]
+
+async def measure(label: str, sync, connector, integration):
+    """Time one sync, then repeat it traced for peak memory (tracing distorts timing)"""
+    
+    start = time.perf_counter()
+    records = await sync(connector, integration)
+    elapsed = time.perf_counter() - start
+    
+    tracemalloc.start()
+    await sync(connector, integration)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<28} records: {records:8d}   {elapsed:7.2f} s   peak: {peak / 1024 / 1024:8.1f} MB")
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20000, 100000])
+    parser.add_argument("--page-size", type=int, default=10000)
+    args = parser.parse_args()
+    
+    server = MockExportServer(("127.0.0.1", 0), MockExportHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/export"
+    
+    connector = UniversalConnector()
+    mappings = connector._get_common_mappings("erp")
+    
+    for total in args.sizes:
+        single = await connector.create_integration("bench_client", {
+            "name": f"Export {total}",
+            "endpoints": [{"name": "export", "type": "api", "url": base_url, "parameters": {"total": total}}],
+            "data_mappings": mappings
+        })
+        paged = await connector.create_integration("bench_client", {
+            "name": f"Paged export {total}",
+            "endpoints": [{
+                "name": "export", "type": "api", "url": base_url, "parameters": {"total": total},
+                "pagination": {"type": "offset", "page_size": args.page_size}
+            }],
+            "data_mappings": mappings
+        })
+        
+        await measure(f"eager / {total}", eager_sync, connector, single)
+        await measure(f"streaming / {total}", streaming_sync, connector, single)
+        await measure(f"streaming paged / {total}", streaming_sync, connector, paged)
+    
+    await connector.aclose()
+    server.shutdown()
+
+if __name__ == "__main__":
+    asyncio.run(main())
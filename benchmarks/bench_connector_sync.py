@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Connector Sync Benchmark
+Compares the sequential blocking requests fetch with pooled concurrent httpx fetching in sync_data
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import requests
+
+# Add repository root to path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from core.integrations.universal_connector import UniversalConnector
+
+class MockERPHandler(BaseHTTPRequestHandler):
+    """Answers every GET with a JSON page of records after a fixed latency"""
+    
+    latency = 0.1
+    records = 100
+    
+    def do_GET(self):
+        time.sleep(self.latency)
+        body = json.dumps({"data": [
+            {"item_id": i, "quantity": i % 50, "cost": i * 1.5, "status": "active"}
+            for i in range(self.records)
+        ]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        pass
+
+class MockERPServer(ThreadingHTTPServer):
+    # The default backlog of 5 drops SYNs under concurrent connects (1 s retransmit)
+    request_queue_size = 128
+    daemon_threads = True
+
+def start_mock_server() -> ThreadingHTTPServer:
+    server = MockERPServer(("127.0.0.1", 0), MockERPHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+async def legacy_sync(connector: UniversalConnector, integration_id: str):
+    """The previous path: blocking requests.get per endpoint, one after another"""
+    
+    integration = connector.integrations[integration_id]
+    for endpoint in integration.endpoints:
+        response = requests.get(endpoint.url, headers=endpoint.headers, params=endpoint.parameters, timeout=60)
+        data = response.json()["data"]
+        mapped = await connector._map_data(data, integration.data_mappings)
+        await connector._store_mapped_data(mapped, integration.client_id)
+
+async def measure(label: str, sync):
+    """Time one sync and record the worst event-loop stall seen meanwhile"""
+    
+    worst_stall = 0.0
+    running = True
+    
+    async def ticker():
+        nonlocal worst_stall
+        while running:
+            start = time.perf_counter()
+            await asyncio.sleep(0.01)
+            worst_stall = max(worst_stall, time.perf_counter() - start - 0.01)
+    
+    ticker_task = asyncio.create_task(ticker())
+    await asyncio.sleep(0)
+    start = time.perf_counter()
+    await sync()
+    elapsed = time.perf_counter() - start
+    running = False
+    await ticker_task
+    
+    print(f"{label:<22} {elapsed * 1000:9.1f} ms   worst loop stall: {worst_stall * 1000:8.1f} ms")
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--endpoints", type=int, default=24, help="endpoints per integration")
+    parser.add_argument("--hosts", type=int, default=3, help="mock ERP hosts")
+    parser.add_argument("--latency-ms", type=int, default=100, help="server latency per request")
+    parser.add_argument("--per-host", type=int, default=8, help="concurrent requests per host")
+    args = parser.parse_args()
+    
+    MockERPHandler.latency = args.latency_ms / 1000
+    servers = [start_mock_server() for _ in range(args.hosts)]
+    
+    connector = UniversalConnector(max_requests_per_host=args.per_host)
+    integration = await connector.create_integration("bench_client", {
+        "name": "Bench ERP",
+        "system_type": "erp",
+        "endpoints": [
+            {
+                "name": f"endpoint_{i}",
+                "type": "api",
+                "url": f"http://127.0.0.1:{servers[i % args.hosts].server_address[1]}/api/v1/data/{i}"
+            }
+            for i in range(args.endpoints)
+        ],
+        "data_mappings": connector._get_common_mappings("erp")
+    })
+    
+    print(f"{args.endpoints} endpoints on {args.hosts} hosts, {args.latency_ms} ms latency, "
+          f"{args.per_host} requests per host")
+    
+    await measure("legacy sequential", lambda: legacy_sync(connector, integration.id))
+    await measure("pooled concurrent", lambda: connector.sync_data(integration.id))
+    
+    await connector.aclose()
+    for server in servers:
+        server.shutdown()
+
+if __name__ == "__main__":
+    asyncio.run(main())
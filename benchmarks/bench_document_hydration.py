@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Document Row Hydration Benchmark
+Compares eager DocumentMetadata hydration with lazy DocumentRow views over large result sets
+"""
+
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+from dataclasses import asdict
+from pathlib import Path
+
+# Add repository root to path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from core.memory.universal_memory_system import (
+    DocumentMetadata, DocumentRow, DocumentType, StorageLocation, DOCUMENT_COLUMNS
+)
+
+def make_rows(count: int, content_chars: int):
+    """Synthetic search rows shaped like the documents projection plus a score column"""
+    
+    tags = json.dumps(["safety", "maintenance", "manual"])
+    permissions = json.dumps({"admin": ["read", "write", "delete"], "viewer": ["read"]})
+    modules = json.dumps(["safety", "maintenance"])
+    keywords = json.dumps([f"keyword{i}" for i in range(20)])
+    content = "x" * content_chars
+    
+    return [
+        (
+            f"DOC-{i:08x}", f"manual_{i}.txt", DocumentType.TEXT.value, 1024,
+            "2024-01-01T00:00:00", "2024-01-01T00:00:00", "bench", "bench", "maintenance",
+            f"AI-generated summary of manual_{i}.txt", tags, "safety_document", 0.95,
+            "department", permissions, False, "1.0", None, True, modules, json.dumps(["inspection"]),
+            "[]", keywords, content, StorageLocation.LOCAL_SQLITE.value, f"data/blobs/{i}",
+            f"{i:064x}", "complete", -1.5
+        )
+        for i in range(count)
+    ]
+
+def eager_metadata(row) -> DocumentMetadata:
+    """The previous hydration: decode every column of every row up front"""
+    return DocumentMetadata(
+        document_id=row[0], filename=row[1], file_type=DocumentType(row[2]), size_bytes=row[3],
+        created_at=row[4], modified_at=row[5], uploaded_by=row[6], company_id=row[7],
+        department=row[8], ai_summary=row[9], ai_tags=json.loads(row[10]), ai_category=row[11],
+        ai_importance_score=row[12], access_level=row[13], permissions=json.loads(row[14]),
+        encryption_status=row[15], version=row[16], parent_document_id=row[17],
+        is_latest_version=row[18], related_modules=json.loads(row[19]),
+        related_processes=json.loads(row[20]), related_workers=json.loads(row[21]),
+        search_keywords=json.loads(row[22]), full_text_content=row[23],
+        storage_location=StorageLocation(row[24]), storage_path=row[25],
+        content_hash=row[26], analysis_status=row[27]
+    )
+
+def measure(label: str, rows, hydrate, consume):
+    """Time hydration + consumption, then report the memory held by the hydrated objects"""
+    
+    start = time.perf_counter()
+    hydrated = [hydrate(row) for row in rows]
+    results = [consume(item) for item in hydrated]
+    elapsed = time.perf_counter() - start
+    del hydrated, results
+    
+    # Separate pass so tracing overhead doesn't distort the timing
+    tracemalloc.start()
+    hydrated = [hydrate(row) for row in rows]
+    results = [consume(item) for item in hydrated]
+    held, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del hydrated, results
+    
+    print(f"{label:<28} {elapsed * 1000:10.1f} ms   "
+          f"held: {held / 1024 / 1024:8.1f} MB   peak: {peak / 1024 / 1024:8.1f} MB")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--content-chars", type=int, default=0,
+                        help="full_text_content size per row (0 = listing projection)")
+    args = parser.parse_args()
+    
+    rows = make_rows(args.rows, args.content_chars)
+    print(f"{args.rows} rows, {len(DOCUMENT_COLUMNS)} columns + score")
+    
+    listing = lambda doc: (doc.document_id, doc.filename)
+    
+    measure("eager metadata / listing", rows, eager_metadata, listing)
+    measure("lazy row / listing", rows, DocumentRow,
+            lambda doc: (doc.document_id, doc.filename, doc.score))
+    measure("lazy row / tags", rows, DocumentRow, lambda doc: doc.ai_tags)
+    measure("eager metadata / asdict", rows, eager_metadata, asdict)
+    measure("lazy row / to_dict", rows, DocumentRow, DocumentRow.to_dict)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Universal Memory System Benchmark
+Compares legacy connection-per-call SQLite access with the pooled WAL connection manager
+"""
+
+import argparse
+import asyncio
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add repository root to path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from core.memory.universal_memory_system import UniversalMemorySystem
+from core.memory.connection_pool import close_all_pools
+
+SAMPLE_TEXT = (
+    "Safety inspection procedure for hydraulic press maintenance. "
+    "Check equipment for hazard, verify compliance with quality standard, "
+    "report any defect to the maintenance supervisor. "
+)
+
+SEARCH_TERMS = ["safety", "maintenance", "hydraulic", "compliance", "defect", "quality"]
+
+class LegacyConnections:
+    """Mimics the original access pattern: fresh connection + commit per call on the loop thread"""
+    
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.data_version = 0
+    
+    async def write(self, fn, *args):
+        conn = sqlite3.connect(self.db_path)
+        try:
+            result = fn(conn, *args)
+            conn.commit()
+            self.data_version += 1
+            return result
+        finally:
+            conn.close()
+    
+    async def read(self, fn, *args):
+        conn = sqlite3.connect(self.db_path)
+        try:
+            return fn(conn, *args)
+        finally:
+            conn.close()
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+async def run_scenario(label: str, company_id: str, uploads: int, searches: int,
+                       concurrency: int, search_rate: float, legacy: bool):
+    """Upload a burst of documents, then replay searches at a fixed arrival rate"""
+    
+    memory = await UniversalMemorySystem(company_id).initialize()
+    if legacy:
+        memory.pool = LegacyConnections(memory.db_path)
+    
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def upload(i):
+        async with semaphore:
+            await memory.upload_document(
+                file_data=(SAMPLE_TEXT * (1 + i % 5)).encode(),
+                filename=f"manual_{i}.txt",
+                uploaded_by="bench",
+                department="maintenance"
+            )
+    
+    start = time.perf_counter()
+    await asyncio.gather(*(upload(i) for i in range(uploads)))
+    upload_elapsed = time.perf_counter() - start
+    
+    # Open-loop arrivals: latency is measured from the scheduled arrival time,
+    # so time spent waiting on a blocked event loop is counted too
+    latencies = []
+    
+    async def search(i, arrival):
+        await memory.search_documents(SEARCH_TERMS[i % len(SEARCH_TERMS)])
+        latencies.append((time.perf_counter() - arrival) * 1000)
+    
+    tasks = []
+    start = time.perf_counter()
+    for i in range(searches):
+        arrival = start + i / search_rate
+        await asyncio.sleep(max(0.0, arrival - time.perf_counter()))
+        tasks.append(asyncio.create_task(search(i, arrival)))
+    await asyncio.gather(*tasks)
+    
+    print(f"{label:<8} uploads/sec: {uploads / upload_elapsed:10.1f}   "
+          f"search p50: {statistics.median(latencies):8.2f} ms   "
+          f"search p99: {percentile(latencies, 99):8.2f} ms")
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--uploads", type=int, default=2000)
+    parser.add_argument("--searches", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--search-rate", type=float, default=20.0, help="search arrivals per second")
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        Path("data").mkdir()
+        
+        await run_scenario("legacy", "bench_legacy", args.uploads, args.searches,
+                           args.concurrency, args.search_rate, legacy=True)
+        await run_scenario("pooled", "bench_pooled", args.uploads, args.searches,
+                           args.concurrency, args.search_rate, legacy=False)
+        
+        close_all_pools()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Offline Media Upload Benchmark
+Base64-in-JSON media payloads versus deduplicated, resumable chunked uploads over a link with dead zones
+"""
+
+import argparse
+import asyncio
+import base64
+import io
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import wave
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import numpy as np
+
+# Add repository root to path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+# The module-level engine creates its database and media folders in the working directory
+WORKDIR = tempfile.mkdtemp(prefix="bench_offline_media_")
+os.chdir(WORKDIR)
+
+from core.offline.media_store import MediaUploadReceiver, UploadOffsetMismatch, parse_content_range
+from core.offline.offline_sync_engine import OfflineSyncEngine
+
+class DeadZoneHandler(BaseHTTPRequestHandler):
+    """The media upload endpoints; every ``drop_every``-th chunk is stored but its response never arrives"""
+    
+    protocol_version = "HTTP/1.1"
+    receiver: MediaUploadReceiver = None
+    drop_every = 0
+    chunks_received = 0
+    
+    def _reply(self, status: int, offset: int, complete: bool):
+        self.send_response(status)
+        self.send_header("Upload-Offset", str(offset))
+        self.send_header("Upload-Complete", "1" if complete else "0")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+    
+    def do_HEAD(self):
+        status = self.receiver.status(self.path.rsplit("/", 1)[-1])
+        if status is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+        else:
+            self._reply(200, *status)
+    
+    def do_PUT(self):
+        start, size, total = parse_content_range(self.headers["Content-Range"])
+        chunk = self.rfile.read(size)
+        try:
+            offset, complete = self.receiver.write_chunk(self.path.rsplit("/", 1)[-1], start, total, chunk)
+        except UploadOffsetMismatch as e:
+            self._reply(409, e.offset, False)
+            return
+        DeadZoneHandler.chunks_received += 1
+        if self.drop_every and DeadZoneHandler.chunks_received % self.drop_every == 0:
+            self.close_connection = True
+            self.connection.close()
+            return
+        self._reply(201 if complete else 200, offset, complete)
+    
+    def log_message(self, format, *args):
+        pass
+
+class LinkEngine(OfflineSyncEngine):
+    async def _check_network_connectivity(self) -> bool:
+        return True
+
+def recording(seconds: int, rate: int = 44100) -> bytes:
+    """Stereo 16-bit PCM WAV of a tone with noise"""
+    
+    t = np.arange(seconds * rate) / rate
+    tone = 8000 * np.sin(2 * np.pi * 220 * t) + np.random.default_rng(1).normal(0, 500, len(t))
+    samples = np.repeat(tone.astype("<i2")[:, None], 2, axis=1)
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as out:
+        out.setnchannels(2)
+        out.setsampwidth(2)
+        out.setframerate(rate)
+        out.writeframes(samples.tobytes())
+    return buffer.getvalue()
+
+async def upload_until_done(engine: LinkEngine) -> dict:
+    totals = {"rounds": 0, "bytes_sent": 0, "resumed": 0, "uploaded": 0}
+    while True:
+        result = await engine.sync_media()
+        totals["rounds"] += 1
+        for key in ("bytes_sent", "resumed", "uploaded"):
+            totals[key] += result[key]
+        if not result["failed"]:
+            return totals
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--photos", type=int, default=40, help="distinct photos")
+    parser.add_argument("--photo-kb", type=int, default=2048)
+    parser.add_argument("--duplicates", type=int, default=3, help="times each photo is attached")
+    parser.add_argument("--voice-seconds", type=int, default=120)
+    parser.add_argument("--drop-every", type=int, default=12, help="chunks between dead zones")
+    args = parser.parse_args()
+    # Every dead zone logs an interrupted upload
+    logging.getLogger().setLevel(logging.ERROR)
+    
+    DeadZoneHandler.receiver = MediaUploadReceiver(os.path.join(WORKDIR, "server_media"))
+    DeadZoneHandler.drop_every = args.drop_every
+    server = ThreadingHTTPServer(("127.0.0.1", 0), DeadZoneHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    
+    engine = LinkEngine(db_path=os.path.join(WORKDIR, "bench_offline.db"))
+    engine.sync_service.media_url = f"http://127.0.0.1:{server.server_address[1]}/api/offline/media"
+    
+    photos = [os.urandom(args.photo_kb * 1024) for _ in range(args.photos)]
+    voice = recording(args.voice_seconds)
+    captures = [photo for photo in photos for _ in range(args.duplicates)]
+    
+    start = time.perf_counter()
+    for n, photo in enumerate(captures):
+        await engine.photo_manager.store_photo_offline(photo, f"INSP-{n}", "W-1")
+    voice_id = await engine.voice_recorder.store_voice_offline(voice, "W-1", "bearing noise on pump 4")
+    await engine.media_store.pipeline.join()
+    store_time = time.perf_counter() - start
+    
+    legacy_bytes = sum(len(json.dumps({"photo_data": base64.b64encode(photo).decode()})) for photo in captures)
+    legacy_bytes += len(json.dumps({"audio_data": base64.b64encode(voice).decode()}))
+    media_bytes = sum(map(len, captures)) + len(voice)
+    
+    start = time.perf_counter()
+    totals = await upload_until_done(engine)
+    upload_time = time.perf_counter() - start
+    
+    print(f"{len(captures)} photo captures ({args.photos} distinct, {args.photo_kb} KB), "
+          f"{args.voice_seconds} s recording, link drops every {args.drop_every} chunks")
+    print(f"{'captured media':<26} {media_bytes / 1e6:9.2f} MB   stored in {store_time:5.2f} s")
+    print(f"{'base64 JSON payloads':<26} {legacy_bytes / 1e6:9.2f} MB")
+    print(f"{'chunked, deduplicated':<26} {totals['bytes_sent'] / 1e6:9.2f} MB   "
+          f"{totals['uploaded']} blobs in {totals['rounds']} rounds, {totals['resumed']} resumed, "
+          f"{upload_time:5.2f} s")
+    
+    variants = engine.media_store.get_media(voice_id)["variants"]
+    print(f"{'voice variants':<26} {', '.join(variants) or 'none'}")
+    
+    await engine.media_store.shutdown()
+    server.shutdown()
+    shutil.rmtree(WORKDIR, ignore_errors=True)
+
+if __name__ == "__main__":
+    asyncio.run(main())
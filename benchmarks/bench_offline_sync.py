@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Offline Sync Benchmark
+Serial per-record sync with per-update connections versus batched, grouped, concurrent sync_when_online
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add repository root to path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+# The module-level engine creates its database and media folders in the working directory
+WORKDIR = tempfile.mkdtemp(prefix="bench_offline_sync_")
+os.chdir(WORKDIR)
+
+from core.offline.offline_sync_engine import OfflineSyncEngine
+from core.offline.sync_payloads import SyncBatchReceiver, document_checksum, encode_batch
+
+RECORD_TYPES = ["inspection", "measurement", "defect", "photo"]
+
+class SimulatedServerEngine(OfflineSyncEngine):
+    """Engine whose server round trips are a fixed latency, reassembled by an in-process receiver"""
+    
+    latency = 0.002
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.receiver = SyncBatchReceiver(os.path.join(WORKDIR, "bench_server.db"))
+    
+    async def _check_network_connectivity(self) -> bool:
+        return True
+    
+    async def _sync_single_record(self, record_id, record_type, data):
+        await asyncio.sleep(self.latency)
+        return {"status": "success", "remote_id": record_id}
+    
+    async def _upload_sync_batch(self, items):
+        await asyncio.sleep(self.latency)
+        return self.receiver.receive(encode_batch(items))
+
+def seed_pending(db_path: str, count: int):
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.execute("DELETE FROM offline_records")
+        conn.execute("DELETE FROM synced_documents")
+        conn.executemany('''
+            INSERT INTO offline_records
+            (record_id, record_type, data, timestamp, worker_id, device_id, checksum, sync_status, entity_key)
+            VALUES (?, ?, ?, ?, ?, ?, ?, 'pending', ?)
+        ''', [
+            (f"OFFLINE-{i:08d}", RECORD_TYPES[i % len(RECORD_TYPES)],
+             json.dumps({"inspection_id": f"OFFLINE-{i - i % 4:08d}", "value": i, "notes": "shift handover"}),
+             f"2024-03-18T{(i // 3600) % 24:02d}:{(i // 60) % 60:02d}:{i % 60:02d}.{i:06d}",
+             f"W-{i % 40}", f"TABLET-{i % 25:02d}",
+             document_checksum({"inspection_id": f"OFFLINE-{i - i % 4:08d}", "value": i, "notes": "shift handover"}),
+             OfflineSyncEngine._entity_key(RECORD_TYPES[i % len(RECORD_TYPES)],
+                                           {"inspection_id": f"OFFLINE-{i - i % 4:08d}"}, f"OFFLINE-{i:08d}"))
+            for i in range(count)
+        ])
+        # Synced history the pending scan has to skip
+        conn.executemany('''
+            INSERT INTO offline_records
+            (record_id, record_type, data, timestamp, worker_id, device_id, checksum, sync_status, entity_key)
+            VALUES (?, 'inspection', '{}', '2024-03-17T00:00:00', 'W-0', 'TABLET-00', '', 'synced', ?)
+        ''', [(f"SYNCED-{i:08d}", f"SYNCED-{i:08d}") for i in range(count)])
+    conn.close()
+
+async def legacy_sync(engine: SimulatedServerEngine):
+    """The previous path: SELECT * of every pending row, one record at a time, a connection per update"""
+    
+    conn = sqlite3.connect(engine.db_path)
+    pending_records = conn.execute(
+        "SELECT * FROM offline_records WHERE sync_status = 'pending' ORDER BY timestamp ASC"
+    ).fetchall()
+    conn.close()
+    
+    synced = 0
+    for record_row in pending_records:
+        result = await engine._sync_single_record(record_row[0], record_row[1], json.loads(record_row[2]))
+        if result["status"] == "success":
+            conn = sqlite3.connect(engine.db_path)
+            conn.execute("UPDATE offline_records SET sync_status = 'synced' WHERE record_id = ?", (record_row[0],))
+            conn.commit()
+            conn.close()
+            synced += 1
+    return synced
+
+async def batched_sync(engine: SimulatedServerEngine, progress_callback=None):
+    result = await engine.sync_when_online(progress_callback)
+    return result["synced"]
+
+async def measure(label: str, engine: SimulatedServerEngine, sync, count: int):
+    seed_pending(engine.db_path, count)
+    start = time.perf_counter()
+    synced = await sync()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<20} synced: {synced:7d}   {elapsed:8.2f} s   {synced / elapsed:9.0f} records/s")
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--records", type=int, default=50000)
+    parser.add_argument("--latency-ms", type=float, default=2.0, help="simulated server round trip")
+    parser.add_argument("--legacy-records", type=int, default=5000,
+                        help="records for the serial path (it scales linearly)")
+    args = parser.parse_args()
+    
+    SimulatedServerEngine.latency = args.latency_ms / 1000
+    
+    engine = SimulatedServerEngine(db_path=os.path.join(WORKDIR, "bench_offline.db"))
+    print(f"{args.latency_ms} ms per upload, batches of {engine.sync_batch_size}, "
+          f"{engine.sync_upload_chunk} records per upload, {engine.sync_concurrency} uploads in flight")
+    
+    await measure("legacy serial", engine, lambda: legacy_sync(engine), args.legacy_records)
+    await measure("batched", engine, lambda: batched_sync(engine), args.legacy_records)
+    
+    progress = {}
+    await measure("batched", engine, lambda: batched_sync(engine, progress.update), args.records)
+    print(f"last progress report: {progress['processed']}/{progress['total_records']} ({progress['percent']}%)")
+    
+    shutil.rmtree(WORKDIR, ignore_errors=True)
+
+if __name__ == "__main__":
+    asyncio.run(main())
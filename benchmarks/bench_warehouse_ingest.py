@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Warehouse Ingest Benchmark
+Compares commit-per-call operational writes with the group-commit ingest queue (ops/sec)
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+# Add repository root to path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from data.warehouse.data_warehouse import GringoDataWarehouse
+
+LEGACY_OPERATION_INSERT = """
+    INSERT INTO daily_operations
+    (id, client_id, module, operation_type, timestamp, data, processed)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+LEGACY_METRIC_INSERT = """
+    INSERT INTO real_time_metrics
+    (id, client_id, metric_name, metric_value, timestamp, module_source)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+
+METRICS_PER_OPERATION = 3
+
+def operation_rows(client_id: str, i: int):
+    """One daily_operations row plus its real_time_metrics rows"""
+    
+    now = datetime.now().isoformat()
+    operation = (
+        str(uuid.uuid4()), client_id, 'iot_monitoring', 'sensor_readings', now,
+        json.dumps({'raw_data': {'temperature': 70 + i % 10, 'vibration': 0.2}}), True
+    )
+    metrics = [
+        (client_id, f"sensor_{m}", float(i % 100), now, 'iot_monitoring')
+        for m in range(METRICS_PER_OPERATION)
+    ]
+    return operation, metrics
+
+async def legacy_ingest(warehouse: GringoDataWarehouse, client_id: str, i: int):
+    """The previous path: open, insert, commit for the operation and again for its metrics"""
+    
+    operation, metrics = operation_rows(client_id, i)
+    
+    conn = sqlite3.connect(warehouse.operational_db)
+    conn.execute(LEGACY_OPERATION_INSERT, operation)
+    conn.commit()
+    conn.close()
+    
+    conn = sqlite3.connect(warehouse.operational_db)
+    for metric in metrics:
+        conn.execute(LEGACY_METRIC_INSERT, (str(uuid.uuid4()),) + metric)
+    conn.commit()
+    conn.close()
+
+async def queued_ingest(warehouse: GringoDataWarehouse, client_id: str, i: int):
+    """What store_daily_operation does after processing"""
+    
+    operation, metrics = operation_rows(client_id, i)
+    operation_committed = warehouse.ingest_queue.add('daily_operations', [operation])
+    metrics_committed = warehouse.ingest_queue.add('metric_samples', metrics)
+    await warehouse.ingest_queue.wait(operation_committed, metrics_committed)
+
+async def run_scenario(label: str, ingest, operations: int, concurrency: int, **warehouse_options):
+    with tempfile.TemporaryDirectory() as workdir:
+        warehouse = GringoDataWarehouse(os.path.join(workdir, "gringo_data"), **warehouse_options)
+        await warehouse._storage_ready
+        
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async def ingest_one(i):
+            async with semaphore:
+                await ingest(warehouse, f"client_{i % 10}", i)
+        
+        start = time.perf_counter()
+        await asyncio.gather(*(ingest_one(i) for i in range(operations)))
+        await warehouse.flush()
+        elapsed = time.perf_counter() - start
+        
+        # Legacy rows sit in operational.db, queued ones in the monthly partitions
+        conn = sqlite3.connect(warehouse.operational_db)
+        stored = conn.execute("SELECT COUNT(*) FROM daily_operations").fetchone()[0]
+        conn.close()
+        stored += sum(1 for _ in warehouse.partitions.query(columns="id", order_by="rowid"))
+        await warehouse.close()
+        
+        batches = warehouse.ingest_queue.committed_batches
+        print(f"{label:<18} ops/sec: {operations / elapsed:10.1f}   "
+              f"stored: {stored:7d}   group commits: {batches:6d}")
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--operations", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=200, help="concurrent producers")
+    parser.add_argument("--flush-ms", type=int, default=50)
+    parser.add_argument("--batch-rows", type=int, default=1000)
+    args = parser.parse_args()
+    
+    print(f"{args.operations} operations x (1 + {METRICS_PER_OPERATION} metrics), "
+          f"{args.concurrency} concurrent producers")
+    
+    await run_scenario("legacy", legacy_ingest, args.operations, args.concurrency)
+    for durability in ('full', 'normal', 'relaxed'):
+        await run_scenario(
+            f"queued/{durability}", queued_ingest, args.operations, args.concurrency,
+            ingest_flush_ms=args.flush_ms, ingest_batch_rows=args.batch_rows, durability=durability
+        )
+
+if __name__ == "__main__":
+    asyncio.run(main())
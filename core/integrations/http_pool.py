@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+FixItFred Integration HTTP Pool
+Shared async HTTP clients per integration host with concurrency limits and retries
+"""
+
+import asyncio
+import logging
+import random
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+# Status codes worth retrying: throttling and transient server errors
+RETRY_STATUS_CODES = {408, 425, 429, 500, 502, 503, 504}
+
+# Methods a server may see twice without a second effect (RFC 9110 9.2.2)
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "TRACE", "PUT", "DELETE"}
+
+# Failures before any of the request was sent; safe to retry for every method
+UNSENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+class HostClientPool:
+    """One pooled ``httpx.AsyncClient`` per scheme://host:port
+    
+    Each host gets a keep-alive connection pool and a semaphore of
+    ``max_per_host`` in-flight requests, so a slow ERP only queues its own
+    requests. Every request runs under a total deadline on top of httpx's
+    connect/read timeouts, and is retried on connection errors, timeouts and
+    RETRY_STATUS_CODES with exponential backoff plus jitter (honouring
+    ``Retry-After``).
+    
+    Only idempotent requests are retried once they may have reached the
+    server: IDEMPOTENT_METHODS, requests carrying an ``Idempotency-Key``
+    header, or ``idempotent=True``. Anything else (a plain POST) is only
+    retried when the connection failed before it was sent.
+    """
+    
+    def __init__(self, max_per_host: int = 8, connect_timeout: float = 10.0,
+                 read_timeout: float = 30.0, total_timeout: float = 60.0,
+                 max_retries: int = 3, backoff_base: float = 0.5, backoff_max: float = 10.0):
+        self.max_per_host = max_per_host
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self.total_timeout = total_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+    
+    @staticmethod
+    def host_key(url: str) -> str:
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}"
+    
+    def _bind_loop(self):
+        """Clients and semaphores belong to one event loop; start fresh on a new one"""
+        
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Connections of a closed loop can't be reused or closed cleanly
+            self._clients = {}
+            self._semaphores = {}
+            self._loop = loop
+    
+    def client(self, url: str) -> httpx.AsyncClient:
+        """Pooled client for the URL's host"""
+        
+        self._bind_loop()
+        key = self.host_key(url)
+        client = self._clients.get(key)
+        if client is None:
+            client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_per_host,
+                                    max_keepalive_connections=self.max_per_host)
+            )
+            self._clients[key] = client
+            self._semaphores[key] = asyncio.Semaphore(self.max_per_host)
+        return client
+    
+    @staticmethod
+    def _replayable(method: str, kwargs: Dict[str, Any], idempotent: Optional[bool]) -> bool:
+        if idempotent is not None:
+            return idempotent
+        return method.upper() in IDEMPOTENT_METHODS or 'Idempotency-Key' in httpx.Headers(kwargs.get('headers'))
+    
+    def _retry_delay(self, attempt: int, response: Optional[httpx.Response] = None) -> float:
+        if response is not None:
+            retry_after = response.headers.get('Retry-After')
+            if retry_after and retry_after.isdigit():
+                return min(float(retry_after), self.backoff_max)
+        delay = min(self.backoff_base * (2 ** attempt), self.backoff_max)
+        return delay * random.uniform(0.5, 1.0)
+    
+    async def request(self, method: str, url: str, idempotent: Optional[bool] = None,
+                      **kwargs: Any) -> httpx.Response:
+        """Send a request through the host's pool with retries; returns the final response
+        
+        Responses with non-retryable error statuses are returned, not raised.
+        ``idempotent`` overrides the method-based retry decision.
+        """
+        
+        client = self.client(url)
+        semaphore = self._semaphores[self.host_key(url)]
+        replayable = self._replayable(method, kwargs, idempotent)
+        
+        attempt = 0
+        while True:
+            try:
+                async with semaphore:
+                    response = await asyncio.wait_for(
+                        client.request(method, url, **kwargs), self.total_timeout
+                    )
+            except (httpx.TransportError, asyncio.TimeoutError) as e:
+                if attempt >= self.max_retries or not (replayable or isinstance(e, UNSENT_ERRORS)):
+                    raise
+                delay = self._retry_delay(attempt)
+                logging.warning(f"{method} {url} failed ({e!r}); retry {attempt + 1} in {delay:.1f}s")
+            else:
+                if response.status_code not in RETRY_STATUS_CODES or attempt >= self.max_retries or not replayable:
+                    return response
+                delay = self._retry_delay(attempt, response)
+                logging.warning(f"{method} {url} returned {response.status_code}; retry {attempt + 1} in {delay:.1f}s")
+            
+            attempt += 1
+            await asyncio.sleep(delay)
+    
+    @asynccontextmanager
+    async def stream(self, method: str, url: str, idempotent: Optional[bool] = None,
+                     **kwargs: Any) -> AsyncIterator[httpx.Response]:
+        """Like ``request()`` but yields the response with its body unread
+        
+        Retries only happen before the body is handed out. The host's
+        concurrency slot is held until the caller leaves the block; the total
+        deadline covers the response headers, after which httpx's read timeout
+        applies per chunk.
+        """
+        
+        client = self.client(url)
+        semaphore = self._semaphores[self.host_key(url)]
+        replayable = self._replayable(method, kwargs, idempotent)
+        
+        attempt = 0
+        while True:
+            async with semaphore:
+                response = None
+                try:
+                    response = await asyncio.wait_for(
+                        client.send(client.build_request(method, url, **kwargs), stream=True),
+                        self.total_timeout
+                    )
+                except (httpx.TransportError, asyncio.TimeoutError) as e:
+                    if attempt >= self.max_retries or not (replayable or isinstance(e, UNSENT_ERRORS)):
+                        raise
+                    delay = self._retry_delay(attempt)
+                    logging.warning(f"{method} {url} failed ({e!r}); retry {attempt + 1} in {delay:.1f}s")
+                else:
+                    if response.status_code not in RETRY_STATUS_CODES or attempt >= self.max_retries or not replayable:
+                        try:
+                            yield response
+                        finally:
+                            await response.aclose()
+                        return
+                    await response.aclose()
+                    delay = self._retry_delay(attempt, response)
+                    logging.warning(f"{method} {url} returned {response.status_code}; retry {attempt + 1} in {delay:.1f}s")
+            
+            attempt += 1
+            await asyncio.sleep(delay)
+    
+    async def aclose(self):
+        """Close every pooled client"""
+        
+        clients, self._clients = self._clients, {}
+        self._semaphores = {}
+        await asyncio.gather(*(client.aclose() for client in clients.values()), return_exceptions=True)
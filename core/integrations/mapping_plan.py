@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+FixItFred Integration Mapping Plans
+Field mappings compiled once into a specialized batch mapping function
+"""
+
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+# transformation -> expression over the source value ``v``; unknown ones pass through
+TRANSFORM_EXPRESSIONS = {
+    'direct': "v",
+    'calculate': "float(v) if isinstance(v, (int, float, str)) else v",
+    'format': "str(v).strip().upper()"
+}
+
+MappingPlan = Callable[[Iterable[Dict[str, Any]]], List[Dict[str, Any]]]
+
+def mapping_signature(mappings) -> Tuple[Tuple[str, str, str], ...]:
+    """(source field, target key, transformation) per mapping, in order"""
+    return tuple(
+        (mapping.source_field, f"{mapping.target_module}_{mapping.target_field}", mapping.transformation)
+        for mapping in mappings
+    )
+
+def compile_mapping_plan(mappings, keep_raw_data: bool = True) -> MappingPlan:
+    """Compile DataMappings into ``plan(records) -> mapped records``
+    
+    The generated function has one membership test and one assignment per
+    mapping with the transformation inlined, instead of looping the mappings
+    and dispatching on the transformation name for every record. Output is
+    the same as the interpreted mapping; with ``keep_raw_data`` false the
+    source record is not attached under ``raw_data``.
+    
+    Field names only enter the generated source as ``repr()`` literals.
+    """
+    
+    lines = [
+        "def plan(records):",
+        "    mapped = []",
+        "    append = mapped.append",
+        "    for r in records:",
+        "        m = {'raw_data': r}" if keep_raw_data else "        m = {}"
+    ]
+    for source, target, transformation in mapping_signature(mappings):
+        expression = TRANSFORM_EXPRESSIONS.get(transformation, "v")
+        lines.append(f"        if {source!r} in r:")
+        if expression == "v":
+            lines.append(f"            m[{target!r}] = r[{source!r}]")
+        else:
+            lines.append(f"            v = r[{source!r}]")
+            lines.append(f"            m[{target!r}] = {expression}")
+    lines.append("        append(m)")
+    lines.append("    return mapped")
+    
+    namespace: Dict[str, Any] = {}
+    exec(compile("\n".join(lines), "<mapping plan>", "exec"), namespace)
+    return namespace['plan']
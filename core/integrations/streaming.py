@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+FixItFred Integration Streaming Parsers
+Incremental JSON and CSV record parsing over async byte streams
+"""
+
+import codecs
+import csv
+import io
+import json
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional
+
+# Envelope keys that commonly hold the record list
+RECORD_CONTAINER_KEYS = ('data', 'results', 'items', 'records')
+
+_WHITESPACE = ' \t\n\r'
+
+class JSONRecordStream:
+    """Yield the records of a JSON document without holding the whole body
+    
+    Accepts a top-level array of records, or an object whose first
+    RECORD_CONTAINER_KEYS member (or ``records_key``) is an array of records;
+    the other members of such an envelope (cursors, totals) are collected in
+    ``envelope`` as they are parsed. Any other document yields one record, as
+    the eager parser did.
+    """
+    
+    def __init__(self, chunks: AsyncIterator[bytes], records_key: Optional[str] = None,
+                 compact_at: int = 65536):
+        self.chunks = chunks
+        self.records_keys = (records_key,) if records_key else RECORD_CONTAINER_KEYS
+        self.envelope: Dict[str, Any] = {}
+        self.compact_at = compact_at
+        
+        self._decoder = json.JSONDecoder()
+        self._text_decoder = codecs.getincrementaldecoder('utf-8')()
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+    
+    async def _fill(self) -> bool:
+        """Append the next chunk to the buffer; False at end of stream"""
+        
+        if self._eof:
+            return False
+        if self._pos >= self.compact_at:
+            self._buffer = self._buffer[self._pos:]
+            self._pos = 0
+        try:
+            chunk = await self.chunks.__anext__()
+        except StopAsyncIteration:
+            self._eof = True
+            self._buffer += self._text_decoder.decode(b"", final=True)
+            return False
+        self._buffer += self._text_decoder.decode(chunk)
+        return True
+    
+    async def _peek(self) -> str:
+        """Next non-whitespace character (not consumed), '' at end of stream"""
+        
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in _WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not await self._fill():
+                return ""
+    
+    async def _expect(self, chars: str) -> str:
+        char = await self._peek()
+        if not char or char not in chars:
+            raise ValueError(f"Malformed JSON: expected one of {chars!r}, got {char!r} at {self._pos}")
+        self._pos += 1
+        return char
+    
+    async def _value(self) -> Any:
+        """Decode the next complete JSON value"""
+        
+        await self._peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+                # A number or literal touching the buffer end may continue in the next chunk
+                if end < len(self._buffer) or self._eof:
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            # At end of stream the next attempt either completes or raises
+            await self._fill()
+    
+    async def _array_items(self) -> AsyncIterator[Any]:
+        await self._expect('[')
+        if await self._peek() == ']':
+            self._pos += 1
+            return
+        while True:
+            yield await self._value()
+            if await self._expect(',]') == ']':
+                return
+    
+    async def records(self) -> AsyncIterator[Any]:
+        first = await self._peek()
+        
+        if first == '[':
+            async for item in self._array_items():
+                yield item
+            return
+        
+        if first != '{':
+            yield {"raw_data": await self._value()}
+            return
+        
+        self._pos += 1
+        streamed = False
+        if await self._peek() == '}':
+            self._pos += 1
+        else:
+            while True:
+                key = await self._value()
+                await self._expect(':')
+                if not streamed and key in self.records_keys and await self._peek() == '[':
+                    streamed = True
+                    async for item in self._array_items():
+                        yield item
+                else:
+                    self.envelope[key] = await self._value()
+                if await self._expect(',}') == '}':
+                    break
+        
+        if not streamed:
+            # No record list: the object itself is the record
+            yield self.envelope
+
+class CSVRecordStream:
+    """Yield CSV rows as dicts keyed by the header row, chunk by chunk"""
+    
+    def __init__(self, chunks: AsyncIterator[bytes], encoding: str = 'utf-8'):
+        self.chunks = chunks
+        self._text_decoder = codecs.getincrementaldecoder(encoding)()
+        self._header: Optional[List[str]] = None
+    
+    @staticmethod
+    def _complete_prefix(text: str) -> int:
+        """Length of the prefix ending at the last newline outside quotes"""
+        
+        newline = text.rfind('\n')
+        # An odd number of quotes before a newline puts it inside a quoted field
+        while newline != -1 and text.count('"', 0, newline) % 2:
+            newline = text.rfind('\n', 0, newline)
+        return newline + 1
+    
+    def _rows(self, text: str) -> Iterable[Dict[str, str]]:
+        reader = csv.reader(io.StringIO(text))
+        for row in reader:
+            if self._header is None:
+                self._header = row
+                continue
+            if row:
+                yield dict(zip(self._header, row))
+    
+    async def records(self) -> AsyncIterator[Dict[str, str]]:
+        pending = ""
+        async for chunk in self.chunks:
+            pending += self._text_decoder.decode(chunk)
+            cut = self._complete_prefix(pending)
+            if cut:
+                for row in self._rows(pending[:cut]):
+                    yield row
+                pending = pending[cut:]
+        
+        pending += self._text_decoder.decode(b"", final=True)
+        if pending.strip():
+            for row in self._rows(pending):
+                yield row
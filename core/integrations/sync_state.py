@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+FixItFred Integration Sync State
+Persisted per-endpoint change cursors and record content hashes for delta syncs
+"""
+
+import hashlib
+import json
+import sqlite3
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from core.memory.connection_pool import get_connection_pool
+
+# SQLite's default host parameter limit is 999; leave room for the endpoint key
+HASH_LOOKUP_CHUNK = 900
+
+@dataclass
+class SyncCursor:
+    """Where the last successful sync of an endpoint left off"""
+    updated_since: Optional[str] = None  # highest change timestamp seen
+    etag: Optional[str] = None
+    delta_token: Optional[str] = None
+    last_success: Optional[str] = None
+    not_modified: bool = False  # set for the current run on HTTP 304, never persisted
+
+def record_hash(record: Dict[str, Any]) -> bytes:
+    """Stable content hash of a source record"""
+    
+    payload = json.dumps(record, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.blake2b(payload.encode(), digest_size=16).digest()
+
+class SyncStateStore:
+    """Cursor and record-hash store shared by every integration
+    
+    Endpoints are keyed by a caller-chosen stable string (client, integration
+    and endpoint names), so state survives the connector being rebuilt.
+    Record hashes let a sync skip records whose content has not changed
+    since they were last stored. The schema is created through the pool's
+    writer on first use, so constructing a store never blocks.
+    """
+    
+    def __init__(self, db_path: str = "data/integration_sync_state.db"):
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.pool = get_connection_pool(db_path)
+    
+    async def _ensure_schema(self):
+        # CREATE IF NOT EXISTS, so concurrent first calls can both queue it
+        if not self.pool.schema_ready:
+            await self.pool.write(self._create_schema)
+            self.pool.schema_ready = True
+    
+    def _create_schema(self, conn: sqlite3.Connection):
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS endpoint_sync_state (
+                endpoint_key TEXT PRIMARY KEY,
+                updated_since TEXT,
+                etag TEXT,
+                delta_token TEXT,
+                last_success TEXT
+            )
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS record_hashes (
+                endpoint_key TEXT NOT NULL,
+                record_key TEXT NOT NULL,
+                content_hash BLOB NOT NULL,
+                PRIMARY KEY (endpoint_key, record_key)
+            ) WITHOUT ROWID
+        ''')
+    
+    async def load_cursor(self, endpoint_key: str) -> SyncCursor:
+        await self._ensure_schema()
+        
+        def fetch(conn):
+            return conn.execute(
+                "SELECT updated_since, etag, delta_token, last_success FROM endpoint_sync_state WHERE endpoint_key = ?",
+                (endpoint_key,)
+            ).fetchone()
+        
+        row = await self.pool.read(fetch)
+        return SyncCursor(*row) if row else SyncCursor()
+    
+    async def save_cursor(self, endpoint_key: str, cursor: SyncCursor):
+        """Persist the cursor of a completed sync"""
+        
+        await self._ensure_schema()
+        
+        def save(conn):
+            conn.execute('''
+                INSERT INTO endpoint_sync_state (endpoint_key, updated_since, etag, delta_token, last_success)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(endpoint_key) DO UPDATE SET
+                    updated_since = excluded.updated_since, etag = excluded.etag,
+                    delta_token = excluded.delta_token, last_success = excluded.last_success
+            ''', (endpoint_key, cursor.updated_since, cursor.etag, cursor.delta_token, cursor.last_success))
+        
+        cursor.last_success = datetime.now().isoformat()
+        await self.pool.write(save)
+    
+    async def changed_keys(self, endpoint_key: str, hashes: Dict[str, bytes]) -> Set[str]:
+        """Record keys whose hash is new or differs from the stored one"""
+        
+        await self._ensure_schema()
+        keys = list(hashes)
+        
+        def fetch(conn):
+            stored = {}
+            for start in range(0, len(keys), HASH_LOOKUP_CHUNK):
+                chunk = keys[start:start + HASH_LOOKUP_CHUNK]
+                stored.update(conn.execute(
+                    f"SELECT record_key, content_hash FROM record_hashes "
+                    f"WHERE endpoint_key = ? AND record_key IN ({','.join('?' * len(chunk))})",
+                    (endpoint_key, *chunk)
+                ).fetchall())
+            return stored
+        
+        stored = await self.pool.read(fetch)
+        return {key for key, content_hash in hashes.items() if stored.get(key) != content_hash}
+    
+    async def remember_hashes(self, endpoint_key: str, hashes: List[Tuple[str, bytes]]):
+        """Record the hashes of stored records"""
+        
+        await self._ensure_schema()
+        
+        def save(conn):
+            conn.executemany(
+                "INSERT OR REPLACE INTO record_hashes (endpoint_key, record_key, content_hash) VALUES (?, ?, ?)",
+                [(endpoint_key, key, content_hash) for key, content_hash in hashes]
+            )
+        
+        if hashes:
+            await self.pool.write(save)
+    
+    async def reset(self, endpoint_key: str):
+        """Forget an endpoint's cursor and hashes; its next sync is a full one"""
+        
+        await self._ensure_schema()
+        
+        def clear(conn):
+            conn.execute("DELETE FROM endpoint_sync_state WHERE endpoint_key = ?", (endpoint_key,))
+            conn.execute("DELETE FROM record_hashes WHERE endpoint_key = ?", (endpoint_key,))
+        
+        await self.pool.write(clear)
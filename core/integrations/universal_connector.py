@@ -7,14 +7,49 @@ Connect any application, API, automation, or system during client onboarding
 import asyncio
 import json
 import uuid
-import requests
-from typing import Dict, List, Any, Optional, Union
+from typing import AsyncIterator, Dict, List, Any, Optional, Union
+from urllib.parse import parse_qsl, urljoin, urlsplit
 from datetime import datetime, timedelta
 from dataclasses import dataclass, asdict
 from pathlib import Path
 import base64
 import hmac
 import hashlib
+import logging
+
+from core.integrations.http_pool import HostClientPool
+from core.integrations.mapping_plan import MappingPlan, compile_mapping_plan, mapping_signature
+from core.integrations.streaming import CSVRecordStream, JSONRecordStream
+from core.integrations.sync_state import SyncCursor, SyncStateStore, record_hash
+
+# Endpoint pagination settings; 'type' is one of
+#   none   - a single response
+#   offset - offset/limit query parameters until a short page
+#   page   - page number/page size query parameters until a short page
+#   cursor - the response envelope's cursor_path value goes in cursor_param
+#   link   - follow the rel="next" Link header
+PAGINATION_DEFAULTS = {
+    'type': 'none',
+    'page_size': 1000,
+    'size_param': 'limit',
+    'offset_param': 'offset',
+    'page_param': 'page',
+    'first_page': 1,
+    'cursor_param': 'cursor',
+    'cursor_path': 'next_cursor',  # dotted path into the JSON envelope
+    'records_key': None,  # envelope key holding the records (default: data/results/items/records)
+    'max_pages': 100000
+}
+
+# Endpoint delta-sync settings; an endpoint without a delta config always syncs in full
+DELTA_DEFAULTS = {
+    'updated_since_param': None,  # query parameter given the highest updated_field seen so far
+    'updated_field': 'updated_at',  # record field holding its change timestamp (ISO, sortable)
+    'etag': True,  # If-None-Match on single-response endpoints; 304 skips the sync
+    'token_param': None,  # query parameter carrying the vendor delta token
+    'token_path': None,  # dotted envelope path of the next delta token (a URL is requested as is)
+    'key_fields': None  # record identity; enables content hashing and upsert-only storage
+}
 
 @dataclass
 class IntegrationEndpoint:
@@ -32,10 +67,17 @@ class IntegrationEndpoint:
     frequency: str = 'on_demand'  # on_demand, hourly, daily, weekly, real_time
     enabled: bool = True
     created_at: datetime = None
+    pagination: Dict[str, Any] = None  # see PAGINATION_DEFAULTS
+    batch_size: int = 1000  # records per map/store batch
+    delta: Dict[str, Any] = None  # see DELTA_DEFAULTS
     
     def __post_init__(self):
         if self.headers is None:
             self.headers = {}
+        if self.pagination is None:
+            self.pagination = {}
+        if self.delta is None:
+            self.delta = {}
         if self.auth_config is None:
             self.auth_config = {}
         if self.parameters is None:
@@ -70,6 +112,7 @@ class Integration:
     last_sync: datetime = None
     sync_count: int = 0
     error_count: int = 0
+    keep_raw_data: bool = True  # attach the source record to each mapped record
     
     def __post_init__(self):
         if self.last_sync is None:
@@ -78,8 +121,17 @@ class Integration:
 class UniversalConnector:
     """Universal connector for any system integration"""
     
-    def __init__(self):
+    def __init__(self, max_requests_per_host: int = 8, sync_state_path: str = "data/integration_sync_state.db"):
         self.integrations: Dict[str, Integration] = {}
+        # Shared keep-alive clients; one slow host only queues its own requests
+        self.http = HostClientPool(max_per_host=max_requests_per_host)
+        # Fetched batches waiting for map/store per endpoint (backpressure bound)
+        self.pipeline_depth = 2
+        # Compiled mapping functions by (mapping signature, keep_raw_data)
+        self._mapping_plans: Dict[tuple, MappingPlan] = {}
+        # Delta-sync cursors and record hashes, opened on first use
+        self.sync_state_path = sync_state_path
+        self._sync_state: Optional[SyncStateStore] = None
         self.supported_systems = {
             'erp': {
                 'SAP': {'endpoints': ['/api/v1/data'], 'auth': 'oauth2'},
@@ -141,7 +193,8 @@ class UniversalConnector:
             description=integration_config.get('description', ''),
             system_type=integration_config.get('system_type', 'custom'),
             endpoints=endpoints,
-            data_mappings=data_mappings
+            data_mappings=data_mappings,
+            keep_raw_data=integration_config.get('keep_raw_data', True)
         )
         
         self.integrations[integration_id] = integration
@@ -202,25 +255,24 @@ class UniversalConnector:
             
             # Make request
             if endpoint.method.upper() == 'GET':
-                response = requests.get(
+                response = await self.http.request(
+                    'GET',
                     endpoint.url,
                     headers=headers,
-                    params=endpoint.parameters,
-                    timeout=30
+                    params=endpoint.parameters
                 )
             elif endpoint.method.upper() == 'POST':
-                response = requests.post(
+                response = await self.http.request(
+                    'POST',
                     endpoint.url,
                     headers=headers,
-                    json=endpoint.parameters,
-                    timeout=30
+                    json=endpoint.parameters
                 )
             else:
-                response = requests.request(
+                response = await self.http.request(
                     endpoint.method.upper(),
                     endpoint.url,
-                    headers=headers,
-                    timeout=30
+                    headers=headers
                 )
             
             response_time = (datetime.now() - start_time).total_seconds() * 1000
@@ -268,42 +320,30 @@ class UniversalConnector:
             
         return headers
     
-    async def sync_data(self, integration_id: str) -> Dict[str, Any]:
-        """Sync data from external system"""
+    @property
+    def sync_state(self) -> SyncStateStore:
+        if self._sync_state is None:
+            self._sync_state = SyncStateStore(self.sync_state_path)
+        return self._sync_state
+    
+    @staticmethod
+    def _endpoint_state_key(integration: Integration, endpoint: IntegrationEndpoint) -> str:
+        """Stable sync-state key; integration ids are regenerated on every create"""
+        return f"{integration.client_id}/{integration.name}/{endpoint.name}"
+    
+    async def sync_data(self, integration_id: str, full_resync: bool = False) -> Dict[str, Any]:
+        """Sync data from external system (only changes for endpoints with a delta config)"""
         
         if integration_id not in self.integrations:
             return {"success": False, "error": "Integration not found"}
         
         integration = self.integrations[integration_id]
-        sync_results = []
-        total_records = 0
         
-        for endpoint in integration.endpoints:
-            try:
-                # Fetch data from endpoint
-                data = await self._fetch_endpoint_data(endpoint)
-                
-                # Process and map data
-                mapped_data = await self._map_data(data, integration.data_mappings)
-                
-                # Store data in appropriate modules
-                storage_result = await self._store_mapped_data(mapped_data, integration.client_id)
-                
-                sync_results.append({
-                    "endpoint": endpoint.name,
-                    "success": True,
-                    "records_processed": len(mapped_data),
-                    "storage_result": storage_result
-                })
-                
-                total_records += len(mapped_data)
-                
-            except Exception as e:
-                sync_results.append({
-                    "endpoint": endpoint.name,
-                    "success": False,
-                    "error": str(e)
-                })
+        # Endpoints are fetched concurrently; HostClientPool caps each host
+        sync_results = await asyncio.gather(*(
+            self._sync_endpoint(integration, endpoint, full_resync) for endpoint in integration.endpoints
+        ))
+        total_records = sum(result.get("records_processed", 0) for result in sync_results)
         
         # Update integration statistics
         integration.last_sync = datetime.now()
@@ -316,71 +356,280 @@ class UniversalConnector:
             "timestamp": datetime.now().isoformat()
         }
     
-    async def _fetch_endpoint_data(self, endpoint: IntegrationEndpoint) -> List[Dict[str, Any]]:
-        """Fetch data from an endpoint"""
+    async def _sync_endpoint(self, integration: Integration, endpoint: IntegrationEndpoint,
+                             full_resync: bool = False) -> Dict[str, Any]:
+        """Stream one endpoint through fetch -> map -> store in bounded batches
+        
+        The fetch side parses records as the body arrives and hands batches of
+        ``endpoint.batch_size`` to map/store through a queue of
+        ``pipeline_depth`` batches; when storage falls behind, fetching pauses.
+        
+        With a ``delta`` config the request is narrowed by the stored cursor,
+        records whose content hash is unchanged are dropped before mapping and
+        the rest are upserted by ``key_fields``. The cursor is only saved once
+        every batch is stored, so a failed run is retried from the old one.
+        """
+        
+        delta = {**DELTA_DEFAULTS, **endpoint.delta} if endpoint.delta else None
+        cursor = None
+        if delta:
+            state_key = self._endpoint_state_key(integration, endpoint)
+            if full_resync:
+                await self.sync_state.reset(state_key)
+            cursor = await self.sync_state.load_cursor(state_key)
+            key_fields = delta['key_fields']
+            if isinstance(key_fields, str):
+                key_fields = [key_fields]
+        
+        batches: asyncio.Queue = asyncio.Queue(maxsize=self.pipeline_depth)
+        
+        async def produce():
+            try:
+                batch = []
+                async for record in self._iter_endpoint_records(endpoint, cursor, delta):
+                    batch.append(record)
+                    if len(batch) >= endpoint.batch_size:
+                        await batches.put(batch)
+                        batch = []
+                if batch:
+                    await batches.put(batch)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                await batches.put(None)
+                raise
+            await batches.put(None)
+        
+        producer = asyncio.create_task(produce())
+        records_fetched = 0
+        records_processed = 0
+        batch_count = 0
+        modules_affected = set()
         
-        headers = endpoint.headers.copy()
-        auth_headers = await self._prepare_auth(endpoint)
-        headers.update(auth_headers)
+        try:
+            while True:
+                batch = await batches.get()
+                if batch is None:
+                    break
+                records_fetched += len(batch)
+                
+                upsert_keys = hashes = None
+                if delta and key_fields:
+                    # Before the first completed sync there is nothing worth comparing against
+                    batch, upsert_keys, hashes = await self._changed_records(
+                        state_key, batch, key_fields, compare=cursor.last_success is not None
+                    )
+                    if not batch:
+                        continue
+                
+                # Process and map data
+                mapped_data = await self._map_data(batch, integration.data_mappings, integration.keep_raw_data)
+                
+                # Store data in appropriate modules
+                storage_result = await self._store_mapped_data(mapped_data, integration.client_id, upsert_keys)
+                if hashes:
+                    await self.sync_state.remember_hashes(state_key, hashes)
+                
+                records_processed += len(mapped_data)
+                batch_count += 1
+                modules_affected.update(storage_result.get("modules_affected", []))
+            
+            # Re-raises a fetch error
+            await producer
+            
+            if delta:
+                await self.sync_state.save_cursor(state_key, cursor)
+            
+            return {
+                "endpoint": endpoint.name,
+                "success": True,
+                "records_fetched": records_fetched,
+                "records_processed": records_processed,
+                "records_unchanged": records_fetched - records_processed,
+                "not_modified": bool(cursor and cursor.not_modified),
+                "storage_result": {
+                    "success": True,
+                    "operation": "upsert" if delta and key_fields else "insert",
+                    "records_stored": records_processed,
+                    "batches": batch_count,
+                    "modules_affected": sorted(modules_affected),
+                    "client_id": integration.client_id
+                }
+            }
         
-        response = requests.get(
-            endpoint.url,
-            headers=headers,
-            params=endpoint.parameters,
-            timeout=60
-        )
+        except Exception as e:
+            return {
+                "endpoint": endpoint.name,
+                "success": False,
+                "records_processed": records_processed,
+                "error": str(e)
+            }
         
-        if response.status_code >= 400:
-            raise Exception(f"HTTP {response.status_code}: {response.text}")
-        
-        if endpoint.data_format == 'json':
-            data = response.json()
-            # Handle different JSON structures
-            if isinstance(data, list):
-                return data
-            elif isinstance(data, dict):
-                # Look for common data containers
-                for key in ['data', 'results', 'items', 'records']:
-                    if key in data and isinstance(data[key], list):
-                        return data[key]
-                return [data]  # Single record
-            else:
-                return [{"raw_data": data}]
+        finally:
+            if not producer.done():
+                producer.cancel()
+    
+    async def _changed_records(self, state_key: str, batch: List[Dict[str, Any]],
+                               key_fields: List[str], compare: bool = True) -> tuple:
+        """Records of a batch that are new or changed, their upsert keys and content hashes"""
+        
+        keyed = {}
+        for record in batch:
+            # The last version of a key within a batch wins
+            keyed['\x1f'.join(str(record.get(field)) for field in key_fields)] = record
+        hashes = {key: record_hash(record) for key, record in keyed.items()}
+        
+        if compare:
+            changed = await self.sync_state.changed_keys(state_key, hashes)
+            keys = [key for key in keyed if key in changed]
         else:
-            # Handle other formats (CSV, XML, etc.)
-            return [{"raw_data": response.text}]
+            keys = list(keyed)
+        return [keyed[key] for key in keys], keys, [(key, hashes[key]) for key in keys]
     
-    async def _map_data(self, raw_data: List[Dict[str, Any]], mappings: List[DataMapping]) -> List[Dict[str, Any]]:
-        """Map raw data to FixItFred module format"""
+    @staticmethod
+    def _envelope_value(stream, path: str) -> Any:
+        """Value at a dotted path of a JSON response envelope, or None"""
+        
+        value = stream.envelope if isinstance(stream, JSONRecordStream) else {}
+        for part in path.split('.'):
+            value = value.get(part) if isinstance(value, dict) else None
+        return value
+    
+    async def _iter_endpoint_records(self, endpoint: IntegrationEndpoint, cursor: SyncCursor = None,
+                                     delta: Dict[str, Any] = None) -> AsyncIterator[Any]:
+        """Records of an endpoint across all pages, parsed incrementally
         
-        mapped_records = []
+        Given a delta ``cursor``, the request is narrowed by it and the cursor
+        is advanced in place (new ETag, delta token, highest updated_field);
+        persisting it is up to the caller.
+        """
         
-        for record in raw_data:
-            mapped_record = {"raw_data": record}
+        headers = endpoint.headers.copy()
+        auth_headers = await self._prepare_auth(endpoint)
+        headers.update(auth_headers)
+        
+        pagination = {**PAGINATION_DEFAULTS, **endpoint.pagination}
+        paging = pagination['type']
+        page_size = pagination['page_size']
+        
+        url = endpoint.url
+        params = dict(endpoint.parameters)
+        
+        delta = delta or {}
+        updated_field = delta.get('updated_field') if delta.get('updated_since_param') else None
+        next_token = None
+        if cursor is not None:
+            if cursor.updated_since and updated_field:
+                params[delta['updated_since_param']] = cursor.updated_since
+            if cursor.delta_token and delta.get('token_path'):
+                if '://' in cursor.delta_token:
+                    # A delta link carries the whole query; httpx drops a URL's query when params are given
+                    link = urlsplit(cursor.delta_token)
+                    url, params = link._replace(query='').geturl(), dict(parse_qsl(link.query, keep_blank_values=True))
+                elif delta.get('token_param'):
+                    params[delta['token_param']] = cursor.delta_token
+            if cursor.etag and delta.get('etag') and paging == 'none':
+                headers['If-None-Match'] = cursor.etag
+        
+        if paging == 'offset':
+            params.update({pagination['offset_param']: 0, pagination['size_param']: page_size})
+        elif paging == 'page':
+            params.update({pagination['page_param']: pagination['first_page'], pagination['size_param']: page_size})
+        elif paging in ('cursor', 'link'):
+            params.setdefault(pagination['size_param'], page_size)
+        
+        for page in range(pagination['max_pages']):
+            page_records = 0
+            next_url = None
             
-            for mapping in mappings:
-                if mapping.source_field in record:
-                    source_value = record[mapping.source_field]
-                    
-                    # Apply transformation
-                    if mapping.transformation == 'direct':
-                        mapped_value = source_value
-                    elif mapping.transformation == 'calculate':
-                        # Simple calculation example
-                        mapped_value = float(source_value) * 1.0 if isinstance(source_value, (int, float, str)) else source_value
-                    elif mapping.transformation == 'format':
-                        mapped_value = str(source_value).strip().upper()
-                    else:
-                        mapped_value = source_value
-                    
-                    mapped_record[f"{mapping.target_module}_{mapping.target_field}"] = mapped_value
+            async with self.http.stream('GET', url, headers=headers, params=params) as response:
+                if response.status_code == 304 and cursor is not None:
+                    cursor.not_modified = True
+                    return
+                if response.status_code >= 400:
+                    body = await response.aread()
+                    raise Exception(f"HTTP {response.status_code}: {body.decode(errors='replace')}")
+                
+                if endpoint.data_format == 'json':
+                    stream = JSONRecordStream(response.aiter_bytes(), pagination['records_key'])
+                elif endpoint.data_format == 'csv':
+                    stream = CSVRecordStream(response.aiter_bytes())
+                else:
+                    # Handle other formats (XML, etc.)
+                    yield {"raw_data": (await response.aread()).decode(errors='replace')}
+                    return
+                
+                async for record in stream.records():
+                    page_records += 1
+                    if updated_field and isinstance(record, dict):
+                        changed_at = record.get(updated_field)
+                        if changed_at is not None and (cursor.updated_since is None or str(changed_at) > cursor.updated_since):
+                            cursor.updated_since = str(changed_at)
+                    yield record
+                
+                if cursor is not None:
+                    if paging == 'none' and delta.get('etag'):
+                        cursor.etag = response.headers.get('ETag')
+                    if delta.get('token_path'):
+                        # Vendors return the next delta token on the last page
+                        next_token = self._envelope_value(stream, delta['token_path']) or next_token
+                
+                if paging == 'link':
+                    next_link = response.links.get('next', {}).get('url')
+                    next_url = urljoin(str(response.url), next_link) if next_link else None
+                elif paging == 'cursor':
+                    page_cursor = self._envelope_value(stream, pagination['cursor_path'])
             
-            mapped_records.append(mapped_record)
+            if paging in ('offset', 'page'):
+                if page_records < page_size:
+                    break
+                if paging == 'offset':
+                    params[pagination['offset_param']] += page_records
+                else:
+                    params[pagination['page_param']] += 1
+            elif paging == 'cursor':
+                if not page_cursor or not page_records:
+                    break
+                params[pagination['cursor_param']] = page_cursor
+            elif paging == 'link':
+                if not next_url:
+                    break
+                # The next link carries its own query string
+                url, params = next_url, None
+            else:
+                break
+        else:
+            logging.warning(f"Endpoint {endpoint.name} stopped after {pagination['max_pages']} pages")
         
-        return mapped_records
+        if cursor is not None and next_token:
+            cursor.delta_token = str(next_token)
+    
+    async def _fetch_endpoint_data(self, endpoint: IntegrationEndpoint) -> List[Dict[str, Any]]:
+        """Fetch data from an endpoint (all pages, materialized)"""
+        return [record async for record in self._iter_endpoint_records(endpoint)]
+    
+    def _mapping_plan(self, mappings: List[DataMapping], keep_raw_data: bool = True) -> MappingPlan:
+        """Compiled plan for a mapping list, built once and reused across batches"""
+        
+        key = (mapping_signature(mappings), keep_raw_data)
+        plan = self._mapping_plans.get(key)
+        if plan is None:
+            plan = compile_mapping_plan(mappings, keep_raw_data)
+            self._mapping_plans[key] = plan
+        return plan
     
-    async def _store_mapped_data(self, mapped_data: List[Dict[str, Any]], client_id: str) -> Dict[str, Any]:
-        """Store mapped data in appropriate FixItFred modules"""
+    async def _map_data(self, raw_data: List[Dict[str, Any]], mappings: List[DataMapping],
+                        keep_raw_data: bool = True) -> List[Dict[str, Any]]:
+        """Map raw data to FixItFred module format"""
+        return self._mapping_plan(mappings, keep_raw_data)(raw_data)
+    
+    async def _store_mapped_data(self, mapped_data: List[Dict[str, Any]], client_id: str,
+                                 upsert_keys: List[str] = None) -> Dict[str, Any]:
+        """Store mapped data in appropriate FixItFred modules
+        
+        With ``upsert_keys`` (one per record) records replace the stored
+        record with the same key instead of being appended.
+        """
         
         # This would integrate with your actual data storage system
         # For now, we'll simulate storage
@@ -394,6 +643,7 @@ class UniversalConnector:
         
         return {
             "success": True,
+            "operation": "upsert" if upsert_keys is not None else "insert",
             "records_stored": len(mapped_data),
             "modules_affected": list(modules_affected),
             "client_id": client_id
@@ -506,5 +756,9 @@ class UniversalConnector:
         
         return client_integrations
 
-# Global universal connector instance
-universal_connector = UniversalConnector()
\ No newline at end of file
+    async def aclose(self):
+        """Close pooled HTTP connections"""
+        await self.http.aclose()
+
+# Global universal connector instance; closed from the app's lifespan (dashboard.py)
+universal_connector = UniversalConnector()
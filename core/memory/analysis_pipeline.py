@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+FixItFred Document Analysis Pipeline
+Bounded queue feeding CPU-bound extraction and analysis into a process pool
+"""
+
+import asyncio
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Awaitable, Callable, List, Optional
+
+class AnalysisPipeline:
+    """Staged background analysis: bounded asyncio queue -> process pool -> completion callback
+    
+    ``submit`` waits while ``max_pending`` jobs are queued, so a burst of
+    uploads is throttled at the queue instead of piling unbounded work onto
+    the process pool. ``run`` skips the queue for callers that need the
+    result inline but still keeps the CPU work off the event loop.
+    """
+    
+    def __init__(self, max_workers: int = None, max_pending: int = 256):
+        self.max_workers = max_workers or max(1, (os.cpu_count() or 2) - 1)
+        self.max_pending = max_pending
+        
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._consumers: List[asyncio.Task] = []
+    
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+    
+    def _ensure_started(self):
+        """Bind the queue and consumer tasks to the running event loop"""
+        
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        
+        self._loop = loop
+        self._queue = asyncio.Queue(maxsize=self.max_pending)
+        self._consumers = [
+            loop.create_task(self._consume()) for _ in range(self.max_workers)
+        ]
+    
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+    
+    async def run(self, fn: Callable[..., Any], *args) -> Any:
+        """Run ``fn(*args)`` in the process pool and return its result"""
+        
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_executor(), fn, *args)
+    
+    async def submit(self, fn: Callable[..., Any], args: tuple,
+                     on_complete: Callable[[Any], Awaitable[None]],
+                     on_error: Callable[[BaseException], Awaitable[None]]):
+        """Queue a job; waits while the queue is full (backpressure)"""
+        
+        self._ensure_started()
+        await self._queue.put((fn, args, on_complete, on_error))
+    
+    async def _consume(self):
+        while True:
+            fn, args, on_complete, on_error = await self._queue.get()
+            try:
+                try:
+                    result = await self.run(fn, *args)
+                except Exception as e:
+                    await on_error(e)
+                else:
+                    await on_complete(result)
+            except Exception as e:
+                logging.error(f"Analysis pipeline callback failed: {e}")
+            finally:
+                self._queue.task_done()
+    
+    async def join(self):
+        """Wait until every queued job has been processed"""
+        
+        if self._queue is not None and self._loop is asyncio.get_running_loop():
+            await self._queue.join()
+    
+    async def shutdown(self):
+        """Drain queued jobs, then stop consumers and the process pool"""
+        
+        await self.join()
+        consumers, self._consumers = self._consumers, []
+        if self._loop is asyncio.get_running_loop():
+            for task in consumers:
+                task.cancel()
+            await asyncio.gather(*consumers, return_exceptions=True)
+        elif self._loop is not None and not self._loop.is_closed():
+            # Consumers bound to another thread's loop are cancelled there
+            for task in consumers:
+                self._loop.call_soon_threadsafe(task.cancel)
+        self._queue = None
+        self._loop = None
+        
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+# Process-wide pipeline shared by every company
+_pipeline: Optional[AnalysisPipeline] = None
+
+def get_analysis_pipeline() -> AnalysisPipeline:
+    """Get (or create) the shared analysis pipeline"""
+    
+    global _pipeline
+    if _pipeline is None:
+        _pipeline = AnalysisPipeline()
+    return _pipeline
+
+async def shutdown_analysis_pipeline():
+    """Drain and stop the shared pipeline - call on application shutdown"""
+    
+    global _pipeline
+    if _pipeline is not None:
+        await _pipeline.shutdown()
+        _pipeline = None
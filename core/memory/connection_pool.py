@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+FixItFred SQLite Connection Pool
+Shared per-database connection manager: WAL journal, one batched writer, pooled readers
+"""
+
+import asyncio
+import logging
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List
+
+# Pragmas applied to every pooled connection
+DEFAULT_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "temp_store": "MEMORY",
+    "cache_size": -16000,  # ~16MB page cache per connection
+    "mmap_size": 268435456,  # 256MB
+    "busy_timeout": 5000
+}
+
+_STOP = object()
+
+class SQLiteConnectionPool:
+    """Connection pool for one SQLite database file
+    
+    All writes are funnelled through a single writer thread which drains the
+    write queue and commits up to ``max_batch`` jobs in one transaction. Each
+    job runs inside its own SAVEPOINT so a failing job only rolls back itself.
+    Jobs can register ``after_commit`` callbacks for side effects outside the
+    database, which run on the writer only once their batch has committed.
+    Reads run on a small thread pool with one connection per reader thread.
+    """
+    
+    def __init__(self, db_path: str, read_workers: int = 4, max_batch: int = 128,
+                 pragmas: Dict[str, Any] = None):
+        self.db_path = str(db_path)
+        self.max_batch = max_batch
+        self.pragmas = dict(DEFAULT_PRAGMAS, **(pragmas or {}))
+        
+        # Bumped after every committed write batch; used for cache invalidation
+        self.data_version = 0
+        self.schema_ready = False
+        self.schema_lock = threading.Lock()
+        
+        self._write_queue: "queue.Queue" = queue.Queue()
+        self._commit_callbacks: List[Callable[[sqlite3.Connection], Any]] = []  # writer thread only
+        self._reader_local = threading.local()
+        self._reader_connections: List[sqlite3.Connection] = []
+        self._reader_lock = threading.Lock()
+        self._readers = ThreadPoolExecutor(
+            max_workers=read_workers,
+            thread_name_prefix=f"sqlite-read-{self.db_path}"
+        )
+        self._closed = False
+        
+        self._writer = threading.Thread(
+            target=self._writer_loop,
+            name=f"sqlite-write-{self.db_path}",
+            daemon=True
+        )
+        self._writer.start()
+    
+    def _connect(self) -> sqlite3.Connection:
+        """Open a connection with the pool pragmas applied"""
+        
+        # isolation_level=None: transactions are managed explicitly
+        conn = sqlite3.connect(self.db_path, isolation_level=None, check_same_thread=False)
+        for pragma, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {pragma}={value}")
+        return conn
+    
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
+    
+    def submit_write(self, fn: Callable[..., Any], *args) -> Future:
+        """Queue ``fn(conn, *args)`` for the writer thread"""
+        
+        if self._closed:
+            raise RuntimeError(f"Connection pool for {self.db_path} is closed")
+        
+        future: Future = Future()
+        self._write_queue.put((fn, args, future))
+        return future
+    
+    async def write(self, fn: Callable[..., Any], *args) -> Any:
+        """Run ``fn(conn, *args)`` in the next committed write batch"""
+        return await asyncio.wrap_future(self.submit_write(fn, *args))
+    
+    def write_blocking(self, fn: Callable[..., Any], *args) -> Any:
+        """Synchronous variant of write() for non-async callers"""
+        return self.submit_write(fn, *args).result()
+    
+    def after_commit(self, callback: Callable[[sqlite3.Connection], Any]):
+        """Run ``callback(conn)`` on the writer once the calling write job's batch commits
+        
+        Only callable from inside a write job. The callback is dropped if the
+        job or its batch rolls back, and runs before the job's future resolves.
+        """
+        
+        if threading.current_thread() is not self._writer:
+            raise RuntimeError("after_commit() can only be called from a write job")
+        self._commit_callbacks.append(callback)
+    
+    def _writer_loop(self):
+        """Drain the write queue and group-commit jobs"""
+        
+        conn = self._connect()
+        
+        while True:
+            job = self._write_queue.get()
+            if job is _STOP:
+                break
+            
+            batch = [job]
+            stop_requested = False
+            while len(batch) < self.max_batch:
+                try:
+                    next_job = self._write_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if next_job is _STOP:
+                    stop_requested = True
+                    break
+                batch.append(next_job)
+            
+            self._run_write_batch(conn, batch)
+            
+            if stop_requested:
+                break
+        
+        conn.close()
+    
+    def _run_write_batch(self, conn: sqlite3.Connection, batch: List[tuple]):
+        """Execute one batch of write jobs in a single transaction"""
+        
+        outcomes = []
+        
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            
+            for fn, args, future in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                
+                conn.execute("SAVEPOINT job")
+                callbacks_before = len(self._commit_callbacks)
+                try:
+                    result = fn(conn, *args)
+                    conn.execute("RELEASE SAVEPOINT job")
+                    outcomes.append((future, result, None))
+                except BaseException as e:
+                    conn.execute("ROLLBACK TO SAVEPOINT job")
+                    conn.execute("RELEASE SAVEPOINT job")
+                    del self._commit_callbacks[callbacks_before:]
+                    outcomes.append((future, None, e))
+            
+            conn.execute("COMMIT")
+            self.data_version += 1
+        
+        except Exception as e:
+            logging.error(f"SQLite write batch failed for {self.db_path}: {e}")
+            self._commit_callbacks.clear()
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            for fn, args, future in batch:
+                if future.done():
+                    continue
+                if future.running() or future.set_running_or_notify_cancel():
+                    future.set_exception(e)
+            return
+        
+        callbacks, self._commit_callbacks = self._commit_callbacks, []
+        for callback in callbacks:
+            try:
+                callback(conn)
+            except Exception as e:
+                logging.error(f"after_commit callback failed for {self.db_path}: {e}")
+        
+        for future, result, error in outcomes:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+    
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+    
+    def _reader_connection(self) -> sqlite3.Connection:
+        """Per-thread reader connection"""
+        
+        conn = getattr(self._reader_local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            self._reader_local.conn = conn
+            with self._reader_lock:
+                self._reader_connections.append(conn)
+        return conn
+    
+    def _run_read(self, fn: Callable[..., Any], args: tuple) -> Any:
+        return fn(self._reader_connection(), *args)
+    
+    async def read(self, fn: Callable[..., Any], *args) -> Any:
+        """Run ``fn(conn, *args)`` on a reader thread"""
+        
+        if self._closed:
+            raise RuntimeError(f"Connection pool for {self.db_path} is closed")
+        
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._readers, self._run_read, fn, args)
+    
+    def read_blocking(self, fn: Callable[..., Any], *args) -> Any:
+        """Synchronous variant of read() for non-async callers"""
+        return self._readers.submit(self._run_read, fn, args).result()
+    
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+    
+    def close(self):
+        """Flush pending writes and close all connections"""
+        
+        if self._closed:
+            return
+        self._closed = True
+        
+        self._write_queue.put(_STOP)
+        self._writer.join()
+        self._readers.shutdown(wait=True)
+        
+        with self._reader_lock:
+            for conn in self._reader_connections:
+                conn.close()
+            self._reader_connections.clear()
+
+# Process-wide pool registry, one pool per database file
+_pools: Dict[str, SQLiteConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+def get_connection_pool(db_path: str, **kwargs) -> SQLiteConnectionPool:
+    """Get (or create) the shared pool for a database file"""
+    
+    key = str(db_path)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = SQLiteConnectionPool(key, **kwargs)
+            _pools[key] = pool
+        return pool
+
+def close_connection_pool(db_path: str):
+    """Close and forget the pool for a database file"""
+    
+    with _pools_lock:
+        pool = _pools.pop(str(db_path), None)
+    if pool:
+        pool.close()
+
+def close_all_pools():
+    """Close every pool - call on application shutdown"""
+    
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
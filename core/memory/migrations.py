@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""
+FixItFred Memory Database Migrations
+Versioned schema upgrades for per-company memory databases (tracked in PRAGMA user_version)
+"""
+
+import logging
+import sqlite3
+from typing import Callable, List, Optional, Tuple
+
+from core.memory.connection_pool import SQLiteConnectionPool
+
+BACKFILL_BATCH_SIZE = 5000
+
+# Column expressions feeding the memory_search index. Triggers evaluate them
+# against NEW/OLD rows and the backfill against memory_contexts rows; they
+# must stay identical because contentless FTS5 deletes need the original values.
+MEMORY_SEARCH_EXPRESSIONS = {
+    "summary": "{row}.ai_summary",
+    "insights": "(SELECT group_concat(value, ' ') FROM json_each({row}.ai_insights))",
+    "recommendations": "(SELECT group_concat(value, ' ') FROM json_each({row}.ai_recommendations))",
+    "conversation": "(SELECT group_concat(atom, ' ') FROM json_tree({row}.conversation_history) WHERE type = 'text')"
+}
+
+def _memory_search_values(row: str) -> str:
+    return ', '.join(expression.format(row=row) for expression in MEMORY_SEARCH_EXPRESSIONS.values())
+
+def _create_progress_table(conn: sqlite3.Connection):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS migration_progress (
+            name TEXT PRIMARY KEY,
+            last_rowid INTEGER NOT NULL,
+            target_rowid INTEGER NOT NULL
+        )
+    ''')
+
+def backfill_in_batches(pool: SQLiteConnectionPool, name: str, table: str,
+                        insert_batch: Callable[[sqlite3.Connection, int, int], None],
+                        batch_size: int = BACKFILL_BATCH_SIZE,
+                        prepare: Optional[Callable[[sqlite3.Connection], None]] = None):
+    """Resumable rowid-ordered backfill, one committed write job per batch
+    
+    ``insert_batch(conn, after_rowid, upto_rowid)`` processes the rows in
+    (after_rowid, upto_rowid]. Progress is saved in the same transaction as
+    each batch, so an interrupted backfill resumes where it stopped. Rows
+    inserted after the target was captured are left to the live write path;
+    ``prepare(conn)`` (e.g. creating the triggers of that path) runs in the
+    same transaction that captures the target, so no row falls in between
+    or is handled by both.
+    """
+    
+    def start(conn):
+        _create_progress_table(conn)
+        if prepare is not None:
+            prepare(conn)
+        row = conn.execute(
+            'SELECT last_rowid, target_rowid FROM migration_progress WHERE name = ?', (name,)
+        ).fetchone()
+        if row:
+            return row
+        target = conn.execute(f'SELECT COALESCE(MAX(rowid), 0) FROM {table}').fetchone()[0]
+        conn.execute(
+            'INSERT INTO migration_progress (name, last_rowid, target_rowid) VALUES (?, 0, ?)',
+            (name, target)
+        )
+        return 0, target
+    
+    last_rowid, target_rowid = pool.write_blocking(start)
+    
+    def run_batch(conn, after_rowid):
+        upto_rowid = conn.execute(f'''
+            SELECT MAX(rowid) FROM (
+                SELECT rowid FROM {table}
+                WHERE rowid > ? AND rowid <= ?
+                ORDER BY rowid
+                LIMIT ?
+            )
+        ''', (after_rowid, target_rowid, batch_size)).fetchone()[0]
+        
+        if upto_rowid is None:
+            return None
+        
+        insert_batch(conn, after_rowid, upto_rowid)
+        conn.execute(
+            'UPDATE migration_progress SET last_rowid = ? WHERE name = ?', (upto_rowid, name)
+        )
+        return upto_rowid
+    
+    processed_batches = 0
+    while last_rowid < target_rowid:
+        upto_rowid = pool.write_blocking(run_batch, last_rowid)
+        if upto_rowid is None:
+            break
+        last_rowid = upto_rowid
+        processed_batches += 1
+    
+    if processed_batches:
+        logging.info(f"Backfill {name} on {pool.db_path}: {processed_batches} batches, up to rowid {last_rowid}")
+
+# ----------------------------------------------------------------------
+# Migration 1: contentless FTS5 index for memory recall
+# ----------------------------------------------------------------------
+
+def create_memory_search_index(pool: SQLiteConnectionPool):
+    """Full-text index over memory context summaries, insights, recommendations and conversations
+    
+    memory_contexts has no INTEGER PRIMARY KEY, so its rowids are not
+    guaranteed to survive VACUUM. The contentless index is therefore keyed
+    by ``memory_search_keys.search_rowid``, a stable integer per context_id.
+    """
+    
+    columns = ', '.join(MEMORY_SEARCH_EXPRESSIONS.keys())
+    
+    index_row = f'''
+        INSERT OR IGNORE INTO memory_search_keys (context_id) VALUES ({{row}}.context_id);
+        INSERT INTO memory_search (rowid, {columns})
+        SELECT search_rowid, {_memory_search_values('{row}')}
+        FROM memory_search_keys WHERE context_id = {{row}}.context_id;
+    '''
+    # Rows the backfill has not reached yet have no key and nothing to delete
+    unindex_row = f'''
+        INSERT INTO memory_search (memory_search, rowid, {columns})
+        SELECT 'delete', search_rowid, {_memory_search_values('{row}')}
+        FROM memory_search_keys WHERE context_id = {{row}}.context_id;
+        DELETE FROM memory_search_keys WHERE context_id = {{row}}.context_id;
+    '''
+    
+    def create_index(conn):
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS memory_search_keys (
+                search_rowid INTEGER PRIMARY KEY AUTOINCREMENT,
+                context_id TEXT NOT NULL UNIQUE
+            )
+        ''')
+        conn.execute(f'''
+            CREATE VIRTUAL TABLE IF NOT EXISTS memory_search
+            USING fts5({columns}, content='')
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS memory_contexts_search_insert
+            AFTER INSERT ON memory_contexts BEGIN
+                {index_row.format(row='new')}
+            END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS memory_contexts_search_delete
+            AFTER DELETE ON memory_contexts BEGIN
+                {unindex_row.format(row='old')}
+            END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS memory_contexts_search_update
+            AFTER UPDATE ON memory_contexts BEGIN
+                {unindex_row.format(row='old')}
+                {index_row.format(row='new')}
+            END
+        ''')
+    
+    def index_contexts(conn, after_rowid, upto_rowid):
+        # Contexts updated since the triggers went live already have a key and an index row
+        last_key = conn.execute('SELECT COALESCE(MAX(search_rowid), 0) FROM memory_search_keys').fetchone()[0]
+        conn.execute('''
+            INSERT INTO memory_search_keys (context_id)
+            SELECT c.context_id FROM memory_contexts c
+            WHERE c.rowid > ? AND c.rowid <= ?
+              AND NOT EXISTS (SELECT 1 FROM memory_search_keys k WHERE k.context_id = c.context_id)
+        ''', (after_rowid, upto_rowid))
+        conn.execute(f'''
+            INSERT INTO memory_search (rowid, {columns})
+            SELECT k.search_rowid, {_memory_search_values('c')}
+            FROM memory_search_keys k JOIN memory_contexts c ON c.context_id = k.context_id
+            WHERE k.search_rowid > ?
+        ''', (last_key,))
+    
+    backfill_in_batches(pool, "memory_search", "memory_contexts", index_contexts, prepare=create_index)
+
+# ----------------------------------------------------------------------
+# Migration 2: normalized document relation tables
+# ----------------------------------------------------------------------
+
+# join table -> (value column, JSON array column on documents)
+DOCUMENT_RELATION_TABLES = {
+    "document_modules": ("module", "related_modules"),
+    "document_tags": ("tag", "ai_tags"),
+    "document_processes": ("process", "related_processes"),
+    "document_workers": ("worker_id", "related_workers")
+}
+
+def create_document_relation_tables(pool: SQLiteConnectionPool):
+    """Join tables for modules, tags, processes and workers with covering indexes"""
+    
+    def create_tables(conn):
+        for table, (column, _) in DOCUMENT_RELATION_TABLES.items():
+            # (value, document_id) primary key on a WITHOUT ROWID table is
+            # itself the covering index for "documents with this value"
+            conn.execute(f'''
+                CREATE TABLE IF NOT EXISTS {table} (
+                    {column} TEXT NOT NULL,
+                    document_id TEXT NOT NULL,
+                    PRIMARY KEY ({column}, document_id)
+                ) WITHOUT ROWID
+            ''')
+            conn.execute(
+                f'CREATE INDEX IF NOT EXISTS idx_{table}_document ON {table}(document_id)'
+            )
+    
+    def link_documents(conn, after_rowid, upto_rowid):
+        for table, (column, source) in DOCUMENT_RELATION_TABLES.items():
+            conn.execute(f'''
+                INSERT OR IGNORE INTO {table} ({column}, document_id)
+                SELECT value, d.document_id
+                FROM documents d, json_each(d.{source})
+                WHERE d.rowid > ? AND d.rowid <= ?
+            ''', (after_rowid, upto_rowid))
+    
+    backfill_in_batches(pool, "document_relations", "documents", link_documents, prepare=create_tables)
+
+# ----------------------------------------------------------------------
+# Migration 3: content-addressed document blobs
+# ----------------------------------------------------------------------
+
+def create_document_blobs(pool: SQLiteConnectionPool):
+    """Blob table with reference counts and cached analysis, plus documents.content_hash"""
+    
+    def create_blobs(conn):
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS document_blobs (
+                content_hash TEXT PRIMARY KEY,
+                storage_path TEXT NOT NULL,
+                size_bytes INTEGER,
+                ref_count INTEGER NOT NULL DEFAULT 0,
+                pending_refs INTEGER NOT NULL DEFAULT 0,  -- uploads holding the blob before their commit
+                analysis TEXT,  -- JSON, content analysis reused for duplicate uploads
+                created_at TEXT
+            )
+        ''')
+        
+        columns = {row[1] for row in conn.execute('PRAGMA table_info(documents)')}
+        if "content_hash" not in columns:
+            conn.execute('ALTER TABLE documents ADD COLUMN content_hash TEXT')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_documents_content_hash ON documents(content_hash)')
+    
+    pool.write_blocking(create_blobs)
+
+# ----------------------------------------------------------------------
+# Migration 4: background analysis status
+# ----------------------------------------------------------------------
+
+def add_document_analysis_status(pool: SQLiteConnectionPool):
+    """analysis_status/analysis_error columns on documents; existing rows count as complete"""
+    
+    def add_columns(conn):
+        columns = {row[1] for row in conn.execute('PRAGMA table_info(documents)')}
+        if "analysis_status" not in columns:
+            conn.execute("ALTER TABLE documents ADD COLUMN analysis_status TEXT NOT NULL DEFAULT 'complete'")
+        if "analysis_error" not in columns:
+            conn.execute('ALTER TABLE documents ADD COLUMN analysis_error TEXT')
+        
+        # Partial index - only the few documents still awaiting analysis are indexed
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_documents_analysis_pending
+            ON documents(analysis_status) WHERE analysis_status = 'pending'
+        ''')
+    
+    pool.write_blocking(add_columns)
+
+# ----------------------------------------------------------------------
+# Migration 5: stable document_search rowids
+# ----------------------------------------------------------------------
+
+def create_document_search_keys(pool: SQLiteConnectionPool):
+    """document_id -> document_search rowid, so re-indexing deletes by rowid
+    
+    document_id is an ordinary FTS5 column; filtering on it scans the whole
+    index. Existing index rows keep their rowids; if a document has more
+    than one, the extra rows are dropped.
+    """
+    
+    def create_keys(conn):
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS document_search_keys (
+                search_rowid INTEGER PRIMARY KEY AUTOINCREMENT,
+                document_id TEXT NOT NULL UNIQUE
+            )
+        ''')
+        conn.execute('''
+            INSERT OR IGNORE INTO document_search_keys (search_rowid, document_id)
+            SELECT rowid, document_id FROM document_search ORDER BY rowid
+        ''')
+        conn.execute('''
+            DELETE FROM document_search
+            WHERE rowid NOT IN (SELECT search_rowid FROM document_search_keys)
+        ''')
+    
+    pool.write_blocking(create_keys)
+
+# Ordered (version, migration) pairs for memory databases
+MEMORY_MIGRATIONS: List[Tuple[int, Callable[[SQLiteConnectionPool], None]]] = [
+    (1, create_memory_search_index),
+    (2, create_document_relation_tables),
+    (3, create_document_blobs),
+    (4, add_document_analysis_status),
+    (5, create_document_search_keys),
+]
+
+def get_schema_version(pool: SQLiteConnectionPool) -> int:
+    return pool.read_blocking(lambda conn: conn.execute('PRAGMA user_version').fetchone()[0])
+
+def apply_migrations(pool: SQLiteConnectionPool, migrations=MEMORY_MIGRATIONS) -> int:
+    """Bring a database up to the latest schema version; returns the final version"""
+    
+    current = get_schema_version(pool)
+    
+    for version, migration in migrations:
+        if version <= current:
+            continue
+        
+        logging.info(f"Applying memory migration {version} ({migration.__name__}) to {pool.db_path}")
+        migration(pool)
+        pool.write_blocking(lambda conn: conn.execute(f'PRAGMA user_version = {int(version)}'))
+        current = version
+    
+    return current
@@ -6,18 +6,26 @@ Core module that plugs into all companies for AI-customizable memory and storage
 
 import asyncio
 import json
+import logging
 import sqlite3
 import uuid
 import hashlib
 import mimetypes
 import os
-from typing import Dict, List, Any, Optional, Union
+from typing import Dict, List, Any, Optional, Union, Iterable, Tuple
 from datetime import datetime, timedelta
 from dataclasses import dataclass, asdict
 from pathlib import Path
 import base64
+import re
+import threading
+from collections import OrderedDict
 from enum import Enum
 
+from core.memory.analysis_pipeline import get_analysis_pipeline, shutdown_analysis_pipeline
+from core.memory.connection_pool import get_connection_pool, close_all_pools
+from core.memory.migrations import apply_migrations, DOCUMENT_RELATION_TABLES
+
 class DocumentType(Enum):
     """Supported document types"""
     PDF = "pdf"
@@ -87,6 +95,8 @@ class DocumentMetadata:
     full_text_content: str  # AI-extracted text content
     storage_location: StorageLocation
     storage_path: str
+    content_hash: Optional[str] = None  # SHA-256 of the stored blob
+    analysis_status: str = "complete"  # pending, complete or failed
 
 @dataclass
 class MemoryContext:
@@ -115,17 +125,121 @@ class MemoryContext:
     spawned_tasks: List[str]
     linked_incidents: List[str]
 
+# Words ignored when turning free text into search terms
+SEARCH_STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "but", "by", "can", "do", "for",
+    "from", "has", "have", "how", "i", "in", "is", "it", "its", "me", "my", "need",
+    "of", "on", "or", "our", "should", "so", "that", "the", "their", "then", "there",
+    "this", "to", "up", "was", "we", "what", "when", "where", "which", "who", "will",
+    "with", "you", "your"
+}
+
+def extract_search_terms(text: str, max_terms: int = 12) -> List[str]:
+    """Normalize free text into distinct, stopword-free search terms"""
+    
+    terms = []
+    for word in re.findall(r"[a-z0-9_]+", text.lower()):
+        if len(word) > 1 and word not in SEARCH_STOPWORDS and word not in terms:
+            terms.append(word)
+    return terms[:max_terms]
+
+def fts_phrase(term: str) -> str:
+    """Quote a term so FTS5 treats it literally"""
+    return '"' + term.replace('"', '""') + '"'
+
+# Column order of the documents table, used for projections
+DOCUMENT_COLUMNS = [
+    "document_id", "filename", "file_type", "size_bytes", "created_at", "modified_at",
+    "uploaded_by", "company_id", "department", "ai_summary", "ai_tags", "ai_category",
+    "ai_importance_score", "access_level", "permissions", "encryption_status",
+    "version", "parent_document_id", "is_latest_version", "related_modules",
+    "related_processes", "related_workers", "search_keywords", "full_text_content",
+    "storage_location", "storage_path", "content_hash", "analysis_status"
+]
+
+_DOCUMENT_COLUMN_INDEX = {column: index for index, column in enumerate(DOCUMENT_COLUMNS)}
+
+# Columns that need decoding before use; everything else is returned as stored
+_DOCUMENT_DECODERS = {
+    "file_type": DocumentType,
+    "ai_tags": json.loads,
+    "permissions": json.loads,
+    "related_modules": json.loads,
+    "related_processes": json.loads,
+    "related_workers": json.loads,
+    "search_keywords": json.loads,
+    "storage_location": StorageLocation
+}
+
+class DocumentRow:
+    """Lightweight read-only view of a documents row
+    
+    Attributes mirror DocumentMetadata, but JSON and enum columns are only
+    decoded when first accessed, so listing callers that read the id,
+    filename and score never pay for the rest. ``score`` holds the rank
+    column of search results (None for plain listings).
+    """
+    
+    __slots__ = ("_row", "_decoded", "score")
+    
+    def __init__(self, row: tuple):
+        self._row = row
+        self._decoded = None
+        self.score = row[len(DOCUMENT_COLUMNS)] if len(row) > len(DOCUMENT_COLUMNS) else None
+    
+    def __getattr__(self, name: str) -> Any:
+        index = _DOCUMENT_COLUMN_INDEX.get(name)
+        if index is None:
+            raise AttributeError(name)
+        
+        decoder = _DOCUMENT_DECODERS.get(name)
+        if decoder is None:
+            return self._row[index]
+        
+        if self._decoded is None:
+            self._decoded = {}
+        elif name in self._decoded:
+            return self._decoded[name]
+        
+        value = decoder(self._row[index])
+        self._decoded[name] = value
+        return value
+    
+    def __repr__(self) -> str:
+        return f"DocumentRow(document_id={self._row[0]!r}, filename={self._row[1]!r})"
+    
+    def to_metadata(self) -> DocumentMetadata:
+        """Fully hydrated DocumentMetadata"""
+        return DocumentMetadata(**{column: getattr(self, column) for column in DOCUMENT_COLUMNS})
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Same shape as asdict(self.to_metadata()), without building the dataclass"""
+        # Decoded fresh rather than from the cache so callers get their own containers
+        values = {}
+        for column, raw in zip(DOCUMENT_COLUMNS, self._row):
+            decoder = _DOCUMENT_DECODERS.get(column)
+            values[column] = decoder(raw) if decoder else raw
+        return values
+
 class UniversalMemorySystem:
-    """Core memory and document management system for all companies"""
+    """Core memory and document management system for all companies
+    
+    Construction is cheap; await ``initialize()`` before first use to create
+    the schema and run migrations (once per process per company database).
+    """
     
     def __init__(self, company_id: str):
         self.company_id = company_id
         self.db_path = f"data/memory_{company_id}.db"
         self.storage_path = Path(f"data/documents/{company_id}")
         self.storage_path.mkdir(parents=True, exist_ok=True)
+        self.blob_path = self.storage_path / "blobs"
         
-        # Initialize database
-        self._initialize_database()
+        # Shared per-company pool (WAL, batched writer, pooled readers)
+        self.pool = get_connection_pool(self.db_path)
+        
+        # Shared process pool for text extraction and content analysis
+        self.analysis_pipeline = get_analysis_pipeline()
         
         # AI configuration - customizable per company
         self.ai_config = {
@@ -136,11 +250,32 @@ class UniversalMemorySystem:
             "duplicate_detection": True,
             "retention_policies": True
         }
+        
+        # How strongly importance_score boosts bm25 relevance in recall_memory
+        self.recall_importance_weight = 1.0
+    
+    async def initialize(self) -> "UniversalMemorySystem":
+        """Create the schema and apply migrations off the event loop; returns self"""
+        
+        if not self.pool.schema_ready:
+            await asyncio.to_thread(self._initialize_database)
+        return self
     
     def _initialize_database(self):
-        """Initialize SQLite database with optimized schema"""
+        """Initialize SQLite database with optimized schema (blocking; see initialize())"""
+        
+        # The pool is shared by every instance for this company, so the
+        # schema only needs to be created once per process
+        with self.pool.schema_lock:
+            if not self.pool.schema_ready:
+                self.pool.write_blocking(self._create_schema)
+                apply_migrations(self.pool)
+                self.pool.write_blocking(self._release_stale_blob_reservations)
+                self.pool.schema_ready = True
+    
+    def _create_schema(self, conn: sqlite3.Connection):
+        """Create tables and indexes (runs on the pool writer)"""
         
-        conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
         # Documents table
@@ -225,35 +360,330 @@ class UniversalMemorySystem:
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_documents_importance ON documents(ai_importance_score)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_contexts_company ON memory_contexts(company_id)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_contexts_type ON memory_contexts(context_type)')
-        
-        conn.commit()
-        conn.close()
     
     async def upload_document(self, file_data: bytes, filename: str, 
                             uploaded_by: str, department: str,
                             custom_tags: List[str] = None,
-                            ai_prompt: str = None) -> DocumentMetadata:
-        """Upload and process document with AI analysis"""
+                            ai_prompt: str = None,
+                            background_analysis: bool = False) -> DocumentMetadata:
+        """Upload and process document with AI analysis
+        
+        With ``background_analysis`` the document is stored and indexed by
+        filename right away with ``analysis_status="pending"``; extraction and
+        analysis then run on the analysis pipeline and update the row when done.
+        """
         
         document_id = f"DOC-{uuid.uuid4().hex[:8]}"
         file_type = self._detect_file_type(filename)
         
-        # Store file
-        storage_path = self.storage_path / f"{document_id}_{filename}"
-        with open(storage_path, 'wb') as f:
-            f.write(file_data)
+        # Store file (content-addressed, identical bytes share one blob)
+        content_hash, blob_path, size_bytes, base_analysis = await self._store_blob(file_data)
+        
+        try:
+            # AI processing - skipped when this content was analyzed before
+            is_new_content = base_analysis is None
+            defer_analysis = is_new_content and background_analysis
+            
+            if defer_analysis:
+                ai_analysis = self._pending_analysis(filename)
+            else:
+                if is_new_content:
+                    base_analysis = await self._ai_analyze_document(blob_path, file_type)
+                ai_analysis = await self._finalize_analysis(base_analysis, filename, ai_prompt)
+            
+            # Create metadata
+            metadata = self._build_document_metadata(
+                document_id, filename, file_type, size_bytes, uploaded_by,
+                department, custom_tags, ai_analysis, blob_path, content_hash
+            )
+            if defer_analysis:
+                metadata.analysis_status = "pending"
+            
+            # Document row, search index row and blob reference are written in one transaction
+            await self.pool.write(
+                self._insert_documents, [metadata],
+                {content_hash: base_analysis} if is_new_content and not defer_analysis else {}
+            )
+        except Exception:
+            await self.pool.write(self._release_blobs, [content_hash])
+            raise
+        
+        if defer_analysis:
+            await self._schedule_analysis(metadata, ai_prompt)
+        
+        return metadata
+    
+    async def upload_documents_bulk(self, files: Iterable[Tuple[str, Any]],
+                                    uploaded_by: str, department: str,
+                                    custom_tags: List[str] = None,
+                                    ai_prompt: str = None,
+                                    batch_size: int = 500) -> Dict[str, Any]:
+        """Bulk-ingest documents for backfills
+        
+        ``files`` yields ``(filename, source)`` pairs where source is bytes, a
+        binary file object or a filesystem path. Files are streamed to disk one
+        at a time and each batch of ``batch_size`` documents is committed in a
+        single transaction, so memory stays bounded for large backfills.
+        """
+        
+        results = []
+        batch: List[DocumentMetadata] = []
+        batch_results: List[Dict[str, Any]] = []
+        batch_analyses: Dict[str, Dict[str, Any]] = {}
+        
+        async def flush_batch():
+            if not batch:
+                return
+            try:
+                await self.pool.write(self._insert_documents, list(batch), dict(batch_analyses))
+                for result in batch_results:
+                    result["status"] = "success"
+            except Exception as e:
+                # The whole batch rolled back - release its blob reservations
+                await self.pool.write(self._release_blobs, [metadata.content_hash for metadata in batch])
+                for result in batch_results:
+                    result.update({"status": "failed", "error": str(e), "document_id": None})
+            batch.clear()
+            batch_results.clear()
+            batch_analyses.clear()
+        
+        for filename, source in files:
+            result = {"filename": filename, "document_id": None, "status": "pending"}
+            results.append(result)
+            
+            document_id = f"DOC-{uuid.uuid4().hex[:8]}"
+            content_hash = None
+            
+            try:
+                file_type = self._detect_file_type(filename)
+                content_hash, blob_path, size_bytes, cached_analysis = await self._store_blob(source)
+                
+                base_analysis = batch_analyses.get(content_hash) or cached_analysis
+                if base_analysis is None:
+                    # The worker process reads the blob; only the analysis comes back
+                    base_analysis = await self._ai_analyze_document(blob_path, file_type)
+                    batch_analyses[content_hash] = base_analysis
+                
+                ai_analysis = await self._finalize_analysis(base_analysis, filename, ai_prompt)
+                
+                metadata = self._build_document_metadata(
+                    document_id, filename, file_type, size_bytes, uploaded_by,
+                    department, custom_tags, ai_analysis, blob_path, content_hash
+                )
+            except Exception as e:
+                if content_hash:
+                    await self.pool.write(self._release_blobs, [content_hash])
+                result.update({"status": "failed", "error": str(e)})
+                continue
+            
+            result["document_id"] = document_id
+            batch.append(metadata)
+            batch_results.append(result)
+            
+            if len(batch) >= batch_size:
+                await flush_batch()
+        
+        await flush_batch()
+        
+        succeeded = sum(1 for result in results if result["status"] == "success")
+        
+        return {
+            "total_files": len(results),
+            "succeeded": succeeded,
+            "failed": len(results) - succeeded,
+            "results": results
+        }
+    
+    def _stage_blob(self, source: Any, chunk_size: int = 1024 * 1024) -> Tuple[str, Path, int]:
+        """Stream bytes, a file object or a path into a temp file, hashing as it goes
+        
+        Returns (SHA-256, temp file path, size); ``_reserve_blob`` moves the
+        file into content-addressed storage.
+        """
+        
+        if isinstance(source, (str, Path)):
+            with open(source, 'rb') as src:
+                return self._stage_blob(src, chunk_size)
+        
+        hasher = hashlib.sha256()
+        size_bytes = 0
+        tmp_dir = self.blob_path / "tmp"
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = tmp_dir / uuid.uuid4().hex
+        
+        try:
+            with open(tmp_path, 'wb') as f:
+                if isinstance(source, (bytes, bytearray, memoryview)):
+                    hasher.update(source)
+                    f.write(source)
+                    size_bytes = len(source)
+                else:
+                    while True:
+                        chunk = source.read(chunk_size)
+                        if not chunk:
+                            break
+                        hasher.update(chunk)
+                        f.write(chunk)
+                        size_bytes += len(chunk)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+        
+        return hasher.hexdigest(), tmp_path, size_bytes
+    
+    async def _store_blob(self, source: Any) -> Tuple[str, Path, int, Optional[Dict[str, Any]]]:
+        """Store ``source`` as a content-addressed blob and take a pending reference on it
+        
+        Returns (hash, blob path, size, cached content analysis or None). The
+        pending reference keeps the blob alive until ``_insert_documents``
+        turns it into a document reference or ``_release_blobs`` drops it.
+        """
+        
+        content_hash, staged_path, size_bytes = await asyncio.to_thread(self._stage_blob, source)
+        try:
+            analysis = await self.pool.write(self._reserve_blob, content_hash, staged_path, size_bytes)
+        finally:
+            # Already moved into place or dropped by the reservation
+            staged_path.unlink(missing_ok=True)
+        return content_hash, self._blob_path_for(content_hash), size_bytes, analysis
+    
+    def _blob_path_for(self, content_hash: str) -> Path:
+        return self.blob_path / content_hash[:2] / content_hash
+    
+    def _reserve_blob(self, conn: sqlite3.Connection, content_hash: str, staged_path: Path,
+                      size_bytes: int) -> Optional[Dict[str, Any]]:
+        """Take a pending reference and place the staged file (runs on the pool writer)
+        
+        Reuse and release of a blob are both decided on the writer, and files
+        are only unlinked after the release commits, so an existing blob
+        cannot disappear between this check and the upload that reuses it.
+        Returns the cached content analysis, if any.
+        """
+        
+        blob_path = self._blob_path_for(content_hash)
+        analysis = conn.execute('''
+            INSERT INTO document_blobs (content_hash, storage_path, size_bytes, ref_count, pending_refs, created_at)
+            VALUES (?, ?, ?, 0, 1, ?)
+            ON CONFLICT (content_hash) DO UPDATE SET pending_refs = pending_refs + 1
+            RETURNING analysis
+        ''', (content_hash, str(blob_path), size_bytes, datetime.now().isoformat())).fetchone()[0]
+        
+        if blob_path.exists():
+            staged_path.unlink()
+        else:
+            blob_path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(staged_path, blob_path)
+        
+        return json.loads(analysis) if analysis else None
+    
+    def _release_blobs(self, conn: sqlite3.Connection, content_hashes: List[str]):
+        """Drop pending references of uploads that were not committed (runs on the pool writer)"""
+        
+        conn.executemany(
+            'UPDATE document_blobs SET pending_refs = pending_refs - 1 WHERE content_hash = ? AND pending_refs > 0',
+            [(content_hash,) for content_hash in content_hashes if content_hash]
+        )
+        self._drop_unreferenced_blobs(conn, content_hashes)
+    
+    def _release_stale_blob_reservations(self, conn: sqlite3.Connection):
+        """Pending references of uploads interrupted by a restart (runs on the pool writer)"""
+        
+        rows = conn.execute(
+            'UPDATE document_blobs SET pending_refs = 0 WHERE pending_refs > 0 RETURNING content_hash'
+        ).fetchall()
+        self._drop_unreferenced_blobs(conn, [row[0] for row in rows])
+    
+    def _drop_unreferenced_blobs(self, conn: sqlite3.Connection, content_hashes: List[str]):
+        """Delete blob rows nothing references and unlink their files once that commits"""
+        
+        hashes = [content_hash for content_hash in set(content_hashes) if content_hash]
+        if not hashes:
+            return
+        conn.executemany(
+            'DELETE FROM document_blobs WHERE content_hash = ? AND ref_count + pending_refs <= 0',
+            [(content_hash,) for content_hash in hashes]
+        )
+        
+        def unlink_released(conn):
+            # Re-checked after commit: a later job in the same batch may have reserved the blob again
+            for content_hash in hashes:
+                if conn.execute(
+                    'SELECT 1 FROM document_blobs WHERE content_hash = ?', (content_hash,)
+                ).fetchone() is None:
+                    self._blob_path_for(content_hash).unlink(missing_ok=True)
+        
+        self.pool.after_commit(unlink_released)
+    
+    async def _finalize_analysis(self, base_analysis: Dict[str, Any], filename: str,
+                                 ai_prompt: str = None) -> Dict[str, Any]:
+        """Per-upload analysis: the shared content analysis plus summary, tags and category from the filename"""
+        
+        analysis = dict(
+            base_analysis,
+            summary=f"AI-generated summary of {filename}",
+            tags=list(set(base_analysis["tags"] + self._filename_tags(filename))),
+            category=base_analysis["category"] or self._filename_category(filename),
+            related_modules=list(base_analysis["related_modules"])
+        )
+        
+        # Apply custom AI prompt if provided
+        if ai_prompt:
+            analysis = await self._apply_custom_ai_prompt(analysis, ai_prompt, analysis["content"])
+        
+        return analysis
+    
+    async def delete_document(self, document_id: str) -> bool:
+        """Delete a document, releasing its blob when no other document or upload uses it"""
+        
+        def remove_document(conn):
+            row = conn.execute(
+                'SELECT content_hash, storage_path FROM documents WHERE document_id = ?',
+                (document_id,)
+            ).fetchone()
+            if not row:
+                return None
+            
+            content_hash, storage_path = row
+            conn.execute('DELETE FROM documents WHERE document_id = ?', (document_id,))
+            self._delete_document_index_rows(conn, document_id)
+            
+            if not content_hash:
+                # Stored before content addressing - the file belongs to this document only
+                return storage_path
+            
+            conn.execute(
+                'UPDATE document_blobs SET ref_count = ref_count - 1 WHERE content_hash = ?',
+                (content_hash,)
+            )
+            self._drop_unreferenced_blobs(conn, [content_hash])
+            return ""
+        
+        released_path = await self.pool.write(remove_document)
+        if released_path is None:
+            return False
         
-        # AI processing
-        ai_analysis = await self._ai_analyze_document(file_data, filename, file_type, ai_prompt)
+        if released_path:
+            await asyncio.to_thread(Path(released_path).unlink, missing_ok=True)
+        return True
+    
+    def _build_document_metadata(self, document_id: str, filename: str,
+                                 file_type: DocumentType, size_bytes: int,
+                                 uploaded_by: str, department: str,
+                                 custom_tags: Optional[List[str]],
+                                 ai_analysis: Dict[str, Any],
+                                 storage_path: Path,
+                                 content_hash: str = None) -> DocumentMetadata:
+        """Assemble DocumentMetadata from upload details and AI analysis"""
         
-        # Create metadata
-        metadata = DocumentMetadata(
+        now = datetime.now().isoformat()
+        
+        return DocumentMetadata(
             document_id=document_id,
             filename=filename,
             file_type=file_type,
-            size_bytes=len(file_data),
-            created_at=datetime.now().isoformat(),
-            modified_at=datetime.now().isoformat(),
+            size_bytes=size_bytes,
+            created_at=now,
+            modified_at=now,
             uploaded_by=uploaded_by,
             company_id=self.company_id,
             department=department,
@@ -273,53 +703,165 @@ class UniversalMemorySystem:
             search_keywords=ai_analysis["keywords"],
             full_text_content=ai_analysis["content"],
             storage_location=StorageLocation.LOCAL_SQLITE,
-            storage_path=str(storage_path)
+            storage_path=str(storage_path),
+            content_hash=content_hash
         )
+    
+    async def _ai_analyze_document(self, blob_path: Path, file_type: DocumentType) -> Dict[str, Any]:
+        """AI-powered document analysis, run in the analysis process pool"""
         
-        # Save to database
-        await self._save_document_metadata(metadata)
-        
-        # Update search index
-        await self._update_search_index(metadata)
-        
-        return metadata
+        return await self.analysis_pipeline.run(analyze_document_file, str(blob_path), file_type.value)
     
-    async def _ai_analyze_document(self, file_data: bytes, filename: str, 
-                                 file_type: DocumentType, ai_prompt: str = None) -> Dict[str, Any]:
-        """AI-powered document analysis and metadata extraction"""
+    @staticmethod
+    def _analyze_document_bytes(file_data: bytes, file_type: DocumentType) -> Dict[str, Any]:
+        """Text extraction and content analysis (CPU-bound, no I/O or shared state)
+        
+        Only fields derived from the content are returned - the result is
+        cached per blob and shared by every upload of the same bytes.
+        ``category`` is None when the content alone does not decide it.
+        """
         
         # Simulate AI analysis (replace with actual AI model)
         content = ""
         
         # Extract text content based on file type
         if file_type == DocumentType.PDF:
-            content = self._extract_pdf_text(file_data)
+            content = UniversalMemorySystem._extract_pdf_text(file_data)
         elif file_type == DocumentType.WORD:
-            content = self._extract_docx_text(file_data)
+            content = UniversalMemorySystem._extract_docx_text(file_data)
         elif file_type == DocumentType.TEXT:
             content = file_data.decode('utf-8')
         elif file_type == DocumentType.JSON:
             content = json.dumps(json.loads(file_data.decode('utf-8')), indent=2)
         
         # AI analysis
-        analysis = {
-            "summary": f"AI-generated summary of {filename}",
-            "tags": self._ai_generate_tags(content, filename),
-            "category": self._ai_categorize_document(content, filename),
-            "importance_score": self._ai_calculate_importance(content),
-            "related_modules": self._ai_find_related_modules(content),
-            "related_processes": self._ai_find_related_processes(content),
-            "keywords": self._ai_extract_keywords(content),
+        return {
+            "tags": UniversalMemorySystem._ai_generate_tags(content),
+            "category": UniversalMemorySystem._ai_categorize_document(content),
+            "importance_score": UniversalMemorySystem._ai_calculate_importance(content),
+            "related_modules": UniversalMemorySystem._ai_find_related_modules(content),
+            "related_processes": UniversalMemorySystem._ai_find_related_processes(content),
+            "keywords": UniversalMemorySystem._ai_extract_keywords(content),
             "content": content[:5000]  # First 5000 chars for search
         }
+    
+    def _pending_analysis(self, filename: str) -> Dict[str, Any]:
+        """Placeholder analysis stored until background analysis completes"""
         
-        # Apply custom AI prompt if provided
-        if ai_prompt:
-            analysis = await self._apply_custom_ai_prompt(analysis, ai_prompt, content)
+        return {
+            "summary": f"Analysis pending for {filename}",
+            "tags": self._filename_tags(filename),
+            "category": "general_document",
+            "importance_score": 0.5,
+            "related_modules": [],
+            "related_processes": [],
+            "keywords": [],
+            "content": ""
+        }
+    
+    async def _schedule_analysis(self, pending: DocumentMetadata, ai_prompt: str = None):
+        """Queue background analysis for a pending document (waits while the queue is full)"""
+        
+        async def on_complete(base_analysis: Dict[str, Any]):
+            ai_analysis = await self._finalize_analysis(base_analysis, pending.filename, ai_prompt)
+            # Tags already on the pending row (custom and filename tags) are kept
+            extra_tags = [tag for tag in pending.ai_tags if tag not in ai_analysis["tags"]]
+            metadata = self._build_document_metadata(
+                pending.document_id, pending.filename, pending.file_type, pending.size_bytes,
+                pending.uploaded_by, pending.department, extra_tags, ai_analysis,
+                Path(pending.storage_path), pending.content_hash
+            )
+            await self.pool.write(self._apply_document_analysis, metadata, base_analysis)
         
-        return analysis
+        async def on_error(error: BaseException):
+            logging.error(f"Analysis failed for {pending.document_id}: {error}")
+            await self.pool.write(self._mark_analysis_failed, pending.document_id, str(error))
+        
+        await self.analysis_pipeline.submit(
+            analyze_document_file,
+            (pending.storage_path, pending.file_type.value),
+            on_complete, on_error
+        )
+    
+    def _apply_document_analysis(self, conn: sqlite3.Connection, metadata: DocumentMetadata,
+                                 base_analysis: Dict[str, Any]) -> bool:
+        """Store finished analysis and refresh the document's index rows (runs on the pool writer)"""
+        
+        updated = conn.execute('''
+            UPDATE documents SET
+                modified_at = ?, ai_summary = ?, ai_tags = ?, ai_category = ?,
+                ai_importance_score = ?, related_modules = ?, related_processes = ?,
+                search_keywords = ?, full_text_content = ?,
+                analysis_status = 'complete', analysis_error = NULL
+            WHERE document_id = ?
+        ''', (
+            metadata.modified_at, metadata.ai_summary, json.dumps(metadata.ai_tags),
+            metadata.ai_category, metadata.ai_importance_score,
+            json.dumps(metadata.related_modules), json.dumps(metadata.related_processes),
+            json.dumps(metadata.search_keywords), metadata.full_text_content,
+            metadata.document_id
+        )).rowcount
+        
+        if not updated:
+            # Deleted while the analysis was running
+            return False
+        
+        self._delete_document_index_rows(conn, metadata.document_id)
+        self._insert_search_rows(conn, [metadata])
+        self._insert_document_relations(conn, [metadata])
+        
+        conn.execute(
+            'UPDATE document_blobs SET analysis = COALESCE(analysis, ?) WHERE content_hash = ?',
+            (json.dumps(base_analysis), metadata.content_hash)
+        )
+        return True
+    
+    def _mark_analysis_failed(self, conn: sqlite3.Connection, document_id: str, error: str):
+        conn.execute(
+            "UPDATE documents SET analysis_status = 'failed', analysis_error = ? WHERE document_id = ?",
+            (error, document_id)
+        )
+    
+    async def get_analysis_status(self, document_id: str) -> Optional[Dict[str, Any]]:
+        """Background analysis state for a document"""
+        
+        def fetch_status(conn):
+            return conn.execute(
+                'SELECT analysis_status, analysis_error, modified_at FROM documents WHERE document_id = ?',
+                (document_id,)
+            ).fetchone()
+        
+        row = await self.pool.read(fetch_status)
+        if not row:
+            return None
+        
+        return {
+            "document_id": document_id,
+            "analysis_status": row[0],
+            "error": row[1],
+            "modified_at": row[2]
+        }
+    
+    async def requeue_pending_analysis(self) -> int:
+        """Re-submit documents left pending (e.g. by a restart); returns how many
+        
+        Custom AI prompts are not persisted, so requeued documents are
+        analyzed without them.
+        """
+        
+        def fetch_pending(conn):
+            return conn.execute(f'''
+                SELECT {self._document_columns_sql(include_content=False)} FROM documents d
+                WHERE analysis_status = 'pending'
+            ''').fetchall()
+        
+        rows = await self.pool.read(fetch_pending)
+        for row in rows:
+            await self._schedule_analysis(self._row_to_document_metadata(row))
+        return len(rows)
     
-    def _ai_generate_tags(self, content: str, filename: str) -> List[str]:
+    @staticmethod
+    def _ai_generate_tags(content: str) -> List[str]:
         """AI-generated tags based on content analysis"""
         tags = []
         
@@ -337,7 +879,13 @@ class UniversalMemorySystem:
             if any(term in keywords for term in terms):
                 tags.append(category)
         
-        # Add file-based tags
+        return tags
+    
+    @staticmethod
+    def _filename_tags(filename: str) -> List[str]:
+        """Tags derived from the filename alone"""
+        tags = []
+        
         if "manual" in filename.lower():
             tags.append("manual")
         if "policy" in filename.lower():
@@ -345,12 +893,12 @@ class UniversalMemorySystem:
         if "sop" in filename.lower():
             tags.append("standard_operating_procedure")
         
-        return list(set(tags))
+        return tags
     
-    def _ai_categorize_document(self, content: str, filename: str) -> str:
-        """AI categorization of document"""
+    @staticmethod
+    def _ai_categorize_document(content: str) -> Optional[str]:
+        """AI categorization of document content; None if the content gives no category"""
         content_lower = content.lower()
-        filename_lower = filename.lower()
         
         if any(term in content_lower for term in ["policy", "regulation", "compliance"]):
             return "policy_document"
@@ -362,12 +910,19 @@ class UniversalMemorySystem:
             return "safety_document"
         elif any(term in content_lower for term in ["maintenance", "repair", "equipment"]):
             return "maintenance_document"
-        elif "form" in filename_lower or "template" in filename_lower:
+        return None
+    
+    @staticmethod
+    def _filename_category(filename: str) -> str:
+        """Category for documents whose content gives none"""
+        filename_lower = filename.lower()
+        
+        if "form" in filename_lower or "template" in filename_lower:
             return "form_template"
-        else:
-            return "general_document"
+        return "general_document"
     
-    def _ai_calculate_importance(self, content: str) -> float:
+    @staticmethod
+    def _ai_calculate_importance(content: str) -> float:
         """AI-calculated importance score"""
         importance_indicators = {
             "critical": 1.0,
@@ -389,7 +944,8 @@ class UniversalMemorySystem:
         # Base score for any document
         return max(max_score, 0.5)
     
-    def _ai_find_related_modules(self, content: str) -> List[str]:
+    @staticmethod
+    def _ai_find_related_modules(content: str) -> List[str]:
         """Find related FixItFred modules"""
         module_keywords = {
             "quality": ["quality", "inspection", "defect", "compliance", "audit"],
@@ -409,7 +965,8 @@ class UniversalMemorySystem:
         
         return related
     
-    def _ai_find_related_processes(self, content: str) -> List[str]:
+    @staticmethod
+    def _ai_find_related_processes(content: str) -> List[str]:
         """Find related business processes"""
         processes = []
         content_lower = content.lower()
@@ -428,7 +985,8 @@ class UniversalMemorySystem:
         
         return processes
     
-    def _ai_extract_keywords(self, content: str) -> List[str]:
+    @staticmethod
+    def _ai_extract_keywords(content: str) -> List[str]:
         """Extract searchable keywords"""
         # Simple keyword extraction (replace with advanced NLP)
         words = content.lower().split()
@@ -500,11 +1058,13 @@ class UniversalMemorySystem:
         
         return type_mapping.get(ext, DocumentType.TEXT)
     
-    def _extract_pdf_text(self, file_data: bytes) -> str:
+    @staticmethod
+    def _extract_pdf_text(file_data: bytes) -> str:
         """Extract text from PDF (stub - implement with PyPDF2 or pdfplumber)"""
         return "PDF content would be extracted here using PyPDF2 or similar library"
     
-    def _extract_docx_text(self, file_data: bytes) -> str:
+    @staticmethod
+    def _extract_docx_text(file_data: bytes) -> str:
         """Extract text from DOCX (stub - implement with python-docx)"""
         return "DOCX content would be extracted here using python-docx library"
     
@@ -517,140 +1077,220 @@ class UniversalMemorySystem:
             "viewer": ["read"]
         }
     
-    async def _save_document_metadata(self, metadata: DocumentMetadata):
-        """Save document metadata to database"""
+    def _insert_documents(self, conn: sqlite3.Connection, documents: List[DocumentMetadata],
+                          blob_analyses: Dict[str, Dict[str, Any]] = None):
+        """Insert document rows and their search index rows (runs on the pool writer)
+        
+        Both inserts run inside the same write job, so a document is never
+        committed without its search index entry or vice versa. Blob reference
+        counts are bumped in the same job; ``blob_analyses`` carries the AI
+        analysis for newly seen content so later uploads can reuse it.
+        """
+        
+        placeholders = ', '.join(['?' for _ in DOCUMENT_COLUMNS])
+        conn.executemany(f'''
+            INSERT INTO documents ({', '.join(DOCUMENT_COLUMNS)})
+            VALUES ({placeholders})
+        ''', [
+            (
+                metadata.document_id, metadata.filename, metadata.file_type.value,
+                metadata.size_bytes, metadata.created_at, metadata.modified_at,
+                metadata.uploaded_by, metadata.company_id, metadata.department,
+                metadata.ai_summary, json.dumps(metadata.ai_tags), metadata.ai_category,
+                metadata.ai_importance_score, metadata.access_level,
+                json.dumps(metadata.permissions), metadata.encryption_status,
+                metadata.version, metadata.parent_document_id, metadata.is_latest_version,
+                json.dumps(metadata.related_modules), json.dumps(metadata.related_processes),
+                json.dumps(metadata.related_workers), json.dumps(metadata.search_keywords),
+                metadata.full_text_content, metadata.storage_location.value, metadata.storage_path,
+                metadata.content_hash, metadata.analysis_status
+            )
+            for metadata in documents
+        ])
+        
+        # Content-addressed blob references
+        blob_analyses = blob_analyses or {}
+        now = datetime.now().isoformat()
+        conn.executemany('''
+            INSERT INTO document_blobs (content_hash, storage_path, size_bytes, ref_count, analysis, created_at)
+            VALUES (?, ?, ?, 1, ?, ?)
+            ON CONFLICT (content_hash) DO UPDATE SET
+                ref_count = ref_count + 1,
+                pending_refs = MAX(pending_refs - 1, 0),
+                analysis = COALESCE(analysis, excluded.analysis)
+        ''', [
+            (
+                metadata.content_hash, metadata.storage_path, metadata.size_bytes,
+                json.dumps(blob_analyses[metadata.content_hash])
+                if metadata.content_hash in blob_analyses else None,
+                now
+            )
+            for metadata in documents
+            if metadata.content_hash
+        ])
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        # Full-text search index
+        self._insert_search_rows(conn, documents)
         
-        cursor.execute('''
-            INSERT INTO documents VALUES (
-                ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?
+        # Normalized module/tag/process/worker links
+        self._insert_document_relations(conn, documents)
+    
+    def _insert_search_rows(self, conn: sqlite3.Connection, documents: List[DocumentMetadata]):
+        # Index rows take their rowid from document_search_keys, so they can be deleted by rowid
+        conn.executemany(
+            'INSERT OR IGNORE INTO document_search_keys (document_id) VALUES (?)',
+            [(metadata.document_id,) for metadata in documents]
+        )
+        conn.executemany('''
+            INSERT INTO document_search (rowid, document_id, filename, content, tags, category)
+            SELECT search_rowid, ?, ?, ?, ?, ? FROM document_search_keys WHERE document_id = ?
+        ''', [
+            (
+                metadata.document_id,
+                metadata.filename,
+                metadata.full_text_content,
+                ' '.join(metadata.ai_tags),
+                metadata.ai_category,
+                metadata.document_id
             )
-        ''', (
-            metadata.document_id, metadata.filename, metadata.file_type.value,
-            metadata.size_bytes, metadata.created_at, metadata.modified_at,
-            metadata.uploaded_by, metadata.company_id, metadata.department,
-            metadata.ai_summary, json.dumps(metadata.ai_tags), metadata.ai_category,
-            metadata.ai_importance_score, metadata.access_level,
-            json.dumps(metadata.permissions), metadata.encryption_status,
-            metadata.version, metadata.parent_document_id, metadata.is_latest_version,
-            json.dumps(metadata.related_modules), json.dumps(metadata.related_processes),
-            json.dumps(metadata.related_workers), json.dumps(metadata.search_keywords),
-            metadata.full_text_content, metadata.storage_location.value, metadata.storage_path
-        ))
-        
-        conn.commit()
-        conn.close()
+            for metadata in documents
+        ])
     
-    async def _update_search_index(self, metadata: DocumentMetadata):
-        """Update full-text search index"""
-        
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO document_search VALUES (?, ?, ?, ?, ?)
-        ''', (
-            metadata.document_id,
-            metadata.filename,
-            metadata.full_text_content,
-            ' '.join(metadata.ai_tags),
-            metadata.ai_category
-        ))
-        
-        conn.commit()
-        conn.close()
+    def _delete_document_index_rows(self, conn: sqlite3.Connection, document_id: str):
+        """Remove a document's search index and relation rows"""
+        
+        key = conn.execute(
+            'SELECT search_rowid FROM document_search_keys WHERE document_id = ?', (document_id,)
+        ).fetchone()
+        if key:
+            conn.execute('DELETE FROM document_search WHERE rowid = ?', key)
+            conn.execute('DELETE FROM document_search_keys WHERE document_id = ?', (document_id,))
+        for table in DOCUMENT_RELATION_TABLES:
+            conn.execute(f'DELETE FROM {table} WHERE document_id = ?', (document_id,))
+    
+    def _insert_document_relations(self, conn: sqlite3.Connection, documents: List[DocumentMetadata]):
+        """Fill the document relation join tables for the given documents"""
+        
+        for table, (column, field) in DOCUMENT_RELATION_TABLES.items():
+            conn.executemany(
+                f'INSERT OR IGNORE INTO {table} ({column}, document_id) VALUES (?, ?)',
+                [
+                    (value, metadata.document_id)
+                    for metadata in documents
+                    for value in getattr(metadata, field)
+                ]
+            )
     
-    async def search_documents(self, query: str, filters: Dict[str, Any] = None) -> List[DocumentMetadata]:
+    async def search_documents(self, query: str, filters: Dict[str, Any] = None,
+                               limit: int = 50, cursor: str = None,
+                               include_content: bool = False) -> List[DocumentRow]:
         """AI-powered document search"""
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        page = await self.search_documents_page(query, filters, limit, cursor, include_content)
+        return page["documents"]
+    
+    async def search_documents_page(self, query: str, filters: Dict[str, Any] = None,
+                                    limit: int = 50, cursor: str = None,
+                                    include_content: bool = False) -> Dict[str, Any]:
+        """Keyset-paginated full-text search
+        
+        Filters are applied in the SQL join and results stay in bm25 order.
+        ``full_text_content`` is only loaded when ``include_content`` is set.
+        Pass the returned ``next_cursor`` back in to fetch the next page.
+        """
+        
+        columns = self._document_columns_sql(include_content)
+        filter_sql, params = self._search_filter_clauses(filters or {})
+        
+        sql = f'''
+            WITH hits AS (
+                SELECT document_id, bm25(document_search) AS score
+                FROM document_search
+                WHERE document_search MATCH ?
+            )
+            SELECT {columns}, hits.score
+            FROM hits
+            JOIN documents d ON d.document_id = hits.document_id
+            WHERE 1 = 1 {filter_sql}
+        '''
+        params = [query] + params
         
-        # Full-text search
-        cursor.execute('''
-            SELECT document_id FROM document_search 
-            WHERE document_search MATCH ?
-            ORDER BY bm25(document_search)
-        ''', (query,))
-        
-        search_results = [row[0] for row in cursor.fetchall()]
-        
-        # Get full metadata for results
-        if search_results:
-            placeholders = ','.join(['?' for _ in search_results])
-            cursor.execute(f'''
-                SELECT * FROM documents 
-                WHERE document_id IN ({placeholders})
-                ORDER BY ai_importance_score DESC
-            ''', search_results)
-            
-            documents = []
-            for row in cursor.fetchall():
-                documents.append(self._row_to_document_metadata(row))
-        else:
-            documents = []
+        if cursor:
+            last_score, last_document_id = self._decode_search_cursor(cursor)
+            sql += ' AND (hits.score, d.document_id) > (?, ?)'
+            params.extend([last_score, last_document_id])
+        
+        # Fetch one extra row to know whether another page exists
+        sql += ' ORDER BY hits.score, d.document_id LIMIT ?'
+        params.append(limit + 1)
+        
+        def run_search(conn):
+            return conn.execute(sql, params).fetchall()
         
-        conn.close()
+        rows = await self.pool.read(run_search)
         
-        # Apply additional filters
-        if filters:
-            documents = self._apply_search_filters(documents, filters)
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last_row = rows[-1]
+            next_cursor = self._encode_search_cursor(last_row[-1], last_row[0])
         
-        return documents
+        return {
+            "documents": [DocumentRow(row) for row in rows],
+            "next_cursor": next_cursor
+        }
     
-    def _row_to_document_metadata(self, row) -> DocumentMetadata:
-        """Convert database row to DocumentMetadata"""
-        return DocumentMetadata(
-            document_id=row[0],
-            filename=row[1],
-            file_type=DocumentType(row[2]),
-            size_bytes=row[3],
-            created_at=row[4],
-            modified_at=row[5],
-            uploaded_by=row[6],
-            company_id=row[7],
-            department=row[8],
-            ai_summary=row[9],
-            ai_tags=json.loads(row[10]),
-            ai_category=row[11],
-            ai_importance_score=row[12],
-            access_level=row[13],
-            permissions=json.loads(row[14]),
-            encryption_status=row[15],
-            version=row[16],
-            parent_document_id=row[17],
-            is_latest_version=row[18],
-            related_modules=json.loads(row[19]),
-            related_processes=json.loads(row[20]),
-            related_workers=json.loads(row[21]),
-            search_keywords=json.loads(row[22]),
-            full_text_content=row[23],
-            storage_location=StorageLocation(row[24]),
-            storage_path=row[25]
+    def _document_columns_sql(self, include_content: bool = True) -> str:
+        """Select list for documents rows, optionally skipping full_text_content"""
+        
+        return ', '.join(
+            f"d.{column}" if include_content or column != "full_text_content"
+            else "'' AS full_text_content"
+            for column in DOCUMENT_COLUMNS
         )
     
-    def _apply_search_filters(self, documents: List[DocumentMetadata], 
-                            filters: Dict[str, Any]) -> List[DocumentMetadata]:
-        """Apply search filters"""
+    def _search_filter_clauses(self, filters: Dict[str, Any]) -> Tuple[str, List[Any]]:
+        """Translate search filters into SQL predicates on the documents join"""
         
-        filtered = documents
+        clauses = []
+        params = []
         
         if filters.get("department"):
-            filtered = [d for d in filtered if d.department == filters["department"]]
+            clauses.append("d.department = ?")
+            params.append(filters["department"])
         
         if filters.get("file_type"):
-            filtered = [d for d in filtered if d.file_type.value == filters["file_type"]]
+            clauses.append("d.file_type = ?")
+            params.append(filters["file_type"])
         
         if filters.get("importance_min"):
-            filtered = [d for d in filtered if d.ai_importance_score >= filters["importance_min"]]
+            clauses.append("d.ai_importance_score >= ?")
+            params.append(filters["importance_min"])
         
         if filters.get("tags"):
-            required_tags = filters["tags"]
-            filtered = [d for d in filtered if any(tag in d.ai_tags for tag in required_tags)]
+            required_tags = list(filters["tags"])
+            placeholders = ','.join(['?' for _ in required_tags])
+            clauses.append(
+                f"EXISTS (SELECT 1 FROM document_tags t "
+                f"WHERE t.document_id = d.document_id AND t.tag IN ({placeholders}))"
+            )
+            params.extend(required_tags)
         
-        return filtered
+        sql = ''.join(f" AND {clause}" for clause in clauses)
+        return sql, params
+    
+    def _encode_search_cursor(self, score: float, document_id: str) -> str:
+        """Opaque keyset cursor for search pagination"""
+        return base64.urlsafe_b64encode(json.dumps([score, document_id]).encode()).decode()
+    
+    def _decode_search_cursor(self, cursor: str) -> Tuple[float, str]:
+        """Decode a cursor produced by _encode_search_cursor"""
+        score, document_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return float(score), document_id
+    
+    def _row_to_document_metadata(self, row) -> DocumentMetadata:
+        """Convert database row to DocumentMetadata"""
+        return DocumentRow(row[:len(DOCUMENT_COLUMNS)]).to_metadata()
     
     async def create_memory_context(self, context_type: str, participants: List[str],
                                   conversation_data: Dict[str, Any],
@@ -726,53 +1366,63 @@ class UniversalMemorySystem:
     async def _save_memory_context(self, context: MemoryContext):
         """Save memory context to database"""
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        def insert_context(conn):
+            conn.execute('''
+                INSERT INTO memory_contexts VALUES (
+                    ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?
+                )
+            ''', (
+                context.context_id, context.company_id, context.context_type,
+                json.dumps(context.participants), context.start_time, context.end_time,
+                json.dumps(context.conversation_history), json.dumps(context.decision_points),
+                json.dumps(context.action_items), json.dumps(context.referenced_documents),
+                context.ai_summary, json.dumps(context.ai_insights),
+                json.dumps(context.ai_recommendations), context.importance_score,
+                json.dumps(context.related_contexts), json.dumps(context.spawned_tasks),
+                json.dumps(context.linked_incidents)
+            ))
+        
+        await self.pool.write(insert_context)
+    
+    async def recall_memory(self, query: str, context_type: str = None,
+                            limit: int = 10) -> List[MemoryContext]:
+        """AI-powered memory recall
         
-        cursor.execute('''
-            INSERT INTO memory_contexts VALUES (
-                ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?
-            )
-        ''', (
-            context.context_id, context.company_id, context.context_type,
-            json.dumps(context.participants), context.start_time, context.end_time,
-            json.dumps(context.conversation_history), json.dumps(context.decision_points),
-            json.dumps(context.action_items), json.dumps(context.referenced_documents),
-            context.ai_summary, json.dumps(context.ai_insights),
-            json.dumps(context.ai_recommendations), context.importance_score,
-            json.dumps(context.related_contexts), json.dumps(context.spawned_tasks),
-            json.dumps(context.linked_incidents)
-        ))
-        
-        conn.commit()
-        conn.close()
-    
-    async def recall_memory(self, query: str, context_type: str = None) -> List[MemoryContext]:
-        """AI-powered memory recall"""
-        
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        Matches any query term against the memory_search FTS5 index (summary,
+        insights, recommendations and conversation text). The bm25 score is
+        scaled by ``1 + recall_importance_weight * importance_score`` so more
+        important contexts rank higher at equal relevance.
+        """
+        
+        terms = extract_search_terms(query)
+        if not terms:
+            return []
         
         base_query = '''
-            SELECT * FROM memory_contexts 
-            WHERE company_id = ? AND ai_summary LIKE ?
+            WITH hits AS (
+                SELECT rowid, bm25(memory_search, 2.0, 1.0, 1.0, 0.5) AS score
+                FROM memory_search
+                WHERE memory_search MATCH ?
+            )
+            SELECT c.* FROM hits
+            JOIN memory_search_keys k ON k.search_rowid = hits.rowid
+            JOIN memory_contexts c ON c.context_id = k.context_id
+            WHERE c.company_id = ?
         '''
-        params = [self.company_id, f'%{query}%']
+        params = [' OR '.join(fts_phrase(term) for term in terms), self.company_id]
         
         if context_type:
-            base_query += ' AND context_type = ?'
+            base_query += ' AND c.context_type = ?'
             params.append(context_type)
         
-        base_query += ' ORDER BY importance_score DESC LIMIT 10'
+        base_query += ' ORDER BY hits.score * (1.0 + ? * c.importance_score) LIMIT ?'
+        params.extend([self.recall_importance_weight, limit])
         
-        cursor.execute(base_query, params)
+        def run_recall(conn):
+            rows = conn.execute(base_query, params).fetchall()
+            return [self._row_to_memory_context(row) for row in rows]
         
-        contexts = []
-        for row in cursor.fetchall():
-            contexts.append(self._row_to_memory_context(row))
-        
-        conn.close()
-        return contexts
+        return await self.pool.read(run_recall)
     
     def _row_to_memory_context(self, row) -> MemoryContext:
         """Convert database row to MemoryContext"""
@@ -799,58 +1449,63 @@ class UniversalMemorySystem:
     async def get_document_by_id(self, document_id: str) -> Optional[DocumentMetadata]:
         """Retrieve document by ID"""
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT * FROM documents WHERE document_id = ?', (document_id,))
-        row = cursor.fetchone()
+        def fetch_document(conn):
+            return conn.execute(
+                'SELECT * FROM documents WHERE document_id = ?', (document_id,)
+            ).fetchone()
         
-        conn.close()
+        row = await self.pool.read(fetch_document)
         
         if row:
             return self._row_to_document_metadata(row)
         return None
     
-    async def get_documents_by_module(self, module_name: str) -> List[DocumentMetadata]:
+    async def get_documents_by_module(self, module_name: str, limit: int = None,
+                                      include_content: bool = False) -> List[DocumentRow]:
         """Get all documents related to a specific module"""
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        columns = self._document_columns_sql(include_content)
+        sql = f'''
+            SELECT {columns} FROM document_modules m
+            JOIN documents d ON d.document_id = m.document_id
+            WHERE m.module = ?
+            ORDER BY d.ai_importance_score DESC
+        '''
+        params: List[Any] = [module_name]
         
-        cursor.execute('''
-            SELECT * FROM documents 
-            WHERE related_modules LIKE ?
-            ORDER BY ai_importance_score DESC
-        ''', (f'%{module_name}%',))
+        if limit:
+            sql += ' LIMIT ?'
+            params.append(limit)
         
-        documents = []
-        for row in cursor.fetchall():
-            documents.append(self._row_to_document_metadata(row))
+        def fetch_documents(conn):
+            return conn.execute(sql, params).fetchall()
         
-        conn.close()
-        return documents
+        return [DocumentRow(row) for row in await self.pool.read(fetch_documents)]
     
     async def smart_recommendations(self, worker_id: str, current_task: str) -> Dict[str, Any]:
         """AI-powered smart recommendations for documents and memory"""
         
         # Analyze current task to find relevant content
-        task_keywords = current_task.lower().split()
+        task_terms = extract_search_terms(current_task)
         
-        # Find related documents
-        related_docs = []
-        for keyword in task_keywords:
-            docs = await self.search_documents(keyword)
-            related_docs.extend(docs)
+        # Served from cache until the company's data changes
+        cache_key = (self.company_id, worker_id, ' '.join(task_terms), self.pool.data_version)
+        cached = _recommendation_cache.get(cache_key)
+        if cached is not None:
+            return dict(cached)
+        
+        # Find related documents - one fused query for all task terms
+        related_docs = await self._fused_document_search(task_terms, limit=5)
         
         # Find related memories
         related_memories = await self.recall_memory(current_task)
         
         # AI-powered recommendations
         recommendations = {
-            "suggested_documents": related_docs[:5],  # Top 5 most relevant
+            "suggested_documents": related_docs,  # Top 5 most relevant
             "related_memories": related_memories[:3],  # Top 3 contexts
             "ai_insights": [
-                f"Based on similar tasks, workers typically reference documents about {task_keywords[0] if task_keywords else 'the process'}",
+                f"Based on similar tasks, workers typically reference documents about {task_terms[0] if task_terms else 'the process'}",
                 "Consider reviewing recent safety protocols",
                 "Check for updated procedures in the last 30 days"
             ],
@@ -861,10 +1516,94 @@ class UniversalMemorySystem:
             ]
         }
         
-        return recommendations
+        _recommendation_cache.put(cache_key, recommendations)
+        
+        return dict(recommendations)
+    
+    async def _fused_document_search(self, terms: List[str], limit: int = 5,
+                                     per_term_limit: int = 50, rrf_k: int = 60) -> List[DocumentRow]:
+        """Rank documents for several terms with reciprocal-rank fusion
+        
+        RRF needs each term's own bm25 ranking, so every term is one ranked
+        arm of a single compound FTS5 statement; fusion, dedup and the limit
+        are applied in the same statement and only the winners are hydrated.
+        """
+        
+        if not terms:
+            return []
+        
+        arms = []
+        params: List[Any] = []
+        for term in terms:
+            arms.append('''
+                SELECT * FROM (
+                    SELECT document_id,
+                           row_number() OVER (ORDER BY bm25(document_search)) AS term_rank
+                    FROM document_search
+                    WHERE document_search MATCH ?
+                    ORDER BY bm25(document_search)
+                    LIMIT ?
+                )
+            ''')
+            params.extend([fts_phrase(term), per_term_limit])
+        
+        columns = self._document_columns_sql(include_content=False)
+        sql = f'''
+            WITH term_hits AS ({' UNION ALL '.join(arms)}),
+            fused AS (
+                SELECT document_id, SUM(1.0 / (? + term_rank)) AS rrf_score
+                FROM term_hits
+                GROUP BY document_id
+                ORDER BY rrf_score DESC
+                LIMIT ?
+            )
+            SELECT {columns}
+            FROM fused
+            JOIN documents d ON d.document_id = fused.document_id
+            ORDER BY fused.rrf_score DESC, d.ai_importance_score DESC
+        '''
+        params.extend([rrf_k, limit])
+        
+        def run_fused_search(conn):
+            return conn.execute(sql, params).fetchall()
+        
+        rows = await self.pool.read(run_fused_search)
+        return [DocumentRow(row) for row in rows]
+
+def analyze_document_file(blob_path: str, file_type: str) -> Dict[str, Any]:
+    """Analysis pipeline entry point: read one stored blob and analyze it in a worker process"""
+    
+    file_data = Path(blob_path).read_bytes()
+    return UniversalMemorySystem._analyze_document_bytes(file_data, DocumentType(file_type))
+
+class RecommendationCache:
+    """Small LRU cache for smart_recommendations results"""
+    
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[Tuple, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: Tuple) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+    
+    def put(self, key: Tuple, value: Dict[str, Any]):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+# Shared across requests; keys include the pool data_version so any write
+# to a company's database makes its old entries unreachable
+_recommendation_cache = RecommendationCache()
 
 # API Routes for Memory System
-from fastapi import APIRouter, UploadFile, File, Form
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException
 
 memory_router = APIRouter(prefix="/api/memory", tags=["memory"])
 
@@ -876,9 +1615,9 @@ async def upload_document_endpoint(
     department: str = Form(...),
     ai_prompt: str = Form(None)
 ):
-    """Upload document with AI processing"""
+    """Upload document; AI processing continues in the background"""
     
-    memory_system = UniversalMemorySystem(company_id)
+    memory_system = await UniversalMemorySystem(company_id).initialize()
     file_data = await file.read()
     
     metadata = await memory_system.upload_document(
@@ -886,12 +1625,14 @@ async def upload_document_endpoint(
         filename=file.filename,
         uploaded_by=uploaded_by,
         department=department,
-        ai_prompt=ai_prompt
+        ai_prompt=ai_prompt,
+        background_analysis=True
     )
     
     return {
         "status": "success",
         "document_id": metadata.document_id,
+        "analysis_status": metadata.analysis_status,
         "ai_analysis": {
             "summary": metadata.ai_summary,
             "tags": metadata.ai_tags,
@@ -900,25 +1641,69 @@ async def upload_document_endpoint(
         }
     }
 
+@memory_router.post("/upload/bulk")
+async def upload_documents_bulk_endpoint(
+    company_id: str = Form(...),
+    files: List[UploadFile] = File(...),
+    uploaded_by: str = Form(...),
+    department: str = Form(...),
+    ai_prompt: str = Form(None)
+):
+    """Bulk upload documents in batched transactions"""
+    
+    memory_system = await UniversalMemorySystem(company_id).initialize()
+    
+    # Stream each spooled upload to storage instead of reading it into memory
+    summary = await memory_system.upload_documents_bulk(
+        ((file.filename, file.file) for file in files),
+        uploaded_by=uploaded_by,
+        department=department,
+        ai_prompt=ai_prompt
+    )
+    
+    return {
+        "status": "success" if summary["failed"] == 0 else "partial",
+        **summary
+    }
+
+@memory_router.get("/documents/{company_id}/{document_id}/status")
+async def document_analysis_status_endpoint(company_id: str, document_id: str):
+    """Poll background analysis of an uploaded document"""
+    
+    memory_system = await UniversalMemorySystem(company_id).initialize()
+    status = await memory_system.get_analysis_status(document_id)
+    
+    if status is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    
+    return status
+
 @memory_router.get("/search/{company_id}")
-async def search_documents_endpoint(company_id: str, query: str, filters: str = None):
+async def search_documents_endpoint(company_id: str, query: str, filters: str = None,
+                                    limit: int = 50, cursor: str = None,
+                                    include_content: bool = False):
     """Search documents with AI"""
     
-    memory_system = UniversalMemorySystem(company_id)
+    memory_system = await UniversalMemorySystem(company_id).initialize()
     filter_dict = json.loads(filters) if filters else {}
     
-    documents = await memory_system.search_documents(query, filter_dict)
+    page = await memory_system.search_documents_page(
+        query, filter_dict, limit=min(limit, 500), cursor=cursor,
+        include_content=include_content
+    )
+    documents = page["documents"]
     
     return {
-        "results": [asdict(doc) for doc in documents],
-        "count": len(documents)
+        "results": [doc.to_dict() for doc in documents],
+        "count": len(documents),
+        "next_cursor": page["next_cursor"]
     }
 
 @memory_router.post("/memory/create")
 async def create_memory_context_endpoint(request: Dict[str, Any]):
     """Create memory context"""
     
-    memory_system = UniversalMemorySystem(request["company_id"])
+    memory_system = await UniversalMemorySystem(request["company_id"]).initialize()
     
     context = await memory_system.create_memory_context(
         context_type=request["context_type"],
@@ -937,7 +1722,7 @@ async def create_memory_context_endpoint(request: Dict[str, Any]):
 async def recall_memory_endpoint(company_id: str, query: str, context_type: str = None):
     """Recall relevant memories"""
     
-    memory_system = UniversalMemorySystem(company_id)
+    memory_system = await UniversalMemorySystem(company_id).initialize()
     contexts = await memory_system.recall_memory(query, context_type)
     
     return {
@@ -949,7 +1734,27 @@ async def recall_memory_endpoint(company_id: str, query: str, context_type: str
 async def smart_recommendations_endpoint(company_id: str, worker_id: str, current_task: str):
     """Get AI-powered recommendations"""
     
-    memory_system = UniversalMemorySystem(company_id)
+    memory_system = await UniversalMemorySystem(company_id).initialize()
     recommendations = await memory_system.smart_recommendations(worker_id, current_task)
+    recommendations["suggested_documents"] = [
+        doc.to_dict() for doc in recommendations["suggested_documents"]
+    ]
+    
+    return recommendations
+
+# Run from the app's lifespan (dashboard.py) on startup
+async def resume_pending_analysis(data_dir: str = "data") -> int:
+    """Requeue analysis left pending by a crash or restart, for every company database"""
+    
+    requeued = 0
+    for db_file in sorted(Path(data_dir).glob("memory_*.db")):
+        memory_system = await UniversalMemorySystem(db_file.stem[len("memory_"):]).initialize()
+        requeued += await memory_system.requeue_pending_analysis()
+    return requeued
+
+# Run from the app's lifespan (dashboard.py) on shutdown
+async def close_memory_pools():
+    """Finish queued analysis, then flush pending writes and close pooled SQLite connections"""
     
-    return recommendations
\ No newline at end of file
+    await shutdown_analysis_pipeline()
+    close_all_pools()
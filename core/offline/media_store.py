@@ -0,0 +1,460 @@
+#!/usr/bin/env python3
+"""
+FixItFred Offline Media Store
+Content-addressed photo and voice storage with on-device variants and resumable chunked uploads
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import threading
+import uuid
+import wave
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from core.memory.analysis_pipeline import AnalysisPipeline
+
+# Pillow is optional; without it photos simply get no thumbnails
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+    ImageOps = None
+
+CONTENT_HASH_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+CONTENT_RANGE_PATTERN = re.compile(r"^bytes (?:(\d+)-(\d+)|\*)/(\d+)$")
+
+PHOTO_VARIANTS = {"thumbnail": 256, "preview": 1024}  # longest edge, pixels
+VOICE_VARIANTS = {"voice_8k": 8000}  # sample rate, Hz
+
+def content_range(start: int, size: int, total: int) -> str:
+    """Content-Range header value for ``size`` bytes at ``start`` of a ``total``-byte upload"""
+    return f"bytes {start}-{start + size - 1}/{total}" if size else f"bytes */{total}"
+
+def parse_content_range(value: str) -> Tuple[int, int, int]:
+    """(start, size, total) of a Content-Range header; ValueError if malformed"""
+    
+    match = CONTENT_RANGE_PATTERN.match(value or "")
+    if match is None:
+        raise ValueError(f"Invalid Content-Range: {value!r}")
+    first, last, total = match.groups()
+    if first is None:
+        return int(total), 0, int(total)
+    start, end = int(first), int(last)
+    if end < start or end >= int(total):
+        raise ValueError(f"Invalid Content-Range: {value!r}")
+    return start, end - start + 1, int(total)
+
+def _check_content_hash(content_hash: str):
+    # Hashes become file names
+    if not CONTENT_HASH_PATTERN.match(content_hash or ""):
+        raise ValueError(f"Invalid content hash: {content_hash!r}")
+
+def _hash_file(path: Path, chunk_size: int = 1024 * 1024) -> str:
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+def store_blob(source: Any, blob_root: Path, chunk_size: int = 1024 * 1024) -> Tuple[str, Path, int, bool]:
+    """Stream bytes, a file object or a path into ``blob_root/<hash[:2]>/<hash>``
+    
+    The SHA-256 is computed while writing to a temp file, which is renamed
+    into place - or dropped when a blob with the same content already
+    exists. Returns (hash, blob path, size, whether the blob already existed).
+    """
+    
+    if isinstance(source, (str, Path)):
+        with open(source, 'rb') as src:
+            return store_blob(src, blob_root, chunk_size)
+    
+    hasher = hashlib.sha256()
+    size_bytes = 0
+    tmp_dir = blob_root / "tmp"
+    tmp_dir.mkdir(parents=True, exist_ok=True)
+    tmp_path = tmp_dir / uuid.uuid4().hex
+    
+    try:
+        with open(tmp_path, 'wb') as f:
+            if isinstance(source, (bytes, bytearray, memoryview)):
+                hasher.update(source)
+                f.write(source)
+                size_bytes = len(source)
+            else:
+                while True:
+                    chunk = source.read(chunk_size)
+                    if not chunk:
+                        break
+                    hasher.update(chunk)
+                    f.write(chunk)
+                    size_bytes += len(chunk)
+        
+        content_hash = hasher.hexdigest()
+        blob_path = blob_root / content_hash[:2] / content_hash
+        existed = blob_path.exists()
+        if existed:
+            tmp_path.unlink()
+        else:
+            blob_path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(tmp_path, blob_path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    
+    return content_hash, blob_path, size_bytes, existed
+
+# ----------------------------------------------------------------------
+# Variant rendering (runs in worker processes)
+# ----------------------------------------------------------------------
+
+def render_photo_variants(blob_path: str, out_dir: str, sizes: Dict[str, int]) -> Dict[str, str]:
+    """JPEG thumbnails of a photo, one per ``{name: longest edge}``; {} without Pillow"""
+    
+    if Image is None:
+        return {}
+    rendered = {}
+    with Image.open(blob_path) as image:
+        image = ImageOps.exif_transpose(image).convert("RGB")
+        for name, edge in sizes.items():
+            variant = image.copy()
+            variant.thumbnail((edge, edge))
+            path = os.path.join(out_dir, f"{name}.jpg")
+            variant.save(path, "JPEG", quality=80, optimize=True)
+            rendered[name] = path
+    return rendered
+
+def render_voice_variants(blob_path: str, out_dir: str, rates: Dict[str, int]) -> Dict[str, str]:
+    """Mono 16-bit WAV downsamples of a recording, one per ``{name: sample rate}``
+    
+    Only 16-bit PCM WAV input is downsampled (box filter over whole-number
+    rate ratios); anything else gets no variants.
+    """
+    
+    try:
+        with wave.open(blob_path, 'rb') as source:
+            if source.getsampwidth() != 2:
+                return {}
+            channels, rate = source.getnchannels(), source.getframerate()
+            frames = source.readframes(source.getnframes())
+    except (wave.Error, EOFError):
+        return {}
+    
+    samples = np.frombuffer(frames, dtype="<i2").reshape(-1, channels).mean(axis=1)
+    rendered = {}
+    for name, target_rate in rates.items():
+        factor = rate // target_rate
+        if factor < 2:
+            continue
+        usable = len(samples) - len(samples) % factor
+        downsampled = samples[:usable].reshape(-1, factor).mean(axis=1)
+        path = os.path.join(out_dir, f"{name}.wav")
+        with wave.open(path, 'wb') as out:
+            out.setnchannels(1)
+            out.setsampwidth(2)
+            out.setframerate(rate // factor)
+            out.writeframes(np.round(downsampled).astype("<i2").tobytes())
+        rendered[name] = path
+    return rendered
+
+# ----------------------------------------------------------------------
+# Device side
+# ----------------------------------------------------------------------
+
+class OfflineMediaStore:
+    """Content-addressed media on the device, uploaded in resumable chunks
+    
+    Photos and recordings are streamed into ``blobs/<hash[:2]>/<hash>``; a
+    second capture of identical bytes only adds a media item pointing at the
+    existing blob. New blobs get smaller variants (thumbnails, downsampled
+    audio) rendered in a worker process pool; variants are blobs themselves
+    and upload first, so the server has something to show over a weak link.
+    Each blob tracks how many bytes the server acknowledged, read back
+    ``chunk_size`` bytes at a time from that offset.
+    """
+    
+    def __init__(self, storage_path: str = "offline_media", chunk_size: int = 256 * 1024,
+                 variant_workers: int = 2):
+        self.storage_path = Path(storage_path)
+        self.blob_path = self.storage_path / "blobs"
+        self.db_path = self.storage_path / "media.db"
+        self.chunk_size = chunk_size
+        self.storage_path.mkdir(parents=True, exist_ok=True)
+        self.pipeline = AnalysisPipeline(max_workers=variant_workers)
+        self._init_database()
+    
+    def _init_database(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.executescript('''
+            CREATE TABLE IF NOT EXISTS media_blobs (
+                content_hash TEXT PRIMARY KEY,
+                media_type TEXT NOT NULL,
+                size_bytes INTEGER NOT NULL,
+                ref_count INTEGER NOT NULL DEFAULT 0,
+                upload_priority INTEGER NOT NULL DEFAULT 1,
+                uploaded_bytes INTEGER NOT NULL DEFAULT 0,
+                upload_status TEXT NOT NULL DEFAULT 'pending',
+                created_at TEXT NOT NULL,
+                uploaded_at TEXT
+            );
+            
+            CREATE INDEX IF NOT EXISTS idx_media_blobs_upload
+                ON media_blobs (upload_status, upload_priority, created_at);
+            
+            CREATE TABLE IF NOT EXISTS media_items (
+                media_id TEXT PRIMARY KEY,
+                content_hash TEXT NOT NULL,
+                media_type TEXT NOT NULL,
+                metadata TEXT NOT NULL,
+                created_at TEXT NOT NULL
+            );
+            
+            CREATE TABLE IF NOT EXISTS media_variants (
+                content_hash TEXT NOT NULL,
+                variant TEXT NOT NULL,
+                variant_hash TEXT NOT NULL,
+                PRIMARY KEY (content_hash, variant)
+            );
+        ''')
+        conn.commit()
+        conn.close()
+    
+    def blob_path_for(self, content_hash: str) -> Path:
+        return self.blob_path / content_hash[:2] / content_hash
+    
+    def _add_blob(self, conn: sqlite3.Connection, source: Any, media_type: str,
+                  priority: int) -> Tuple[str, int, bool]:
+        content_hash, _, size_bytes, existed = store_blob(source, self.blob_path)
+        known = conn.execute(
+            "SELECT 1 FROM media_blobs WHERE content_hash = ?", (content_hash,)
+        ).fetchone() is not None
+        conn.execute('''
+            INSERT INTO media_blobs (content_hash, media_type, size_bytes, ref_count, upload_priority, created_at)
+            VALUES (?, ?, ?, 1, ?, ?)
+            ON CONFLICT(content_hash) DO UPDATE SET
+                ref_count = ref_count + 1,
+                upload_priority = MIN(upload_priority, excluded.upload_priority)
+        ''', (content_hash, media_type, size_bytes, priority, datetime.now().isoformat()))
+        return content_hash, size_bytes, existed and known
+    
+    def put(self, source: Any, media_type: str, media_id: str, metadata: Dict[str, Any]) -> Dict[str, Any]:
+        """Store one captured photo or recording (blocking); its blob is shared if already known"""
+        
+        conn = sqlite3.connect(self.db_path)
+        try:
+            with conn:
+                content_hash, size_bytes, deduplicated = self._add_blob(conn, source, media_type, priority=1)
+                conn.execute('''
+                    INSERT INTO media_items (media_id, content_hash, media_type, metadata, created_at)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (media_id, content_hash, media_type, json.dumps(metadata), datetime.now().isoformat()))
+        finally:
+            conn.close()
+        return {
+            "media_id": media_id,
+            "content_hash": content_hash,
+            "size_bytes": size_bytes,
+            "deduplicated": deduplicated
+        }
+    
+    async def add(self, source: Any, media_type: str, media_id: str, metadata: Dict[str, Any],
+                  render=None, variant_spec: Dict[str, int] = None) -> Dict[str, Any]:
+        """Store media off the event loop and queue variant rendering for new blobs"""
+        
+        stored = await asyncio.to_thread(self.put, source, media_type, media_id, metadata)
+        if render is not None and not stored["deduplicated"]:
+            await self._queue_variants(stored["content_hash"], media_type, render, variant_spec)
+        return stored
+    
+    async def _queue_variants(self, content_hash: str, media_type: str, render, variant_spec: Dict[str, int]):
+        out_dir = tempfile.mkdtemp(dir=self.storage_path, prefix="variants-")
+        
+        async def on_complete(rendered: Dict[str, str]):
+            try:
+                await asyncio.to_thread(self._save_variants, content_hash, media_type, rendered)
+            finally:
+                shutil.rmtree(out_dir, ignore_errors=True)
+        
+        async def on_error(error: BaseException):
+            logging.warning(f"Variant rendering failed for {content_hash[:12]}: {error}")
+            shutil.rmtree(out_dir, ignore_errors=True)
+        
+        await self.pipeline.submit(
+            render, (str(self.blob_path_for(content_hash)), out_dir, variant_spec), on_complete, on_error
+        )
+    
+    def _save_variants(self, content_hash: str, media_type: str, rendered: Dict[str, str]):
+        conn = sqlite3.connect(self.db_path)
+        try:
+            with conn:
+                for name, path in rendered.items():
+                    variant_hash, _, _ = self._add_blob(conn, path, media_type, priority=0)
+                    conn.execute(
+                        "INSERT OR REPLACE INTO media_variants (content_hash, variant, variant_hash) VALUES (?, ?, ?)",
+                        (content_hash, name, variant_hash)
+                    )
+        finally:
+            conn.close()
+    
+    def get_media(self, media_id: str) -> Optional[Dict[str, Any]]:
+        """A media item with its blob's upload state and variant hashes"""
+        
+        conn = sqlite3.connect(self.db_path)
+        try:
+            row = conn.execute('''
+                SELECT i.content_hash, i.media_type, i.metadata, i.created_at,
+                       b.size_bytes, b.uploaded_bytes, b.upload_status
+                FROM media_items i JOIN media_blobs b ON b.content_hash = i.content_hash
+                WHERE i.media_id = ?
+            ''', (media_id,)).fetchone()
+            if row is None:
+                return None
+            variants = dict(conn.execute(
+                "SELECT variant, variant_hash FROM media_variants WHERE content_hash = ?", (row[0],)
+            ).fetchall())
+        finally:
+            conn.close()
+        return {
+            "media_id": media_id,
+            "content_hash": row[0],
+            "media_type": row[1],
+            "metadata": json.loads(row[2]),
+            "created_at": row[3],
+            "size_bytes": row[4],
+            "uploaded_bytes": row[5],
+            "upload_status": row[6],
+            "file_path": str(self.blob_path_for(row[0])),
+            "variants": variants
+        }
+    
+    # ------------------------------------------------------------------
+    # Upload bookkeeping
+    # ------------------------------------------------------------------
+    
+    def pending_uploads(self, limit: int = 100) -> List[Tuple[str, int, int]]:
+        """(content_hash, size, acknowledged bytes) of blobs still to upload, variants first"""
+        
+        conn = sqlite3.connect(self.db_path)
+        try:
+            return conn.execute('''
+                SELECT content_hash, size_bytes, uploaded_bytes FROM media_blobs
+                WHERE upload_status = 'pending'
+                ORDER BY upload_priority, created_at
+                LIMIT ?
+            ''', (limit,)).fetchall()
+        finally:
+            conn.close()
+    
+    def read_chunk(self, content_hash: str, offset: int, size: int = None) -> bytes:
+        with open(self.blob_path_for(content_hash), 'rb') as f:
+            f.seek(offset)
+            return f.read(size or self.chunk_size)
+    
+    def record_upload_progress(self, content_hash: str, offset: int, complete: bool = False):
+        """Persist the server-acknowledged offset, so an interrupted upload resumes there"""
+        
+        conn = sqlite3.connect(self.db_path)
+        try:
+            with conn:
+                conn.execute('''
+                    UPDATE media_blobs SET uploaded_bytes = ?, upload_status = ?, uploaded_at = ?
+                    WHERE content_hash = ?
+                ''', (offset, 'uploaded' if complete else 'pending',
+                      datetime.now().isoformat() if complete else None, content_hash))
+        finally:
+            conn.close()
+    
+    async def shutdown(self):
+        """Finish queued variant rendering and stop the worker pool"""
+        await self.pipeline.shutdown()
+
+# ----------------------------------------------------------------------
+# Server side
+# ----------------------------------------------------------------------
+
+class UploadOffsetMismatch(ValueError):
+    """A chunk did not start where the server's copy of the upload ends"""
+    
+    def __init__(self, offset: int):
+        super().__init__(f"Upload is at offset {offset}")
+        self.offset = offset
+
+class MediaUploadReceiver:
+    """Server end of the resumable media upload protocol
+    
+    Chunks are appended to ``uploads/<hash>.part`` only when they start at
+    its current length, so a client that lost its connection asks for the
+    offset (``status``) and continues from there. The finished file must
+    hash to the name it was uploaded under before it moves into the
+    content-addressed ``blobs`` tree; blobs already there are never
+    uploaded twice.
+    """
+    
+    def __init__(self, storage_path: str = "data/offline_media"):
+        self.storage_path = Path(storage_path)
+        self.blob_path = self.storage_path / "blobs"
+        self.upload_path = self.storage_path / "uploads"
+        self.upload_path.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+    
+    def blob_path_for(self, content_hash: str) -> Path:
+        return self.blob_path / content_hash[:2] / content_hash
+    
+    def status(self, content_hash: str) -> Optional[Tuple[int, bool]]:
+        """(bytes received, complete) of an upload; None if the server has none of it"""
+        
+        _check_content_hash(content_hash)
+        blob = self.blob_path_for(content_hash)
+        if blob.exists():
+            return blob.stat().st_size, True
+        part = self.upload_path / f"{content_hash}.part"
+        if part.exists():
+            return part.stat().st_size, False
+        return None
+    
+    def write_chunk(self, content_hash: str, start: int, total: int, data: bytes) -> Tuple[int, bool]:
+        """Append a chunk at ``start``; (new offset, complete)
+        
+        Raises UploadOffsetMismatch when ``start`` is not the current offset
+        and ValueError when the chunk overruns ``total`` or the completed
+        file does not match its hash.
+        """
+        
+        _check_content_hash(content_hash)
+        with self._lock:
+            blob = self.blob_path_for(content_hash)
+            if blob.exists():
+                return blob.stat().st_size, True
+            
+            part = self.upload_path / f"{content_hash}.part"
+            offset = part.stat().st_size if part.exists() else 0
+            if start != offset:
+                raise UploadOffsetMismatch(offset)
+            if offset + len(data) > total:
+                raise ValueError(f"Chunk overruns upload length {total}")
+            with open(part, 'ab') as f:
+                f.write(data)
+            offset += len(data)
+            
+            if offset < total:
+                return offset, False
+            
+            if _hash_file(part) != content_hash:
+                part.unlink()
+                raise ValueError("Uploaded content does not match its hash")
+            blob.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(part, blob)
+            return offset, True
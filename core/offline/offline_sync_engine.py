@@ -6,16 +6,20 @@ Critical for manufacturing environments where network connectivity is unreliable
 
 import asyncio
 import json
+import logging
 import sqlite3
 import uuid
-import hashlib
-from typing import Dict, List, Any, Optional, Tuple
+from typing import Callable, Dict, List, Any, Optional, Tuple
 from datetime import datetime, timedelta
 from dataclasses import dataclass, asdict
-from pathlib import Path
-import threading
-import queue
-import time
+
+from core.offline.sync_payloads import (
+    apply_patch, conflicting_paths, diff_documents, document_checksum, encode_batch, merge_documents
+)
+from core.offline.media_store import (
+    PHOTO_VARIANTS, VOICE_VARIANTS, OfflineMediaStore, render_photo_variants, render_voice_variants
+)
+from core.offline.sync_service import OfflineSyncService
 
 @dataclass
 class OfflineRecord:
@@ -44,14 +48,28 @@ class SyncConflict:
 class OfflineSyncEngine:
     """Manages offline data storage and intelligent synchronization"""
     
-    def __init__(self, db_path: str = "offline_data.db"):
+    def __init__(self, db_path: str = "offline_data.db", sync_batch_size: int = 500,
+                 sync_concurrency: int = 8, max_sync_retries: int = 5, sync_upload_chunk: int = 100):
         self.db_path = db_path
-        self.sync_queue = queue.Queue()
+        # Pending rows read and settled per transaction, records per upload request,
+        # and upload requests in flight at once
+        self.sync_batch_size = sync_batch_size
+        self.sync_upload_chunk = sync_upload_chunk
+        self.sync_concurrency = sync_concurrency
+        # Failed uploads stay pending until this many attempts
+        self.max_sync_retries = max_sync_retries
+        self.sync_progress: Dict[str, Any] = {"state": "idle"}
+        # One sync at a time: background sweeps and manual syncs would upload the same rows
+        self._sync_lock = asyncio.Lock()
         self.conflict_resolver = ConflictResolver()
-        self.photo_manager = OfflinePhotoManager()
-        self.voice_recorder = OfflineVoiceRecorder()
+        # Photos and recordings, deduplicated by content and uploaded in resumable chunks
+        self.media_store = OfflineMediaStore()
+        self._media_lock = asyncio.Lock()
+        self.photo_manager = OfflinePhotoManager(self.media_store)
+        self.voice_recorder = OfflineVoiceRecorder(self.media_store)
+        # Background worker and pooled HTTP session; started by the app (start()/stop())
+        self.sync_service = OfflineSyncService(self)
         self._init_database()
-        self._start_background_sync()
     
     def _init_database(self):
         """Initialize offline SQLite database"""
@@ -72,9 +90,22 @@ class OfflineSyncEngine:
                 parent_record_id TEXT,
                 operation TEXT DEFAULT 'create',
                 retry_count INTEGER DEFAULT 0,
-                last_sync_attempt TEXT
+                last_sync_attempt TEXT,
+                entity_key TEXT
             )
         ''')
+        if 'entity_key' not in [row[1] for row in cursor.execute("PRAGMA table_info(offline_records)")]:
+            cursor.execute("ALTER TABLE offline_records ADD COLUMN entity_key TEXT")
+        # Rows stored before entity_key was recorded
+        cursor.executemany(
+            "UPDATE offline_records SET entity_key = ? WHERE record_id = ?",
+            [
+                (self._entity_key(record_type, json.loads(data), record_id), record_id)
+                for record_id, record_type, data in cursor.execute(
+                    "SELECT record_id, record_type, data FROM offline_records WHERE entity_key IS NULL"
+                ).fetchall()
+            ]
+        )
         
         # Sync conflicts table
         cursor.execute('''
@@ -101,6 +132,31 @@ class OfflineSyncEngine:
             )
         ''')
         
+        # Last synced version of each document; uploads send patches against it.
+        # local_data is the device's own version when the server copy is a merge
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS synced_documents (
+                entity_key TEXT PRIMARY KEY,
+                record_type TEXT NOT NULL,
+                data TEXT NOT NULL,
+                checksum TEXT NOT NULL,
+                synced_at TEXT NOT NULL,
+                local_data TEXT
+            )
+        ''')
+        
+        # Pending scans walk this index in timestamp order
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_offline_records_status_ts
+            ON offline_records(sync_status, timestamp)
+        ''')
+        
+        # A record waits for the older unsettled records of its document (see _blocked_entities)
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_offline_records_entity_ts
+            ON offline_records(entity_key, timestamp)
+        ''')
+        
         conn.commit()
         conn.close()
     
@@ -114,8 +170,7 @@ class OfflineSyncEngine:
         timestamp = datetime.now().isoformat()
         
         # Create checksum for data integrity
-        data_json = json.dumps(data, sort_keys=True)
-        checksum = hashlib.md5(data_json.encode()).hexdigest()
+        checksum = document_checksum(data)
         
         record = OfflineRecord(
             record_id=record_id,
@@ -136,226 +191,587 @@ class OfflineSyncEngine:
         cursor.execute('''
             INSERT INTO offline_records 
             (record_id, record_type, data, timestamp, worker_id, device_id, 
-             checksum, sync_status, parent_record_id, operation)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+             checksum, sync_status, parent_record_id, operation, entity_key)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         ''', (
             record.record_id, record.record_type, json.dumps(record.data),
             record.timestamp, record.worker_id, record.device_id,
             record.checksum, record.sync_status, record.parent_record_id,
-            record.operation
+            record.operation, self._entity_key(record_type, data, record_id)
         ))
         conn.commit()
         conn.close()
         
-        # Add to sync queue if network is available
-        if await self._check_network_connectivity():
-            self.sync_queue.put(record_id)
+        # Background sync uploads it once the server is reachable
+        self.sync_service.enqueue(record_id)
         
         return record_id
     
-    async def sync_when_online(self) -> Dict[str, Any]:
-        """Sync all pending offline records when network comes back"""
+    async def sync_when_online(self, progress_callback: Callable[[Dict[str, Any]], None] = None) -> Dict[str, Any]:
+        """Sync all pending offline records when network comes back
+        
+        Pending rows are read in timestamp order, ``sync_batch_size`` at a
+        time. Each batch is grouped by record_type; groups go in order of their
+        oldest record (parents before children) and the records of a group
+        upload ``sync_concurrency`` at a time. The outcomes of a batch are
+        written in one transaction. ``sync_progress`` (also passed to
+        ``progress_callback``) is updated after every batch.
+        """
         
         if not await self._check_network_connectivity():
             return {"status": "offline", "message": "Network not available"}
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        async with self._sync_lock:
+            conn = sqlite3.connect(self.db_path)
+            try:
+                total = conn.execute(
+                    "SELECT COUNT(*) FROM offline_records WHERE sync_status = 'pending'"
+                ).fetchone()[0]
+                sync_results = self._new_sync_results(total)
+                self._report_sync_progress(sync_results, "syncing", progress_callback)
+                
+                semaphore = asyncio.Semaphore(self.sync_concurrency)
+                last_key = ("", 0)
+                while True:
+                    # Keyset scan over the (sync_status, timestamp) index; rows settled by
+                    # this sync leave the pending set, retried ones are picked up next run
+                    rows = conn.execute('''
+                        SELECT rowid, record_id, record_type, data, timestamp, worker_id, device_id,
+                               checksum, parent_record_id, operation, entity_key
+                        FROM offline_records
+                        WHERE sync_status = 'pending' AND (timestamp, rowid) > (?, ?)
+                        ORDER BY timestamp, rowid
+                        LIMIT ?
+                    ''', (*last_key, self.sync_batch_size)).fetchall()
+                    if not rows:
+                        break
+                    last_key = (rows[-1][4], rows[-1][0])
+                    
+                    await self._sync_rows(conn, rows, semaphore, sync_results)
+                    self._report_sync_progress(sync_results, "syncing", progress_callback)
+            finally:
+                conn.close()
+            
+            self._report_sync_progress(sync_results, "complete", progress_callback)
         
-        # Get all pending records
-        cursor.execute('''
-            SELECT * FROM offline_records 
-            WHERE sync_status = 'pending' 
-            ORDER BY timestamp ASC
-        ''')
+        sync_results["media"] = await self.sync_media()
+        return sync_results
+    
+    async def sync_records(self, record_ids: List[str]) -> Dict[str, Any]:
+        """Sync specific records that are still pending (background queue path)
         
-        pending_records = cursor.fetchall()
-        conn.close()
+        Older pending records of the same documents are synced with them, in
+        order, so a queued edit does not wait behind one left by an earlier run.
+        """
         
-        sync_results = {
-            "total_records": len(pending_records),
+        async with self._sync_lock:
+            conn = sqlite3.connect(self.db_path)
+            try:
+                placeholders = ','.join('?' * len(record_ids))
+                rows = conn.execute(f'''
+                    SELECT rowid, record_id, record_type, data, timestamp, worker_id, device_id,
+                           checksum, parent_record_id, operation, entity_key
+                    FROM offline_records AS r
+                    WHERE sync_status = 'pending' AND (
+                        record_id IN ({placeholders}) OR EXISTS (
+                            SELECT 1 FROM offline_records AS queued
+                            WHERE queued.record_id IN ({placeholders})
+                              AND queued.entity_key = r.entity_key
+                              AND (r.timestamp, r.rowid) < (queued.timestamp, queued.rowid)
+                        )
+                    )
+                    ORDER BY timestamp, rowid
+                ''', [*record_ids, *record_ids]).fetchall()
+                sync_results = self._new_sync_results(len(rows))
+                if rows:
+                    await self._sync_rows(conn, rows, asyncio.Semaphore(self.sync_concurrency), sync_results)
+            finally:
+                conn.close()
+            return sync_results
+    
+    async def sync_media(self) -> Dict[str, Any]:
+        """Upload pending media blobs in resumable chunks, variants first
+        
+        Each blob starts at the offset the server reports (a HEAD request),
+        so an upload cut off by a dead zone continues from its last
+        acknowledged chunk; blobs the server already has send nothing. The
+        acknowledged offset is saved after every chunk. A failed request
+        stops the run; the rest waits for the next sync.
+        """
+        
+        media_results = {"uploaded": 0, "resumed": 0, "bytes_sent": 0, "failed": 0}
+        async with self._media_lock:
+            for content_hash, size_bytes, _ in await asyncio.to_thread(self.media_store.pending_uploads):
+                try:
+                    offset, complete = await self.sync_service.media_upload_status(content_hash) or (0, False)
+                    if offset and not complete:
+                        media_results["resumed"] += 1
+                    
+                    while not complete:
+                        chunk = await asyncio.to_thread(self.media_store.read_chunk, content_hash, offset)
+                        media_results["bytes_sent"] += len(chunk)
+                        offset, complete = await self.sync_service.upload_media_chunk(
+                            content_hash, offset, size_bytes, chunk
+                        )
+                        await asyncio.to_thread(self.media_store.record_upload_progress, content_hash, offset)
+                    
+                    await asyncio.to_thread(self.media_store.record_upload_progress, content_hash, offset, True)
+                    media_results["uploaded"] += 1
+                except Exception as e:
+                    logging.warning(f"Media upload of {content_hash[:12]} interrupted: {e}")
+                    media_results["failed"] += 1
+                    break
+        return media_results
+    
+    @staticmethod
+    def _new_sync_results(total: int) -> Dict[str, Any]:
+        return {
+            "total_records": total,
             "synced": 0,
             "conflicts": 0,
             "failures": 0,
+            "deferred": 0,
             "details": []
         }
-        
-        for record_row in pending_records:
-            record_id = record_row[0]
-            record_type = record_row[1]
-            data = json.loads(record_row[2])
-            
-            try:
-                sync_result = await self._sync_single_record(record_id, record_type, data)
-                
-                if sync_result["status"] == "success":
-                    sync_results["synced"] += 1
-                    await self._mark_record_synced(record_id)
-                elif sync_result["status"] == "conflict":
-                    sync_results["conflicts"] += 1
-                    await self._handle_sync_conflict(record_id, sync_result["conflict_data"])
-                else:
-                    sync_results["failures"] += 1
-                    await self._mark_sync_failed(record_id, sync_result.get("error"))
-                
-                sync_results["details"].append({
-                    "record_id": record_id,
-                    "type": record_type,
-                    "status": sync_result["status"]
-                })
-                
-            except Exception as e:
-                sync_results["failures"] += 1
-                sync_results["details"].append({
-                    "record_id": record_id,
-                    "type": record_type,
-                    "status": "error",
-                    "error": str(e)
-                })
-        
-        return sync_results
     
-    async def _sync_single_record(self, record_id: str, record_type: str, 
-                                data: Dict[str, Any]) -> Dict[str, Any]:
-        """Sync a single record to the server"""
-        
-        # Different sync strategies based on record type
-        if record_type == "inspection":
-            return await self._sync_inspection_record(record_id, data)
-        elif record_type == "measurement":
-            return await self._sync_measurement_record(record_id, data)
-        elif record_type == "photo":
-            return await self._sync_photo_record(record_id, data)
-        elif record_type == "defect":
-            return await self._sync_defect_record(record_id, data)
-        else:
-            return await self._sync_generic_record(record_id, record_type, data)
+    async def _sync_rows(self, conn: sqlite3.Connection, rows: List[tuple],
+                         semaphore: asyncio.Semaphore, sync_results: Dict[str, Any]):
+        """Upload a batch of pending rows, settle the outcomes and tally them into sync_results"""
+        
+        outcomes = await self._sync_record_batch(conn, rows, semaphore)
+        conflicts = self._settle_sync_batch(conn, outcomes)
+        
+        for record, result in outcomes:
+            status = result["status"]
+            if status == "success":
+                sync_results["synced"] += 1
+            elif status == "conflict":
+                sync_results["conflicts"] += 1
+            elif status == "held":
+                sync_results["deferred"] += 1
+            else:
+                sync_results["failures"] += 1
+            detail = {"record_id": record.record_id, "type": record.record_type, "status": status}
+            if status == "error" and result.get("error"):
+                detail["error"] = result["error"]
+            sync_results["details"].append(detail)
+        
+        # Automatic resolutions run after their conflicts are committed; one that
+        # fails leaves its conflict for manual review and the sync carries on
+        for conflict_id, resolution_strategy in conflicts:
+            if resolution_strategy in ["local_wins", "remote_wins", "merge"]:
+                try:
+                    await self._apply_conflict_resolution(conflict_id, resolution_strategy)
+                except Exception as e:
+                    logging.error(f"Automatic {resolution_strategy} resolution of {conflict_id} failed: {e}")
     
-    async def _sync_inspection_record(self, record_id: str, data: Dict[str, Any]) -> Dict[str, Any]:
-        """Sync inspection record with conflict detection"""
-        
-        # Check if inspection was modified remotely while offline
-        inspection_id = data.get("inspection_id")
-        if inspection_id and not inspection_id.startswith("OFFLINE-"):
-            # This is an update to existing inspection
-            remote_inspection = await self._fetch_remote_inspection(inspection_id)
-            
-            if remote_inspection:
-                # Check for conflicts
-                local_timestamp = datetime.fromisoformat(data.get("updated_at", data.get("created_at")))
-                remote_timestamp = datetime.fromisoformat(remote_inspection.get("updated_at"))
-                
-                if remote_timestamp > local_timestamp:
-                    # Potential conflict - remote was modified after our local copy
-                    conflict_data = {
-                        "local_data": data,
-                        "remote_data": remote_inspection,
-                        "conflict_fields": self._detect_field_conflicts(data, remote_inspection)
-                    }
-                    return {"status": "conflict", "conflict_data": conflict_data}
-        
-        # No conflict, proceed with sync
+    async def _apply_conflict_resolution(self, conflict_id: str, resolution_strategy: str,
+                                         resolved_by: str = "automatic"):
+        """Settle a stored conflict with ``local_wins``, ``remote_wins`` or ``merge``
+        
+        remote_wins takes the server's document as the synced version.
+        local_wins applies the device's changes over the server's document;
+        merge keeps both sides' changes (see merge_documents). Either result
+        is uploaded as a patch against the server's document from the
+        conflict. If the server copy has moved on since, the upload is
+        rejected, this raises and the conflict stays open. A settled record
+        is synced, and its document's held records follow on the next sync.
+        """
+        
+        if resolution_strategy not in ("local_wins", "remote_wins", "merge"):
+            raise ValueError(f"Unknown resolution strategy: {resolution_strategy}")
+        
+        conn = sqlite3.connect(self.db_path)
         try:
-            if inspection_id and not inspection_id.startswith("OFFLINE-"):
-                # Update existing inspection
-                result = await self._update_remote_inspection(inspection_id, data)
+            row = conn.execute('''
+                SELECT c.remote_data, c.resolved_at, r.entity_key, r.record_id, r.record_type, r.data, r.timestamp,
+                       r.worker_id, r.device_id, r.checksum, r.sync_status, r.parent_record_id, r.operation
+                FROM sync_conflicts c JOIN offline_records r ON r.record_id = c.local_record_id
+                WHERE c.conflict_id = ?
+            ''', (conflict_id,)).fetchone()
+            if row is None:
+                raise ValueError(f"Unknown conflict: {conflict_id}")
+            remote_data, resolved_at, key, *record_row = row
+            if resolved_at is not None:
+                raise ValueError(f"Conflict {conflict_id} was already resolved")
+            record = OfflineRecord(*record_row[:2], json.loads(record_row[2]), *record_row[3:])
+            remote = json.loads(remote_data)
+            
+            # The device's changes are the ones since the version it last synced
+            base = self._load_synced_documents(conn, {key}).get(key)
+            base = base[2] if base else {}
+            if resolution_strategy == "remote_wins":
+                document = remote
+            elif resolution_strategy == "local_wins":
+                document = apply_patch(remote, diff_documents(base, record.data))
             else:
-                # Create new inspection
-                result = await self._create_remote_inspection(data)
+                document = merge_documents(base, record.data, remote, ConflictResolver.text_fields)
             
-            return {"status": "success", "remote_id": result.get("inspection_id")}
+            checksum = document_checksum(document)
+            if document != remote:
+                result, = await self._upload_sync_batch([{
+                    "record_id": record.record_id, "record_type": record.record_type,
+                    "operation": record.operation, "entity_key": key, "checksum": checksum,
+                    "base_checksum": document_checksum(remote), "patch": diff_documents(remote, document)
+                }])
+                if result.get("status") != "success":
+                    raise RuntimeError(
+                        f"Server rejected the {resolution_strategy} resolution of {conflict_id}: "
+                        f"{result.get('error') or result.get('status')}"
+                    )
             
-        except Exception as e:
-            return {"status": "error", "error": str(e)}
+            now = datetime.now().isoformat()
+            with conn:
+                conn.execute(
+                    "UPDATE offline_records SET sync_status = 'synced', last_sync_attempt = ? WHERE record_id = ?",
+                    (now, record.record_id)
+                )
+                conn.execute('''
+                    INSERT OR REPLACE INTO synced_documents
+                    (entity_key, record_type, data, checksum, synced_at, local_data)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', (key, record.record_type, json.dumps(document), checksum, now,
+                      None if checksum == record.checksum else json.dumps(record.data)))
+                conn.execute('''
+                    UPDATE sync_conflicts SET resolution_strategy = ?, resolved_at = ?, resolved_by = ?
+                    WHERE conflict_id = ?
+                ''', (resolution_strategy, now, resolved_by, conflict_id))
+        finally:
+            conn.close()
     
-    def _detect_field_conflicts(self, local_data: Dict[str, Any], 
-                              remote_data: Dict[str, Any]) -> List[str]:
-        """Detect which fields have conflicts between local and remote data"""
-        
-        conflicts = []
-        
-        # Compare key fields that could cause conflicts
-        conflict_fields = ["status", "measurements", "defects", "notes", "photos"]
-        
-        for field in conflict_fields:
-            local_value = local_data.get(field)
-            remote_value = remote_data.get(field)
+    def _report_sync_progress(self, sync_results: Dict[str, Any], state: str,
+                              progress_callback: Callable[[Dict[str, Any]], None] = None):
+        processed = (sync_results["synced"] + sync_results["conflicts"] + sync_results["failures"]
+                     + sync_results["deferred"])
+        self.sync_progress = {
+            "state": state,
+            "total_records": sync_results["total_records"],
+            "processed": processed,
+            "synced": sync_results["synced"],
+            "conflicts": sync_results["conflicts"],
+            "failures": sync_results["failures"],
+            "deferred": sync_results["deferred"],
+            "percent": round(100.0 * processed / sync_results["total_records"], 1) if sync_results["total_records"] else 100.0,
+            "updated_at": datetime.now().isoformat()
+        }
+        if progress_callback:
+            progress_callback(self.sync_progress)
+    
+    @staticmethod
+    def _entity_key(record_type: str, data: Dict[str, Any], record_id: str) -> str:
+        """Identity of the document a record creates or updates (stored as offline_records.entity_key)"""
+        return str(data.get(f"{record_type}_id") or data.get("id") or record_id)
+    
+    async def _upload_sync_batch(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Send one encoded sync batch; the server's per-item results, in order"""
+        return await self.sync_service.upload_batch(encode_batch(items))
+    
+    async def _sync_record_batch(self, conn: sqlite3.Connection, rows: List[tuple],
+                                 semaphore: asyncio.Semaphore) -> List[Tuple[OfflineRecord, Dict[str, Any]]]:
+        """Upload one batch of pending rows, grouped by record_type
+        
+        Every record goes to the server's sync-batch endpoint, which keeps one
+        reassembled document per entity (SyncBatchReceiver). A record whose
+        document was synced before goes as a field-level patch (see
+        sync_payloads): the change from the version it was edited on, applied
+        to the server's copy. Others go whole. Each group is split into upload
+        chunks of ``sync_upload_chunk`` records, keeping all records of one
+        document in the same chunk and in order.
+        
+        A patch the server rejects because its copy moved on is compared
+        patch to patch: if the server changed other fields, it is rebased
+        onto the server copy and re-sent once; otherwise it is a conflict on
+        the overlapping fields. Once a record of a document does not sync,
+        the document's later records in the batch are held: they stay
+        pending, without a failed attempt, until that record has settled.
+        The same goes for records behind an older unsettled record of their
+        document outside the batch, left by an earlier batch or run.
+        """
+        
+        records = []
+        keys = {}
+        positions = {}
+        for (rowid, record_id, record_type, data, timestamp, worker_id, device_id,
+             checksum, parent_record_id, operation, entity_key) in rows:
+            keys[record_id] = entity_key
+            positions[record_id] = (timestamp, rowid)
+            records.append(OfflineRecord(
+                record_id=record_id,
+                record_type=record_type,
+                data=json.loads(data),
+                timestamp=timestamp,
+                worker_id=worker_id,
+                device_id=device_id,
+                checksum=checksum,
+                sync_status='pending',
+                parent_record_id=parent_record_id,
+                operation=operation
+            ))
+        
+        # Last synced versions, advanced as records of the same document follow
+        # each other; a record only syncs if every earlier one did (see held below)
+        versions = self._load_synced_documents(conn, set(keys.values()))
+        blocked = self._blocked_entities(conn, keys)
+        held = set()
+        bases: Dict[str, Optional[Dict[str, Any]]] = {}
+        documents: Dict[str, Dict[str, Any]] = {}  # record_id -> server document once it is applied
+        groups: Dict[str, Tuple[List[list], Dict[str, int]]] = {}
+        for record in records:
+            key = keys[record.record_id]
+            if key in blocked and blocked[key] < positions[record.record_id]:
+                held.add(record.record_id)
+                continue
+            item = {
+                "record_id": record.record_id,
+                "record_type": record.record_type,
+                "operation": record.operation,
+                "entity_key": key,
+                "checksum": record.checksum
+            }
+            base = versions.get(key)
+            document = record.data
+            if base is not None and record.operation != 'delete':
+                server_document, server_checksum, local_document = base
+                item["base_checksum"] = server_checksum
+                item["patch"] = diff_documents(local_document, record.data)
+                if local_document is not server_document:
+                    # The server copy is a merge: the patch lands on it, not on our version
+                    document = apply_patch(server_document, item["patch"])
+                    item["checksum"] = document_checksum(document)
+            else:
+                item["data"] = record.data
+            bases[record.record_id] = base[2] if base else None
+            documents[record.record_id] = document
+            if record.operation == 'delete':
+                versions.pop(key, None)
+            else:
+                versions[key] = (document, item["checksum"], record.data)
             
-            if local_value != remote_value:
-                conflicts.append(field)
-        
-        return conflicts
+            # Dict order is first appearance, i.e. oldest record first
+            chunks, chunk_of = groups.setdefault(record.record_type, ([], {}))
+            index = chunk_of.get(key)
+            if index is None:
+                if not chunks or len(chunks[-1]) >= self.sync_upload_chunk:
+                    chunks.append([])
+                index = chunk_of[key] = len(chunks) - 1
+            chunks[index].append(item)
+        
+        async def upload(chunk: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+            async with semaphore:
+                try:
+                    return await self._upload_sync_batch(chunk)
+                except Exception as e:
+                    return [{"record_id": item["record_id"], "status": "error", "error": str(e)} for item in chunk]
+        
+        results: Dict[str, Dict[str, Any]] = {}
+        for chunks, _ in groups.values():
+            for chunk_results in await asyncio.gather(*(upload(chunk) for chunk in chunks)):
+                results.update((result["record_id"], result) for result in chunk_results)
+        
+        # One retry round for the first record of each document that did not
+        # sync: base missing on the server -> whole document; patch conflicts
+        # touching different fields -> rebased patch. Its later records wait.
+        retries = []
+        unsettled = set()
+        for record in records:
+            record_id, key = record.record_id, keys[record.record_id]
+            if record_id in held:
+                continue
+            if key in unsettled:
+                held.add(record_id)
+                continue
+            result = results.get(record_id, {})
+            if result.get("status") == "success":
+                continue
+            unsettled.add(key)
+            if result.get("status") == "base_missing":
+                retries.append({
+                    "record_id": record_id, "record_type": record.record_type, "operation": record.operation,
+                    "entity_key": key, "checksum": record.checksum, "data": record.data, "replace": True
+                })
+                documents[record_id] = record.data
+            elif result.get("status") == "conflict" and bases[record_id] is not None:
+                local_patch = diff_documents(bases[record_id], record.data)
+                remote = result["remote_data"]
+                if not conflicting_paths(local_patch, diff_documents(bases[record_id], remote)):
+                    documents[record_id] = apply_patch(remote, local_patch)
+                    retries.append({
+                        "record_id": record_id, "record_type": record.record_type, "operation": record.operation,
+                        "entity_key": key, "checksum": document_checksum(documents[record_id]),
+                        "base_checksum": document_checksum(remote), "patch": local_patch
+                    })
+        for start in range(0, len(retries), self.sync_upload_chunk):
+            results.update((result["record_id"], result)
+                           for result in await upload(retries[start:start + self.sync_upload_chunk]))
+        
+        outcomes = []
+        for record in records:
+            if record.record_id in held:
+                result = {"status": "held"}
+            else:
+                result = results.get(record.record_id) or {"status": "error", "error": "No result from server"}
+            result["entity_key"] = keys[record.record_id]
+            if result["status"] == "success":
+                result["document"] = documents[record.record_id]
+            elif result["status"] == "conflict":
+                remote = result.get("remote_data", {})
+                # Without a synced version, fields both sides hold with different values conflict
+                base = bases[record.record_id] or {}
+                paths = conflicting_paths(diff_documents(base, record.data), diff_documents(base, remote))
+                conflict_fields = sorted({path.split(".")[0] for path in paths})
+                result["conflict_data"] = {
+                    "local_data": record.data,
+                    "remote_data": remote,
+                    "conflict_fields": conflict_fields,
+                    "conflict_paths": paths
+                }
+                try:
+                    result["resolution_strategy"] = await self.conflict_resolver.determine_resolution_strategy(
+                        record.data, remote, conflict_fields
+                    )
+                except Exception as e:
+                    # A resolver failure must not keep the whole batch pending
+                    logging.error(f"Choosing a resolution for {record.record_id} failed: {e}")
+                    result["resolution_strategy"] = "manual"
+            elif result["status"] not in ("error", "held"):
+                result = {**result, "status": "error", "error": f"Unexpected sync status {result['status']}"}
+            outcomes.append((record, result))
+        return outcomes
     
-    async def _handle_sync_conflict(self, record_id: str, conflict_data: Dict[str, Any]):
-        """Handle sync conflict using intelligent resolution strategies"""
-        
-        conflict_id = f"CONFLICT-{uuid.uuid4().hex[:8]}"
-        
-        # Determine resolution strategy
-        resolution_strategy = await self.conflict_resolver.determine_resolution_strategy(
-            conflict_data["local_data"],
-            conflict_data["remote_data"],
-            conflict_data["conflict_fields"]
-        )
-        
-        conflict = SyncConflict(
-            conflict_id=conflict_id,
-            local_record=await self._get_offline_record(record_id),
-            remote_record=conflict_data["remote_data"],
-            conflict_type="data",
-            resolution_strategy=resolution_strategy,
-            created_at=datetime.now().isoformat()
-        )
-        
-        # Store conflict for review
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO sync_conflicts 
-            (conflict_id, local_record_id, remote_data, conflict_type, 
-             resolution_strategy, created_at)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (
-            conflict.conflict_id, record_id, json.dumps(conflict_data["remote_data"]),
-            conflict.conflict_type, conflict.resolution_strategy, conflict.created_at
-        ))
-        conn.commit()
-        conn.close()
+    def _blocked_entities(self, conn: sqlite3.Connection,
+                          keys: Dict[str, str]) -> Dict[str, Tuple[str, int]]:
+        """entity_key -> (timestamp, rowid) of its oldest pending, conflicting or
+        failed record outside the batch (``keys``: record_id -> entity_key)
+        
+        Records of the document after that one must not upload: their patch
+        would be applied before it, and it would later revert them.
+        """
+        
+        entity_keys = sorted(set(keys.values()))
+        blocked = {}
+        for start in range(0, len(entity_keys), 900):
+            chunk = entity_keys[start:start + 900]
+            for key, timestamp, rowid, record_id in conn.execute(f'''
+                SELECT entity_key, timestamp, rowid, record_id FROM offline_records
+                WHERE entity_key IN ({','.join('?' * len(chunk))})
+                  AND sync_status IN ('pending', 'conflict', 'failed')
+                ORDER BY entity_key, timestamp, rowid
+            ''', chunk):
+                if key not in blocked and record_id not in keys:
+                    blocked[key] = (timestamp, rowid)
+        return blocked
+    
+    def _load_synced_documents(self, conn: sqlite3.Connection,
+                               keys: set) -> Dict[str, Tuple[Dict[str, Any], str, Dict[str, Any]]]:
+        """entity_key -> (server's document, its checksum, the device's version it was synced from)
+        
+        The two documents are the same object unless the server copy is a merge.
+        """
+        
+        keys = list(keys)
+        versions = {}
+        for start in range(0, len(keys), 900):
+            chunk = keys[start:start + 900]
+            for key, data, checksum, local_data in conn.execute(
+                f"SELECT entity_key, data, checksum, local_data FROM synced_documents "
+                f"WHERE entity_key IN ({','.join('?' * len(chunk))})", chunk
+            ):
+                document = json.loads(data)
+                versions[key] = (document, checksum, json.loads(local_data) if local_data else document)
+        return versions
+    
+    def _settle_sync_batch(self, conn: sqlite3.Connection,
+                           outcomes: List[Tuple[OfflineRecord, Dict[str, Any]]]) -> List[Tuple[str, str]]:
+        """Write a batch's sync outcomes and conflicts in one transaction
+        
+        Returns (conflict_id, resolution_strategy) for the stored conflicts.
+        """
+        
+        now = datetime.now().isoformat()
+        synced = []
+        failed = []
+        conflict_rows = []
+        synced_devices = set()
+        document_changes = []
+        
+        for record, result in outcomes:
+            status = result["status"]
+            if status == "success":
+                synced.append((now, record.record_id))
+                synced_devices.add(record.device_id)
+                document_changes.append((record, result))
+            elif status == "conflict":
+                conflict_rows.append(SyncConflict(
+                    conflict_id=f"CONFLICT-{uuid.uuid4().hex[:8]}",
+                    local_record=record,
+                    remote_record=result["conflict_data"]["remote_data"],
+                    conflict_type="data",
+                    resolution_strategy=result["resolution_strategy"],
+                    created_at=now
+                ))
+            elif status == "held":
+                # Waits for an earlier record of its document; not a failed attempt
+                continue
+            else:
+                failed.append((now, self.max_sync_retries, record.record_id))
         
-        # Apply automatic resolution if strategy is available
-        if resolution_strategy in ["local_wins", "remote_wins", "merge"]:
-            await self._apply_conflict_resolution(conflict_id, resolution_strategy)
+        with conn:
+            conn.executemany(
+                "UPDATE offline_records SET sync_status = 'synced', last_sync_attempt = ? WHERE record_id = ?",
+                synced
+            )
+            conn.executemany('''
+                UPDATE offline_records
+                SET retry_count = retry_count + 1, last_sync_attempt = ?,
+                    sync_status = CASE WHEN retry_count + 1 >= ? THEN 'failed' ELSE 'pending' END
+                WHERE record_id = ?
+            ''', failed)
+            conn.executemany(
+                "UPDATE offline_records SET sync_status = 'conflict', last_sync_attempt = ? WHERE record_id = ?",
+                [(now, conflict.local_record.record_id) for conflict in conflict_rows]
+            )
+            conn.executemany('''
+                INSERT INTO sync_conflicts
+                (conflict_id, local_record_id, remote_data, conflict_type,
+                 resolution_strategy, created_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', [
+                (conflict.conflict_id, conflict.local_record.record_id, json.dumps(conflict.remote_record),
+                 conflict.conflict_type, conflict.resolution_strategy, conflict.created_at)
+                for conflict in conflict_rows
+            ])
+            # In batch order, so the last record of a document leaves its version
+            for record, result in document_changes:
+                if record.operation == 'delete':
+                    conn.execute("DELETE FROM synced_documents WHERE entity_key = ?", (result["entity_key"],))
+                else:
+                    document = result["document"]
+                    checksum = document_checksum(document)
+                    conn.execute('''
+                        INSERT OR REPLACE INTO synced_documents
+                        (entity_key, record_type, data, checksum, synced_at, local_data)
+                        VALUES (?, ?, ?, ?, ?, ?)
+                    ''', (result["entity_key"], record.record_type, json.dumps(document), checksum, now,
+                          None if checksum == record.checksum else json.dumps(record.data)))
+            conn.executemany('''
+                INSERT INTO device_sync_state (device_id, last_sync_timestamp) VALUES (?, ?)
+                ON CONFLICT(device_id) DO UPDATE SET last_sync_timestamp = excluded.last_sync_timestamp
+            ''', [(device_id, now) for device_id in synced_devices])
+        
+        return [(conflict.conflict_id, conflict.resolution_strategy) for conflict in conflict_rows]
     
     async def _check_network_connectivity(self) -> bool:
-        """Check if network connection is available"""
-        try:
-            # Try to ping the FixItFred server
-            import aiohttp
-            async with aiohttp.ClientSession() as session:
-                async with session.get("http://localhost:8080/api/system/status", 
-                                     timeout=aiohttp.ClientTimeout(total=5)) as response:
-                    return response.status == 200
-        except:
-            return False
+        """Check if network connection is available (debounced by the sync service)"""
+        return await self.sync_service.is_online()
     
-    def _start_background_sync(self):
-        """Start background thread for automatic syncing"""
-        def sync_worker():
-            while True:
-                try:
-                    if asyncio.run(self._check_network_connectivity()):
-                        # Process sync queue
-                        while not self.sync_queue.empty():
-                            record_id = self.sync_queue.get(timeout=1)
-                            # Process sync in background
-                            asyncio.run(self._process_background_sync(record_id))
-                except:
-                    pass
-                
-                time.sleep(30)  # Check every 30 seconds
-        
-        sync_thread = threading.Thread(target=sync_worker, daemon=True)
-        sync_thread.start()
+    async def start(self):
+        """Start background sync on the running loop"""
+        await self.sync_service.start()
+    
+    async def stop(self):
+        """Stop background sync and close its HTTP session, then the media worker pool"""
+        await self.sync_service.stop()
+        await self.media_store.shutdown()
     
     async def get_offline_status(self, device_id: str) -> Dict[str, Any]:
         """Get current offline status for a device"""
@@ -402,6 +818,9 @@ class OfflineSyncEngine:
 class ConflictResolver:
     """Intelligent conflict resolution for data synchronization"""
     
+    # Free-text fields: both sides' edits are kept by merging
+    text_fields = ("notes", "comments", "observations")
+    
     async def determine_resolution_strategy(self, local_data: Dict[str, Any], 
                                           remote_data: Dict[str, Any], 
                                           conflict_fields: List[str]) -> str:
@@ -419,16 +838,18 @@ class ConflictResolver:
         if any(field in conflict_fields for field in measurement_fields):
             return "local_wins"
         
-        # 3. Status changes: most recent wins
+        # 3. Status changes: most recent wins; without both timestamps a person decides
         status_fields = ["status", "completion_status", "approval_status"]
         if any(field in conflict_fields for field in status_fields):
-            local_time = datetime.fromisoformat(local_data.get("updated_at", local_data.get("created_at")))
-            remote_time = datetime.fromisoformat(remote_data.get("updated_at", remote_data.get("created_at")))
+            try:
+                local_time = datetime.fromisoformat(local_data.get("updated_at") or local_data["created_at"])
+                remote_time = datetime.fromisoformat(remote_data.get("updated_at") or remote_data["created_at"])
+            except (KeyError, TypeError, ValueError):
+                return "manual"
             return "local_wins" if local_time > remote_time else "remote_wins"
         
         # 4. Notes and comments: merge
-        text_fields = ["notes", "comments", "observations"]
-        if any(field in conflict_fields for field in text_fields):
+        if any(field in conflict_fields for field in self.text_fields):
             return "merge"
         
         # 5. Default: manual review required
@@ -437,71 +858,55 @@ class ConflictResolver:
 class OfflinePhotoManager:
     """Manages photos taken offline"""
     
-    def __init__(self, storage_path: str = "offline_photos"):
-        self.storage_path = Path(storage_path)
-        self.storage_path.mkdir(exist_ok=True)
+    def __init__(self, media_store: OfflineMediaStore):
+        self.media_store = media_store
     
-    async def store_photo_offline(self, photo_data: bytes, 
+    async def store_photo_offline(self, photo_data: Any, 
                                 record_id: str, worker_id: str) -> str:
-        """Store photo offline with metadata"""
-        
-        photo_id = f"PHOTO-{uuid.uuid4().hex[:8]}"
-        photo_path = self.storage_path / f"{photo_id}.jpg"
+        """Store photo offline with metadata
         
-        # Save photo file
-        with open(photo_path, 'wb') as f:
-            f.write(photo_data)
+        ``photo_data`` may be bytes, a file object or a path; it is streamed
+        into the content-addressed media store, and new photos get
+        thumbnails rendered in the background.
+        """
         
-        # Store metadata
+        photo_id = f"PHOTO-{uuid.uuid4().hex[:8]}"
         metadata = {
             "photo_id": photo_id,
             "record_id": record_id,
             "worker_id": worker_id,
-            "timestamp": datetime.now().isoformat(),
-            "file_path": str(photo_path),
-            "file_size": len(photo_data),
-            "sync_status": "pending"
+            "timestamp": datetime.now().isoformat()
         }
         
-        metadata_path = self.storage_path / f"{photo_id}_metadata.json"
-        with open(metadata_path, 'w') as f:
-            json.dump(metadata, f)
-        
+        await self.media_store.add(
+            photo_data, "photo", photo_id, metadata,
+            render=render_photo_variants, variant_spec=PHOTO_VARIANTS
+        )
         return photo_id
 
 class OfflineVoiceRecorder:
     """Manages voice recordings taken offline"""
     
-    def __init__(self, storage_path: str = "offline_voice"):
-        self.storage_path = Path(storage_path)
-        self.storage_path.mkdir(exist_ok=True)
+    def __init__(self, media_store: OfflineMediaStore):
+        self.media_store = media_store
     
-    async def store_voice_offline(self, audio_data: bytes, 
+    async def store_voice_offline(self, audio_data: Any, 
                                 worker_id: str, transcript: str = "") -> str:
-        """Store voice recording offline"""
+        """Store voice recording offline (bytes, a file object or a path)"""
         
         voice_id = f"VOICE-{uuid.uuid4().hex[:8]}"
-        voice_path = self.storage_path / f"{voice_id}.wav"
-        
-        # Save audio file
-        with open(voice_path, 'wb') as f:
-            f.write(audio_data)
-        
-        # Store metadata with transcript
         metadata = {
             "voice_id": voice_id,
             "worker_id": worker_id,
             "timestamp": datetime.now().isoformat(),
-            "file_path": str(voice_path),
-            "transcript": transcript,
-            "sync_status": "pending"
+            "transcript": transcript
         }
         
-        metadata_path = self.storage_path / f"{voice_id}_metadata.json"
-        with open(metadata_path, 'w') as f:
-            json.dump(metadata, f)
-        
+        await self.media_store.add(
+            audio_data, "voice", voice_id, metadata,
+            render=render_voice_variants, variant_spec=VOICE_VARIANTS
+        )
         return voice_id
 
 # Global offline sync engine instance
-offline_sync_engine = OfflineSyncEngine()
\ No newline at end of file
+offline_sync_engine = OfflineSyncEngine()
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+FixItFred Offline Sync Payloads
+Field-level record patches, compact compressed sync batches and their server-side reassembly
+"""
+
+import hashlib
+import json
+import sqlite3
+import zlib
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+# MessagePack is optional; batches fall back to JSON (tagged, so both ends agree)
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+SYNC_BATCH_CONTENT_TYPE = "application/x-fixitfred-sync-batch"
+
+# Decompressed size cap, so a small payload cannot inflate into gigabytes
+MAX_DECODED_BATCH_BYTES = 64 * 1024 * 1024
+
+_MSGPACK_TAG = b"M"
+_JSON_TAG = b"J"
+
+def document_checksum(document: Dict[str, Any]) -> str:
+    """Checksum of a record document, as stored with every offline record"""
+    return hashlib.md5(json.dumps(document, sort_keys=True).encode()).hexdigest()
+
+# ----------------------------------------------------------------------
+# Patches
+# ----------------------------------------------------------------------
+
+def diff_documents(base: Dict[str, Any], current: Dict[str, Any], path: Tuple[str, ...] = ()) -> List[list]:
+    """Field-level patch turning ``base`` into ``current``
+    
+    Operations are ``["set", path, value]``, ``["del", path]`` and
+    ``["append", path, items]`` (a list that only grew at the end, e.g. new
+    measurements), where ``path`` is the list of keys down to the field.
+    Nested objects are diffed recursively; other changed values are set whole.
+    """
+    
+    ops = []
+    for key in base:
+        if key not in current:
+            ops.append(["del", [*path, key]])
+    for key, value in current.items():
+        if key not in base:
+            ops.append(["set", [*path, key], value])
+            continue
+        old = base[key]
+        if old == value:
+            continue
+        if isinstance(old, dict) and isinstance(value, dict):
+            ops.extend(diff_documents(old, value, (*path, key)))
+        elif isinstance(old, list) and isinstance(value, list) and len(value) > len(old) and value[:len(old)] == old:
+            ops.append(["append", [*path, key], value[len(old):]])
+        else:
+            ops.append(["set", [*path, key], value])
+    return ops
+
+def apply_patch(base: Dict[str, Any], patch: List[list]) -> Dict[str, Any]:
+    """New document from ``base`` with a diff_documents() patch applied
+    
+    Only the objects along patched paths are copied; untouched fields are
+    shared with ``base``, which is left unchanged.
+    """
+    
+    document = dict(base)
+    copied = {()}
+    for op in patch:
+        action, path = op[0], op[1]
+        parent = document
+        for depth, key in enumerate(path[:-1], 1):
+            prefix = tuple(path[:depth])
+            if prefix not in copied:
+                child = parent.get(key)
+                parent[key] = dict(child) if isinstance(child, dict) else {}
+                copied.add(prefix)
+            parent = parent[key]
+        field = path[-1]
+        if action == "set":
+            parent[field] = op[2]
+        elif action == "del":
+            parent.pop(field, None)
+        elif action == "append":
+            parent[field] = list(parent.get(field) or []) + list(op[2])
+        else:
+            raise ValueError(f"Unknown patch operation: {action}")
+    return document
+
+def conflicting_paths(local_patch: List[list], remote_patch: List[list]) -> List[str]:
+    """Dotted paths both patches change differently (a path or one of its parents)"""
+    
+    remote = {tuple(op[1]): op for op in remote_patch}
+    conflicts = set()
+    for op in local_patch:
+        path = tuple(op[1])
+        for remote_path, remote_op in remote.items():
+            overlap = path[:len(remote_path)] == remote_path or remote_path[:len(path)] == path
+            if overlap and not (path == remote_path and op == remote_op):
+                conflicts.add(".".join(min(path, remote_path, key=len)))
+    return sorted(conflicts)
+
+def _value_at(document: Any, path: List[str]) -> Any:
+    for key in path:
+        if not isinstance(document, dict) or key not in document:
+            return None
+        document = document[key]
+    return document
+
+def merge_documents(base: Dict[str, Any], local: Dict[str, Any], remote: Dict[str, Any],
+                    text_fields: Tuple[str, ...] = ()) -> Dict[str, Any]:
+    """``remote`` with the changes ``local`` made to ``base`` merged in
+    
+    A change only the local side made is applied. Where both sides changed
+    a field, lists keep the remote items followed by the local ones remote
+    lacks, text under one of ``text_fields`` gets the local text appended
+    on a new line, and other values stay remote.
+    """
+    
+    remote_patch = diff_documents(base, remote)
+    merged = remote
+    for op in diff_documents(base, local):
+        if not conflicting_paths([op], remote_patch):
+            merged = apply_patch(merged, [op])
+            continue
+        path = op[1]
+        local_value, remote_value = _value_at(local, path), _value_at(remote, path)
+        if isinstance(local_value, list) and isinstance(remote_value, list):
+            added = [item for item in local_value if item not in remote_value]
+            if added:
+                merged = apply_patch(merged, [["set", path, remote_value + added]])
+        elif path[0] in text_fields and isinstance(local_value, str) and isinstance(remote_value, str):
+            if local_value and local_value not in remote_value.splitlines():
+                value = f"{remote_value}\n{local_value}" if remote_value else local_value
+                merged = apply_patch(merged, [["set", path, value]])
+    return merged
+
+# ----------------------------------------------------------------------
+# Batch encoding
+# ----------------------------------------------------------------------
+
+def encode_batch(items: List[Dict[str, Any]], level: int = 6) -> bytes:
+    """MessagePack (or JSON) + zlib encoding of a list of sync items"""
+    
+    if msgpack is not None:
+        return _MSGPACK_TAG + zlib.compress(msgpack.packb(items, use_bin_type=True), level)
+    return _JSON_TAG + zlib.compress(json.dumps(items, separators=(',', ':')).encode(), level)
+
+def decode_batch(payload: bytes, max_size: int = MAX_DECODED_BATCH_BYTES) -> List[Dict[str, Any]]:
+    """Items of an encode_batch() payload; ValueError if it is not one or inflates past ``max_size`` bytes"""
+    
+    tag = payload[:1]
+    decompressor = zlib.decompressobj()
+    try:
+        # One byte over the cap is enough to tell the batch is too large
+        body = decompressor.decompress(payload[1:], max_size + 1)
+    except zlib.error as e:
+        raise ValueError(f"Corrupt sync batch: {e}") from e
+    if len(body) > max_size:
+        raise ValueError(f"Sync batch inflates past {max_size} bytes")
+    if not decompressor.eof:
+        raise ValueError("Corrupt sync batch: truncated stream")
+    if tag == _MSGPACK_TAG:
+        if msgpack is None:
+            raise ValueError("MessagePack sync batch received but msgpack is not installed")
+        return msgpack.unpackb(body, raw=False)
+    if tag == _JSON_TAG:
+        return json.loads(body)
+    raise ValueError(f"Unknown sync batch encoding: {tag!r}")
+
+# ----------------------------------------------------------------------
+# Server side
+# ----------------------------------------------------------------------
+
+class SyncBatchReceiver:
+    """Server-side reassembly of sync batches into full documents
+    
+    Items carry either the whole document (``data``) or a ``patch`` against
+    the version the device last synced (``base_checksum``). A patch is only
+    applied when the server's copy still has that checksum; otherwise the
+    item comes back as a conflict with the server's document so the device
+    can compare patches. A whole document for an entity the server already
+    holds with different content is a conflict too, unless the item is a
+    ``replace`` resend after ``base_missing``. The reassembled document must
+    match the item's ``checksum``.
+    """
+    
+    def __init__(self, db_path: str = "data/offline_server_documents.db"):
+        self.db_path = db_path
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS server_documents (
+                entity_key TEXT PRIMARY KEY,
+                record_type TEXT NOT NULL,
+                data TEXT NOT NULL,
+                checksum TEXT NOT NULL,
+                updated_at TEXT NOT NULL
+            )
+        ''')
+        conn.commit()
+        conn.close()
+    
+    @staticmethod
+    def _item_error(item: Dict[str, Any]) -> Optional[str]:
+        """Why an item cannot be applied, or None if it is well formed"""
+        
+        for field in ("entity_key", "record_id"):
+            if not isinstance(item.get(field), str):
+                return f"Missing or invalid {field}"
+        if item.get("operation") == "delete":
+            return None
+        for field in ("record_type", "checksum"):
+            if not isinstance(item.get(field), str):
+                return f"Missing or invalid {field}"
+        
+        if "patch" not in item:
+            return None if isinstance(item.get("data"), dict) else "Missing or invalid data"
+        if not isinstance(item.get("base_checksum"), str):
+            return "Missing or invalid base_checksum"
+        patch = item["patch"]
+        if not isinstance(patch, list):
+            return "Invalid patch"
+        for op in patch:
+            if not (isinstance(op, list) and len(op) >= 2 and isinstance(op[1], list) and op[1]
+                    and all(isinstance(key, str) for key in op[1])):
+                return "Invalid patch operation"
+            if op[0] == "del":
+                continue
+            if op[0] not in ("set", "append") or len(op) < 3 or (op[0] == "append" and not isinstance(op[2], list)):
+                return "Invalid patch operation"
+        return None
+    
+    def _apply_item(self, conn: sqlite3.Connection, item: Any, now: str) -> Dict[str, Any]:
+        if not isinstance(item, dict):
+            return {"record_id": None, "status": "error", "error": "Sync item is not an object"}
+        error = self._item_error(item)
+        if error is not None:
+            record_id = item.get("record_id")
+            return {"record_id": record_id if isinstance(record_id, str) else None, "status": "error", "error": error}
+        
+        key = item["entity_key"]
+        result = {"record_id": item["record_id"]}
+        
+        if item.get("operation") == "delete":
+            conn.execute("DELETE FROM server_documents WHERE entity_key = ?", (key,))
+            return {**result, "status": "success"}
+        
+        row = conn.execute(
+            "SELECT data, checksum FROM server_documents WHERE entity_key = ?", (key,)
+        ).fetchone()
+        if "patch" in item:
+            if row is None:
+                return {**result, "status": "base_missing"}
+            current, current_checksum = json.loads(row[0]), row[1]
+            if current_checksum != item["base_checksum"]:
+                return {**result, "status": "conflict", "remote_data": current}
+            document = apply_patch(current, item["patch"])
+        else:
+            # Without a base the device never saw this copy; replacing it would drop other devices' edits
+            if row is not None and row[1] != item["checksum"] and not item.get("replace"):
+                return {**result, "status": "conflict", "remote_data": json.loads(row[0])}
+            document = item["data"]
+        
+        try:
+            checksum = document_checksum(document)
+        except (TypeError, ValueError):
+            # e.g. binary values from a MessagePack batch
+            return {**result, "status": "error", "error": "Document is not JSON serializable"}
+        if checksum != item["checksum"]:
+            return {**result, "status": "error", "error": "Checksum mismatch after reassembly"}
+        
+        conn.execute('''
+            INSERT INTO server_documents (entity_key, record_type, data, checksum, updated_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(entity_key) DO UPDATE SET
+                data = excluded.data, checksum = excluded.checksum, updated_at = excluded.updated_at
+        ''', (key, item["record_type"], json.dumps(document), checksum, now))
+        return {**result, "status": "success"}
+    
+    def receive(self, payload: bytes) -> List[Dict[str, Any]]:
+        """Apply an encoded batch in order, in one transaction; per-item results
+        
+        Malformed items get an ``error`` result and are skipped; the rest of
+        the batch still applies. ValueError if the payload is not a batch.
+        """
+        
+        items = decode_batch(payload)
+        if not isinstance(items, list):
+            raise ValueError("Sync batch is not a list of items")
+        now = datetime.now().isoformat()
+        conn = sqlite3.connect(self.db_path)
+        try:
+            with conn:
+                return [self._apply_item(conn, item, now) for item in items]
+        finally:
+            conn.close()
+    
+    def get_document(self, entity_key: str) -> Optional[Dict[str, Any]]:
+        conn = sqlite3.connect(self.db_path)
+        try:
+            row = conn.execute("SELECT data FROM server_documents WHERE entity_key = ?", (entity_key,)).fetchone()
+        finally:
+            conn.close()
+        return json.loads(row[0]) if row else None
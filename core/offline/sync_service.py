@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+FixItFred Offline Sync Service
+Long-lived asyncio worker that syncs offline records whenever the server is reachable
+"""
+
+import asyncio
+import logging
+import random
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from core.offline.media_store import content_range
+from core.offline.sync_payloads import SYNC_BATCH_CONTENT_TYPE, decode_batch
+
+_STOP = object()
+
+class OfflineSyncService:
+    """Background sync for an OfflineSyncEngine, owned by the app's event loop
+    
+    One pooled ``httpx.AsyncClient`` serves the connectivity probe and the
+    engine's sync batch and media chunk uploads. Probe results are cached (``online_ttl`` when
+    reachable); while the server is unreachable, callers get the cached
+    "offline" answer and the worker re-probes with exponential backoff from
+    ``min_backoff`` to ``max_backoff`` seconds. Records stored while online
+    are queued on an ``asyncio.Queue`` and synced in batches; every return
+    to connectivity, and every ``sweep_interval`` seconds, the worker runs
+    a full ``sync_when_online`` sweep for anything left pending.
+    """
+    
+    def __init__(self, engine, status_url: str = "http://localhost:8080/api/system/status",
+                 sync_url: str = "http://localhost:8080/api/offline/sync-batch",
+                 media_url: str = "http://localhost:8080/api/offline/media",
+                 probe_timeout: float = 5.0, online_ttl: float = 5.0, min_backoff: float = 1.0,
+                 max_backoff: float = 300.0, sweep_interval: float = 300.0, batch_size: int = 200):
+        self.engine = engine
+        self.status_url = status_url
+        self.sync_url = sync_url
+        self.media_url = media_url
+        self.probe_timeout = probe_timeout
+        self.online_ttl = online_ttl
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.sweep_interval = sweep_interval
+        self.batch_size = batch_size
+        
+        self.http: Optional[httpx.AsyncClient] = None
+        self.queue: asyncio.Queue = asyncio.Queue()
+        
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stop_requested: Optional[asyncio.Event] = None
+        self._probe: Optional[asyncio.Future] = None
+        
+        self.online: Optional[bool] = None
+        self.consecutive_failures = 0
+        self._probe_valid_until = 0.0
+    
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+    
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+    
+    async def start(self):
+        """Start the worker on the running loop (e.g. from an app startup hook)"""
+        
+        if self.running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self.http = httpx.AsyncClient(timeout=self.probe_timeout)
+        self.queue = asyncio.Queue()
+        self._stop_requested = asyncio.Event()
+        self._probe = None
+        self._task = asyncio.create_task(self._run(), name="offline-sync-service")
+    
+    async def stop(self, timeout: float = 30.0):
+        """Let the current batch finish (up to ``timeout``), then close the HTTP session"""
+        
+        if self._task is not None:
+            self._stop_requested.set()
+            self.queue.put_nowait(_STOP)
+            try:
+                await asyncio.wait_for(self._task, timeout)
+            except asyncio.TimeoutError:
+                logging.warning("Offline sync service did not stop in time; cancelled")
+            except Exception as e:
+                logging.error(f"Offline sync service failed: {e}")
+            self._task = None
+        if self.http is not None:
+            await self.http.aclose()
+            self.http = None
+    
+    def enqueue(self, record_id: str):
+        """Queue a stored record for background sync (safe from any thread)"""
+        
+        if not self.running:
+            # Picked up by the start-up sweep
+            return
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        if running_loop is self._loop:
+            self.queue.put_nowait(record_id)
+        else:
+            self._loop.call_soon_threadsafe(self.queue.put_nowait, record_id)
+    
+    # ------------------------------------------------------------------
+    # Connectivity
+    # ------------------------------------------------------------------
+    
+    def _backoff_delay(self) -> float:
+        delay = min(self.min_backoff * (2 ** max(self.consecutive_failures - 1, 0)), self.max_backoff)
+        return delay * random.uniform(0.8, 1.0)
+    
+    async def _probe_server(self, client: httpx.AsyncClient) -> bool:
+        try:
+            response = await client.get(self.status_url)
+            return response.status_code == 200
+        except (httpx.HTTPError, OSError):
+            return False
+    
+    def _record_probe(self, online: bool):
+        self.online = online
+        if online:
+            self.consecutive_failures = 0
+            self._probe_valid_until = time.monotonic() + self.online_ttl
+        else:
+            self.consecutive_failures += 1
+            self._probe_valid_until = time.monotonic() + self._backoff_delay()
+    
+    async def is_online(self, force: bool = False) -> bool:
+        """Debounced reachability of the FixItFred server
+        
+        Answers from the last probe until it expires; concurrent callers on
+        the service loop share one in-flight probe.
+        """
+        
+        if not force and self.online is not None and time.monotonic() < self._probe_valid_until:
+            return self.online
+        
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop or self.http is None:
+            # Another thread's loop (or not started): a one-off client, nothing shared
+            async with httpx.AsyncClient(timeout=self.probe_timeout) as client:
+                online = await self._probe_server(client)
+            self._record_probe(online)
+            return online
+        
+        if self._probe is None:
+            async def probe():
+                try:
+                    online = await self._probe_server(self.http)
+                    self._record_probe(online)
+                    return online
+                finally:
+                    self._probe = None
+            self._probe = asyncio.ensure_future(probe())
+        return await asyncio.shield(self._probe)
+    
+    async def _send(self, method: str, url: str, **kwargs) -> httpx.Response:
+        if asyncio.get_running_loop() is self._loop and self.http is not None:
+            return await self.http.request(method, url, **kwargs)
+        async with httpx.AsyncClient(timeout=self.probe_timeout) as client:
+            return await client.request(method, url, **kwargs)
+    
+    async def upload_batch(self, payload: bytes) -> List[Dict[str, Any]]:
+        """POST an encoded sync batch; decoded per-item results"""
+        
+        response = await self._send(
+            "POST", self.sync_url, content=payload, headers={"Content-Type": SYNC_BATCH_CONTENT_TYPE}
+        )
+        response.raise_for_status()
+        return decode_batch(response.content)
+    
+    async def media_upload_status(self, content_hash: str) -> Optional[Tuple[int, bool]]:
+        """(bytes the server holds, complete) for a media blob; None if it has none"""
+        
+        response = await self._send("HEAD", f"{self.media_url}/{content_hash}")
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return int(response.headers["Upload-Offset"]), response.headers.get("Upload-Complete") == "1"
+    
+    async def upload_media_chunk(self, content_hash: str, start: int, total: int,
+                                 chunk: bytes) -> Tuple[int, bool]:
+        """PUT one chunk at ``start``; the server's (offset, complete) afterwards
+        
+        A 409 means the server holds a different offset than ``start``
+        (e.g. an earlier chunk arrived but its response was lost); its
+        offset is returned so the upload continues from there.
+        """
+        
+        response = await self._send(
+            "PUT", f"{self.media_url}/{content_hash}", content=chunk,
+            headers={"Content-Range": content_range(start, len(chunk), total),
+                     "Content-Type": "application/octet-stream"}
+        )
+        if response.status_code != 409:
+            response.raise_for_status()
+        return int(response.headers["Upload-Offset"]), response.headers.get("Upload-Complete") == "1"
+    
+    # ------------------------------------------------------------------
+    # Worker
+    # ------------------------------------------------------------------
+    
+    async def _sleep(self, delay: float):
+        """Sleep, waking early when stop is requested"""
+        
+        try:
+            await asyncio.wait_for(self._stop_requested.wait(), delay)
+        except asyncio.TimeoutError:
+            pass
+    
+    async def _next_batch(self) -> Optional[list]:
+        """Queued record ids (up to batch_size); None on stop or sweep timeout"""
+        
+        try:
+            first = await asyncio.wait_for(self.queue.get(), self.sweep_interval)
+        except asyncio.TimeoutError:
+            return None
+        batch = [first]
+        while len(batch) < self.batch_size and not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+        if _STOP in batch:
+            return None
+        return batch
+    
+    async def _run(self):
+        sweep = True  # records stored before start, or while offline
+        while not self._stop_requested.is_set():
+            try:
+                if not await self.is_online():
+                    sweep = True
+                    await self._sleep(max(self._probe_valid_until - time.monotonic(), 0.0))
+                    continue
+                
+                if sweep:
+                    sweep = False
+                    # The sweep covers everything queued so far
+                    while not self.queue.empty():
+                        if self.queue.get_nowait() is _STOP:
+                            return
+                    await self.engine.sync_when_online()
+                    continue
+                
+                record_ids = await self._next_batch()
+                if record_ids is None:
+                    sweep = True
+                    continue
+                await self.engine.sync_records(record_ids)
+                await self.engine.sync_media()
+            
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"Offline background sync failed: {e}")
+                self.consecutive_failures += 1
+                sweep = True
+                await self._sleep(self._backoff_delay())
+    
+    def status(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "online": self.online,
+            "consecutive_failures": self.consecutive_failures,
+            "queued": self.queue.qsize()
+        }
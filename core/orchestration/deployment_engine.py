@@ -44,6 +44,12 @@ class GringoCompleteSystem:
         
         print("✅ Complete system ready for enterprise deployments")
     
+    async def shutdown(self):
+        """Stop learning and maintenance, then flush buffered warehouse writes"""
+        
+        await self.operations_manager.shutdown()
+        await self.data_warehouse.close()
+    
     async def deploy_complete_client_system(self, client_requirements: Dict[str, Any]) -> Dict[str, Any]:
         """Deploy a complete client system with data storage and operations"""
         
@@ -369,92 +375,97 @@ async def complete_system_demo():
     complete_system = GringoCompleteSystem()
     await complete_system.initialize()
     
-    # Example client requirements
-    client_requirements = {
-        'company_name': 'Advanced Manufacturing Solutions',
-        'industry': 'manufacturing',
-        'sub_industry': 'precision_machining',
-        'employees': 275,
-        'locations': 2,
-        'annual_revenue': 45000000,
-        'existing_systems': ['Legacy ERP', 'Manual QC', 'Spreadsheet Maintenance'],
-        'pain_points': [
-            'Quality inconsistencies',
-            'Reactive maintenance approach',
-            'Limited real-time visibility',
-            'Manual data entry errors',
-            'Compliance reporting challenges'
-        ],
-        'business_goals': [
-            'Improve quality by 40%',
-            'Reduce maintenance costs by 25%',
-            'Achieve real-time operational visibility',
-            'Automate compliance reporting',
-            'Increase overall efficiency by 20%'
-        ],
-        'budget': 350000,
-        'timeline': '4 months'
-    }
-    
-    # Deploy complete system
-    deployment = await complete_system.deploy_complete_client_system(client_requirements)
-    client_id = deployment['client_id']
-    
-    print(f"\n🎉 DEPLOYMENT SUMMARY:")
-    print(f"Client: {deployment['company_name']}")
-    print(f"Client ID: {client_id}")
-    print(f"Modules Built: {deployment['modules_built']}")
-    print(f"Investment: ${deployment['proposal']['investment']['one_time_costs']['total']:,.0f}")
-    print(f"Dashboard: {deployment['gringo_deployment']['dashboard_url']}")
-    
-    # Simulate operations
-    await complete_system.simulate_daily_operations(client_id, days=5)
-    
-    # Test voice commands with data
-    print(f"\n🎤 TESTING VOICE COMMANDS WITH REAL DATA:")
-    
-    test_commands = [
-        "show me today's quality metrics",
-        "what's the status of our equipment",
-        "report on safety performance",
-        "how is production performing today",
-        "give me insights on our operations"
-    ]
-    
-    for command in test_commands:
-        print(f"\n  Command: '{command}'")
-        response = await complete_system.process_voice_command_with_data(command, client_id)
-        
-        if response.get('real_data_available'):
-            print(f"  ✅ Response: Command processed with real operational data")
-            print(f"  📊 Current Metrics: {len(response['current_metrics'])} metrics available")
-            print(f"  🧠 AI Insights: {len(response['data_insights'])} insights generated")
-            print(f"  🚨 Alerts: {len(response['alerts'])} active alerts")
-        else:
-            print(f"  ✅ Response: {response.get('response', 'Command processed')}")
-    
-    # Get final complete status
-    final_status = await complete_system.get_complete_client_status(client_id)
-    
-    print(f"\n📊 FINAL SYSTEM STATUS:")
-    print(f"System Health: {final_status['system_health']}")
-    print(f"Learning Active: {final_status['learning_active']}")
-    print(f"Data Processing: {final_status['data_processing_active']}")
-    print(f"Total Operations: {final_status['data_warehouse_summary']['total_operations']}")
-    
-    print(f"\n🎯 AI INSIGHTS GENERATED:")
-    for insight in final_status['daily_operations']['insights']:
-        print(f"• {insight['insight_type']}: {insight['description']}")
-        print(f"  Confidence: {insight['confidence']:.0%}, Impact: {insight['impact_score']:.1f}")
-    
-    print(f"\n🚨 ACTIVE ALERTS:")
-    for alert in final_status['daily_operations']['alerts']:
-        print(f"• {alert['type'].upper()}: {alert['message']}")
-    
-    print(f"\n✅ COMPLETE SYSTEM DEMONSTRATION FINISHED!")
-    print(f"🔄 Continuous learning and optimization running in background")
-    print(f"📈 Real-time data processing and insights generation active")
-    print(f"💾 All operational data stored and available for analysis")
+    try:
+        # Example client requirements
+        client_requirements = {
+            'company_name': 'Advanced Manufacturing Solutions',
+            'industry': 'manufacturing',
+            'sub_industry': 'precision_machining',
+            'employees': 275,
+            'locations': 2,
+            'annual_revenue': 45000000,
+            'existing_systems': ['Legacy ERP', 'Manual QC', 'Spreadsheet Maintenance'],
+            'pain_points': [
+                'Quality inconsistencies',
+                'Reactive maintenance approach',
+                'Limited real-time visibility',
+                'Manual data entry errors',
+                'Compliance reporting challenges'
+            ],
+            'business_goals': [
+                'Improve quality by 40%',
+                'Reduce maintenance costs by 25%',
+                'Achieve real-time operational visibility',
+                'Automate compliance reporting',
+                'Increase overall efficiency by 20%'
+            ],
+            'budget': 350000,
+            'timeline': '4 months'
+        }
+        
+        # Deploy complete system
+        deployment = await complete_system.deploy_complete_client_system(client_requirements)
+        client_id = deployment['client_id']
+        
+        print(f"\n🎉 DEPLOYMENT SUMMARY:")
+        print(f"Client: {deployment['company_name']}")
+        print(f"Client ID: {client_id}")
+        print(f"Modules Built: {deployment['modules_built']}")
+        print(f"Investment: ${deployment['proposal']['investment']['one_time_costs']['total']:,.0f}")
+        print(f"Dashboard: {deployment['gringo_deployment']['dashboard_url']}")
+        
+        # Simulate operations
+        await complete_system.simulate_daily_operations(client_id, days=5)
+        
+        # Test voice commands with data
+        print(f"\n🎤 TESTING VOICE COMMANDS WITH REAL DATA:")
+        
+        test_commands = [
+            "show me today's quality metrics",
+            "what's the status of our equipment",
+            "report on safety performance",
+            "how is production performing today",
+            "give me insights on our operations"
+        ]
+        
+        for command in test_commands:
+            print(f"\n  Command: '{command}'")
+            response = await complete_system.process_voice_command_with_data(command, client_id)
+            
+            if response.get('real_data_available'):
+                print(f"  ✅ Response: Command processed with real operational data")
+                print(f"  📊 Current Metrics: {len(response['current_metrics'])} metrics available")
+                print(f"  🧠 AI Insights: {len(response['data_insights'])} insights generated")
+                print(f"  🚨 Alerts: {len(response['alerts'])} active alerts")
+            else:
+                print(f"  ✅ Response: {response.get('response', 'Command processed')}")
+        
+        # Get final complete status
+        final_status = await complete_system.get_complete_client_status(client_id)
+        
+        print(f"\n📊 FINAL SYSTEM STATUS:")
+        print(f"System Health: {final_status['system_health']}")
+        print(f"Learning Active: {final_status['learning_active']}")
+        print(f"Data Processing: {final_status['data_processing_active']}")
+        print(f"Total Operations: {final_status['data_warehouse_summary']['total_operations']}")
+        
+        print(f"\n🎯 AI INSIGHTS GENERATED:")
+        for insight in final_status['daily_operations']['insights']:
+            print(f"• {insight['insight_type']}: {insight['description']}")
+            print(f"  Confidence: {insight['confidence']:.0%}, Impact: {insight['impact_score']:.1f}")
+        
+        print(f"\n🚨 ACTIVE ALERTS:")
+        for alert in final_status['daily_operations']['alerts']:
+            print(f"• {alert['type'].upper()}: {alert['message']}")
+        
+        print(f"\n✅ COMPLETE SYSTEM DEMONSTRATION FINISHED!")
+        print(f"🔄 Continuous learning and optimization running in background")
+        print(f"📈 Real-time data processing and insights generation active")
+        print(f"💾 All operational data stored and available for analysis")
+        
+    finally:
+        # Flushes relaxed-durability buffers and stops the learning scheduler
+        await complete_system.shutdown()
     
     return deployment
 
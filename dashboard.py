@@ -7,6 +7,7 @@ Visual interface for creating custom modules and deploying business systems
 import asyncio
 import json
 import sys
+from contextlib import AsyncExitStack, asynccontextmanager
 from pathlib import Path
 from datetime import datetime
 from typing import Dict, List, Any
@@ -45,18 +46,44 @@ from core.modules.module_template_engine import universal_module_engine
 from api.assistant import router as assistant_router
 from api.worker_api import router as worker_router
 from api.quality_module_api import router as quality_router
-from api.offline_api import router as offline_router
+from api.offline_api import router as offline_router, start_background_sync, stop_background_sync
+from api.operations_api import router as operations_router, start_operations_manager, stop_operations_manager
 from api.device_recovery_api import router as device_recovery_router
 from api.master_control_api import router as master_control_router
 from api.company_management_api import router as company_management_router
-from core.memory.universal_memory_system import memory_router
+from core.memory.universal_memory_system import close_memory_pools, memory_router, resume_pending_analysis
+from core.integrations.universal_connector import universal_connector
 from api.professional_deployment_api import router as professional_router
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Background services that run as long as the app
+    
+    Each shutdown step is registered once its service has started and runs
+    in reverse order, even if a later-registered step raised.
+    """
+    
+    async with AsyncExitStack() as shutdown:
+        shutdown.push_async_callback(close_memory_pools)
+        shutdown.push_async_callback(universal_connector.aclose)
+        
+        await start_background_sync()
+        shutdown.push_async_callback(stop_background_sync)
+        
+        await start_operations_manager()
+        shutdown.push_async_callback(stop_operations_manager)
+        
+        # Waits on the analysis queue, so it runs beside the app rather than holding up startup
+        requeue = asyncio.create_task(resume_pending_analysis())
+        shutdown.callback(requeue.cancel)
+        
+        yield
+
 class FixItFredDashboard:
     """Web-based dashboard for FixItFred platform management"""
     
     def __init__(self):
-        self.app = FastAPI(title="FixItFred Dashboard", version="1.0.0")
+        self.app = FastAPI(title="FixItFred Dashboard", version="1.0.0", lifespan=lifespan)
         self.platform = FixItFredOS()
         self.module_builder = EnterpriseModuleBuilder()
         self.engagement = CustomerEngagementProcess()
@@ -79,6 +106,7 @@ class FixItFredDashboard:
         self.app.include_router(worker_router)
         self.app.include_router(quality_router)
         self.app.include_router(offline_router)
+        self.app.include_router(operations_router)
         self.app.include_router(device_recovery_router)
         self.app.include_router(master_control_router)
         self.app.include_router(company_management_router)
@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""
+GRINGO ANOMALY ENGINE
+Streaming and vectorized batch anomaly detection for warehouse metrics
+"""
+
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+DETECTORS = ('rolling_zscore', 'ewma', 'seasonal')
+
+@dataclass
+class SeriesState:
+    """O(1)-update detector state for one (client, metric) series"""
+    window: np.ndarray
+    count: int = 0
+    # Running sums of (value - window_shift); the shift keeps the variance from cancelling on large offsets
+    window_shift: float = 0.0
+    window_sum: float = 0.0
+    window_sumsq: float = 0.0
+    ewma_mean: float = 0.0
+    ewma_var: float = 0.0
+    seasonal_count: np.ndarray = None
+    seasonal_mean: np.ndarray = None
+    seasonal_m2: np.ndarray = None
+
+@dataclass
+class AnomalyEvent:
+    """A sample at least one detector scored past the threshold"""
+    client_id: str
+    metric_name: str
+    timestamp: str
+    value: float
+    score: float
+    scores: Dict[str, float] = field(default_factory=dict)
+
+class AnomalyEngine:
+    """Rolling z-score, EWMA and seasonal-baseline detectors per (client, metric)
+    
+    ``update()`` scores one sample against the state built from the samples
+    before it and then folds it in, in constant time. ``score_series()`` runs
+    the same three detectors over a whole array at once and gives the same
+    scores the streaming path would have produced sample by sample.
+    
+    * rolling z-score - mean/std of the previous ``window`` samples
+    * EWMA - exponentially weighted mean/variance (``ewma_alpha``)
+    * seasonal - mean/std of earlier samples in the same slot of the
+      ``seasonal_period`` (hour of day by default)
+    
+    A detector only scores once it has ``min_samples`` of history; a sample is
+    anomalous when any score reaches ``threshold`` standard deviations.
+    """
+    
+    def __init__(self, window: int = 60, ewma_alpha: float = 0.1, threshold: float = 3.0,
+                 min_samples: int = 10, seasonal_period_seconds: int = 86400, seasonal_buckets: int = 24,
+                 history_loader: Callable[[str, str], Tuple[np.ndarray, np.ndarray]] = None,
+                 max_events_per_client: int = 1000):
+        self.window = window
+        self.ewma_alpha = ewma_alpha
+        self.threshold = threshold
+        self.min_samples = min_samples
+        self.seasonal_period_us = seasonal_period_seconds * 1_000_000
+        self.seasonal_buckets = seasonal_buckets
+        # (client, metric) -> (timestamps in epoch microseconds, values) to warm a new series from
+        self.history_loader = history_loader
+        self.max_events_per_client = max_events_per_client
+        
+        self._series: Dict[Tuple[str, str], SeriesState] = {}
+        self._events: Dict[str, Deque[AnomalyEvent]] = {}
+    
+    def _bucket(self, ts_us):
+        return (ts_us % self.seasonal_period_us) * self.seasonal_buckets // self.seasonal_period_us
+    
+    def _new_state(self) -> SeriesState:
+        return SeriesState(
+            window=np.zeros(self.window),
+            seasonal_count=np.zeros(self.seasonal_buckets, dtype=np.int64),
+            seasonal_mean=np.zeros(self.seasonal_buckets),
+            seasonal_m2=np.zeros(self.seasonal_buckets)
+        )
+    
+    # ------------------------------------------------------------------
+    # Streaming
+    # ------------------------------------------------------------------
+    
+    def has_series(self, client_id: str, metric_name: str) -> bool:
+        return (client_id, metric_name) in self._series
+    
+    def warm_series(self, client_id: str, metric_name: str):
+        """Build a new series' state from ``history_loader``
+        
+        The loader reads storage, so async callers run this in a worker thread
+        before the series' first ``update()``; a series that already exists is
+        left alone.
+        """
+        
+        key = (client_id, metric_name)
+        if key in self._series:
+            return
+        state = self._new_state()
+        if self.history_loader:
+            ts, values = self.history_loader(client_id, metric_name)
+            if len(values):
+                self._warm(state, np.asarray(ts, dtype=np.int64), np.asarray(values, dtype=np.float64))
+        self._series.setdefault(key, state)
+    
+    def _state(self, client_id: str, metric_name: str) -> SeriesState:
+        key = (client_id, metric_name)
+        if key not in self._series:
+            self.warm_series(client_id, metric_name)
+        return self._series[key]
+    
+    def _warm(self, state: SeriesState, ts: np.ndarray, values: np.ndarray):
+        """Build streaming state from history in one vectorized pass"""
+        
+        tail = values[-self.window:]
+        state.count = len(values)
+        # Ring buffer slot of sample i is i % window
+        slots = np.arange(len(values) - len(tail), len(values)) % self.window
+        state.window[slots] = tail
+        state.window_shift = float(tail.mean())
+        state.window_sum = float((tail - state.window_shift).sum())
+        state.window_sumsq = float(np.square(tail - state.window_shift).sum())
+        
+        ewm = pd.Series(values).ewm(alpha=self.ewma_alpha, adjust=False)
+        state.ewma_mean = float(ewm.mean().iloc[-1])
+        state.ewma_var = float(ewm.var(bias=True).iloc[-1])
+        
+        buckets = self._bucket(ts)
+        counts = np.bincount(buckets, minlength=self.seasonal_buckets)
+        sums = np.bincount(buckets, weights=values, minlength=self.seasonal_buckets)
+        means = np.divide(sums, counts, out=np.zeros(self.seasonal_buckets), where=counts > 0)
+        state.seasonal_count = counts.astype(np.int64)
+        state.seasonal_mean = means
+        state.seasonal_m2 = np.bincount(buckets, weights=np.square(values - means[buckets]),
+                                        minlength=self.seasonal_buckets)
+    
+    def _zscore(self, value: float, mean: float, var: float) -> float:
+        std = np.sqrt(max(var, 0.0))
+        if std < 1e-12:
+            return 0.0
+        return float((value - mean) / std)
+    
+    def update(self, client_id: str, metric_name: str, timestamp: str, value: float) -> Optional[AnomalyEvent]:
+        """Score one sample, fold it into the series state; returns the event if anomalous"""
+        
+        state = self._state(client_id, metric_name)
+        ts_us = int(round(datetime.fromisoformat(timestamp).timestamp() * 1_000_000))
+        value = float(value)
+        scores = {}
+        
+        # Rolling z-score over the previous window
+        n = min(state.count, self.window)
+        if n >= self.min_samples:
+            shifted_mean = state.window_sum / n
+            scores['rolling_zscore'] = self._zscore(
+                value, state.window_shift + shifted_mean, state.window_sumsq / n - shifted_mean * shifted_mean
+            )
+        
+        # EWMA
+        if state.count >= self.min_samples:
+            scores['ewma'] = self._zscore(value, state.ewma_mean, state.ewma_var)
+        
+        # Seasonal baseline for this slot
+        bucket = int(self._bucket(ts_us))
+        bucket_count = state.seasonal_count[bucket]
+        if bucket_count >= self.min_samples:
+            scores['seasonal'] = self._zscore(
+                value, state.seasonal_mean[bucket], state.seasonal_m2[bucket] / bucket_count
+            )
+        
+        # Fold the sample in
+        slot = state.count % self.window
+        if state.count == 0:
+            state.window_shift = value
+        if state.count >= self.window:
+            evicted = state.window[slot] - state.window_shift
+            state.window_sum -= evicted
+            state.window_sumsq -= evicted * evicted
+        state.window[slot] = value
+        shifted = value - state.window_shift
+        state.window_sum += shifted
+        state.window_sumsq += shifted * shifted
+        if slot == self.window - 1:
+            # Re-centre on the window mean and re-sync the running sums once per lap to stop float drift
+            state.window_shift = float(state.window.mean())
+            centred = state.window - state.window_shift
+            state.window_sum = float(centred.sum())
+            state.window_sumsq = float(np.square(centred).sum())
+        
+        if state.count == 0:
+            state.ewma_mean = value
+        else:
+            delta = value - state.ewma_mean
+            state.ewma_mean += self.ewma_alpha * delta
+            state.ewma_var = (1 - self.ewma_alpha) * (state.ewma_var + self.ewma_alpha * delta * delta)
+        
+        state.seasonal_count[bucket] += 1
+        delta = value - state.seasonal_mean[bucket]
+        state.seasonal_mean[bucket] += delta / state.seasonal_count[bucket]
+        state.seasonal_m2[bucket] += delta * (value - state.seasonal_mean[bucket])
+        
+        state.count += 1
+        
+        if not scores:
+            return None
+        score = max(scores.values(), key=abs)
+        if abs(score) < self.threshold:
+            return None
+        
+        event = AnomalyEvent(client_id, metric_name, timestamp, value, score, scores)
+        self._events.setdefault(client_id, deque(maxlen=self.max_events_per_client)).append(event)
+        return event
+    
+    def recent_events(self, client_id: str, since: datetime = None) -> List[AnomalyEvent]:
+        """Streaming anomalies recorded for a client, oldest first"""
+        
+        events = self._events.get(client_id, ())
+        if since is None:
+            return list(events)
+        since = since.isoformat()
+        return [event for event in events if event.timestamp >= since]
+    
+    def record_events(self, client_id: str, events: List[AnomalyEvent]):
+        """Add batch-detected events (a backfill) to a client's streaming event log, keeping time order"""
+        
+        log = self._events.setdefault(client_id, deque(maxlen=self.max_events_per_client))
+        merged = sorted([*log, *events], key=lambda event: event.timestamp)
+        log.clear()
+        log.extend(merged)
+    
+    # ------------------------------------------------------------------
+    # Batch
+    # ------------------------------------------------------------------
+    
+    def score_series(self, ts: np.ndarray, values: np.ndarray) -> Dict[str, np.ndarray]:
+        """Detector scores for every sample of a time-sorted series (NaN where not enough history)"""
+        
+        ts = np.asarray(ts, dtype=np.int64)
+        values = np.asarray(values, dtype=np.float64)
+        n = len(values)
+        index = np.arange(n)
+        
+        def zscores(mean, var, enough):
+            std = np.sqrt(np.clip(var, 0.0, None))
+            scores = np.full(n, np.nan)
+            valid = enough & (std >= 1e-12)
+            scores[valid] = (values[valid] - mean[valid]) / std[valid]
+            scores[enough & ~valid] = 0.0
+            return scores
+        
+        # Rolling z-score: stats of the window ending at the previous sample (pandas
+        # rolling var is Welford-style, so a large offset does not cancel the spread)
+        counts = np.minimum(index, self.window)
+        rolling_window = pd.Series(values).rolling(self.window, min_periods=1)
+        window_mean = np.concatenate(([0.0], rolling_window.mean().to_numpy()[:-1]))
+        window_var = np.concatenate(([0.0], rolling_window.var(ddof=0).to_numpy()[:-1]))
+        rolling = zscores(window_mean, window_var, counts >= self.min_samples)
+        
+        # EWMA state before each sample
+        ewm = pd.Series(values).ewm(alpha=self.ewma_alpha, adjust=False)
+        ewma_mean = np.concatenate(([0.0], ewm.mean().to_numpy()[:-1]))
+        ewma_var = np.concatenate(([0.0], ewm.var(bias=True).to_numpy()[:-1]))
+        ewma = zscores(ewma_mean, ewma_var, index >= self.min_samples)
+        
+        # Seasonal: earlier samples of the same slot via grouped prefix sums, taken
+        # around each slot's mean so the squared sums do not cancel on large offsets
+        buckets = self._bucket(ts)
+        order = np.argsort(buckets, kind='stable')
+        sorted_buckets = buckets[order]
+        bucket_counts = np.bincount(buckets, minlength=self.seasonal_buckets)
+        bucket_sums = np.bincount(buckets, weights=values, minlength=self.seasonal_buckets)
+        bucket_means = np.divide(bucket_sums, bucket_counts, out=np.zeros(self.seasonal_buckets),
+                                 where=bucket_counts > 0)
+        sorted_values = values[order] - bucket_means[sorted_buckets]
+        group_start = np.searchsorted(sorted_buckets, sorted_buckets, side='left')
+        sorted_csum = np.concatenate(([0.0], np.cumsum(sorted_values)))
+        sorted_csumsq = np.concatenate(([0.0], np.cumsum(np.square(sorted_values))))
+        positions = np.arange(n)
+        prior = np.empty(n, dtype=np.int64)
+        prior_sum = np.empty(n)
+        prior_sumsq = np.empty(n)
+        prior[order] = positions - group_start
+        prior_sum[order] = sorted_csum[positions] - sorted_csum[group_start]
+        prior_sumsq[order] = sorted_csumsq[positions] - sorted_csumsq[group_start]
+        safe_prior = np.maximum(prior, 1)
+        shifted_mean = prior_sum / safe_prior
+        seasonal_mean = bucket_means[buckets] + shifted_mean
+        seasonal_var = prior_sumsq / safe_prior - shifted_mean ** 2
+        seasonal = zscores(seasonal_mean, seasonal_var, prior >= self.min_samples)
+        
+        return {'rolling_zscore': rolling, 'ewma': ewma, 'seasonal': seasonal}
+    
+    def detect_batch(self, client_id: str, metric_name: str, ts: np.ndarray, values: np.ndarray,
+                     start_us: int = None) -> List[AnomalyEvent]:
+        """Anomalous samples of a series; samples before ``start_us`` only serve as history"""
+        
+        scores = self.score_series(ts, values)
+        stacked = np.vstack([scores[name] for name in DETECTORS])
+        magnitude = np.nan_to_num(np.abs(stacked), nan=0.0)
+        peak = magnitude.max(axis=0)
+        
+        flagged = peak >= self.threshold
+        if start_us is not None:
+            flagged &= np.asarray(ts) >= start_us
+        
+        events = []
+        for i in np.flatnonzero(flagged):
+            sample_scores = {
+                name: float(stacked[d, i]) for d, name in enumerate(DETECTORS) if not np.isnan(stacked[d, i])
+            }
+            events.append(AnomalyEvent(
+                client_id, metric_name,
+                datetime.fromtimestamp(ts[i] / 1_000_000).isoformat(),
+                float(values[i]),
+                float(stacked[magnitude[:, i].argmax(), i]),
+                sample_scores
+            ))
+        return events
@@ -5,17 +5,108 @@ Complete data storage, processing, and learning system for daily operations
 """
 
 import asyncio
+import hashlib
 import json
 import uuid
 import sqlite3
 import pandas as pd
 import numpy as np
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Sequence, Tuple
 from datetime import datetime, timedelta
 from dataclasses import dataclass, asdict
 from pathlib import Path
 import pickle
 import logging
+import time
+from collections import Counter
+
+from data.warehouse.anomaly_engine import AnomalyEngine, AnomalyEvent
+from data.warehouse.ingest_queue import IngestQueue
+from data.warehouse.learning_scheduler import LearningScheduler
+from data.warehouse.partitions import OperationPartitions
+from data.warehouse.timeseries_store import TimeSeriesStore, to_epoch_us
+
+# Alert category per key metric (see _extract_key_metrics)
+METRIC_ALERT_TYPES = {
+    'defect_rate': 'quality',
+    'pass_rate': 'quality',
+    'cost_of_quality': 'quality',
+    'mtbf': 'maintenance',
+    'mttr': 'maintenance',
+    'maintenance_cost': 'maintenance',
+    'incident_rate': 'safety',
+    'severity_score': 'safety'
+}
+
+# Minimum |score| (standard deviations) per alert severity
+ALERT_SEVERITY_SCORES = {'high': 5.0, 'medium': 4.0, 'low': 0.0}
+
+def update_operational_rollups(conn: sqlite3.Connection, operations: Sequence[Tuple[str, str, str]],
+                               samples: Sequence[tuple]):
+    """Fold operations (client_id, module, timestamp) and metric samples into the per-day rollup tables
+    
+    Days are the date part of the ISO timestamps, matching DATE(timestamp).
+    """
+    
+    module_counts = Counter(
+        (client_id, timestamp[:10], module) for client_id, module, timestamp in operations
+    )
+    if module_counts:
+        conn.executemany("""
+            INSERT INTO daily_module_counts (client_id, day, module, operation_count)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (client_id, day, module)
+            DO UPDATE SET operation_count = operation_count + excluded.operation_count
+        """, [key + (count,) for key, count in module_counts.items()])
+    
+    # Reduce the batch to the newest sample per metric before touching the table
+    latest = {}
+    for client_id, metric_name, metric_value, timestamp, module_source in samples:
+        key = (client_id, timestamp[:10], metric_name)
+        if key not in latest or timestamp >= latest[key][1]:
+            latest[key] = (metric_value, timestamp, module_source)
+    if latest:
+        conn.executemany("""
+            INSERT INTO latest_metrics (client_id, day, metric_name, metric_value, timestamp, module_source)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (client_id, day, metric_name) DO UPDATE SET
+                metric_value = excluded.metric_value,
+                timestamp = excluded.timestamp,
+                module_source = excluded.module_source
+            WHERE excluded.timestamp >= latest_metrics.timestamp
+        """, [key + value for key, value in latest.items()])
+    
+    # Per-day sample statistics, merged batch by batch
+    stats = {}
+    for client_id, metric_name, metric_value, timestamp, _ in samples:
+        key = (client_id, timestamp[:10], metric_name)
+        count, low, high, total, last_timestamp, last_value = stats.get(
+            key, (0, metric_value, metric_value, 0.0, timestamp, metric_value)
+        )
+        if timestamp >= last_timestamp:
+            last_timestamp, last_value = timestamp, metric_value
+        stats[key] = (count + 1, min(low, metric_value), max(high, metric_value),
+                      total + metric_value, last_timestamp, last_value)
+    if stats:
+        merge_daily_metric_stats(conn, [key + value for key, value in stats.items()])
+
+def merge_daily_metric_stats(conn: sqlite3.Connection, rows: Sequence[tuple]):
+    """Merge (client_id, day, metric_name, count, min, max, sum, last_timestamp, last_value) into daily_metric_stats"""
+    
+    # Every right-hand side sees the row as it was before the update
+    conn.executemany("""
+        INSERT INTO daily_metric_stats
+        (client_id, day, metric_name, sample_count, min_value, max_value, sum_value, last_timestamp, last_value)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (client_id, day, metric_name) DO UPDATE SET
+            sample_count = sample_count + excluded.sample_count,
+            min_value = MIN(min_value, excluded.min_value),
+            max_value = MAX(max_value, excluded.max_value),
+            sum_value = sum_value + excluded.sum_value,
+            last_timestamp = MAX(last_timestamp, excluded.last_timestamp),
+            last_value = CASE WHEN excluded.last_timestamp >= last_timestamp
+                              THEN excluded.last_value ELSE last_value END
+    """, rows)
 
 @dataclass
 class DataRecord:
@@ -44,10 +135,20 @@ class LearningInsight:
     created_at: datetime
     applied: bool = False
 
+@dataclass
+class DashboardSnapshot:
+    """Materialized dashboard payload served to pollers"""
+    payload: Dict[str, Any]
+    etag: str
+    version: int
+    built_at: float
+    dirty: bool = False
+
 class GringoDataWarehouse:
     """Centralized data warehouse for all client data"""
     
-    def __init__(self, storage_path: str = "gringo_data"):
+    def __init__(self, storage_path: str = "gringo_data", ingest_flush_ms: int = 50,
+                 ingest_batch_rows: int = 1000, durability: str = 'normal'):
         self.storage_path = Path(storage_path)
         self.storage_path.mkdir(exist_ok=True)
         
@@ -73,14 +174,67 @@ class GringoDataWarehouse:
         self.learning_models = {}
         self.daily_analytics = {}
         
+        # Insights from each client's latest learning pass (read by dashboards)
+        self.latest_insights: Dict[str, List[LearningInsight]] = {}
+        
+        # New operations that make a client's learning pass due early (see LearningScheduler)
+        self.learning_trigger_rows = 500
+        
+        # Columnar per (client, metric) sample store replacing real_time_metrics rows
+        self.timeseries = TimeSeriesStore(self.storage_path / "timeseries")
+        # Sealed chunks older than this are compressed by run_maintenance()
+        self.compact_after_days = 7
+        
+        # Streaming detectors per (client, metric), warmed from a week of samples
+        self.anomaly_history_days = 7
+        self.anomaly_engine = AnomalyEngine(history_loader=self._load_anomaly_history)
+        # Samples stored before this are only covered by a one-off batch backfill per client
+        self.anomaly_streaming_since = datetime.now()
+        self._anomaly_backfills: Dict[str, asyncio.Task] = {}
+        
+        # Operations and metrics are group-committed instead of one commit per call.
+        # Neither is stored in operational.db itself: 'daily_operations' rows go
+        # to their monthly partition file from the batch hook and
+        # 'metric_samples' (client_id, metric_name, value, timestamp,
+        # module_source) to the time-series store once the batch has committed;
+        # operational.db keeps the rollups updated in the group commit.
+        self.ingest_queue = IngestQueue(
+            self.operational_db,
+            flush_interval_ms=ingest_flush_ms,
+            max_batch_rows=ingest_batch_rows,
+            durability=durability,
+            on_batch=self._apply_ingest_batch,
+            on_commit=self._flush_ingested_samples
+        )
+        
+        # daily_operations rows live in monthly partition files; only the
+        # newest hot_partition_months stay uncompressed
+        self.hot_partition_months = 3
+        self.partitions = OperationPartitions(
+            self.storage_path / "operations", synchronous=self.ingest_queue.synchronous
+        )
+        
         # Initialize storage
-        asyncio.create_task(self._initialize_storage())
+        self._storage_ready = asyncio.create_task(self._initialize_storage())
     
     async def _initialize_storage(self):
-        """Initialize all database schemas"""
+        """Initialize all database schemas
+        
+        Creating the schemas and the user_version migrations (partition
+        moves, VACUUM, time-series scans) is blocking sqlite and file I/O, so
+        it runs on the ingest writer, off the event loop and ahead of any
+        group commit.
+        """
+        
+        await self.ingest_queue.run_on_writer(self._migrate_storage)
+        logging.info("🗄️ Data warehouse initialized with all schemas")
+    
+    def _migrate_storage(self):
+        """Create the schemas and run pending migrations (runs on the ingest writer)"""
         
         # Operational database schema
         operational_schema = """
+        -- Legacy single-file table; rows are moved into monthly partitions on startup
         CREATE TABLE IF NOT EXISTS daily_operations (
             id TEXT PRIMARY KEY,
             client_id TEXT NOT NULL,
@@ -103,6 +257,65 @@ class GringoDataWarehouse:
         );
         CREATE INDEX IF NOT EXISTS idx_real_time_metrics_client_metric_ts ON real_time_metrics (client_id, metric_name, timestamp);
         
+        -- Per client and partition: last daily_operations rowid handed to learning,
+        -- valid for the partition file generation it was read from
+        CREATE TABLE IF NOT EXISTS learning_watermarks (
+            client_id TEXT NOT NULL,
+            partition_key TEXT NOT NULL,
+            last_rowid INTEGER NOT NULL,
+            generation TEXT,
+            updated_at DATETIME NOT NULL,
+            PRIMARY KEY (client_id, partition_key)
+        ) WITHOUT ROWID;
+        
+        CREATE TABLE IF NOT EXISTS learning_pass_stats (
+            client_id TEXT NOT NULL,
+            started_at DATETIME NOT NULL,
+            rows_processed INTEGER NOT NULL,
+            duration_seconds REAL NOT NULL,
+            rows_per_second REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_learning_pass_stats_client ON learning_pass_stats (client_id, started_at);
+        
+        -- Per partition generation: last daily_operations rowid folded into daily_module_counts
+        CREATE TABLE IF NOT EXISTS rollup_watermarks (
+            partition_key TEXT PRIMARY KEY,
+            generation TEXT NOT NULL,
+            last_rowid INTEGER NOT NULL
+        ) WITHOUT ROWID;
+        
+        -- Rollups maintained on ingest so summaries cost O(modules + metrics)
+        CREATE TABLE IF NOT EXISTS daily_module_counts (
+            client_id TEXT NOT NULL,
+            day TEXT NOT NULL,
+            module TEXT NOT NULL,
+            operation_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (client_id, day, module)
+        ) WITHOUT ROWID;
+        
+        CREATE TABLE IF NOT EXISTS latest_metrics (
+            client_id TEXT NOT NULL,
+            day TEXT NOT NULL,
+            metric_name TEXT NOT NULL,
+            metric_value REAL NOT NULL,
+            timestamp DATETIME NOT NULL,
+            module_source TEXT NOT NULL,
+            PRIMARY KEY (client_id, day, metric_name)
+        ) WITHOUT ROWID;
+        
+        CREATE TABLE IF NOT EXISTS daily_metric_stats (
+            client_id TEXT NOT NULL,
+            day TEXT NOT NULL,
+            metric_name TEXT NOT NULL,
+            sample_count INTEGER NOT NULL,
+            min_value REAL NOT NULL,
+            max_value REAL NOT NULL,
+            sum_value REAL NOT NULL,
+            last_timestamp DATETIME NOT NULL,
+            last_value REAL NOT NULL,
+            PRIMARY KEY (client_id, day, metric_name)
+        ) WITHOUT ROWID;
+        
         CREATE TABLE IF NOT EXISTS work_orders (
             id TEXT PRIMARY KEY,
             client_id TEXT NOT NULL,
@@ -264,37 +477,228 @@ class GringoDataWarehouse:
             conn.commit()
             conn.close()
         
-        logging.info("🗄️ Data warehouse initialized with all schemas")
+        self._backfill_operational_rollups()
+        self._import_sqlite_metrics()
+        self._partition_legacy_operations()
+        self.partitions.prepare()
+        self._init_rollup_watermarks()
+        self._backfill_daily_metric_stats()
+    
+    def _backfill_operational_rollups(self):
+        """One-time rollup backfill for rows stored before rollups existed (user_version 0 -> 1)"""
+        
+        conn = sqlite3.connect(self.operational_db)
+        try:
+            if conn.execute("PRAGMA user_version").fetchone()[0] >= 1:
+                return
+            
+            with conn:
+                conn.execute("""
+                    INSERT OR REPLACE INTO daily_module_counts (client_id, day, module, operation_count)
+                    SELECT client_id, DATE(timestamp), module, COUNT(*)
+                    FROM daily_operations
+                    GROUP BY client_id, DATE(timestamp), module
+                """)
+                # Bare columns with MAX() come from the row holding the maximum
+                conn.execute("""
+                    INSERT OR REPLACE INTO latest_metrics
+                    (client_id, day, metric_name, metric_value, timestamp, module_source)
+                    SELECT client_id, DATE(timestamp), metric_name, metric_value, MAX(timestamp), module_source
+                    FROM real_time_metrics
+                    GROUP BY client_id, DATE(timestamp), metric_name
+                """)
+                conn.execute("PRAGMA user_version = 1")
+        finally:
+            conn.close()
+    
+    def _import_sqlite_metrics(self, batch_size: int = 50000):
+        """One-time copy of legacy real_time_metrics rows into the time-series store (user_version 1 -> 2)"""
+        
+        conn = sqlite3.connect(self.operational_db)
+        try:
+            if conn.execute("PRAGMA user_version").fetchone()[0] >= 2:
+                return
+            
+            # Present only while an import runs; samples are not ingested before
+            # storage is ready, so after a crash the store holds only the partial import
+            marker = self.timeseries.root / ".legacy_import"
+            if marker.exists():
+                self.timeseries.clear()
+            marker.touch()
+            cursor = conn.execute("""
+                SELECT client_id, metric_name, metric_value, timestamp
+                FROM real_time_metrics
+                ORDER BY rowid
+            """)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for client_id, metric_name, metric_value, timestamp in rows:
+                    self.timeseries.append(client_id, metric_name, timestamp, metric_value)
+                self.timeseries.flush()
+            
+            # The legacy rows stay in place; new samples are no longer written there
+            conn.execute("PRAGMA user_version = 2")
+            marker.unlink()
+        finally:
+            conn.close()
+    
+    def _partition_legacy_operations(self, batch_size: int = 50000):
+        """One-time move of operational.db daily_operations rows into monthly partitions (user_version 2 -> 3)"""
+        
+        conn = sqlite3.connect(self.operational_db)
+        try:
+            if conn.execute("PRAGMA user_version").fetchone()[0] >= 3:
+                return
+            
+            moved = 0
+            while True:
+                rows = conn.execute("""
+                    SELECT rowid, id, client_id, module, operation_type, timestamp, data, processed
+                    FROM daily_operations
+                    ORDER BY rowid
+                    LIMIT ?
+                """, (batch_size,)).fetchall()
+                if not rows:
+                    break
+                
+                # Partition commit first; the delete makes the move resumable
+                self.partitions.write_operations([row[1:] for row in rows])
+                with conn:
+                    conn.executemany("DELETE FROM daily_operations WHERE rowid = ?", [(row[0],) for row in rows])
+                moved += len(rows)
+            
+            self.partitions.close_writers()
+            conn.execute("PRAGMA user_version = 3")
+            if moved:
+                conn.execute("VACUUM")
+                logging.info(f"Moved {moved} legacy operations into monthly partitions")
+        finally:
+            conn.close()
+    
+    def _init_rollup_watermarks(self):
+        """Mark every operation already in a partition as counted in the rollups (user_version 3 -> 4)"""
+        
+        conn = sqlite3.connect(self.operational_db)
+        try:
+            if conn.execute("PRAGMA user_version").fetchone()[0] >= 4:
+                return
+            
+            with conn:
+                conn.executemany("""
+                    INSERT OR REPLACE INTO rollup_watermarks (partition_key, generation, last_rowid)
+                    VALUES (?, ?, ?)
+                """, [(key, generation, last_rowid) for key, (generation, last_rowid) in self.partitions.heads().items()])
+            self.partitions.close_writers()
+            conn.execute("PRAGMA user_version = 4")
+        finally:
+            conn.close()
+    
+    def _backfill_daily_metric_stats(self):
+        """One-time daily_metric_stats build from the stored samples (user_version 4 -> 5)"""
+        
+        conn = sqlite3.connect(self.operational_db)
+        try:
+            if conn.execute("PRAGMA user_version").fetchone()[0] >= 5:
+                return
+            
+            with conn:
+                conn.execute("DELETE FROM daily_metric_stats")
+                for client_id, metric_name in self.timeseries.series():
+                    ts, values = self.timeseries.range(client_id, metric_name)
+                    rows = []
+                    start = 0
+                    while start < len(ts):
+                        # Local calendar days, matching the ISO timestamps' date part
+                        day = datetime.fromtimestamp(ts[start] / 1_000_000).replace(
+                            hour=0, minute=0, second=0, microsecond=0
+                        )
+                        end = int(np.searchsorted(ts, to_epoch_us(day + timedelta(days=1))))
+                        day_values = values[start:end]
+                        rows.append((
+                            client_id, day.strftime('%Y-%m-%d'), metric_name, len(day_values),
+                            float(day_values.min()), float(day_values.max()), float(day_values.sum()),
+                            datetime.fromtimestamp(ts[end - 1] / 1_000_000).isoformat(), float(day_values[-1])
+                        ))
+                        start = end
+                    merge_daily_metric_stats(conn, rows)
+                conn.execute("PRAGMA user_version = 5")
+        finally:
+            conn.close()
+    
+    def _apply_ingest_batch(self, conn: sqlite3.Connection, batch: Dict[str, List[tuple]]):
+        """Group-commit hook: partition writes and rollups (runs on the ingest writer)
+        
+        Partition rows are committed first and keyed by operation id, so a
+        retried batch stores nothing twice. Module counts are then folded in
+        from the partition rows past the rollup watermark, which advances in
+        this transaction: a batch whose rollups rolled back is counted by the
+        next one, and a retried batch is not counted again.
+        """
+        
+        operations = []
+        for key in self.partitions.write_operations(batch.get('daily_operations', [])):
+            operations.extend(self._operations_to_roll_up(conn, key))
+        
+        update_operational_rollups(conn, operations, batch.get('metric_samples', []))
+    
+    def _operations_to_roll_up(self, conn: sqlite3.Connection, key: str) -> List[Tuple[str, str, str]]:
+        """(client_id, module, timestamp) of partition rows not yet counted; advances the watermark"""
+        
+        generation = self.partitions.writer_generation(key)
+        row = conn.execute(
+            "SELECT generation, last_rowid FROM rollup_watermarks WHERE partition_key = ?", (key,)
+        ).fetchone()
+        after_rowid = row[1] if row and row[0] == generation else 0
+        
+        rows = self.partitions.rows_since(key, after_rowid)
+        if rows:
+            conn.execute("""
+                INSERT OR REPLACE INTO rollup_watermarks (partition_key, generation, last_rowid)
+                VALUES (?, ?, ?)
+            """, (key, generation, rows[-1][0]))
+        return [row[1:] for row in rows]
+    
+    def _flush_ingested_samples(self, batch: Dict[str, List[tuple]]):
+        """Append a committed batch's metric samples to the time-series store (runs on the ingest writer)"""
+        
+        samples = batch.get('metric_samples')
+        if samples:
+            for client_id, metric_name, metric_value, timestamp, _ in samples:
+                self.timeseries.append(client_id, metric_name, timestamp, metric_value)
+            self.timeseries.flush(fsync=self.ingest_queue.durability == 'full')
     
     async def store_daily_operation(self, client_id: str, module: str, 
-                                  operation_type: str, data: Dict[str, Any]) -> str:
-        """Store daily operational data"""
+                                  operation_type: str, data: Dict[str, Any],
+                                  operation_id: str = None) -> str:
+        """Store daily operational data
         
-        operation_id = str(uuid.uuid4())
+        Callers retrying a store pass the ``operation_id`` of the first
+        attempt; an operation already in its partition is neither stored
+        nor counted again.
+        """
+        
+        operation_id = operation_id or str(uuid.uuid4())
+        await self._storage_ready
         
         # Process the data based on type
         processed_data = await self._process_operation_data(
             operation_type, data, client_id, module
         )
         
-        # Store in operational database
-        conn = sqlite3.connect(self.operational_db)
-        conn.execute("""
-            INSERT INTO daily_operations 
-            (id, client_id, module, operation_type, timestamp, data, processed)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (
+        # Queue for the operations partition (committed with the next group)
+        operation_committed = self.ingest_queue.add('daily_operations', [(
             operation_id, client_id, module, operation_type,
             datetime.now().isoformat(), json.dumps(processed_data), True
-        ))
-        conn.commit()
-        conn.close()
+        )])
         
-        # Trigger real-time analytics update
-        await self._update_real_time_metrics(client_id, module, operation_type, processed_data)
+        # Trigger real-time analytics update (lands in the same group commit)
+        metrics_committed = await self._update_real_time_metrics(
+            client_id, module, operation_type, processed_data
+        )
         
-        # Trigger AI learning if enough new data
-        await self._check_learning_trigger(client_id, module, operation_type)
+        await self.ingest_queue.wait(operation_committed, metrics_committed)
         
         return operation_id
     
@@ -304,15 +708,17 @@ class GringoDataWarehouse:
         
         processor = self.data_processors.get(operation_type, self._process_generic_data)
         processed = await processor(data, client_id, module)
+        anomalies = await self._detect_anomalies(operation_type, processed, client_id)
         
         return {
             'raw_data': data,
             'processed_data': processed,
-            'ai_analysis': await self._ai_analyze_data(operation_type, processed),
+            'ai_analysis': await self._ai_analyze_data(operation_type, processed, anomalies),
             'metadata': {
                 'processing_time': datetime.now().isoformat(),
                 'data_quality_score': self._calculate_data_quality(data),
-                'anomaly_detected': await self._detect_anomalies(operation_type, processed, client_id)
+                'anomaly_detected': bool(anomalies),
+                'anomalies': [asdict(event) for event in anomalies]
             }
         }
     
@@ -484,49 +890,102 @@ class GringoDataWarehouse:
             'timestamp': datetime.now().isoformat()
         }
     
-    async def _ai_analyze_data(self, operation_type: str, processed_data: Dict[str, Any]) -> Dict[str, Any]:
+    async def _ai_analyze_data(self, operation_type: str, processed_data: Dict[str, Any],
+                               anomalies: List[AnomalyEvent] = None) -> Dict[str, Any]:
         """AI analysis of processed data"""
         
-        # This would use the AI brain to analyze the data
-        analysis = {
-            'insights': [
-                f"Data quality score: {processed_data.get('completeness_score', 0.8):.2f}",
-                f"Processing successful for {operation_type}",
-                "Data within normal parameters"
-            ],
-            'recommendations': [
-                "Continue monitoring trends",
-                "Schedule regular data quality checks"
-            ],
+        anomalies = anomalies or []
+        insights = [
+            f"Data quality score: {processed_data.get('completeness_score', 0.8):.2f}",
+            f"Processing successful for {operation_type}"
+        ]
+        recommendations = ["Continue monitoring trends"]
+        
+        if anomalies:
+            for event in anomalies:
+                insights.append(
+                    f"{event.metric_name} = {event.value:g} is {abs(event.score):.1f} standard deviations "
+                    f"{'above' if event.score > 0 else 'below'} its baseline"
+                )
+            recommendations.append(f"Investigate {', '.join(event.metric_name for event in anomalies)}")
+        else:
+            insights.append("Data within normal parameters")
+            recommendations.append("Schedule regular data quality checks")
+        
+        return {
+            'insights': insights,
+            'recommendations': recommendations,
             'confidence_score': 0.85,
-            'anomalies_detected': False,
-            'action_required': False
+            'anomalies_detected': bool(anomalies),
+            'action_required': any(abs(event.score) >= ALERT_SEVERITY_SCORES['high'] for event in anomalies)
         }
-        
-        return analysis
     
     async def _update_real_time_metrics(self, client_id: str, module: str, 
-                                      operation_type: str, processed_data: Dict[str, Any]):
-        """Update real-time metrics dashboard"""
-        
-        conn = sqlite3.connect(self.operational_db)
+                                      operation_type: str, processed_data: Dict[str, Any]) -> asyncio.Future:
+        """Update real-time metrics dashboard; returns the pending group commit"""
         
         # Extract key metrics from processed data
         metrics = self._extract_key_metrics(operation_type, processed_data)
+        timestamp = datetime.now().isoformat()
         
-        for metric_name, metric_value in metrics.items():
-            metric_id = str(uuid.uuid4())
-            conn.execute("""
-                INSERT INTO real_time_metrics
-                (id, client_id, metric_name, metric_value, timestamp, module_source)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (
-                metric_id, client_id, metric_name, metric_value,
-                datetime.now().isoformat(), module
-            ))
-        
-        conn.commit()
-        conn.close()
+        return self.ingest_queue.add('metric_samples', [
+            (client_id, metric_name, metric_value, timestamp, module)
+            for metric_name, metric_value in metrics.items()
+        ])
+    
+    async def run_maintenance(self) -> Dict[str, Any]:
+        """Compact cold metric chunks and archive operation partitions past the hot window"""
+        
+        return {
+            'chunks_compacted': await self.compact_timeseries(self.compact_after_days),
+            'partitions_archived': await self.apply_operations_retention()
+        }
+    
+    async def compact_timeseries(self, older_than_days: int = 7) -> int:
+        """Compress metric chunks older than the given age"""
+        
+        await self._storage_ready
+        cutoff = datetime.now() - timedelta(days=older_than_days)
+        return await asyncio.to_thread(self.timeseries.compact, cutoff)
+    
+    async def apply_operations_retention(self, hot_months: int = None) -> List[str]:
+        """Compress operation partitions older than the hot window into archives"""
+        
+        hot_months = hot_months or self.hot_partition_months
+        await self._storage_ready
+        # Runs on the ingest writer so no batch is writing the partition being archived
+        await self.ingest_queue.flush()
+        return await self.ingest_queue.run_on_writer(self.partitions.apply_retention, hot_months)
+    
+    async def query_operations(self, client_id: str, start: datetime, end: datetime = None,
+                               module: str = None, operation_type: str = None,
+                               include_archived: bool = False) -> List[tuple]:
+        """daily_operations rows for a client in [start, end], reading only the partitions that overlap"""
+        
+        await self._storage_ready
+        end = end or datetime.now()
+        where = "client_id = ? AND timestamp >= ? AND timestamp <= ?"
+        params = [client_id, start.isoformat(), end.isoformat()]
+        if module:
+            where += " AND module = ?"
+            params.append(module)
+        if operation_type:
+            where += " AND operation_type = ?"
+            params.append(operation_type)
+        
+        return await asyncio.to_thread(lambda: list(self.partitions.query(
+            where, params, start=start, end=end, include_archived=include_archived
+        )))
+    
+    async def flush(self):
+        """Commit all buffered operations and metrics"""
+        await self.ingest_queue.flush()
+    
+    async def close(self):
+        """Flush buffered writes on shutdown"""
+        await self.ingest_queue.flush()
+        await self.ingest_queue.run_on_writer(self.partitions.close_writers)
+        await self.ingest_queue.close()
     
     def _extract_key_metrics(self, operation_type: str, data: Dict[str, Any]) -> Dict[str, float]:
         """Extract key metrics from processed data"""
@@ -558,25 +1017,42 @@ class GringoDataWarehouse:
         
         if not date:
             date = datetime.now().strftime('%Y-%m-%d')
+        # Reads tables created by the startup migrations
+        await self._storage_ready
         
         conn = sqlite3.connect(self.operational_db)
         
-        # Get operations count by module
+        # Get operations count by module (rollup maintained on ingest)
         operations_by_module = conn.execute("""
-            SELECT module, COUNT(*) as count
-            FROM daily_operations
-            WHERE client_id = ? AND DATE(timestamp) = ?
-            GROUP BY module
+            SELECT module, operation_count
+            FROM daily_module_counts
+            WHERE client_id = ? AND day = ?
         """, (client_id, date)).fetchall()
         
-        # Get real-time metrics
+        # Get latest value per real-time metric
         current_metrics = conn.execute("""
             SELECT metric_name, metric_value, module_source
-            FROM real_time_metrics
-            WHERE client_id = ? AND DATE(timestamp) = ?
-            ORDER BY timestamp DESC
+            FROM latest_metrics
+            WHERE client_id = ? AND day = ?
         """, (client_id, date)).fetchall()
         
+        # Day statistics per metric (rollup maintained on ingest)
+        metric_statistics = {
+            metric: {
+                'count': count,
+                'min': low,
+                'max': high,
+                'mean': total / count,
+                'sum': total,
+                'last': last
+            }
+            for metric, count, low, high, total, last in conn.execute("""
+                SELECT metric_name, sample_count, min_value, max_value, sum_value, last_value
+                FROM daily_metric_stats
+                WHERE client_id = ? AND day = ?
+            """, (client_id, date))
+        }
+        
         conn.close()
         
         return {
@@ -589,10 +1065,32 @@ class GringoDataWarehouse:
                 metric: {'value': value, 'source': source}
                 for metric, value, source in current_metrics
             },
+            'metric_statistics': metric_statistics,
             'total_operations': sum(count for _, count in operations_by_module),
             'active_modules': len(operations_by_module)
         }
     
+    async def get_metric_series(self, client_id: str, metric_name: str, start: datetime, end: datetime,
+                                bucket_seconds: float = None, agg: str = 'mean') -> Dict[str, Any]:
+        """Metric samples for a time range, optionally downsampled into buckets"""
+        
+        await self._storage_ready
+        if bucket_seconds:
+            timestamps, values = await asyncio.to_thread(
+                self.timeseries.downsample, client_id, metric_name, start, end, bucket_seconds, agg
+            )
+        else:
+            timestamps, values = await asyncio.to_thread(
+                self.timeseries.range, client_id, metric_name, start, end
+            )
+        
+        return {
+            'client_id': client_id,
+            'metric_name': metric_name,
+            'timestamps': [datetime.fromtimestamp(ts / 1_000_000).isoformat() for ts in timestamps.tolist()],
+            'values': values.tolist()
+        }
+    
     async def generate_daily_insights(self, client_id: str) -> List[LearningInsight]:
         """Generate AI insights from daily operations"""
         
@@ -674,22 +1172,36 @@ class GringoDataWarehouse:
             created_at=datetime.now()
         )
     
+    async def run_learning_pass(self, client_id: str) -> Dict[str, Any]:
+        """One learning cycle for a client (scheduled by LearningScheduler); returns the analysis stats"""
+        
+        await self._storage_ready
+        
+        # Analyze new data
+        stats = await self._analyze_recent_data(client_id)
+        
+        # Generate insights
+        insights = await self.generate_daily_insights(client_id)
+        self.latest_insights[client_id] = insights
+        
+        # Update AI models
+        await self._update_ai_models(client_id, insights)
+        
+        # Optimize operations
+        await self._apply_optimizations(client_id, insights)
+        
+        return stats
+    
     async def continuous_learning_loop(self, client_id: str):
-        """Continuous learning loop that runs 24/7"""
+        """Standalone hourly learning loop for a single client
+        
+        DailyOperationsManager schedules all clients through one
+        LearningScheduler instead.
+        """
         
         while True:
             try:
-                # Analyze new data
-                await self._analyze_recent_data(client_id)
-                
-                # Generate insights
-                insights = await self.generate_daily_insights(client_id)
-                
-                # Update AI models
-                await self._update_ai_models(client_id, insights)
-                
-                # Optimize operations
-                await self._apply_optimizations(client_id, insights)
+                await self.run_learning_pass(client_id)
                 
                 # Wait before next cycle (hourly learning)
                 await asyncio.sleep(3600)
@@ -698,21 +1210,78 @@ class GringoDataWarehouse:
                 logging.error(f"Error in learning loop for {client_id}: {e}")
                 await asyncio.sleep(300)  # Wait 5 minutes on error
     
-    async def _analyze_recent_data(self, client_id: str):
-        """Analyze data from the last hour"""
+    async def _analyze_recent_data(self, client_id: str, batch_size: int = 1000) -> Dict[str, Any]:
+        """Analyze operations stored since the client's last pass
         
-        one_hour_ago = (datetime.now() - timedelta(hours=1)).isoformat()
+        Each live partition is scanned from the client's persisted rowid
+        watermark, in batches; the watermark advances after every
+        processed batch, so rows are handed to learning exactly once even
+        when a pass runs late or is interrupted.
+        """
         
-        conn = sqlite3.connect(self.operational_db)
-        recent_operations = conn.execute("""
-            SELECT * FROM daily_operations
-            WHERE client_id = ? AND timestamp > ? AND processed = TRUE
-        """, (client_id, one_hour_ago)).fetchall()
-        conn.close()
+        started_at = datetime.now()
+        start = time.perf_counter()
+        processed = 0
+        
+        # Partition reads run in worker threads and bookkeeping writes on the
+        # ingest writer, so a long pass never blocks the event loop
+        def load_watermarks():
+            conn = sqlite3.connect(self.operational_db)
+            try:
+                return {
+                    key: (generation, last_rowid)
+                    for key, generation, last_rowid in conn.execute(
+                        "SELECT partition_key, generation, last_rowid FROM learning_watermarks WHERE client_id = ?",
+                        (client_id,)
+                    )
+                }
+            finally:
+                conn.close()
+        
+        def save_watermark(conn, key, last_rowid, generation):
+            conn.execute("""
+                INSERT INTO learning_watermarks (client_id, partition_key, last_rowid, generation, updated_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (client_id, partition_key)
+                DO UPDATE SET last_rowid = excluded.last_rowid, generation = excluded.generation,
+                              updated_at = excluded.updated_at
+            """, (client_id, key, last_rowid, generation, datetime.now().isoformat()))
+        
+        def save_stats(conn, stats):
+            conn.execute("""
+                INSERT INTO learning_pass_stats
+                (client_id, started_at, rows_processed, duration_seconds, rows_per_second)
+                VALUES (?, ?, ?, ?, ?)
+            """, (client_id, started_at.isoformat(), stats['rows_processed'], stats['duration_seconds'],
+                  stats['rows_per_second']))
+        
+        watermarks = await asyncio.to_thread(load_watermarks)
+        for key in await asyncio.to_thread(self.partitions.partitions):
+            watermark = watermarks.get(key)
+            while True:
+                fetched = await asyncio.to_thread(self.partitions.client_batch, key, client_id, watermark, batch_size)
+                if fetched is None:
+                    break
+                generation, batch = fetched
+                
+                # Process recent operations for learning
+                for operation in batch:
+                    await self._extract_learning_patterns(operation[1:])
+                
+                watermark = (generation, batch[-1][0])
+                await self.ingest_queue.run_in_transaction(save_watermark, key, batch[-1][0], generation)
+                processed += len(batch)
+        
+        duration = time.perf_counter() - start
+        stats = {
+            'rows_processed': processed,
+            'duration_seconds': duration,
+            'rows_per_second': processed / duration if duration > 0 else 0.0
+        }
+        await self.ingest_queue.run_in_transaction(save_stats, stats)
         
-        # Process recent operations for learning
-        for operation in recent_operations:
-            await self._extract_learning_patterns(operation)
+        logging.info(f"Learning pass for {client_id}: {processed} rows at {stats['rows_per_second']:.0f} rows/sec")
+        return stats
     
     async def _extract_learning_patterns(self, operation):
         """Extract learning patterns from operation data"""
@@ -752,10 +1321,82 @@ class GringoDataWarehouse:
         completeness = sum(1 for v in data.values() if v is not None) / len(data)
         return completeness
     
-    async def _detect_anomalies(self, operation_type: str, data: Dict[str, Any], client_id: str) -> bool:
-        """Detect anomalies in data"""
-        # Simple anomaly detection - would be more sophisticated in production
-        return False
+    async def _detect_anomalies(self, operation_type: str, data: Dict[str, Any], client_id: str) -> List[AnomalyEvent]:
+        """Score the operation's key metrics with the streaming detectors"""
+        
+        metrics = self._extract_key_metrics(operation_type, {'processed_data': data})
+        timestamp = datetime.now().isoformat()
+        
+        anomalies = []
+        for metric_name, metric_value in metrics.items():
+            if not self.anomaly_engine.has_series(client_id, metric_name):
+                # Warming reads the time-series store; keep it off the event loop
+                await asyncio.to_thread(self.anomaly_engine.warm_series, client_id, metric_name)
+            event = self.anomaly_engine.update(client_id, metric_name, timestamp, metric_value)
+            if event:
+                anomalies.append(event)
+        return anomalies
+    
+    def _load_anomaly_history(self, client_id: str, metric_name: str):
+        """Recent samples used to warm a series the anomaly engine hasn't seen yet"""
+        return self.timeseries.range(
+            client_id, metric_name, start=datetime.now() - timedelta(days=self.anomaly_history_days)
+        )
+    
+    async def detect_metric_anomalies(self, client_id: str, date: str = None,
+                                      until: datetime = None) -> List[AnomalyEvent]:
+        """Batch-score a whole day of every metric for a client in one vectorized pass per metric
+        
+        The preceding anomaly_history_days of samples only serve as baseline;
+        ``until`` cuts the day short. For backfills and reports - the
+        dashboard reads the streaming detectors' events instead.
+        """
+        
+        if not date:
+            date = datetime.now().strftime('%Y-%m-%d')
+        await self._storage_ready
+        day_start = datetime.strptime(date, '%Y-%m-%d')
+        day_end = min(day_start + timedelta(days=1), until) if until else day_start + timedelta(days=1)
+        history_start = day_start - timedelta(days=self.anomaly_history_days)
+        
+        def score_day():
+            events = []
+            for metric_name in self.timeseries.metrics(client_id):
+                ts, values = self.timeseries.range(client_id, metric_name, history_start, day_end)
+                events.extend(self.anomaly_engine.detect_batch(
+                    client_id, metric_name, ts, values, start_us=to_epoch_us(day_start)
+                ))
+            return sorted(events, key=lambda event: event.timestamp)
+        
+        return await asyncio.to_thread(score_day)
+    
+    async def todays_anomalies(self, client_id: str) -> List[AnomalyEvent]:
+        """Today's anomalies as recorded by the streaming detectors at ingest
+        
+        Samples stored today before this process started were never seen by
+        the detectors; they are batch-scored once per client and merged into
+        the event log.
+        """
+        
+        day_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        if day_start < self.anomaly_streaming_since:
+            backfill = self._anomaly_backfills.get(client_id)
+            if backfill is None:
+                backfill = asyncio.create_task(self._backfill_anomaly_events(client_id))
+                self._anomaly_backfills[client_id] = backfill
+            try:
+                await asyncio.shield(backfill)
+            except Exception as e:
+                # Retried on the next call; streaming events are still served
+                self._anomaly_backfills.pop(client_id, None)
+                logging.error(f"Anomaly backfill for {client_id} failed: {e}")
+        return self.anomaly_engine.recent_events(client_id, since=day_start)
+    
+    async def _backfill_anomaly_events(self, client_id: str):
+        events = await self.detect_metric_anomalies(
+            client_id, self.anomaly_streaming_since.strftime('%Y-%m-%d'), until=self.anomaly_streaming_since
+        )
+        self.anomaly_engine.record_events(client_id, events)
     
     def _calculate_oee(self, data: Dict[str, Any]) -> float:
         """Calculate Overall Equipment Effectiveness"""
@@ -770,21 +1411,59 @@ class GringoDataWarehouse:
 class DailyOperationsManager:
     """Manages all daily operations and data processing"""
     
-    def __init__(self):
+    def __init__(self, learning_workers: int = 4, dashboard_ttl_seconds: float = 30,
+                 dashboard_min_refresh_seconds: float = 2, maintenance_interval_seconds: float = 6 * 3600):
         self.data_warehouse = GringoDataWarehouse()
-        self.active_learning_loops = {}
+        # One scheduler for every client instead of a learning loop per client
+        self.learning_scheduler = LearningScheduler(self.data_warehouse, max_workers=learning_workers)
+        # Metric chunk compaction and partition retention, shared by every client
+        self.maintenance_interval_seconds = maintenance_interval_seconds
+        self._maintenance_task: Optional[asyncio.Task] = None
+        
+        # Dashboard snapshots: rebuilt once the TTL expires, or after ingest
+        # marked them dirty but at most every dashboard_min_refresh_seconds
+        self.dashboard_ttl_seconds = dashboard_ttl_seconds
+        self.dashboard_min_refresh_seconds = dashboard_min_refresh_seconds
+        self.dashboard_snapshots: Dict[str, DashboardSnapshot] = {}
+        self._dashboard_builds: Dict[str, asyncio.Task] = {}
     
     async def start_client_operations(self, client_id: str):
         """Start daily operations monitoring for a client"""
         
-        # Start continuous learning loop
-        learning_task = asyncio.create_task(
-            self.data_warehouse.continuous_learning_loop(client_id)
-        )
-        self.active_learning_loops[client_id] = learning_task
+        self.learning_scheduler.add_client(client_id)
+        await self.learning_scheduler.start()
+        if self._maintenance_task is None:
+            self._maintenance_task = asyncio.create_task(self._maintenance_loop())
         
         logging.info(f"🔄 Started daily operations for client {client_id}")
     
+    def get_learning_lag(self, client_id: str = None) -> Dict[str, Dict[str, Any]]:
+        """Per-client learning lag metrics"""
+        return self.learning_scheduler.lag_metrics(client_id)
+    
+    async def shutdown(self):
+        """Stop the learning scheduler and maintenance, then flush buffered warehouse writes"""
+        
+        await self.learning_scheduler.stop()
+        if self._maintenance_task is not None:
+            self._maintenance_task.cancel()
+            await asyncio.gather(self._maintenance_task, return_exceptions=True)
+            self._maintenance_task = None
+        await self.data_warehouse.close()
+    
+    async def _maintenance_loop(self):
+        """Run warehouse maintenance every maintenance_interval_seconds"""
+        
+        await self.data_warehouse._storage_ready
+        while True:
+            try:
+                result = await self.data_warehouse.run_maintenance()
+                if result['chunks_compacted'] or result['partitions_archived']:
+                    logging.info(f"Warehouse maintenance: {result}")
+            except Exception as e:
+                logging.error(f"Warehouse maintenance failed: {e}")
+            await asyncio.sleep(self.maintenance_interval_seconds)
+    
     async def process_real_time_data(self, client_id: str, module: str, 
                                    operation_type: str, data: Dict[str, Any]) -> str:
         """Process real-time operational data"""
@@ -793,82 +1472,112 @@ class DailyOperationsManager:
             client_id, module, operation_type, data
         )
         
+        snapshot = self.dashboard_snapshots.get(client_id)
+        if snapshot:
+            snapshot.dirty = True
+        
         return operation_id
     
-    async def get_client_dashboard_data(self, client_id: str) -> Dict[str, Any]:
-        """Get real-time dashboard data for client"""
+    async def get_client_dashboard_data(self, client_id: str, if_none_match: str = None) -> Dict[str, Any]:
+        """Get real-time dashboard data for client
+        
+        Served from the client's in-memory snapshot; the payload is shared
+        between callers and must not be modified. When ``if_none_match``
+        equals the current ETag only ``{'not_modified': True, 'etag',
+        'version'}`` is returned.
+        """
+        
+        snapshot = self.dashboard_snapshots.get(client_id)
+        if snapshot is None or self._dashboard_stale(snapshot):
+            # Concurrent pollers share one rebuild
+            build = self._dashboard_builds.get(client_id)
+            if build is None:
+                build = asyncio.create_task(self._build_dashboard_snapshot(client_id))
+                self._dashboard_builds[client_id] = build
+                build.add_done_callback(lambda _: self._dashboard_builds.pop(client_id, None))
+            snapshot = await asyncio.shield(build)
+        
+        if if_none_match is not None and if_none_match == snapshot.etag:
+            return {'not_modified': True, 'etag': snapshot.etag, 'version': snapshot.version}
+        return snapshot.payload
+    
+    def _dashboard_stale(self, snapshot: DashboardSnapshot) -> bool:
+        age = time.time() - snapshot.built_at
+        if snapshot.dirty:
+            return age >= self.dashboard_min_refresh_seconds
+        return age >= self.dashboard_ttl_seconds
+    
+    async def _build_dashboard_snapshot(self, client_id: str) -> DashboardSnapshot:
+        """Recompute the dashboard payload; read-only against the warehouse"""
+        
+        previous = self.dashboard_snapshots.get(client_id)
+        if previous:
+            # Ingest during the rebuild marks it dirty again
+            previous.dirty = False
         
         # Get daily summary
         daily_summary = await self.data_warehouse.get_daily_operations_summary(client_id)
         
-        # Get recent insights
-        insights = await self.data_warehouse.generate_daily_insights(client_id)
+        # Insights come from the learning scheduler's passes, not the read path
+        insights = self.data_warehouse.latest_insights.get(client_id, [])
         
         # Get real-time alerts
         alerts = await self._get_real_time_alerts(client_id)
         
-        return {
+        content = {
             'daily_summary': daily_summary,
             'insights': [asdict(insight) for insight in insights],
-            'alerts': alerts,
-            'last_updated': datetime.now().isoformat()
+            'alerts': alerts
         }
+        etag = hashlib.sha1(json.dumps(content, sort_keys=True, default=str).encode()).hexdigest()
+        
+        if previous and previous.etag == etag:
+            # Unchanged content keeps its version and ETag
+            previous.built_at = time.time()
+            return previous
+        
+        version = previous.version + 1 if previous else 1
+        payload = dict(content, last_updated=datetime.now().isoformat(), etag=etag, version=version)
+        snapshot = DashboardSnapshot(
+            payload=payload, etag=etag, version=version, built_at=time.time(),
+            dirty=previous.dirty if previous else False
+        )
+        self.dashboard_snapshots[client_id] = snapshot
+        return snapshot
     
     async def _get_real_time_alerts(self, client_id: str) -> List[Dict[str, Any]]:
-        """Get real-time alerts for client"""
-        
-        # This would check for critical conditions and generate alerts
-        alerts = []
+        """Alerts for today's metric anomalies, most severe first"""
         
-        # Check for maintenance alerts
-        maintenance_alerts = await self._check_maintenance_alerts(client_id)
-        alerts.extend(maintenance_alerts)
+        events = await self.data_warehouse.todays_anomalies(client_id)
         
-        # Check for quality alerts
-        quality_alerts = await self._check_quality_alerts(client_id)
-        alerts.extend(quality_alerts)
+        # Keep the strongest anomaly per metric
+        strongest: Dict[str, AnomalyEvent] = {}
+        for event in events:
+            current = strongest.get(event.metric_name)
+            if current is None or abs(event.score) > abs(current.score):
+                strongest[event.metric_name] = event
         
-        # Check for safety alerts
-        safety_alerts = await self._check_safety_alerts(client_id)
-        alerts.extend(safety_alerts)
+        alerts = []
+        for event in strongest.values():
+            severity = next(
+                level for level, minimum in ALERT_SEVERITY_SCORES.items() if abs(event.score) >= minimum
+            )
+            alerts.append({
+                'type': METRIC_ALERT_TYPES.get(event.metric_name, 'operations'),
+                'severity': severity,
+                'message': (
+                    f"{event.metric_name} = {event.value:g} is {abs(event.score):.1f} standard deviations "
+                    f"{'above' if event.score > 0 else 'below'} its baseline"
+                ),
+                'action_required': severity != 'low',
+                'timestamp': event.timestamp,
+                'metric': event.metric_name,
+                'value': event.value,
+                'scores': event.scores
+            })
         
+        alerts.sort(key=lambda alert: abs(max(alert['scores'].values(), key=abs)), reverse=True)
         return alerts
-    
-    async def _check_maintenance_alerts(self, client_id: str) -> List[Dict[str, Any]]:
-        """Check for maintenance-related alerts"""
-        return [
-            {
-                'type': 'maintenance',
-                'severity': 'medium',
-                'message': 'Equipment A3 due for maintenance in 2 days',
-                'action_required': True,
-                'timestamp': datetime.now().isoformat()
-            }
-        ]
-    
-    async def _check_quality_alerts(self, client_id: str) -> List[Dict[str, Any]]:
-        """Check for quality-related alerts"""
-        return [
-            {
-                'type': 'quality',
-                'severity': 'low',
-                'message': 'Quality metrics within normal range',
-                'action_required': False,
-                'timestamp': datetime.now().isoformat()
-            }
-        ]
-    
-    async def _check_safety_alerts(self, client_id: str) -> List[Dict[str, Any]]:
-        """Check for safety-related alerts"""
-        return [
-            {
-                'type': 'safety',
-                'severity': 'high',
-                'message': 'Safety training due for 5 employees this week',
-                'action_required': True,
-                'timestamp': datetime.now().isoformat()
-            }
-        ]
 
 # Demo function
 async def demo_daily_operations():
@@ -989,4 +1698,4 @@ async def demo_daily_operations():
     return dashboard_data
 
 if __name__ == "__main__":
-    asyncio.run(demo_daily_operations())
\ No newline at end of file
+    asyncio.run(demo_daily_operations())
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+GRINGO INGEST QUEUE
+Group-commit writer for high-rate operational data
+"""
+
+import asyncio
+import logging
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+# durability -> (PRAGMA synchronous, callers wait for the commit)
+DURABILITY_LEVELS = {
+    'full': ('FULL', True),       # fsync on every group commit, acknowledged after commit
+    'normal': ('NORMAL', True),   # WAL fsync at checkpoints only, acknowledged after commit
+    'relaxed': ('NORMAL', False)  # acknowledged once queued; a crash can lose the last window
+}
+
+class IngestQueue:
+    """Buffers inserts and commits them in groups on a dedicated writer thread
+    
+    Rows are added per target table and flushed every ``flush_interval_ms`` or
+    as soon as ``max_batch_rows`` are buffered, whichever comes first. Each
+    flush is one transaction with one ``executemany`` per table that has an
+    insert in ``statements``, so the fsync cost is paid per batch instead of
+    per row. ``on_batch(conn, batch)`` runs inside the same transaction and
+    gets every table's rows, e.g. to route them elsewhere or maintain
+    rollups; tables without a statement are only handed to it. ``on_commit(batch)``
+    runs after the commit, still on the writer thread, for writes outside
+    the database that must not happen for a rolled-back batch. The batch
+    is committed by then, so an ``on_commit`` failure is logged and counted
+    in ``on_commit_failures`` but does not fail the batch.
+    """
+    
+    def __init__(self, db_path: Path, statements: Dict[str, str] = None,
+                 flush_interval_ms: int = 50, max_batch_rows: int = 1000,
+                 durability: str = 'normal',
+                 on_batch: Callable[[sqlite3.Connection, Dict[str, List[Sequence[Any]]]], None] = None,
+                 on_commit: Callable[[Dict[str, List[Sequence[Any]]]], None] = None):
+        if durability not in DURABILITY_LEVELS:
+            raise ValueError(f"Unknown durability level: {durability}")
+        
+        self.db_path = Path(db_path)
+        self.statements = dict(statements or {})
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_batch_rows = max_batch_rows
+        self.durability = durability
+        self.synchronous, self.wait_for_commit = DURABILITY_LEVELS[durability]
+        self.on_batch = on_batch
+        self.on_commit = on_commit
+        
+        # Ingest statistics
+        self.committed_rows = 0
+        self.committed_batches = 0
+        self.on_commit_failures = 0
+        
+        self._buffers: Dict[str, List[Sequence[Any]]] = {}
+        self._buffered_rows = 0
+        self._batch_future: Optional[asyncio.Future] = None
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._inflight: set = set()
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"ingest-{self.db_path.name}")
+        self._conn: Optional[sqlite3.Connection] = None
+        self._closed = False
+    
+    def add(self, table: str, rows: List[Sequence[Any]]) -> asyncio.Future:
+        """Buffer rows for ``table``; the returned future resolves when their batch commits"""
+        
+        if self._closed:
+            raise RuntimeError(f"Ingest queue for {self.db_path} is closed")
+        if table not in self.statements and self.on_batch is None:
+            raise ValueError(f"No insert statement or on_batch hook for {table}")
+        
+        loop = asyncio.get_running_loop()
+        if self._batch_future is None:
+            self._batch_future = loop.create_future()
+            self._flush_handle = loop.call_later(self.flush_interval, self._start_flush)
+        
+        batch_future = self._batch_future
+        self._buffers.setdefault(table, []).extend(rows)
+        self._buffered_rows += len(rows)
+        
+        if self._buffered_rows >= self.max_batch_rows:
+            self._start_flush()
+        
+        return batch_future
+    
+    async def wait(self, *futures: asyncio.Future):
+        """Wait for commits according to the durability level"""
+        
+        if self.wait_for_commit:
+            await asyncio.gather(*futures)
+    
+    def _start_flush(self) -> Optional[asyncio.Task]:
+        """Hand the current buffers to the writer thread"""
+        
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        
+        batch_future = self._batch_future
+        if batch_future is None:
+            return None
+        
+        batch = {table: rows for table, rows in self._buffers.items() if rows}
+        self._buffers = {}
+        self._buffered_rows = 0
+        self._batch_future = None
+        
+        task = asyncio.get_running_loop().create_task(self._commit(batch, batch_future))
+        self._inflight.add(task)
+        task.add_done_callback(self._inflight.discard)
+        return task
+    
+    async def _commit(self, batch: Dict[str, List[Sequence[Any]]], batch_future: asyncio.Future):
+        loop = asyncio.get_running_loop()
+        try:
+            row_count = await loop.run_in_executor(self._writer, self._write_batch, batch)
+        except Exception as e:
+            logging.error(f"Ingest batch for {self.db_path} failed: {e}")
+            if not batch_future.done():
+                batch_future.set_exception(e)
+                # Nobody awaits the future in relaxed mode
+                batch_future.exception()
+            return
+        
+        self.committed_rows += row_count
+        self.committed_batches += 1
+        if not batch_future.done():
+            batch_future.set_result(row_count)
+    
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={self.synchronous}")
+        conn.execute("PRAGMA busy_timeout=5000")
+        return conn
+    
+    def _connection(self) -> sqlite3.Connection:
+        """The writer connection, opened on first use (writer thread)"""
+        
+        if self._conn is None:
+            self._conn = self._connect()
+        return self._conn
+    
+    def _write_batch(self, batch: Dict[str, List[Sequence[Any]]]) -> int:
+        """Write one group commit (runs on the writer thread)"""
+        
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for table, rows in batch.items():
+                if table in self.statements:
+                    conn.executemany(self.statements[table], rows)
+            if self.on_batch:
+                self.on_batch(conn, batch)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        
+        if self.on_commit:
+            try:
+                self.on_commit(batch)
+            except Exception as e:
+                # Callers must not retry or report rows that are already stored
+                self.on_commit_failures += 1
+                logging.error(f"Post-commit step for {self.db_path} failed; batch stays committed: {e}")
+        
+        return sum(len(rows) for rows in batch.values())
+    
+    async def run_on_writer(self, fn: Callable[..., Any], *args) -> Any:
+        """Run ``fn`` on the writer thread, serialized with group commits"""
+        return await asyncio.get_running_loop().run_in_executor(self._writer, fn, *args)
+    
+    def _run_transaction(self, fn: Callable[..., Any], args: tuple) -> Any:
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(conn, *args)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return result
+    
+    async def run_in_transaction(self, fn: Callable[..., Any], *args) -> Any:
+        """Run ``fn(conn, *args)`` in its own transaction on the writer connection
+        
+        For occasional writes outside the ingest path (bookkeeping such as
+        watermarks); serialized with group commits instead of contending
+        with them for the database lock.
+        """
+        
+        if self._closed:
+            raise RuntimeError(f"Ingest queue for {self.db_path} is closed")
+        return await self.run_on_writer(self._run_transaction, fn, args)
+    
+    async def flush(self):
+        """Commit everything buffered so far"""
+        
+        self._start_flush()
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+    
+    async def close(self):
+        """Flush on shutdown and release the writer connection"""
+        
+        if self._closed:
+            return
+        
+        await self.flush()
+        self._closed = True
+        
+        def close_connection():
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+        
+        await asyncio.get_running_loop().run_in_executor(self._writer, close_connection)
+        self._writer.shutdown(wait=True)
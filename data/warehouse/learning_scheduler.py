@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+GRINGO LEARNING SCHEDULER
+One scheduler and a bounded worker pool for every tenant's learning passes
+"""
+
+import asyncio
+import logging
+import random
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+@dataclass
+class TenantSchedule:
+    """Scheduling state and lag metrics for one tenant"""
+    client_id: str
+    next_run: float
+    pending_rows: int = 0
+    pending_since: Optional[float] = None
+    state: str = "idle"  # idle, queued, running
+    runs: int = 0
+    failures: int = 0
+    last_run_at: Optional[float] = None
+    last_duration: Optional[float] = None
+    last_error: Optional[str] = None
+    last_rows_per_second: Optional[float] = None
+
+class LearningScheduler:
+    """Runs ``warehouse.run_learning_pass(client_id)`` for all registered tenants
+    
+    Every ``poll_seconds`` a single grouped query per live partition counts
+    the operations each tenant has written since the scheduler's
+    (generation, rowid) watermark. A tenant becomes due when its jittered
+    interval elapses or once ``warehouse.learning_trigger_rows`` new
+    operations are pending. Due tenants are queued by pending volume
+    (largest first) and drained by ``max_workers`` workers, so at most that
+    many passes touch the warehouse at once however many tenants are
+    registered.
+    """
+    
+    def __init__(self, warehouse, max_workers: int = 4, interval_seconds: float = 3600,
+                 jitter: float = 0.1, poll_seconds: float = 30, retry_seconds: float = 300):
+        self.warehouse = warehouse
+        self.max_workers = max_workers
+        self.interval_seconds = interval_seconds
+        self.jitter = jitter
+        self.poll_seconds = poll_seconds
+        self.retry_seconds = retry_seconds
+        
+        self.tenants: Dict[str, TenantSchedule] = {}
+        self._watermarks: Dict[str, Tuple[str, int]] = {}
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._queued_seq = 0
+        self._tasks: List[asyncio.Task] = []
+    
+    def _jittered(self, seconds: float) -> float:
+        return seconds * (1 + random.uniform(-self.jitter, self.jitter))
+    
+    def add_client(self, client_id: str):
+        """Register a tenant; its first pass is spread over the jitter window"""
+        
+        if client_id not in self.tenants:
+            first_run = time.time() + random.uniform(0, self.interval_seconds * self.jitter)
+            self.tenants[client_id] = TenantSchedule(client_id=client_id, next_run=first_run)
+    
+    def remove_client(self, client_id: str):
+        self.tenants.pop(client_id, None)
+    
+    async def start(self):
+        """Start the poller and the worker pool (no-op if already running)"""
+        
+        if self._tasks:
+            return
+        
+        self._queue = asyncio.PriorityQueue()
+        self._tasks = [asyncio.create_task(self._poll_loop())]
+        self._tasks.extend(asyncio.create_task(self._worker()) for _ in range(self.max_workers))
+    
+    async def stop(self):
+        """Cancel the poller and workers; a running pass is cancelled too"""
+        
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+        for schedule in self.tenants.values():
+            schedule.state = "idle"
+    
+    async def _poll_loop(self):
+        await self.warehouse._storage_ready
+        baseline = False
+        
+        while True:
+            try:
+                if not baseline:
+                    # Rows already on disk are the learning passes' business, not new changes
+                    self._watermarks = await asyncio.to_thread(self.warehouse.partitions.max_rowids)
+                    baseline = True
+                await self.poll()
+            except Exception as e:
+                logging.error(f"Learning scheduler poll failed: {e}")
+            await asyncio.sleep(self.poll_seconds)
+    
+    async def poll(self):
+        """Fold new writes into pending counts and queue every due tenant"""
+        
+        changes, self._watermarks = await asyncio.to_thread(
+            self.warehouse.partitions.changes_since, self._watermarks
+        )
+        
+        now = time.time()
+        for client_id, new_rows in changes.items():
+            schedule = self.tenants.get(client_id)
+            if schedule is None:
+                continue
+            schedule.pending_rows += new_rows
+            if schedule.pending_since is None:
+                schedule.pending_since = now
+        
+        for schedule in self.tenants.values():
+            if schedule.state != "idle":
+                continue
+            # Volume triggers wait out the retry delay after a failed pass
+            volume_due = schedule.pending_rows >= self.warehouse.learning_trigger_rows and not schedule.last_error
+            if now >= schedule.next_run or volume_due:
+                schedule.state = "queued"
+                self._queued_seq += 1
+                self._queue.put_nowait((-schedule.pending_rows, self._queued_seq, schedule.client_id))
+    
+    async def _worker(self):
+        while True:
+            _, _, client_id = await self._queue.get()
+            schedule = self.tenants.get(client_id)
+            if schedule is None:
+                continue
+            
+            schedule.state = "running"
+            # Rows written while the pass runs count towards the next one
+            processed_rows = schedule.pending_rows
+            start = time.time()
+            try:
+                stats = await self.warehouse.run_learning_pass(client_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"Learning pass for {client_id} failed: {e}")
+                schedule.failures += 1
+                schedule.last_error = str(e)
+                schedule.next_run = time.time() + self._jittered(self.retry_seconds)
+            else:
+                schedule.runs += 1
+                schedule.last_rows_per_second = (stats or {}).get('rows_per_second')
+                schedule.last_error = None
+                schedule.pending_rows = max(schedule.pending_rows - processed_rows, 0)
+                schedule.pending_since = None if schedule.pending_rows == 0 else schedule.pending_since
+                schedule.next_run = time.time() + self._jittered(self.interval_seconds)
+            finally:
+                schedule.last_run_at = start
+                schedule.last_duration = time.time() - start
+                schedule.state = "idle"
+    
+    def lag_metrics(self, client_id: str = None) -> Dict[str, Dict[str, Any]]:
+        """Per-tenant lag: pending rows, age of the oldest unprocessed change, run stats
+        
+        A client the scheduler has not registered reports zero lag and no runs.
+        """
+        
+        now = time.time()
+        if client_id:
+            schedules = [self.tenants.get(client_id) or TenantSchedule(client_id=client_id, next_run=now)]
+        else:
+            schedules = self.tenants.values()
+        
+        return {
+            schedule.client_id: {
+                'state': schedule.state,
+                'pending_rows': schedule.pending_rows,
+                'lag_seconds': now - schedule.pending_since if schedule.pending_since else 0.0,
+                'seconds_until_next_run': max(schedule.next_run - now, 0.0),
+                'runs': schedule.runs,
+                'failures': schedule.failures,
+                'last_run_at': schedule.last_run_at,
+                'last_duration_seconds': schedule.last_duration,
+                'last_error': schedule.last_error,
+                'last_rows_per_second': schedule.last_rows_per_second
+            }
+            for schedule in schedules
+        }
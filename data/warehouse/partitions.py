@@ -0,0 +1,426 @@
+#!/usr/bin/env python3
+"""
+GRINGO OPERATION PARTITIONS
+Monthly partition files for daily_operations with archive compaction
+"""
+
+import logging
+import lzma
+import os
+import shutil
+import sqlite3
+import tempfile
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+PARTITION_SCHEMA = """
+CREATE TABLE IF NOT EXISTS daily_operations (
+    id TEXT PRIMARY KEY,
+    client_id TEXT NOT NULL,
+    module TEXT NOT NULL,
+    operation_type TEXT NOT NULL,
+    timestamp DATETIME NOT NULL,
+    data JSON NOT NULL,
+    processed BOOLEAN DEFAULT FALSE
+);
+CREATE INDEX IF NOT EXISTS idx_daily_operations_client_ts ON daily_operations (client_id, timestamp);
+CREATE INDEX IF NOT EXISTS idx_daily_operations_module_op ON daily_operations (module, operation_type);
+-- (client_id, rowid) order for watermark scans
+CREATE INDEX IF NOT EXISTS idx_daily_operations_client ON daily_operations (client_id);
+-- One row: id of this incarnation of the file, so rowid watermarks reset when a partition is recreated
+CREATE TABLE IF NOT EXISTS partition_info (generation TEXT NOT NULL);
+"""
+
+OPERATION_COLUMNS = "id, client_id, module, operation_type, timestamp, data, processed"
+
+def partition_key(timestamp: str) -> str:
+    """'2024-03-18T10:00:00' -> '2024_03'"""
+    return timestamp[:7].replace('-', '_')
+
+class OperationPartitions:
+    """daily_operations split into one SQLite file per month
+    
+    ``operations/operations_YYYY_MM.db`` holds the rows for that month.
+    Partitions older than the hot window are moved to
+    ``operations/archive/operations_YYYY_MM.db.xz``. Queries name a time range
+    and only open the partitions that overlap it; archives are only read
+    when explicitly requested.
+    
+    Each file records a random generation when it is created. Rowids only
+    grow within a file, so ``(generation, rowid)`` pairs make watermarks
+    that stay valid when an archived month is recreated by late rows.
+    """
+    
+    def __init__(self, root: Path, synchronous: str = 'NORMAL', max_open_writers: int = 3):
+        # Absolute, so read-only partitions can be opened by file: URI
+        self.root = Path(root).resolve()
+        self.archive_root = self.root / "archive"
+        self.archive_root.mkdir(parents=True, exist_ok=True)
+        self.synchronous = synchronous
+        self.max_open_writers = max_open_writers
+        
+        # Writer connections, only touched from the ingest writer thread
+        self._writers: Dict[str, sqlite3.Connection] = {}
+    
+    def partition_path(self, key: str) -> Path:
+        return self.root / f"operations_{key}.db"
+    
+    def archive_path(self, key: str) -> Path:
+        return self.archive_root / f"operations_{key}.db.xz"
+    
+    def partitions(self) -> List[str]:
+        """Keys of live (unarchived) partitions, oldest first"""
+        return sorted(path.stem[len("operations_"):] for path in self.root.glob("operations_*.db"))
+    
+    def archived_partitions(self) -> List[str]:
+        return sorted(path.name[len("operations_"):-len(".db.xz")] for path in self.archive_root.glob("operations_*.db.xz"))
+    
+    def partitions_for_range(self, start: Optional[datetime] = None,
+                             end: Optional[datetime] = None) -> List[str]:
+        """Live partitions that can hold rows with start <= timestamp <= end"""
+        
+        first = partition_key(start.isoformat()) if start else None
+        last = partition_key(end.isoformat()) if end else None
+        return [
+            key for key in self.partitions()
+            if (first is None or key >= first) and (last is None or key <= last)
+        ]
+    
+    # ------------------------------------------------------------------
+    # Writes (ingest writer thread)
+    # ------------------------------------------------------------------
+    
+    def _writer(self, key: str) -> sqlite3.Connection:
+        conn = self._writers.get(key)
+        if conn is None:
+            # Late rows for old months are rare; keep only the newest writers open
+            while len(self._writers) >= self.max_open_writers:
+                oldest = min(self._writers)
+                self._writers.pop(oldest).close()
+            
+            conn = sqlite3.connect(self.partition_path(key), isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"PRAGMA synchronous={self.synchronous}")
+            conn.execute("PRAGMA busy_timeout=5000")
+            conn.executescript(PARTITION_SCHEMA)
+            self._stamp_generation(conn)
+            self._writers[key] = conn
+        return conn
+    
+    @staticmethod
+    def _stamp_generation(conn: sqlite3.Connection):
+        conn.execute(
+            "INSERT INTO partition_info (generation) SELECT ? WHERE NOT EXISTS (SELECT 1 FROM partition_info)",
+            (uuid.uuid4().hex,)
+        )
+    
+    def write_operations(self, rows: Sequence[Sequence[Any]]) -> List[str]:
+        """Insert daily_operations rows, one transaction per touched partition; returns the partition keys
+        
+        Rows are keyed by operation id: an id that is already stored (a
+        retried ingest batch, a re-run of the legacy migration) is left as it is.
+        """
+        
+        by_partition: Dict[str, List[Sequence[Any]]] = {}
+        for row in rows:
+            by_partition.setdefault(partition_key(row[4]), []).append(row)
+        
+        for key, partition_rows in by_partition.items():
+            conn = self._writer(key)
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(f"""
+                    INSERT INTO daily_operations ({OPERATION_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (id) DO NOTHING
+                """, partition_rows)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        
+        return list(by_partition)
+    
+    def writer_generation(self, key: str) -> str:
+        """Generation of a live partition (ingest writer thread)"""
+        return self._writer(key).execute("SELECT generation FROM partition_info").fetchone()[0]
+    
+    def rows_since(self, key: str, after_rowid: int) -> List[Tuple[int, str, str, str]]:
+        """(rowid, client_id, module, timestamp) of a live partition's rows past ``after_rowid`` (ingest writer thread)"""
+        
+        return self._writer(key).execute("""
+            SELECT rowid, client_id, module, timestamp FROM daily_operations
+            WHERE rowid > ? ORDER BY rowid
+        """, (after_rowid,)).fetchall()
+    
+    def prepare(self):
+        """Bring every live partition to the current schema and stamp its generation (startup)
+        
+        Opens (and closes) a writer on every live partition, so indexes and
+        ``partition_info`` added after a file was written are created here,
+        once; the read-only scans never change a file.
+        """
+        
+        for key in self.partitions():
+            self._writer(key)
+        self.close_writers()
+    
+    def heads(self) -> Dict[str, Tuple[str, int]]:
+        """(generation, MAX(rowid)) of every live partition (ingest writer thread or startup)"""
+        
+        return {
+            key: (self.writer_generation(key), self._writer(key).execute(
+                "SELECT COALESCE(MAX(rowid), 0) FROM daily_operations"
+            ).fetchone()[0])
+            for key in self.partitions()
+        }
+    
+    def close_writers(self):
+        for conn in self._writers.values():
+            conn.close()
+        self._writers.clear()
+    
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+    
+    def _reader(self, key: str) -> sqlite3.Connection:
+        return sqlite3.connect(f"{self.partition_path(key).as_uri()}?mode=ro", uri=True)
+    
+    @staticmethod
+    def _generation(conn: sqlite3.Connection) -> Optional[str]:
+        """Generation of an open partition; None while its writer is still creating it"""
+        
+        try:
+            row = conn.execute("SELECT generation FROM partition_info").fetchone()
+        except sqlite3.OperationalError:
+            return None
+        return row[0] if row else None
+    
+    def query(self, where: str = "1 = 1", params: Sequence[Any] = (),
+              start: Optional[datetime] = None, end: Optional[datetime] = None,
+              columns: str = OPERATION_COLUMNS, order_by: str = "timestamp",
+              include_archived: bool = False, batch_size: int = 1000) -> Iterator[Tuple]:
+        """Stream matching rows from the partitions overlapping [start, end], oldest partition first
+        
+        ``start``/``end`` only prune partitions; put the exact timestamp
+        bounds in ``where`` as well.
+        """
+        
+        keys = self.partitions_for_range(start, end)
+        sources = [(key, self.partition_path(key)) for key in keys]
+        
+        if include_archived:
+            first = partition_key(start.isoformat()) if start else None
+            last = partition_key(end.isoformat()) if end else None
+            sources.extend(
+                (key, self.archive_path(key)) for key in self.archived_partitions()
+                if (first is None or key >= first) and (last is None or key <= last)
+            )
+            sources.sort()
+        
+        for key, path in sources:
+            if path.suffix == ".xz":
+                yield from self._query_archive(path, where, params, columns, order_by, batch_size)
+                continue
+            
+            conn = self._reader(key)
+            try:
+                cursor = conn.execute(
+                    f"SELECT {columns} FROM daily_operations WHERE {where} ORDER BY {order_by}", params
+                )
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    yield from rows
+            finally:
+                conn.close()
+    
+    def client_batch(self, key: str, client_id: str, watermark: Optional[Tuple[str, int]] = None,
+                     batch_size: int = 1000) -> Optional[Tuple[str, List[Tuple]]]:
+        """(generation, rows) of the next batch of a client's processed rows past a (generation, rowid) watermark
+        
+        Rows are (rowid, *OPERATION_COLUMNS) in rowid order; None once there
+        are none left. A watermark from another generation of the partition
+        is ignored and the file is read from the start. Each call opens its
+        own read-only connection, so batches can be fetched from any thread.
+        """
+        
+        conn = self._reader(key)
+        try:
+            generation = self._generation(conn)
+            if generation is None:
+                return None
+            after_rowid = watermark[1] if watermark and watermark[0] == generation else 0
+            rows = conn.execute(f"""
+                SELECT rowid, {OPERATION_COLUMNS}
+                FROM daily_operations
+                WHERE client_id = ? AND rowid > ? AND processed = TRUE
+                ORDER BY rowid
+                LIMIT ?
+            """, (client_id, after_rowid, batch_size)).fetchall()
+        finally:
+            conn.close()
+        return (generation, rows) if rows else None
+    
+    def client_batches(self, key: str, client_id: str, watermark: Optional[Tuple[str, int]] = None,
+                       batch_size: int = 1000) -> Iterator[Tuple[str, List[Tuple]]]:
+        """Every client_batch() past a watermark, in order"""
+        
+        while True:
+            batch = self.client_batch(key, client_id, watermark, batch_size)
+            if batch is None:
+                return
+            yield batch
+            watermark = (batch[0], batch[1][-1][0])
+    
+    def max_rowids(self) -> Dict[str, Tuple[str, int]]:
+        """Current (generation, MAX(rowid)) of every live partition"""
+        
+        watermarks = {}
+        for key in self.partitions():
+            conn = self._reader(key)
+            try:
+                generation = self._generation(conn)
+                if generation is not None:
+                    watermarks[key] = (generation, conn.execute(
+                        "SELECT COALESCE(MAX(rowid), 0) FROM daily_operations"
+                    ).fetchone()[0])
+            finally:
+                conn.close()
+        return watermarks
+    
+    def changes_since(self, watermarks: Dict[str, Tuple[str, int]]
+                      ) -> Tuple[Dict[str, int], Dict[str, Tuple[str, int]]]:
+        """New rows per client past the per-partition (generation, rowid) watermarks: (counts, advanced watermarks)
+        
+        One grouped rowid-range query per partition, shared by every client.
+        Only the current and previous month are checked, which is where
+        ingest writes land. A partition recreated since its watermark was
+        taken counts from its first row.
+        """
+        
+        counts: Dict[str, int] = {}
+        advanced = dict(watermarks)
+        since = datetime.now() - timedelta(days=32)
+        
+        for key in self.partitions_for_range(start=since):
+            conn = self._reader(key)
+            try:
+                generation = self._generation(conn)
+                if generation is None:
+                    continue
+                previous_generation, last_rowid = watermarks.get(key, (generation, 0))
+                after_rowid = last_rowid if previous_generation == generation else 0
+                rows = conn.execute("""
+                    SELECT client_id, COUNT(*), MAX(rowid)
+                    FROM daily_operations
+                    WHERE rowid > ?
+                    GROUP BY client_id
+                """, (after_rowid,)).fetchall()
+            finally:
+                conn.close()
+            
+            advanced[key] = (generation, after_rowid)
+            for client_id, count, max_rowid in rows:
+                counts[client_id] = counts.get(client_id, 0) + count
+                advanced[key] = (generation, max(advanced[key][1], max_rowid))
+        
+        return counts, advanced
+    
+    def _query_archive(self, archive: Path, where: str, params: Sequence[Any],
+                       columns: str, order_by: str, batch_size: int) -> Iterator[Tuple]:
+        """Decompress an archived partition to a scratch file and query it"""
+        
+        # A scratch file per call, so concurrent reads of one archive do not share it
+        fd, name = tempfile.mkstemp(prefix=f".{archive.name[:-len('.xz')]}.", suffix=".restore",
+                                    dir=self.archive_root)
+        scratch = Path(name)
+        with lzma.open(archive, 'rb') as src, os.fdopen(fd, 'wb') as dst:
+            shutil.copyfileobj(src, dst, length=1024 * 1024)
+        
+        conn = sqlite3.connect(scratch)
+        try:
+            cursor = conn.execute(
+                f"SELECT {columns} FROM daily_operations WHERE {where} ORDER BY {order_by}", params
+            )
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            conn.close()
+            scratch.unlink(missing_ok=True)
+    
+    # ------------------------------------------------------------------
+    # Retention
+    # ------------------------------------------------------------------
+    
+    def archive_partition(self, key: str) -> Path:
+        """Snapshot a partition, xz-compress it and remove the live file (ingest writer thread)"""
+        
+        writer = self._writers.pop(key, None)
+        if writer is not None:
+            writer.close()
+        
+        source = self.partition_path(key)
+        archive = self.archive_path(key)
+        snapshot = self.archive_root / f".operations_{key}.snapshot"
+        snapshot.unlink(missing_ok=True)
+        
+        # VACUUM INTO folds the WAL in and drops free pages before compressing
+        conn = sqlite3.connect(source)
+        try:
+            conn.execute("VACUUM INTO ?", (str(snapshot),))
+        finally:
+            conn.close()
+        
+        if archive.exists():
+            # Late rows arrived after an earlier archive: merge them in
+            self._merge_archive(archive, snapshot)
+        
+        tmp_archive = archive.with_suffix(".xz.tmp")
+        with open(snapshot, 'rb') as src, lzma.open(tmp_archive, 'wb', preset=6) as dst:
+            shutil.copyfileobj(src, dst, length=1024 * 1024)
+        os.replace(tmp_archive, archive)
+        
+        snapshot.unlink()
+        for suffix in ("", "-wal", "-shm"):
+            Path(f"{source}{suffix}").unlink(missing_ok=True)
+        
+        logging.info(f"Archived operations partition {key} -> {archive}")
+        return archive
+    
+    def _merge_archive(self, archive: Path, snapshot: Path):
+        """Copy rows from an existing archive into a fresh snapshot"""
+        
+        previous = self.archive_root / f".{archive.name}.merge"
+        with lzma.open(archive, 'rb') as src, open(previous, 'wb') as dst:
+            shutil.copyfileobj(src, dst, length=1024 * 1024)
+        
+        conn = sqlite3.connect(snapshot)
+        try:
+            conn.execute("ATTACH DATABASE ? AS previous", (str(previous),))
+            conn.execute("INSERT OR IGNORE INTO daily_operations SELECT * FROM previous.daily_operations")
+            conn.commit()
+            conn.execute("DETACH DATABASE previous")
+        finally:
+            conn.close()
+            previous.unlink(missing_ok=True)
+    
+    def apply_retention(self, hot_months: int = 3, now: datetime = None) -> List[str]:
+        """Archive every partition older than the newest ``hot_months`` months; returns archived keys"""
+        
+        now = now or datetime.now()
+        month_index = now.year * 12 + now.month - 1 - (hot_months - 1)
+        oldest_hot = f"{month_index // 12:04d}_{month_index % 12 + 1:02d}"
+        
+        archived = []
+        for key in self.partitions():
+            if key < oldest_hot:
+                self.archive_partition(key)
+                archived.append(key)
+        return archived
@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+"""
+GRINGO TIME-SERIES STORE
+Chunked columnar storage for real-time metric samples, queried through NumPy
+"""
+
+import os
+import shutil
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote, unquote
+
+import numpy as np
+
+# One sample on disk: int64 epoch microseconds + float64 value (16 bytes)
+SAMPLE_DTYPE = np.dtype([('ts', '<i8'), ('value', '<f8')])
+
+ACTIVE_CHUNK = "active.bin"
+
+def to_epoch_us(timestamp) -> int:
+    """ISO string, datetime or number of seconds -> int64 epoch microseconds"""
+    
+    if isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp)
+    if isinstance(timestamp, datetime):
+        return int(round(timestamp.timestamp() * 1_000_000))
+    return int(round(float(timestamp) * 1_000_000))
+
+class TimeSeriesStore:
+    """Per (client, metric) time series in append-only chunk files
+    
+    Layout under ``root/<client>/<metric>/``:
+    
+    * ``active.bin`` - raw samples appended on every flush
+    * ``<first>_<last>_<seq>.bin`` - sealed raw chunks (``chunk_size`` samples)
+    * ``<first>_<last>_<seq>.npz`` - compacted cold chunks: delta-encoded
+      timestamps, zlib-compressed
+    
+    Raw chunks are memory-mapped for reads; chunk names carry their time span
+    so range queries skip chunks without opening them, and a per-series
+    sequence number so two chunks never share a name. Appends are buffered in
+    memory until ``flush()``, which the warehouse calls after each ingest
+    group commit. A torn sample at the end of ``active.bin`` (a crash during
+    a flush) is truncated before the next append.
+    """
+    
+    def __init__(self, root: Path, chunk_size: int = 65536):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.chunk_size = chunk_size
+        
+        self._buffers: Dict[Tuple[str, str], List[Tuple[int, float]]] = {}
+        self._lock = threading.RLock()
+    
+    def _series_dir(self, client_id: str, metric_name: str) -> Path:
+        return self.root / quote(client_id, safe='') / quote(metric_name, safe='')
+    
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
+    
+    def append(self, client_id: str, metric_name: str, timestamp, value: float):
+        """Buffer one sample"""
+        
+        with self._lock:
+            self._buffers.setdefault((client_id, metric_name), []).append(
+                (to_epoch_us(timestamp), float(value))
+            )
+    
+    def flush(self, fsync: bool = False) -> int:
+        """Write buffered samples to each series' active chunk; returns samples written"""
+        
+        with self._lock:
+            buffers, self._buffers = self._buffers, {}
+            written = 0
+            
+            for (client_id, metric_name), samples in buffers.items():
+                series_dir = self._series_dir(client_id, metric_name)
+                series_dir.mkdir(parents=True, exist_ok=True)
+                active_path = series_dir / ACTIVE_CHUNK
+                pending = np.array(samples, dtype=SAMPLE_DTYPE)
+                
+                # Fill the active chunk up to chunk_size, seal it, continue in a new one
+                while len(pending):
+                    active_count = self._whole_samples(active_path)
+                    chunk_count = min(self.chunk_size - active_count, len(pending))
+                    
+                    if chunk_count > 0:
+                        with open(active_path, 'ab') as f:
+                            f.write(pending[:chunk_count].tobytes())
+                            if fsync:
+                                f.flush()
+                                os.fsync(f.fileno())
+                        written += chunk_count
+                        pending = pending[chunk_count:]
+                    
+                    if active_count + chunk_count >= self.chunk_size:
+                        self._seal(active_path)
+            
+            return written
+    
+    @staticmethod
+    def _whole_samples(active_path: Path) -> int:
+        """Samples in an active chunk, dropping a partially written trailing sample"""
+        
+        if not active_path.exists():
+            return 0
+        size = active_path.stat().st_size
+        count, torn = divmod(size, SAMPLE_DTYPE.itemsize)
+        if torn:
+            os.truncate(active_path, size - torn)
+        return count
+    
+    def _seal(self, active_path: Path):
+        """Rename a full active chunk to its time-span name with the series' next sequence number"""
+        
+        samples = np.fromfile(active_path, dtype=SAMPLE_DTYPE)
+        seq = max(
+            (self._chunk_seq(chunk) for chunk in active_path.parent.iterdir() if self._is_chunk(chunk)),
+            default=0
+        ) + 1
+        sealed = active_path.with_name(f"{samples['ts'].min()}_{samples['ts'].max()}_{seq}.bin")
+        os.replace(active_path, sealed)
+    
+    def clear(self):
+        """Drop every series and all buffered samples"""
+        
+        with self._lock:
+            self._buffers = {}
+            for client_dir in self.root.iterdir():
+                if client_dir.is_dir():
+                    shutil.rmtree(client_dir)
+    
+    def compact(self, older_than) -> int:
+        """Compress sealed chunks whose samples all predate ``older_than``; returns chunks compacted
+        
+        Not run by the store itself; the warehouse's ``run_maintenance`` calls it.
+        """
+        
+        cutoff = to_epoch_us(older_than)
+        compacted = 0
+        
+        with self._lock:
+            for chunk in self.root.glob("*/*/*.bin"):
+                if chunk.name == ACTIVE_CHUNK or self._chunk_span(chunk)[1] >= cutoff:
+                    continue
+                
+                samples = np.fromfile(chunk, dtype=SAMPLE_DTYPE)
+                samples = samples[np.argsort(samples['ts'], kind='stable')]
+                # Timestamps are regular-ish, so deltas compress far better than absolutes
+                deltas = np.diff(samples['ts'], prepend=samples['ts'][:1])
+                deltas[0] = samples['ts'][0]
+                # Written aside and renamed; readers skip a .bin whose .npz exists
+                compacted_path = chunk.with_suffix(".npz")
+                tmp_path = chunk.with_suffix(".npz.tmp")
+                with open(tmp_path, 'wb') as f:
+                    np.savez_compressed(f, ts_delta=deltas, value=samples['value'])
+                os.replace(tmp_path, compacted_path)
+                chunk.unlink()
+                compacted += 1
+        
+        return compacted
+    
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+    
+    @staticmethod
+    def _is_chunk(chunk: Path) -> bool:
+        """Sealed or compacted chunk (not the active chunk or a compaction temp file)"""
+        return chunk.suffix in (".bin", ".npz") and chunk.name != ACTIVE_CHUNK
+    
+    @staticmethod
+    def _chunk_span(chunk: Path) -> Tuple[int, int]:
+        first, last = chunk.stem.split('_')[:2]
+        return int(first), int(last)
+    
+    @staticmethod
+    def _chunk_seq(chunk: Path) -> int:
+        return int(chunk.stem.split('_')[2])
+    
+    @staticmethod
+    def _load_chunk(chunk: Path) -> np.ndarray:
+        if chunk.suffix == ".npz":
+            with np.load(chunk) as data:
+                samples = np.empty(len(data['value']), dtype=SAMPLE_DTYPE)
+                samples['ts'] = np.cumsum(data['ts_delta'])
+                samples['value'] = data['value']
+            return samples
+        
+        count = chunk.stat().st_size // SAMPLE_DTYPE.itemsize
+        if count == 0:
+            return np.empty(0, dtype=SAMPLE_DTYPE)
+        return np.memmap(chunk, dtype=SAMPLE_DTYPE, mode='r', shape=(count,))
+    
+    def _read(self, client_id: str, metric_name: str,
+              start_us: Optional[int], end_us: Optional[int]) -> np.ndarray:
+        """Samples with start <= ts < end, sorted by time"""
+        
+        series_dir = self._series_dir(client_id, metric_name)
+        parts = []
+        
+        with self._lock:
+            chunks = []
+            if series_dir.exists():
+                entries = list(series_dir.iterdir())
+                compacted = {chunk.stem for chunk in entries if chunk.suffix == ".npz"}
+                for chunk in entries:
+                    if chunk.name == ACTIVE_CHUNK:
+                        chunks.append(chunk)
+                        continue
+                    if not self._is_chunk(chunk) or (chunk.suffix == ".bin" and chunk.stem in compacted):
+                        continue
+                    first, last = self._chunk_span(chunk)
+                    if (end_us is not None and first >= end_us) or (start_us is not None and last < start_us):
+                        continue
+                    chunks.append(chunk)
+            loaded = [self._load_chunk(chunk) for chunk in chunks]
+            
+            buffered = self._buffers.get((client_id, metric_name))
+            if buffered:
+                loaded.append(np.array(buffered, dtype=SAMPLE_DTYPE))
+        
+        for samples in loaded:
+            mask = np.ones(len(samples), dtype=bool)
+            if start_us is not None:
+                mask &= samples['ts'] >= start_us
+            if end_us is not None:
+                mask &= samples['ts'] < end_us
+            parts.append(np.asarray(samples[mask]))
+        
+        if not parts:
+            return np.empty(0, dtype=SAMPLE_DTYPE)
+        
+        samples = np.concatenate(parts)
+        return samples[np.argsort(samples['ts'], kind='stable')]
+    
+    def range(self, client_id: str, metric_name: str,
+              start=None, end=None) -> Tuple[np.ndarray, np.ndarray]:
+        """(timestamps in epoch microseconds, values) for start <= ts < end"""
+        
+        samples = self._read(
+            client_id, metric_name,
+            to_epoch_us(start) if start is not None else None,
+            to_epoch_us(end) if end is not None else None
+        )
+        return samples['ts'], samples['value']
+    
+    def aggregate(self, client_id: str, metric_name: str, start=None, end=None) -> Dict[str, float]:
+        """count/min/max/mean/sum/last over a time range"""
+        
+        _, values = self.range(client_id, metric_name, start, end)
+        if not len(values):
+            return {'count': 0}
+        
+        return {
+            'count': int(len(values)),
+            'min': float(values.min()),
+            'max': float(values.max()),
+            'mean': float(values.mean()),
+            'sum': float(values.sum()),
+            'last': float(values[-1])
+        }
+    
+    def downsample(self, client_id: str, metric_name: str, start, end,
+                   bucket_seconds: float, agg: str = 'mean') -> Tuple[np.ndarray, np.ndarray]:
+        """Bucketed series: (bucket start timestamps, aggregated values); empty buckets are omitted"""
+        
+        start_us = to_epoch_us(start)
+        ts, values = self.range(client_id, metric_name, start, end)
+        if not len(values):
+            return ts, values
+        
+        bucket_us = int(bucket_seconds * 1_000_000)
+        buckets = (ts - start_us) // bucket_us
+        bucket_ids, offsets, counts = np.unique(buckets, return_index=True, return_counts=True)
+        
+        if agg == 'mean':
+            aggregated = np.add.reduceat(values, offsets) / counts
+        elif agg == 'sum':
+            aggregated = np.add.reduceat(values, offsets)
+        elif agg == 'min':
+            aggregated = np.minimum.reduceat(values, offsets)
+        elif agg == 'max':
+            aggregated = np.maximum.reduceat(values, offsets)
+        elif agg == 'count':
+            aggregated = counts.astype(np.float64)
+        elif agg == 'last':
+            aggregated = values[offsets + counts - 1]
+        else:
+            raise ValueError(f"Unknown aggregation: {agg}")
+        
+        return start_us + bucket_ids * bucket_us, aggregated
+    
+    def series(self) -> List[Tuple[str, str]]:
+        """(client_id, metric_name) of every series on disk"""
+        
+        return sorted(
+            (unquote(metric_dir.parent.name), unquote(metric_dir.name))
+            for metric_dir in self.root.glob("*/*") if metric_dir.is_dir()
+        )
+    
+    def metrics(self, client_id: str) -> List[str]:
+        """Metric names stored (or buffered) for a client"""
+        
+        client_dir = self.root / quote(client_id, safe='')
+        names = {unquote(path.name) for path in client_dir.iterdir()} if client_dir.exists() else set()
+        with self._lock:
+            names.update(metric for client, metric in self._buffers if client == client_id)
+        return sorted(names)
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Apply pending memory database migrations to every tenant
+Run before deploying so large tenants don't pay for backfills on their first request
+"""
+
+import argparse
+import logging
+import sys
+import time
+from pathlib import Path
+
+# Add repository root to path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from core.memory.connection_pool import get_connection_pool, close_connection_pool
+from core.memory.migrations import apply_migrations, get_schema_version, MEMORY_MIGRATIONS
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--data-dir", default="data", help="directory holding memory_<company>.db files")
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    
+    latest = MEMORY_MIGRATIONS[-1][0]
+    databases = sorted(Path(args.data_dir).glob("memory_*.db"))
+    print(f"Found {len(databases)} tenant databases (latest schema version {latest})")
+    
+    for db_path in databases:
+        company_id = db_path.stem[len("memory_"):]
+        pool = get_connection_pool(str(db_path))
+        before = get_schema_version(pool)
+        
+        if before >= latest:
+            print(f"  {company_id}: up to date (v{before})")
+            close_connection_pool(str(db_path))
+            continue
+        
+        started = time.perf_counter()
+        apply_migrations(pool)
+        elapsed = time.perf_counter() - started
+        
+        print(f"  {company_id}: v{before} -> v{get_schema_version(pool)} in {elapsed:.1f}s")
+        close_connection_pool(str(db_path))
+
+if __name__ == "__main__":
+    main()
@@ -42,6 +42,7 @@ async def test_platform():
         from data.warehouse.data_warehouse import DailyOperationsManager
         data_manager = DailyOperationsManager()
         await asyncio.sleep(0.1) # Allow background initialization to start
+        await data_manager.shutdown()
         print("✅ Data warehouse initialized successfully")
     except Exception as e:
         print(f"❌ Data warehouse failed: {e}")
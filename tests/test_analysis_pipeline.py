@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Document analysis pipeline
+Process-pool jobs behind a bounded queue, and background document analysis
+"""
+
+import asyncio
+import os
+import time
+
+import pytest
+
+from core.memory.analysis_pipeline import AnalysisPipeline
+
+def worker_pid(delay: float = 0.0) -> int:
+    time.sleep(delay)
+    return os.getpid()
+
+def fail(message: str):
+    raise ValueError(message)
+
+def collecting(pipeline, results):
+    async def on_complete(result):
+        results.append(("ok", result))
+    
+    async def on_error(error):
+        results.append(("error", str(error)))
+    
+    return on_complete, on_error
+
+class TestAnalysisPipeline:
+    """Jobs run off the event loop and report through their callbacks"""
+    
+    def test_results_and_errors_reach_callbacks(self):
+        results = []
+        
+        async def run():
+            pipeline = AnalysisPipeline(max_workers=2)
+            await pipeline.submit(worker_pid, (), *collecting(pipeline, results))
+            await pipeline.submit(fail, ("corrupt pdf",), *collecting(pipeline, results))
+            await pipeline.shutdown()
+        
+        asyncio.run(run())
+        
+        assert sorted(kind for kind, _ in results) == ["error", "ok"]
+        assert ("error", "corrupt pdf") in results
+        assert all(value != os.getpid() for kind, value in results if kind == "ok")
+    
+    def test_failing_callback_does_not_stop_the_consumer(self):
+        results = []
+        
+        async def broken(result):
+            raise RuntimeError("database locked")
+        
+        async def run():
+            pipeline = AnalysisPipeline(max_workers=1)
+            on_complete, on_error = collecting(pipeline, results)
+            await pipeline.submit(worker_pid, (), broken, on_error)
+            await pipeline.submit(worker_pid, (), on_complete, on_error)
+            await pipeline.shutdown()
+        
+        asyncio.run(run())
+        assert [kind for kind, _ in results] == ["ok"]
+    
+    def test_submit_waits_while_the_queue_is_full(self):
+        async def run():
+            pipeline = AnalysisPipeline(max_workers=1, max_pending=1)
+            callbacks = collecting(pipeline, [])
+            await pipeline.submit(worker_pid, (0.5,), *callbacks)
+            await asyncio.sleep(0.05)  # the consumer takes the first job
+            await pipeline.submit(worker_pid, (), *callbacks)
+            blocked = asyncio.create_task(pipeline.submit(worker_pid, (), *callbacks))
+            await asyncio.sleep(0.1)
+            was_blocked = not blocked.done() and pipeline.pending == 1
+            await blocked
+            await pipeline.shutdown()
+            return was_blocked
+        
+        assert asyncio.run(run())
+
+class TestBackgroundDocumentAnalysis:
+    """Uploads return before analysis; the row is updated when it finishes"""
+    
+    @pytest.fixture
+    def memory(self, tmp_path, monkeypatch):
+        pytest.importorskip("fastapi")
+        from core.memory.analysis_pipeline import shutdown_analysis_pipeline
+        from core.memory.connection_pool import close_all_pools
+        from core.memory.universal_memory_system import UniversalMemorySystem
+        
+        monkeypatch.chdir(tmp_path)
+        yield asyncio.run(UniversalMemorySystem("analysis-test").initialize())
+        asyncio.run(shutdown_analysis_pipeline())
+        close_all_pools()
+    
+    def test_pending_then_complete(self, memory):
+        async def run():
+            metadata = await memory.upload_document(
+                b"Lockout procedure for hazard control on press 4", "press_4.txt", "w1", "safety",
+                custom_tags=["press"], background_analysis=True
+            )
+            pending = await memory.get_analysis_status(metadata.document_id)
+            await memory.analysis_pipeline.join()
+            return metadata, pending, await memory.get_analysis_status(metadata.document_id)
+        
+        metadata, pending, done = asyncio.run(run())
+        
+        assert metadata.analysis_status == "pending" and pending["analysis_status"] == "pending"
+        assert done["analysis_status"] == "complete" and done["error"] is None
+        category, tags = memory.pool.read_blocking(lambda conn: conn.execute(
+            "SELECT ai_category, ai_tags FROM documents WHERE document_id = ?", (metadata.document_id,)
+        ).fetchone())
+        assert category == "safety_document" and "press" in tags
+    
+    def test_pending_analysis_resumes_after_restart(self, memory, monkeypatch):
+        from core.memory.analysis_pipeline import get_analysis_pipeline, shutdown_analysis_pipeline
+        from core.memory.connection_pool import close_all_pools
+        from core.memory.universal_memory_system import UniversalMemorySystem, resume_pending_analysis
+        
+        async def crashed(self, pending, ai_prompt=None):
+            pass
+        
+        # The process stops before the queued analysis runs
+        with monkeypatch.context() as patch:
+            patch.setattr(UniversalMemorySystem, "_schedule_analysis", crashed)
+            metadata = asyncio.run(memory.upload_document(
+                b"Quality inspection checklist for line 3", "line_3.txt", "w1", "quality",
+                background_analysis=True
+            ))
+        asyncio.run(shutdown_analysis_pipeline())
+        close_all_pools()
+        
+        async def restart():
+            requeued = await resume_pending_analysis()
+            await get_analysis_pipeline().join()
+            memory_system = await UniversalMemorySystem("analysis-test").initialize()
+            return requeued, await memory_system.get_analysis_status(metadata.document_id)
+        
+        requeued, status = asyncio.run(restart())
+        assert requeued == 1
+        assert status["analysis_status"] == "complete"
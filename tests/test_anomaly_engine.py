@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Anomaly engine
+Streaming and batch detectors agree; dashboards read streaming events
+"""
+
+import asyncio
+import threading
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from data.warehouse.anomaly_engine import DETECTORS, AnomalyEngine, AnomalyEvent
+from data.warehouse.data_warehouse import GringoDataWarehouse
+from data.warehouse.timeseries_store import to_epoch_us
+
+START = datetime(2024, 3, 18)
+
+def series(count=200, spike_at=150):
+    values = np.where(np.arange(count) % 2 == 0, 9.0, 11.0)
+    values[spike_at] = 30.0
+    timestamps = [START + timedelta(minutes=15 * n) for n in range(count)]
+    return timestamps, values
+
+class TestAnomalyEngine:
+    """Per-sample updates and whole-series scoring"""
+    
+    def test_streaming_scores_match_batch_scores(self):
+        timestamps, values = series()
+        streaming = AnomalyEngine(window=20, seasonal_buckets=4)
+        batch = streaming.score_series(np.array([to_epoch_us(ts) for ts in timestamps]), values)
+        
+        for n, (ts, value) in enumerate(zip(timestamps, values)):
+            event = streaming.update("c1", "mttr", ts.isoformat(), value)
+            for name in DETECTORS:
+                if event is not None and name in event.scores:
+                    assert event.scores[name] == pytest.approx(batch[name][n], rel=1e-6, abs=1e-6)
+        
+        events = streaming.recent_events("c1")
+        assert [event.value for event in events] == [30.0]
+        assert events[0].score > streaming.threshold
+    
+    def test_large_offset_keeps_scores(self):
+        timestamps, values = series()
+        # Around 1e7 with a spread of 0.01: z-scores do not change under a shift and scale
+        offset = 1e7 + (values - 10.0) / 100
+        ts = np.array([to_epoch_us(t) for t in timestamps])
+        engine = AnomalyEngine(window=20, seasonal_buckets=4)
+        expected = engine.score_series(ts, values)
+        scores = engine.score_series(ts, offset)
+        
+        for name in DETECTORS:
+            np.testing.assert_allclose(scores[name], expected[name], rtol=1e-4, atol=1e-4)
+        
+        for ts_, value in zip(timestamps, offset):
+            engine.update("c1", "mttr", ts_.isoformat(), value)
+        events = engine.recent_events("c1")
+        assert [event.value for event in events] == [offset[150]]
+        assert events[0].scores['rolling_zscore'] == pytest.approx(expected['rolling_zscore'][150], rel=1e-4)
+    
+    def test_detect_batch_only_flags_from_start(self):
+        timestamps, values = series()
+        engine = AnomalyEngine(window=20)
+        ts = np.array([to_epoch_us(t) for t in timestamps])
+        
+        assert [event.value for event in engine.detect_batch("c1", "mttr", ts, values)] == [30.0]
+        assert engine.detect_batch("c1", "mttr", ts, values, start_us=int(ts[151])) == []
+    
+    def test_record_events_keeps_time_order(self):
+        engine = AnomalyEngine(max_events_per_client=3)
+        engine.record_events("c1", [AnomalyEvent("c1", "mttr", f"2024-03-18T0{n}:00:00", 1.0, 5.0) for n in (4, 1)])
+        engine.record_events("c1", [AnomalyEvent("c1", "mttr", "2024-03-18T02:00:00", 1.0, 5.0),
+                                    AnomalyEvent("c1", "mttr", "2024-03-18T05:00:00", 1.0, 5.0)])
+        
+        # The oldest event drops out of the bounded log
+        assert [event.timestamp[11:13] for event in engine.recent_events("c1")] == ["02", "04", "05"]
+
+class TestDashboardAnomalies:
+    """Today's anomalies come from the streaming event log"""
+    
+    def test_samples_before_startup_are_backfilled_once(self, tmp_path, monkeypatch):
+        async def anomalies():
+            warehouse = GringoDataWarehouse(str(tmp_path / "warehouse"))
+            await warehouse._storage_ready
+            
+            now = datetime.now()
+            day_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+            _, values = series(count=60, spike_at=50)
+            for n, value in enumerate(values):
+                warehouse.timeseries.append("c1", "mttr", day_start + timedelta(microseconds=n), value)
+            warehouse.timeseries.flush()
+            warehouse.anomaly_streaming_since = now
+            
+            batch_runs = []
+            detect = warehouse.detect_metric_anomalies
+            
+            async def counted(*args, **kwargs):
+                batch_runs.append(args)
+                return await detect(*args, **kwargs)
+            
+            monkeypatch.setattr(warehouse, "detect_metric_anomalies", counted)
+            results = await asyncio.gather(*(warehouse.todays_anomalies("c1") for _ in range(3)))
+            results.append(await warehouse.todays_anomalies("c1"))
+            await warehouse.close()
+            return batch_runs, results
+        
+        batch_runs, results = asyncio.run(anomalies())
+        
+        assert len(batch_runs) == 1
+        assert all([event.value for event in events] == [30.0] for events in results)
+    
+    def test_streaming_events_without_batch_scoring(self, tmp_path, monkeypatch):
+        async def anomalies():
+            warehouse = GringoDataWarehouse(str(tmp_path / "warehouse"))
+            await warehouse._storage_ready
+            # Started before today: every sample of the day went through the detectors
+            warehouse.anomaly_streaming_since = datetime.now() - timedelta(days=1)
+            
+            async def no_batch(*args, **kwargs):
+                raise AssertionError("dashboard batch-scored the day")
+            
+            monkeypatch.setattr(warehouse, "detect_metric_anomalies", no_batch)
+            timestamps, values = series(count=60, spike_at=50)
+            now = datetime.now()
+            for n, value in enumerate(values):
+                warehouse.anomaly_engine.update("c1", "mttr", (now + timedelta(microseconds=n)).isoformat(), value)
+            events = await warehouse.todays_anomalies("c1")
+            await warehouse.close()
+            return events
+        
+        assert [event.value for event in asyncio.run(anomalies())] == [30.0]
+    
+    def test_new_series_warmed_off_the_event_loop(self, tmp_path):
+        async def detect():
+            warehouse = GringoDataWarehouse(str(tmp_path / "warehouse"))
+            await warehouse._storage_ready
+            loop_thread = threading.get_ident()
+            loader_threads = []
+            
+            def loader(client_id, metric_name):
+                loader_threads.append(threading.get_ident())
+                return np.array([], dtype=np.int64), np.array([])
+            
+            warehouse.anomaly_engine.history_loader = loader
+            data = {'mtbf': 100.0, 'mttr': 2.0, 'maintenance_cost': 50.0}
+            await warehouse._detect_anomalies('maintenance_records', data, "c1")
+            await warehouse._detect_anomalies('maintenance_records', data, "c1")
+            await warehouse.close()
+            return loop_thread, loader_threads
+        
+        loop_thread, loader_threads = asyncio.run(detect())
+        
+        # One load per new series, none of them on the loop
+        assert len(loader_threads) == 3
+        assert loop_thread not in loader_threads
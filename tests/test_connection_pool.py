@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+SQLite connection pool
+Group-committed writes, per-job savepoints and pooled reads
+"""
+
+import asyncio
+import sqlite3
+
+import pytest
+
+from core.memory.connection_pool import SQLiteConnectionPool
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = SQLiteConnectionPool(tmp_path / "pool.db")
+    pool.write_blocking(lambda conn: conn.execute("CREATE TABLE items (name TEXT PRIMARY KEY)"))
+    yield pool
+    pool.close()
+
+def insert(conn, name):
+    conn.execute("INSERT INTO items (name) VALUES (?)", (name,))
+    return name
+
+def names(conn):
+    return sorted(row[0] for row in conn.execute("SELECT name FROM items"))
+
+class TestConnectionPool:
+    """Writes go through one writer thread; reads see committed data"""
+    
+    def test_concurrent_writes_are_all_committed(self, pool):
+        async def write_all():
+            return await asyncio.gather(*(pool.write(insert, f"item-{i}") for i in range(200)))
+        
+        assert len(asyncio.run(write_all())) == 200
+        assert len(pool.read_blocking(names)) == 200
+    
+    def test_failing_job_only_rolls_back_itself(self, pool):
+        futures = [
+            pool.submit_write(insert, "a"),
+            pool.submit_write(insert, "a"),  # primary key violation
+            pool.submit_write(insert, "b")
+        ]
+        
+        assert futures[0].result() == "a"
+        with pytest.raises(sqlite3.IntegrityError):
+            futures[1].result()
+        assert futures[2].result() == "b"
+        assert pool.read_blocking(names) == ["a", "b"]
+    
+    def test_wal_journal_mode(self, pool):
+        assert pool.read_blocking(lambda conn: conn.execute("PRAGMA journal_mode").fetchone()[0]) == "wal"
+    
+    def test_close_flushes_queued_writes(self, tmp_path):
+        pool = SQLiteConnectionPool(tmp_path / "flush.db")
+        pool.submit_write(lambda conn: conn.execute("CREATE TABLE items (name TEXT PRIMARY KEY)"))
+        for i in range(50):
+            pool.submit_write(insert, f"item-{i}")
+        pool.close()
+        
+        conn = sqlite3.connect(tmp_path / "flush.db")
+        assert conn.execute("SELECT COUNT(*) FROM items").fetchone()[0] == 50
+        conn.close()
+        with pytest.raises(RuntimeError):
+            pool.submit_write(insert, "late")
+    
+    def test_after_commit_callbacks_follow_committed_jobs(self, pool):
+        seen = []
+        
+        def insert_with_callback(conn, name, fail=False):
+            insert(conn, name)
+            pool.after_commit(lambda conn: seen.append(names(conn)))
+            if fail:
+                raise ValueError(name)
+        
+        futures = [
+            pool.submit_write(insert_with_callback, "a"),
+            pool.submit_write(insert_with_callback, "b", True)
+        ]
+        
+        assert futures[0].result() is None
+        with pytest.raises(ValueError):
+            futures[1].result()
+        # Only the committed job's callback ran, and it saw the committed rows
+        assert seen == [["a"]]
+        with pytest.raises(RuntimeError):
+            pool.after_commit(lambda conn: None)
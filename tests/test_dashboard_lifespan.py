@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Dashboard lifespan
+Every shutdown step runs, even when an earlier one fails
+"""
+
+import asyncio
+import importlib
+
+import pytest
+
+@pytest.fixture
+def dashboard(tmp_path, monkeypatch):
+    pytest.importorskip("fastapi")
+    # API modules open their stores in the working directory on import
+    monkeypatch.chdir(tmp_path)
+    return importlib.import_module("dashboard")
+
+class TestLifespan:
+    """Shutdown steps are independent of each other"""
+    
+    def test_failing_step_does_not_skip_the_rest(self, dashboard, monkeypatch):
+        calls = []
+        
+        def step(name, error=None):
+            async def run():
+                calls.append(name)
+                if error:
+                    raise error
+            return run
+        
+        async def no_requeue():
+            return 0
+        
+        monkeypatch.setattr(dashboard, "start_background_sync", step("start sync"))
+        monkeypatch.setattr(dashboard, "start_operations_manager", step("start operations"))
+        monkeypatch.setattr(dashboard, "resume_pending_analysis", no_requeue)
+        monkeypatch.setattr(dashboard, "stop_operations_manager", step("stop operations", RuntimeError("flush failed")))
+        monkeypatch.setattr(dashboard, "stop_background_sync", step("stop sync"))
+        monkeypatch.setattr(dashboard.universal_connector, "aclose", step("close connector"))
+        monkeypatch.setattr(dashboard, "close_memory_pools", step("close memory", OSError("disk gone")))
+        
+        async def run():
+            async with dashboard.lifespan(None):
+                calls.append("serving")
+        
+        with pytest.raises(OSError):
+            asyncio.run(run())
+        
+        assert calls == [
+            "start sync", "start operations", "serving",
+            "stop operations", "stop sync", "close connector", "close memory"
+        ]
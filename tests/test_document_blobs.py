@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Content-addressed document blobs
+Per-upload analysis on deduplicated content, and blob reuse racing blob release
+"""
+
+import asyncio
+import sqlite3
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+from core.memory.analysis_pipeline import shutdown_analysis_pipeline
+from core.memory.connection_pool import close_all_pools
+from core.memory.universal_memory_system import UniversalMemorySystem
+
+NOTES = b"Weekly notes on plant operations and shift handover."
+
+@pytest.fixture
+def memory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    yield asyncio.run(UniversalMemorySystem("blobs-test").initialize())
+    asyncio.run(shutdown_analysis_pipeline())
+    close_all_pools()
+
+def blob_refs(memory, content_hash):
+    return memory.pool.read_blocking(lambda conn: conn.execute(
+        "SELECT ref_count, pending_refs FROM document_blobs WHERE content_hash = ?", (content_hash,)
+    ).fetchone())
+
+class TestDeduplicatedAnalysis:
+    """Identical bytes share the content analysis, not the first uploader's filename fields"""
+    
+    def test_filename_fields_are_per_upload(self, memory):
+        async def upload_twice():
+            first = await memory.upload_document(NOTES, "inspection_form.txt", "w1", "quality")
+            second = await memory.upload_document(NOTES, "pump_manual.txt", "w2", "maintenance")
+            return first, second
+        
+        first, second = asyncio.run(upload_twice())
+        
+        assert first.content_hash == second.content_hash
+        assert first.ai_category == "form_template"
+        assert second.ai_category == "general_document"
+        assert "manual" in second.ai_tags and "manual" not in first.ai_tags
+        assert "pump_manual.txt" in second.ai_summary
+        
+        cached = memory.pool.read_blocking(lambda conn: conn.execute(
+            "SELECT analysis FROM document_blobs WHERE content_hash = ?", (first.content_hash,)
+        ).fetchone()[0])
+        assert "summary" not in cached and "form_template" not in cached
+    
+    def test_content_category_wins_over_filename(self, memory):
+        metadata = asyncio.run(memory.upload_document(
+            b"Lockout procedure for hazard control", "lockout_form.txt", "w1", "safety"
+        ))
+        assert metadata.ai_category == "safety_document"
+
+class TestBlobLifecycle:
+    """Reuse and release of a blob are decided on the pool writer"""
+    
+    def test_delete_racing_reupload_keeps_blob(self, memory):
+        async def race():
+            for _ in range(20):
+                existing = await memory.upload_document(NOTES, "notes.txt", "w1", "ops")
+                deleted, reuploaded = await asyncio.gather(
+                    memory.delete_document(existing.document_id),
+                    memory.upload_document(NOTES, "notes.txt", "w1", "ops")
+                )
+                assert deleted
+                assert memory._blob_path_for(reuploaded.content_hash).read_bytes() == NOTES
+                assert blob_refs(memory, reuploaded.content_hash) == (1, 0)
+                await memory.delete_document(reuploaded.document_id)
+        
+        asyncio.run(race())
+    
+    def test_last_delete_unlinks_blob(self, memory):
+        async def upload_and_delete():
+            first = await memory.upload_document(NOTES, "a.txt", "w1", "ops")
+            second = await memory.upload_document(NOTES, "b.txt", "w1", "ops")
+            await memory.delete_document(first.document_id)
+            assert memory._blob_path_for(first.content_hash).exists()
+            await memory.delete_document(second.document_id)
+            return first.content_hash
+        
+        content_hash = asyncio.run(upload_and_delete())
+        assert not memory._blob_path_for(content_hash).exists()
+        assert blob_refs(memory, content_hash) is None
+    
+    def test_failed_upload_releases_reservation(self, memory, monkeypatch):
+        kept = asyncio.run(memory.upload_document(NOTES, "kept.txt", "w1", "ops"))
+        
+        def failing_insert(conn, documents, blob_analyses=None):
+            raise sqlite3.IntegrityError("simulated")
+        monkeypatch.setattr(memory, "_insert_documents", failing_insert)
+        
+        with pytest.raises(sqlite3.IntegrityError):
+            asyncio.run(memory.upload_document(NOTES, "dup.txt", "w1", "ops"))
+        with pytest.raises(sqlite3.IntegrityError):
+            asyncio.run(memory.upload_document(b"never stored", "new.txt", "w1", "ops"))
+        
+        assert blob_refs(memory, kept.content_hash) == (1, 0)
+        assert memory._blob_path_for(kept.content_hash).exists()
+        assert list((memory.blob_path / "tmp").iterdir()) == []
+        stored = [path for path in memory.blob_path.rglob("*") if path.is_file()]
+        assert stored == [memory._blob_path_for(kept.content_hash)]
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Integration HTTP pool
+Retries for idempotent requests only, with backoff and Retry-After
+"""
+
+import asyncio
+
+import httpx
+import pytest
+
+from core.integrations.http_pool import HostClientPool
+
+URL = "http://erp.example/api/orders"
+
+def run(handler, method, idempotent=None, headers=None):
+    """Send one request through a pool whose host client uses ``handler``; (response or error, attempts)"""
+    
+    attempts = []
+    
+    def counting(request):
+        attempts.append(request)
+        return handler(request, len(attempts))
+    
+    async def send():
+        pool = HostClientPool(max_retries=3, backoff_base=0, backoff_max=0)
+        pool.client(URL)
+        pool._clients[pool.host_key(URL)] = httpx.AsyncClient(transport=httpx.MockTransport(counting))
+        try:
+            return await pool.request(method, URL, idempotent=idempotent, headers=headers)
+        except httpx.HTTPError as e:
+            return e
+        finally:
+            await pool.aclose()
+    
+    return asyncio.run(send()), len(attempts)
+
+def unavailable_then_ok(request, attempt):
+    return httpx.Response(503 if attempt < 3 else 200)
+
+def read_error(request, attempt):
+    raise httpx.ReadError("connection reset", request=request)
+
+def connect_error_then_ok(request, attempt):
+    if attempt == 1:
+        raise httpx.ConnectError("refused", request=request)
+    return httpx.Response(201)
+
+class TestRetries:
+    """What a failed request may be sent again for"""
+    
+    @pytest.mark.parametrize("method", ["GET", "PUT", "DELETE"])
+    def test_idempotent_methods_retry_transient_statuses(self, method):
+        response, attempts = run(unavailable_then_ok, method)
+        assert response.status_code == 200 and attempts == 3
+    
+    def test_post_is_not_retried(self):
+        response, attempts = run(unavailable_then_ok, "POST")
+        assert response.status_code == 503 and attempts == 1
+        
+        error, attempts = run(read_error, "POST")
+        assert isinstance(error, httpx.ReadError) and attempts == 1
+    
+    def test_post_retried_when_marked_idempotent(self):
+        response, attempts = run(unavailable_then_ok, "POST", headers={"Idempotency-Key": "order-17"})
+        assert response.status_code == 200 and attempts == 3
+        
+        response, attempts = run(unavailable_then_ok, "POST", idempotent=True)
+        assert response.status_code == 200 and attempts == 3
+    
+    def test_explicitly_non_idempotent_put_is_not_retried(self):
+        response, attempts = run(unavailable_then_ok, "PUT", idempotent=False)
+        assert response.status_code == 503 and attempts == 1
+    
+    def test_unsent_post_is_retried(self):
+        # A refused connection never delivered the request
+        response, attempts = run(connect_error_then_ok, "POST")
+        assert response.status_code == 201 and attempts == 2
+    
+    def test_retries_are_bounded(self):
+        error, attempts = run(read_error, "GET")
+        assert isinstance(error, httpx.ReadError) and attempts == 4
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Learning scheduler
+Volume-triggered learning passes, bounded workers and per-tenant lag
+"""
+
+import asyncio
+import time
+
+from data.warehouse.learning_scheduler import LearningScheduler
+
+class FakePartitions:
+    def __init__(self):
+        self.pending = {}
+    
+    def changes_since(self, watermarks):
+        counts, self.pending = self.pending, {}
+        return counts, watermarks
+
+class FakeWarehouse:
+    def __init__(self, fail=()):
+        self.partitions = FakePartitions()
+        self.learning_trigger_rows = 10
+        self.passes = []
+        self.fail = set(fail)
+    
+    async def run_learning_pass(self, client_id):
+        self.passes.append(client_id)
+        if client_id in self.fail:
+            raise RuntimeError("learning failed")
+        return {'rows_per_second': 100.0}
+
+def run_poll(scheduler):
+    async def poll_and_drain():
+        scheduler._queue = asyncio.PriorityQueue()
+        await scheduler.poll()
+        worker = asyncio.create_task(scheduler._worker())
+        while not scheduler._queue.empty():
+            await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        worker.cancel()
+        await asyncio.gather(worker, return_exceptions=True)
+    
+    asyncio.run(poll_and_drain())
+
+class TestLearningScheduler:
+    """Tenants run when their interval elapses or enough rows are pending"""
+    
+    def make_scheduler(self, warehouse, *clients):
+        scheduler = LearningScheduler(warehouse, max_workers=1, interval_seconds=3600)
+        for client_id in clients:
+            scheduler.add_client(client_id)
+            scheduler.tenants[client_id].next_run = time.time() + 3600
+        return scheduler
+    
+    def test_volume_trigger_runs_pass_and_clears_lag(self):
+        warehouse = FakeWarehouse()
+        scheduler = self.make_scheduler(warehouse, "busy", "quiet")
+        warehouse.partitions.pending = {"busy": 25, "quiet": 3, "unregistered": 50}
+        
+        run_poll(scheduler)
+        
+        assert warehouse.passes == ["busy"]
+        lag = scheduler.lag_metrics()
+        assert lag["busy"]["pending_rows"] == 0 and lag["busy"]["runs"] == 1
+        assert lag["quiet"]["pending_rows"] == 3 and lag["quiet"]["lag_seconds"] >= 0
+        assert "unregistered" not in lag
+    
+    def test_failed_pass_waits_for_retry_delay(self):
+        warehouse = FakeWarehouse(fail={"busy"})
+        scheduler = self.make_scheduler(warehouse, "busy")
+        warehouse.partitions.pending = {"busy": 25}
+        
+        run_poll(scheduler)
+        run_poll(scheduler)
+        
+        # Rows stay pending, but the volume trigger does not hammer a failing tenant
+        assert warehouse.passes == ["busy"]
+        lag = scheduler.lag_metrics("busy")["busy"]
+        assert lag["failures"] == 1 and lag["pending_rows"] == 25
+        assert lag["last_error"] == "learning failed"
+    
+    def test_lag_of_unknown_client_is_zero(self):
+        scheduler = self.make_scheduler(FakeWarehouse())
+        
+        lag = scheduler.lag_metrics("new-client")
+        
+        assert lag["new-client"]["pending_rows"] == 0
+        assert lag["new-client"]["lag_seconds"] == 0.0
+        assert lag["new-client"]["runs"] == 0
+        assert scheduler.tenants == {}
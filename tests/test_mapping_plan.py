@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Integration mapping plans
+Compiled field mappings and their per-connector cache
+"""
+
+import asyncio
+
+from core.integrations.mapping_plan import compile_mapping_plan, mapping_signature
+from core.integrations.universal_connector import DataMapping, UniversalConnector
+
+MAPPINGS = [
+    DataMapping("item_id", "quality", "product_id"),
+    DataMapping("cost", "finance", "unit_cost", "calculate"),
+    DataMapping("status", "operations", "machine_status", "format"),
+    DataMapping("site", "operations", "site", "lookup")  # not compiled: passes through
+]
+
+class TestCompileMappingPlan:
+    """Generated mapping functions"""
+    
+    def test_transformations_and_missing_fields(self):
+        records = [
+            {"item_id": "P-1", "cost": "12.5", "status": " running ", "site": "A"},
+            {"item_id": "P-2", "cost": None, "extra": 1}
+        ]
+        
+        assert compile_mapping_plan(MAPPINGS)(records) == [
+            {"raw_data": records[0], "quality_product_id": "P-1", "finance_unit_cost": 12.5,
+             "operations_machine_status": "RUNNING", "operations_site": "A"},
+            # A non-numeric value is kept as is; absent source fields are left out
+            {"raw_data": records[1], "quality_product_id": "P-2", "finance_unit_cost": None}
+        ]
+    
+    def test_without_raw_data(self):
+        assert compile_mapping_plan(MAPPINGS[:1], keep_raw_data=False)([{"item_id": 3}]) == [{"quality_product_id": 3}]
+    
+    def test_field_names_are_literals(self):
+        hostile = "x'] = 1; import os; r['"
+        plan = compile_mapping_plan([DataMapping(hostile, "quality", "weird\"name")])
+        assert plan([{hostile: 5}]) == [{"raw_data": {hostile: 5}, "quality_weird\"name": 5}]
+    
+    def test_signature_follows_mapping_order(self):
+        assert mapping_signature(MAPPINGS[:2]) == (
+            ("item_id", "quality_product_id", "direct"), ("cost", "finance_unit_cost", "calculate")
+        )
+        assert mapping_signature(MAPPINGS[:2]) != mapping_signature(MAPPINGS[1::-1])
+
+class TestConnectorPlanCache:
+    """Equal mapping lists share one compiled plan"""
+    
+    def test_plans_are_reused(self, tmp_path):
+        connector = UniversalConnector(sync_state_path=str(tmp_path / "state.db"))
+        copies = [DataMapping(m.source_field, m.target_module, m.target_field, m.transformation) for m in MAPPINGS]
+        
+        first = connector._mapping_plan(MAPPINGS)
+        assert connector._mapping_plan(copies) is first
+        assert connector._mapping_plan(MAPPINGS, keep_raw_data=False) is not first
+        assert asyncio.run(connector._map_data([{"cost": 2}], copies, False)) == [{"finance_unit_cost": 2.0}]
+        assert len(connector._mapping_plans) == 2
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Offline media store
+Content-addressed blobs on the device and the resumable upload protocol
+"""
+
+import asyncio
+import hashlib
+import os
+
+import httpx
+import pytest
+
+from core.offline.media_store import (
+    MediaUploadReceiver, OfflineMediaStore, UploadOffsetMismatch, content_range, parse_content_range
+)
+
+@pytest.fixture
+def media_store(tmp_path):
+    store = OfflineMediaStore(str(tmp_path / "device"), chunk_size=1024)
+    yield store
+    asyncio.run(store.shutdown())
+
+@pytest.fixture
+def receiver(tmp_path):
+    return MediaUploadReceiver(str(tmp_path / "server"))
+
+class TestContentRange:
+    """Content-Range headers of upload chunks"""
+    
+    def test_round_trip(self):
+        assert content_range(1024, 512, 4096) == "bytes 1024-1535/4096"
+        assert parse_content_range("bytes 1024-1535/4096") == (1024, 512, 4096)
+        # An empty chunk only announces the total
+        assert parse_content_range(content_range(4096, 0, 4096)) == (4096, 0, 4096)
+    
+    @pytest.mark.parametrize("value", ["bytes 10-5/100", "bytes 0-100/100", "items 0-1/2", None])
+    def test_malformed(self, value):
+        with pytest.raises(ValueError):
+            parse_content_range(value)
+
+class TestOfflineMediaStore:
+    """Captures share blobs by content; upload progress survives restarts"""
+    
+    def test_identical_captures_share_a_blob(self, media_store):
+        photo = os.urandom(5000)
+        first = media_store.put(photo, "photo", "M-1", {"inspection_id": "INSP-1"})
+        second = media_store.put(photo, "photo", "M-2", {"inspection_id": "INSP-2"})
+        
+        assert first["content_hash"] == second["content_hash"] == hashlib.sha256(photo).hexdigest()
+        assert (first["deduplicated"], second["deduplicated"]) == (False, True)
+        assert media_store.pending_uploads() == [(first["content_hash"], 5000, 0)]
+        assert media_store.get_media("M-2")["metadata"] == {"inspection_id": "INSP-2"}
+    
+    def test_upload_progress_is_persisted(self, media_store):
+        stored = media_store.put(os.urandom(3000), "photo", "M-1", {})
+        content_hash = stored["content_hash"]
+        
+        media_store.record_upload_progress(content_hash, 2048)
+        assert media_store.pending_uploads() == [(content_hash, 3000, 2048)]
+        assert len(media_store.read_chunk(content_hash, 2048)) == 952
+        
+        media_store.record_upload_progress(content_hash, 3000, complete=True)
+        assert media_store.pending_uploads() == []
+        assert media_store.get_media("M-1")["upload_status"] == "uploaded"
+
+class TestMediaUploadReceiver:
+    """Chunks append at the server's offset; a mismatch reports where to resume"""
+    
+    def test_chunked_upload_completes_into_blob(self, receiver):
+        data = os.urandom(2500)
+        content_hash = hashlib.sha256(data).hexdigest()
+        
+        assert receiver.status(content_hash) is None
+        assert receiver.write_chunk(content_hash, 0, 2500, data[:1000]) == (1000, False)
+        assert receiver.status(content_hash) == (1000, False)
+        assert receiver.write_chunk(content_hash, 1000, 2500, data[1000:]) == (2500, True)
+        assert receiver.blob_path_for(content_hash).read_bytes() == data
+        # Uploading a blob the server holds is a no-op
+        assert receiver.write_chunk(content_hash, 0, 2500, data[:1000]) == (2500, True)
+    
+    def test_replayed_chunk_reports_offset(self, receiver):
+        data = os.urandom(2000)
+        content_hash = hashlib.sha256(data).hexdigest()
+        receiver.write_chunk(content_hash, 0, 2000, data[:1000])
+        
+        # The response to the first chunk was lost and the client sends it again
+        with pytest.raises(UploadOffsetMismatch) as mismatch:
+            receiver.write_chunk(content_hash, 0, 2000, data[:1000])
+        assert mismatch.value.offset == 1000
+        assert receiver.status(content_hash) == (1000, False)
+    
+    def test_content_must_match_hash(self, receiver):
+        content_hash = hashlib.sha256(b"expected").hexdigest()
+        
+        with pytest.raises(ValueError):
+            receiver.write_chunk(content_hash, 0, 8, b"tampered")
+        assert receiver.status(content_hash) is None
+        with pytest.raises(ValueError):
+            receiver.write_chunk("../../etc/passwd", 0, 1, b"x")
+
+class TestResumableUpload:
+    """Device uploads over HTTP resume where the server's copy ends"""
+    
+    @pytest.fixture
+    def link(self, tmp_path, monkeypatch):
+        """An engine whose sync service talks to a MediaUploadReceiver; ``lose`` drops responses to PUTs at those offsets"""
+        
+        monkeypatch.chdir(tmp_path)
+        from core.offline.offline_sync_engine import OfflineSyncEngine
+        
+        receiver = MediaUploadReceiver(str(tmp_path / "server"))
+        puts = []
+        lose = set()
+        
+        def handler(request):
+            content_hash = request.url.path.rsplit("/", 1)[-1]
+            if request.method == "HEAD":
+                status = receiver.status(content_hash)
+                if status is None:
+                    return httpx.Response(404)
+                return httpx.Response(200, headers={"Upload-Offset": str(status[0]),
+                                                    "Upload-Complete": "1" if status[1] else "0"})
+            start, _, total = parse_content_range(request.headers["Content-Range"])
+            puts.append(start)
+            try:
+                offset, complete = receiver.write_chunk(content_hash, start, total, request.content)
+            except UploadOffsetMismatch as e:
+                return httpx.Response(409, headers={"Upload-Offset": str(e.offset), "Upload-Complete": "0"})
+            if start in lose:
+                lose.discard(start)
+                raise httpx.ReadError("dead zone", request=request)
+            return httpx.Response(201 if complete else 200, headers={"Upload-Offset": str(offset),
+                                                                       "Upload-Complete": "1" if complete else "0"})
+        
+        engine = OfflineSyncEngine(db_path=str(tmp_path / "device.db"))
+        engine.media_store.chunk_size = 1024
+        
+        async def run(coro):
+            engine.sync_service._loop = asyncio.get_running_loop()
+            engine.sync_service.http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+            try:
+                return await coro
+            finally:
+                await engine.sync_service.http.aclose()
+                engine.sync_service.http = None
+        
+        yield engine, receiver, puts, lose, lambda coro: asyncio.run(run(coro))
+        asyncio.run(engine.media_store.shutdown())
+    
+    def test_resume_after_lost_response(self, link):
+        engine, receiver, puts, lose, run = link
+        photo = os.urandom(4000)
+        content_hash = engine.media_store.put(photo, "photo", "M-1", {})["content_hash"]
+        lose.add(1024)
+        
+        first = run(engine.sync_media())
+        assert first["failed"] == 1
+        assert engine.media_store.pending_uploads() == [(content_hash, 4000, 1024)]
+        
+        # The chunk at 1024 did reach the server; the next run starts after it
+        second = run(engine.sync_media())
+        assert (second["uploaded"], second["resumed"]) == (1, 1)
+        assert puts == [0, 1024, 2048, 3072]
+        assert receiver.blob_path_for(content_hash).read_bytes() == photo
+        assert engine.media_store.get_media("M-1")["upload_status"] == "uploaded"
+    
+    def test_stale_chunk_gets_409_with_server_offset(self, link):
+        engine, receiver, puts, _, run = link
+        data = os.urandom(3000)
+        content_hash = hashlib.sha256(data).hexdigest()
+        receiver.write_chunk(content_hash, 0, 3000, data[:2048])
+        
+        # The device only knows about the first chunk
+        offset, complete = run(engine.sync_service.upload_media_chunk(content_hash, 1024, 3000, data[1024:2048]))
+        assert (offset, complete) == (2048, False)
+        
+        offset, complete = run(engine.sync_service.upload_media_chunk(content_hash, offset, 3000, data[offset:]))
+        assert complete and receiver.blob_path_for(content_hash).read_bytes() == data
+        assert puts == [1024, 2048]
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Memory search index migrations
+FTS5 rows keyed by a stable id per context, and a backfill that races live writes safely
+"""
+
+import asyncio
+import json
+import sqlite3
+import threading
+
+import pytest
+
+from core.memory import migrations
+from core.memory.connection_pool import SQLiteConnectionPool
+from core.memory.migrations import create_document_search_keys, create_memory_search_index
+
+CONTEXTS_SCHEMA = '''
+    CREATE TABLE memory_contexts (
+        context_id TEXT PRIMARY KEY,
+        ai_summary TEXT,
+        ai_insights TEXT,
+        ai_recommendations TEXT,
+        conversation_history TEXT
+    )
+'''
+
+def add_context(conn, context_id, summary, insights=()):
+    conn.execute(
+        "INSERT INTO memory_contexts VALUES (?, ?, ?, '[]', '[]')",
+        (context_id, summary, json.dumps(list(insights)))
+    )
+
+def search(conn, query):
+    return sorted(row[0] for row in conn.execute('''
+        SELECT k.context_id FROM memory_search s
+        JOIN memory_search_keys k ON k.search_rowid = s.rowid
+        WHERE memory_search MATCH ?
+    ''', (query,)))
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = SQLiteConnectionPool(tmp_path / "memory.db")
+    pool.write_blocking(lambda conn: conn.execute(CONTEXTS_SCHEMA))
+    yield pool
+    pool.close()
+
+class TestMemorySearchIndex:
+    """memory_search stays consistent with memory_contexts through deletes, VACUUM and migration"""
+    
+    def test_backfill_and_live_triggers(self, pool):
+        def seed(conn):
+            for i in range(10):
+                add_context(conn, f"ctx-{i}", f"pump {i} vibration")
+        pool.write_blocking(seed)
+        create_memory_search_index(pool)
+        
+        pool.write_blocking(add_context, "ctx-new", "conveyor belt wear")
+        pool.write_blocking(lambda conn: conn.execute(
+            "UPDATE memory_contexts SET ai_summary = 'conveyor alignment' WHERE context_id = 'ctx-3'"
+        ))
+        
+        assert pool.read_blocking(search, "conveyor") == ["ctx-3", "ctx-new"]
+        assert len(pool.read_blocking(search, "pump")) == 9
+    
+    def test_recall_survives_delete_and_vacuum(self, pool):
+        create_memory_search_index(pool)
+        
+        def seed(conn):
+            for i in range(20):
+                add_context(conn, f"ctx-{i:02d}", "boiler" if i % 2 else "chiller", [f"note {i}"])
+        pool.write_blocking(seed)
+        pool.write_blocking(lambda conn: conn.execute(
+            "DELETE FROM memory_contexts WHERE context_id IN ('ctx-01', 'ctx-02', 'ctx-05')"
+        ))
+        conn = sqlite3.connect(pool.db_path, isolation_level=None)
+        conn.execute("VACUUM")
+        conn.close()
+        pool.write_blocking(add_context, "ctx-20", "boiler")
+        
+        boilers = [f"ctx-{i:02d}" for i in range(1, 21, 2) if i not in (1, 5)] + ["ctx-20"]
+        assert pool.read_blocking(search, "boiler") == sorted(boilers)
+        assert pool.read_blocking(search, "note") == sorted(
+            f"ctx-{i:02d}" for i in range(20) if i not in (1, 2, 5)
+        )
+    
+    def test_rows_written_during_backfill_are_indexed_once(self, pool, monkeypatch):
+        def seed(conn):
+            for i in range(25):
+                add_context(conn, f"ctx-{i:02d}", "compressor")
+        pool.write_blocking(seed)
+        
+        writes = iter(range(100, 105))
+        backfill = migrations.backfill_in_batches
+        
+        def backfill_during_writes(pool, name, table, insert_batch, prepare=None):
+            def index_while_writing(conn, after_rowid, upto_rowid):
+                # A live insert and an update of a row the backfill has not reached yet
+                add_context(conn, f"ctx-{next(writes)}", "compressor")
+                conn.execute(
+                    "UPDATE memory_contexts SET ai_summary = 'compressor leak' WHERE context_id = 'ctx-24'"
+                )
+                insert_batch(conn, after_rowid, upto_rowid)
+            backfill(pool, name, table, index_while_writing, batch_size=10, prepare=prepare)
+        
+        monkeypatch.setattr(migrations, "backfill_in_batches", backfill_during_writes)
+        create_memory_search_index(pool)
+        
+        def index_counts(conn):
+            return (
+                conn.execute("SELECT COUNT(*) FROM memory_search_keys").fetchone()[0],
+                conn.execute("SELECT COUNT(*) FROM memory_contexts").fetchone()[0]
+            )
+        keys, contexts = pool.read_blocking(index_counts)
+        assert keys == contexts == 28
+        assert len(pool.read_blocking(search, "compressor")) == 28
+        assert pool.read_blocking(search, "leak") == ["ctx-24"]
+
+class TestDocumentSearchKeys:
+    """document_search rows are keyed by a stable rowid per document"""
+    
+    def test_migration_keys_existing_rows_and_drops_duplicates(self, pool):
+        def seed(conn):
+            conn.execute("CREATE VIRTUAL TABLE document_search USING fts5(document_id, filename, content, tags, category)")
+            for document_id, filename in [("DOC-1", "pump.txt"), ("DOC-2", "belt.txt"), ("DOC-1", "pump.txt")]:
+                conn.execute("INSERT INTO document_search VALUES (?, ?, '', '', '')", (document_id, filename))
+        pool.write_blocking(seed)
+        create_document_search_keys(pool)
+        
+        assert pool.read_blocking(lambda conn: conn.execute(
+            "SELECT k.document_id, s.rowid FROM document_search s "
+            "JOIN document_search_keys k ON k.search_rowid = s.rowid ORDER BY s.rowid"
+        ).fetchall()) == [("DOC-1", 1), ("DOC-2", 2)]
+        assert pool.read_blocking(lambda conn: conn.execute("SELECT COUNT(*) FROM document_search").fetchone()[0]) == 2
+    
+    def test_reindexed_document_keeps_one_row(self, tmp_path, monkeypatch):
+        pytest.importorskip("fastapi")
+        from core.memory.analysis_pipeline import shutdown_analysis_pipeline
+        from core.memory.connection_pool import close_all_pools
+        from core.memory.universal_memory_system import UniversalMemorySystem
+        
+        monkeypatch.chdir(tmp_path)
+        memory = asyncio.run(UniversalMemorySystem("search-keys-test").initialize())
+        
+        async def upload_and_analyze():
+            metadata = await memory.upload_document(
+                b"Lockout procedure for press 4", "press_4.txt", "w1", "safety", background_analysis=True
+            )
+            await memory.analysis_pipeline.join()
+            return metadata
+        
+        try:
+            metadata = asyncio.run(upload_and_analyze())
+            rows = memory.pool.read_blocking(lambda conn: conn.execute(
+                "SELECT s.rowid, k.search_rowid, s.content FROM document_search s "
+                "JOIN document_search_keys k ON k.document_id = s.document_id WHERE k.document_id = ?",
+                (metadata.document_id,)
+            ).fetchall())
+            assert len(rows) == 1 and rows[0][0] == rows[0][1] and "Lockout" in rows[0][2]
+            
+            asyncio.run(memory.delete_document(metadata.document_id))
+            assert memory.pool.read_blocking(lambda conn: (
+                conn.execute("SELECT COUNT(*) FROM document_search").fetchone()[0],
+                conn.execute("SELECT COUNT(*) FROM document_search_keys").fetchone()[0]
+            )) == (0, 0)
+        finally:
+            asyncio.run(shutdown_analysis_pipeline())
+            close_all_pools()
+
+class TestMemorySystemStartup:
+    """The constructor stays cheap; schema and migrations run in a worker thread"""
+    
+    def test_schema_created_off_the_event_loop(self, tmp_path, monkeypatch):
+        pytest.importorskip("fastapi")
+        from core.memory.connection_pool import close_all_pools
+        from core.memory.universal_memory_system import UniversalMemorySystem
+        
+        monkeypatch.chdir(tmp_path)
+        migration_threads = []
+        apply = UniversalMemorySystem._initialize_database
+        
+        def recorded(self):
+            migration_threads.append(threading.get_ident())
+            apply(self)
+        
+        monkeypatch.setattr(UniversalMemorySystem, "_initialize_database", recorded)
+        
+        async def open_memory():
+            memory = UniversalMemorySystem("schema-test")
+            assert not memory.pool.schema_ready
+            await memory.initialize()
+            await UniversalMemorySystem("schema-test").initialize()
+            return threading.get_ident(), memory
+        
+        try:
+            loop_thread, memory = asyncio.run(open_memory())
+            assert memory.pool.schema_ready
+            assert len(migration_threads) == 1 and migration_threads[0] != loop_thread
+        finally:
+            close_all_pools()
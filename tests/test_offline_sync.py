@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+"""
+Offline sync engine
+Patch uploads to the sync-batch endpoint, rebases and per-document ordering
+"""
+
+import asyncio
+import sqlite3
+
+import pytest
+
+from core.offline.sync_payloads import SyncBatchReceiver, diff_documents, document_checksum, encode_batch
+
+INSPECTION = {"inspection_id": "INSP-1", "status": "open", "location": "line 2", "readings": [], "notes": ""}
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    # The engine module builds a default engine in the working directory on import
+    monkeypatch.chdir(tmp_path)
+    from core.offline.offline_sync_engine import OfflineSyncEngine
+    
+    class ServerEngine(OfflineSyncEngine):
+        """Uploads go to an in-process SyncBatchReceiver; ``fail_once`` records get a server error once"""
+        
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.receiver = SyncBatchReceiver(str(tmp_path / "server.db"))
+            self.fail_once = set()
+            self.uploads = []
+        
+        async def _check_network_connectivity(self) -> bool:
+            return True
+        
+        async def _upload_sync_batch(self, items):
+            self.uploads.append(items)
+            failing = {item["record_id"] for item in items} & self.fail_once
+            self.fail_once -= failing
+            applied = {
+                result["record_id"]: result
+                for result in self.receiver.receive(encode_batch([
+                    item for item in items if item["record_id"] not in failing
+                ]))
+            }
+            return [
+                applied.get(item["record_id"], {"record_id": item["record_id"], "status": "error", "error": "500"})
+                for item in items
+            ]
+    
+    engine = ServerEngine(db_path=str(tmp_path / "device.db"))
+    yield engine
+    asyncio.run(engine.media_store.shutdown())
+
+def store(engine, data, operation="update"):
+    return asyncio.run(engine.store_offline_record("inspection", data, "W-1", "TABLET-1", operation=operation))
+
+def sync(engine):
+    return asyncio.run(engine.sync_when_online())
+
+def edit_on_server(engine, **fields):
+    """Another device's change, applied to the server copy"""
+    
+    current = engine.receiver.get_document("INSP-1")
+    document = {**current, **fields}
+    result, = engine.receiver.receive(encode_batch([{
+        "record_id": "OTHER-DEVICE", "record_type": "inspection", "operation": "update", "entity_key": "INSP-1",
+        "checksum": document_checksum(document), "base_checksum": document_checksum(current),
+        "patch": diff_documents(current, document)
+    }]))
+    assert result["status"] == "success"
+
+def record_state(engine, record_id):
+    conn = sqlite3.connect(engine.db_path)
+    try:
+        return conn.execute(
+            "SELECT sync_status, retry_count FROM offline_records WHERE record_id = ?", (record_id,)
+        ).fetchone()
+    finally:
+        conn.close()
+
+class TestOfflineSync:
+    """Records reach the server as whole documents or patches, in order per document"""
+    
+    def test_updates_upload_as_patches(self, engine):
+        store(engine, INSPECTION, operation="create")
+        assert sync(engine)["synced"] == 1
+        
+        first = {**INSPECTION, "readings": [1.5]}
+        second = {**first, "readings": [1.5, 1.7], "status": "review"}
+        store(engine, first)
+        store(engine, second)
+        result = sync(engine)
+        
+        assert result["synced"] == 2
+        items = engine.uploads[-1]
+        assert all("patch" in item and "data" not in item for item in items)
+        assert items[1]["patch"] == [["set", ["status"], "review"], ["append", ["readings"], [1.7]]]
+        assert engine.receiver.get_document("INSP-1") == second
+    
+    def test_patch_rebase_with_failed_predecessor(self, engine):
+        store(engine, INSPECTION, operation="create")
+        sync(engine)
+        edit_on_server(engine, supervisor="S-7")
+        
+        with_reading = {**INSPECTION, "readings": [2.5]}
+        with_notes = {**with_reading, "notes": "bearing replaced"}
+        first, second = store(engine, with_reading), store(engine, with_notes)
+        engine.fail_once.add(first)
+        
+        # The first edit fails; the second must not be rebased past it
+        result = sync(engine)
+        assert (result["failures"], result["deferred"], result["synced"]) == (1, 1, 0)
+        assert record_state(engine, first) == ("pending", 1)
+        assert record_state(engine, second) == ("pending", 0)
+        assert engine.receiver.get_document("INSP-1") == {**INSPECTION, "supervisor": "S-7"}
+        
+        # The first edit is rebased onto the server change; the second waits for it
+        result = sync(engine)
+        assert (result["synced"], result["deferred"]) == (1, 1)
+        assert engine.receiver.get_document("INSP-1") == {**with_reading, "supervisor": "S-7"}
+        
+        # The second edit patches the merged copy without reverting the server change
+        result = sync(engine)
+        assert result["synced"] == 1
+        assert engine.receiver.get_document("INSP-1") == {**with_notes, "supervisor": "S-7"}
+        assert record_state(engine, second) == ("synced", 0)
+    
+    def test_overlapping_edit_becomes_conflict(self, engine):
+        store(engine, INSPECTION, operation="create")
+        sync(engine)
+        edit_on_server(engine, location="line 3")
+        
+        edited = store(engine, {**INSPECTION, "location": "line 4"})
+        later = store(engine, {**INSPECTION, "location": "line 4", "notes": "moved"})
+        result = sync(engine)
+        
+        assert (result["conflicts"], result["deferred"]) == (1, 1)
+        assert record_state(engine, edited)[0] == "conflict"
+        assert record_state(engine, later) == ("pending", 0)
+        conn = sqlite3.connect(engine.db_path)
+        assert conn.execute("SELECT local_record_id, resolution_strategy FROM sync_conflicts").fetchall() == [
+            (edited, "manual")
+        ]
+        conn.close()
+    
+    def test_status_conflict_without_timestamps(self, engine):
+        engine.sync_batch_size = 1
+        store(engine, INSPECTION, operation="create")
+        sync(engine)
+        edit_on_server(engine, status="review")
+        
+        edited = store(engine, {**INSPECTION, "status": "closed"})
+        other = store(engine, {**INSPECTION, "inspection_id": "INSP-2"}, operation="create")
+        result = sync(engine)
+        
+        # Neither side says which change is newer, so the conflict goes to manual review
+        assert (result["conflicts"], result["synced"]) == (1, 1)
+        assert record_state(engine, edited)[0] == "conflict"
+        assert record_state(engine, other)[0] == "synced"
+        conn = sqlite3.connect(engine.db_path)
+        assert conn.execute("SELECT resolution_strategy FROM sync_conflicts").fetchall() == [("manual",)]
+        conn.close()
+    
+    def test_failed_automatic_resolution_does_not_stop_sync(self, engine, monkeypatch):
+        async def unavailable(conflict_id, strategy):
+            raise RuntimeError("resolution service unavailable")
+        
+        monkeypatch.setattr(engine, "_apply_conflict_resolution", unavailable)
+        engine.sync_batch_size = 1
+        store(engine, INSPECTION, operation="create")
+        sync(engine)
+        edit_on_server(engine, notes="checked by night shift")
+        
+        store(engine, {**INSPECTION, "notes": "checked"})
+        other = store(engine, {**INSPECTION, "inspection_id": "INSP-2"}, operation="create")
+        result = sync(engine)
+        
+        # The notes conflict is auto-merged; its failure must not abort the next batch
+        assert (result["conflicts"], result["synced"]) == (1, 1)
+        assert record_state(engine, other)[0] == "synced"
+    
+    def test_unsynced_device_cannot_overwrite_server_copy(self, engine):
+        store(engine, INSPECTION, operation="create")
+        sync(engine)
+        edit_on_server(engine, supervisor="S-7")
+        
+        # A second device (no synced version) creates the same inspection
+        conn = sqlite3.connect(engine.db_path)
+        conn.execute("DELETE FROM synced_documents")
+        conn.commit()
+        conn.close()
+        duplicate = store(engine, {**INSPECTION, "location": "line 9"}, operation="create")
+        result = sync(engine)
+        
+        assert result["conflicts"] == 1 and record_state(engine, duplicate)[0] == "conflict"
+        assert engine.receiver.get_document("INSP-1") == {**INSPECTION, "supervisor": "S-7"}
+    
+    def test_queued_edit_syncs_older_pending_edit_first(self, engine):
+        store(engine, INSPECTION, operation="create")
+        sync(engine)
+        
+        reading = {**INSPECTION, "readings": [1]}
+        closed = {**INSPECTION, "status": "closed", "readings": [1, 2]}
+        first, second = store(engine, reading), store(engine, closed)
+        engine.fail_once.add(first)
+        assert asyncio.run(engine.sync_records([first]))["failures"] == 1
+        
+        # Queuing the newer edit syncs the pending older one first, never after it
+        result = asyncio.run(engine.sync_records([second]))
+        assert result["synced"] == 2
+        assert [item["record_id"] for item in engine.uploads[-1]] == [first, second]
+        assert engine.receiver.get_document("INSP-1") == closed
+    
+    def test_queued_edit_held_behind_open_conflict(self, engine):
+        store(engine, INSPECTION, operation="create")
+        sync(engine)
+        edit_on_server(engine, location="line 3")
+        
+        edited = store(engine, {**INSPECTION, "location": "line 4"})
+        assert sync(engine)["conflicts"] == 1
+        
+        # The conflict is not pending, so only the hold keeps the later edit back
+        later = store(engine, {**INSPECTION, "location": "line 4", "status": "closed"})
+        result = asyncio.run(engine.sync_records([later]))
+        assert (result["deferred"], result["synced"]) == (1, 0)
+        assert record_state(engine, edited)[0] == "conflict"
+        assert record_state(engine, later) == ("pending", 0)
+        assert engine.receiver.get_document("INSP-1") == {**INSPECTION, "location": "line 3"}
+    
+    def test_older_failed_edit_holds_newer_across_batches(self, engine):
+        engine.sync_batch_size = 1
+        store(engine, INSPECTION, operation="create")
+        sync(engine)
+        
+        reading = {**INSPECTION, "readings": [1]}
+        closed = {**INSPECTION, "status": "closed", "readings": [1, 2]}
+        first, second = store(engine, reading), store(engine, closed)
+        engine.fail_once.add(first)
+        
+        result = sync(engine)
+        assert (result["failures"], result["deferred"], result["synced"]) == (1, 1, 0)
+        assert sync(engine)["synced"] == 2
+        assert engine.receiver.get_document("INSP-1") == closed
+        assert record_state(engine, second) == ("synced", 0)
+    
+    def test_entity_keys_backfilled_for_existing_records(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        from core.offline.offline_sync_engine import OfflineSyncEngine
+        
+        db_path = str(tmp_path / "legacy.db")
+        conn = sqlite3.connect(db_path)
+        conn.execute('''
+            CREATE TABLE offline_records (
+                record_id TEXT PRIMARY KEY, record_type TEXT NOT NULL, data TEXT NOT NULL,
+                timestamp TEXT NOT NULL, worker_id TEXT NOT NULL, device_id TEXT NOT NULL,
+                checksum TEXT NOT NULL, sync_status TEXT DEFAULT 'pending', parent_record_id TEXT,
+                operation TEXT DEFAULT 'create', retry_count INTEGER DEFAULT 0, last_sync_attempt TEXT
+            )
+        ''')
+        conn.execute(
+            "INSERT INTO offline_records (record_id, record_type, data, timestamp, worker_id, device_id, checksum) "
+            "VALUES ('OFFLINE-1', 'inspection', '{\"inspection_id\": \"INSP-9\"}', '2024-01-01', 'W-1', 'T-1', '')"
+        )
+        conn.commit()
+        conn.close()
+        
+        engine = OfflineSyncEngine(db_path=db_path)
+        conn = sqlite3.connect(db_path)
+        assert conn.execute("SELECT entity_key FROM offline_records").fetchall() == [("INSP-9",)]
+        conn.close()
+        asyncio.run(engine.media_store.shutdown())
+    
+    def test_missing_server_copy_is_resent_whole(self, engine):
+        store(engine, INSPECTION, operation="create")
+        sync(engine)
+        engine.receiver = SyncBatchReceiver(str(engine.receiver.db_path).replace("server", "fresh_server"))
+        
+        store(engine, {**INSPECTION, "status": "closed"})
+        result = sync(engine)
+        
+        assert result["synced"] == 1
+        assert "patch" in engine.uploads[-2][0] and "data" in engine.uploads[-1][0]
+        assert engine.receiver.get_document("INSP-1") == {**INSPECTION, "status": "closed"}
+
+def conflicts(engine):
+    conn = sqlite3.connect(engine.db_path)
+    try:
+        return conn.execute(
+            "SELECT conflict_id, resolution_strategy, resolved_by FROM sync_conflicts WHERE resolved_at IS NOT NULL"
+        ).fetchall(), conn.execute("SELECT conflict_id FROM sync_conflicts WHERE resolved_at IS NULL").fetchall()
+    finally:
+        conn.close()
+
+class TestConflictResolution:
+    """Automatic and manual resolutions settle stored conflicts on the server"""
+    
+    def test_text_conflict_is_merged(self, engine):
+        store(engine, INSPECTION, operation="create")
+        sync(engine)
+        edit_on_server(engine, notes="checked by night shift", supervisor="S-7")
+        
+        edited = store(engine, {**INSPECTION, "notes": "checked"})
+        later = store(engine, {**INSPECTION, "notes": "checked", "status": "closed"})
+        result = sync(engine)
+        
+        merged = {**INSPECTION, "notes": "checked by night shift\nchecked", "supervisor": "S-7"}
+        assert (result["conflicts"], result["deferred"]) == (1, 1)
+        assert engine.receiver.get_document("INSP-1") == merged
+        assert record_state(engine, edited)[0] == "synced"
+        resolved, unresolved = conflicts(engine)
+        assert [row[1:] for row in resolved] == [("merge", "automatic")] and unresolved == []
+        
+        # The held edit follows on top of the merged copy
+        assert sync(engine)["synced"] == 1
+        assert engine.receiver.get_document("INSP-1") == {**merged, "status": "closed"}
+        assert record_state(engine, later)[0] == "synced"
+    
+    def test_safety_conflict_remote_wins(self, engine):
+        store(engine, INSPECTION, operation="create")
+        sync(engine)
+        edit_on_server(engine, hazard_level="high")
+        
+        store(engine, {**INSPECTION, "hazard_level": "low", "readings": [3.1]})
+        assert sync(engine)["conflicts"] == 1
+        
+        # The device's version is dropped for the server's; later edits patch that
+        server = {**INSPECTION, "hazard_level": "high"}
+        assert engine.receiver.get_document("INSP-1") == server
+        store(engine, {**INSPECTION, "hazard_level": "low", "readings": [3.1], "notes": "done"})
+        assert sync(engine)["synced"] == 1
+        assert engine.receiver.get_document("INSP-1") == {**server, "notes": "done"}
+    
+    def test_manual_resolution_local_wins(self, engine):
+        store(engine, INSPECTION, operation="create")
+        sync(engine)
+        edit_on_server(engine, location="line 3", supervisor="S-7")
+        edited = store(engine, {**INSPECTION, "location": "line 4"})
+        sync(engine)
+        (conflict_id,), = conflicts(engine)[1]
+        
+        asyncio.run(engine._apply_conflict_resolution(conflict_id, "local_wins", resolved_by="W-2"))
+        
+        assert engine.receiver.get_document("INSP-1") == {**INSPECTION, "location": "line 4", "supervisor": "S-7"}
+        assert record_state(engine, edited)[0] == "synced"
+        assert conflicts(engine) == ([(conflict_id, "local_wins", "W-2")], [])
+        with pytest.raises(ValueError):
+            asyncio.run(engine._apply_conflict_resolution(conflict_id, "remote_wins"))
+    
+    def test_resolution_against_a_moved_server_copy_stays_open(self, engine):
+        store(engine, INSPECTION, operation="create")
+        sync(engine)
+        edit_on_server(engine, location="line 3")
+        edited = store(engine, {**INSPECTION, "location": "line 4"})
+        sync(engine)
+        (conflict_id,), = conflicts(engine)[1]
+        edit_on_server(engine, location="line 5")
+        
+        with pytest.raises(RuntimeError):
+            asyncio.run(engine._apply_conflict_resolution(conflict_id, "local_wins"))
+        
+        assert engine.receiver.get_document("INSP-1")["location"] == "line 5"
+        assert record_state(engine, edited)[0] == "conflict"
+        assert conflicts(engine) == ([], [(conflict_id,)])
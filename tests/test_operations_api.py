@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Operations API
+Dashboard snapshots over HTTP with ETag revalidation
+"""
+
+from contextlib import asynccontextmanager
+
+import pytest
+
+fastapi = pytest.importorskip("fastapi")
+from fastapi.testclient import TestClient
+
+from api import operations_api
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    # The warehouse stores under gringo_data/ in the working directory
+    monkeypatch.chdir(tmp_path)
+    
+    @asynccontextmanager
+    async def lifespan(app):
+        await operations_api.start_operations_manager()
+        try:
+            yield
+        finally:
+            await operations_api.stop_operations_manager()
+    
+    app = fastapi.FastAPI(lifespan=lifespan)
+    app.include_router(operations_api.router)
+    with TestClient(app) as client:
+        yield client
+
+class TestDashboardEndpoint:
+    """Pollers revalidate with If-None-Match and get 304 while the snapshot is unchanged"""
+    
+    def test_unchanged_dashboard_answers_not_modified(self, client):
+        first = client.get("/api/operations/dashboard/c1")
+        assert first.status_code == 200
+        etag = first.headers["ETag"]
+        assert etag == f'"{first.json()["etag"]}"' and first.json()["version"] == 1
+        
+        again = client.get("/api/operations/dashboard/c1", headers={"If-None-Match": etag})
+        assert again.status_code == 304 and again.headers["ETag"] == etag and not again.content
+        
+        stale = client.get("/api/operations/dashboard/c1", headers={"If-None-Match": '"outdated"'})
+        assert stale.status_code == 200 and stale.headers["ETag"] == etag
+    
+    def test_unavailable_before_startup(self, monkeypatch):
+        monkeypatch.setattr(operations_api, "operations_manager", None)
+        app = fastapi.FastAPI()
+        app.include_router(operations_api.router)
+        
+        assert TestClient(app).get("/api/operations/dashboard/c1").status_code == 503
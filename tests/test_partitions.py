@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Operation partitions
+Monthly partition files, read-only scans and generation-keyed watermarks
+"""
+
+import asyncio
+import json
+import sqlite3
+import threading
+from datetime import datetime
+
+import pytest
+
+from data.warehouse.data_warehouse import GringoDataWarehouse
+from data.warehouse.partitions import OperationPartitions
+
+def operations(count, month="2024-01", prefix="op", client_id="c1"):
+    return [
+        (f"{prefix}-{n}", client_id, "maintenance", "stock_count",
+         f"{month}-15T10:00:{n:02d}", json.dumps({"count": n}), True)
+        for n in range(count)
+    ]
+
+@pytest.fixture
+def partitions(tmp_path):
+    partitions = OperationPartitions(tmp_path / "operations")
+    yield partitions
+    partitions.close_writers()
+
+class TestOperationPartitions:
+    """Rows land in their month's file; scans never write"""
+    
+    def test_rows_split_by_month_and_retry_is_ignored(self, partitions):
+        rows = operations(3) + operations(2, month="2024-02", prefix="feb")
+        
+        assert partitions.write_operations(rows) == ["2024_01", "2024_02"]
+        partitions.write_operations(rows)
+        
+        assert partitions.partitions() == ["2024_01", "2024_02"]
+        assert len(list(partitions.query())) == 5
+    
+    def test_scans_do_not_change_unprepared_partitions(self, partitions):
+        # A file from before partition_info and the client index existed
+        conn = sqlite3.connect(partitions.partition_path("2024_01"))
+        conn.execute("""
+            CREATE TABLE daily_operations (id TEXT PRIMARY KEY, client_id TEXT NOT NULL, module TEXT NOT NULL,
+                operation_type TEXT NOT NULL, timestamp DATETIME NOT NULL, data JSON NOT NULL,
+                processed BOOLEAN DEFAULT FALSE)
+        """)
+        conn.executemany("INSERT INTO daily_operations VALUES (?, ?, ?, ?, ?, ?, ?)", operations(3))
+        conn.commit()
+        conn.close()
+        
+        assert list(partitions.client_batches("2024_01", "c1")) == []
+        assert partitions.max_rowids() == {}
+        assert len(list(partitions.query())) == 3
+        conn = sqlite3.connect(partitions.partition_path("2024_01"))
+        assert [row[0] for row in conn.execute("SELECT name FROM sqlite_master")] == [
+            "daily_operations", "sqlite_autoindex_daily_operations_1"
+        ]
+        conn.close()
+        
+        partitions.prepare()
+        (generation, rows), = partitions.client_batches("2024_01", "c1")
+        assert [row[0] for row in rows] == [1, 2, 3]
+        assert partitions.max_rowids() == {"2024_01": (generation, 3)}
+    
+    def test_client_batches_resume_from_watermark(self, partitions):
+        partitions.write_operations(operations(5) + operations(2, prefix="other", client_id="c2"))
+        generation = partitions.writer_generation("2024_01")
+        
+        batches = list(partitions.client_batches("2024_01", "c1", (generation, 2), batch_size=2))
+        
+        assert [[row[0] for row in rows] for _, rows in batches] == [[3, 4], [5]]
+        assert {batch_generation for batch_generation, _ in batches} == {generation}
+    
+    def test_watermark_after_partition_recreation(self, partitions):
+        month = datetime.now().strftime('%Y-%m')
+        key = month.replace('-', '_')
+        partitions.write_operations(operations(5, month=month))
+        watermarks = partitions.max_rowids()
+        old_generation = watermarks[key][0]
+        
+        partitions.archive_partition(key)
+        # Late rows recreate the month; rowids restart below the old watermark
+        partitions.write_operations(operations(2, month=month, prefix="late"))
+        
+        counts, advanced = partitions.changes_since(watermarks)
+        new_generation = partitions.writer_generation(key)
+        
+        assert new_generation != old_generation
+        assert counts == {"c1": 2}
+        assert advanced[key] == (new_generation, 2)
+        (generation, rows), = partitions.client_batches(key, "c1", watermarks[key])
+        assert generation == new_generation
+        assert [row[1] for row in rows] == ["late-0", "late-1"]
+        assert len(list(partitions.query(include_archived=True))) == 7
+    
+    def test_concurrent_archive_reads(self, partitions):
+        partitions.write_operations(operations(5))
+        partitions.archive_partition("2024_01")
+        
+        first = partitions.query(include_archived=True, batch_size=1)
+        second = partitions.query(include_archived=True, batch_size=1)
+        rows = [next(first), next(second)]
+        assert len(list(partitions.archive_root.glob("*.restore"))) == 2
+        # Finishing one read must not remove the other's scratch copy
+        rows += list(second) + list(first)
+        
+        assert len(rows) == 10
+        assert list(partitions.archive_root.glob("*.restore")) == []
+    
+    def test_changes_since_only_counts_new_rows(self, partitions):
+        month = datetime.now().strftime('%Y-%m')
+        partitions.write_operations(operations(3, month=month) + operations(4))
+        watermarks = partitions.max_rowids()
+        partitions.write_operations(
+            operations(2, month=month, prefix="new") + operations(1, month=month, prefix="x", client_id="c2")
+            + operations(3, prefix="old")
+        )
+        
+        counts, advanced = partitions.changes_since(watermarks)
+        
+        # Only recent months are polled; late rows for 2024_01 are left to learning passes
+        assert counts == {"c1": 2, "c2": 1}
+        assert advanced[month.replace('-', '_')][1] == 6
+        assert advanced["2024_01"] == watermarks["2024_01"]
+
+class TestLearningWatermarks:
+    """Learning passes hand every row to learning once, across partition recreation"""
+    
+    def test_recreated_partition_rows_are_learned(self, tmp_path):
+        async def learn():
+            warehouse = GringoDataWarehouse(str(tmp_path / "warehouse"))
+            await warehouse._storage_ready
+            write = warehouse.ingest_queue.run_on_writer
+            
+            await write(warehouse.partitions.write_operations, operations(5))
+            first = await warehouse._analyze_recent_data("c1")
+            again = await warehouse._analyze_recent_data("c1")
+            
+            await write(warehouse.partitions.archive_partition, "2024_01")
+            await write(warehouse.partitions.write_operations, operations(2, prefix="late"))
+            late = await warehouse._analyze_recent_data("c1")
+            
+            await warehouse.close()
+            return first, again, late
+        
+        first, again, late = asyncio.run(learn())
+        
+        assert first['rows_processed'] == 5
+        assert again['rows_processed'] == 0
+        assert late['rows_processed'] == 2
+    
+    def test_pass_reads_and_writes_off_the_event_loop(self, tmp_path, monkeypatch):
+        async def learn():
+            warehouse = GringoDataWarehouse(str(tmp_path / "warehouse"))
+            await warehouse._storage_ready
+            await warehouse.ingest_queue.run_on_writer(warehouse.partitions.write_operations, operations(5))
+            
+            fetch_threads = []
+            fetch = warehouse.partitions.client_batch
+            
+            def recorded(*args):
+                fetch_threads.append(threading.get_ident())
+                return fetch(*args)
+            
+            monkeypatch.setattr(warehouse.partitions, "client_batch", recorded)
+            result = await warehouse._analyze_recent_data("c1", batch_size=2)
+            watermark = await warehouse.ingest_queue.run_in_transaction(lambda conn: conn.execute(
+                "SELECT last_rowid FROM learning_watermarks WHERE client_id = 'c1'"
+            ).fetchone()[0])
+            await warehouse.close()
+            return threading.get_ident(), fetch_threads, result, watermark
+        
+        loop_thread, fetch_threads, result, watermark = asyncio.run(learn())
+        
+        # Three batches of rows, then the empty fetch that ends the partition
+        assert len(fetch_threads) == 4 and loop_thread not in fetch_threads
+        assert result['rows_processed'] == 5 and watermark == 5
+    
+    def test_relative_storage_path(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        
+        async def learn():
+            warehouse = GringoDataWarehouse("gringo_data")
+            await warehouse._storage_ready
+            await warehouse.ingest_queue.run_on_writer(warehouse.partitions.write_operations, operations(3))
+            result = await warehouse._analyze_recent_data("c1")
+            heads = warehouse.partitions.max_rowids()
+            await warehouse.close()
+            return result, heads
+        
+        result, heads = asyncio.run(learn())
+        assert result['rows_processed'] == 3
+        assert heads["2024_01"][1] == 3
+
+class TestLegacyMigration:
+    """Legacy rows move into partitions on startup, without blocking the event loop"""
+    
+    def test_legacy_operations_move_on_the_ingest_writer(self, tmp_path, monkeypatch):
+        async def create():
+            warehouse = GringoDataWarehouse(str(tmp_path / "warehouse"))
+            await warehouse._storage_ready
+            await warehouse.close()
+            return warehouse.operational_db
+        
+        operational_db = asyncio.run(create())
+        conn = sqlite3.connect(operational_db)
+        conn.executemany("INSERT INTO daily_operations VALUES (?, ?, ?, ?, ?, ?, ?)", operations(4))
+        conn.execute("PRAGMA user_version = 2")
+        conn.commit()
+        conn.close()
+        
+        threads = []
+        move = GringoDataWarehouse._partition_legacy_operations
+        
+        def recording_move(self, *args, **kwargs):
+            threads.append(threading.get_ident())
+            return move(self, *args, **kwargs)
+        monkeypatch.setattr(GringoDataWarehouse, "_partition_legacy_operations", recording_move)
+        
+        async def restart():
+            warehouse = GringoDataWarehouse(str(tmp_path / "warehouse"))
+            await warehouse._storage_ready
+            rows = await warehouse.query_operations("c1", datetime(2000, 1, 1))
+            await warehouse.close()
+            return threading.get_ident(), rows
+        
+        loop_thread, rows = asyncio.run(restart())
+        assert len(threads) == 1 and threads[0] != loop_thread
+        assert sorted(row[0] for row in rows) == [f"op-{n}" for n in range(4)]
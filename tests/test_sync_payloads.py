@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Offline sync payloads
+Field-level patches, batch encoding and server-side reassembly
+"""
+
+import zlib
+
+import pytest
+
+from core.offline import sync_payloads
+from core.offline.sync_payloads import (
+    SyncBatchReceiver, apply_patch, conflicting_paths, decode_batch, diff_documents, document_checksum, encode_batch,
+    merge_documents
+)
+
+BASE = {
+    "status": "open",
+    "checklist": {"guard": "pending", "belt": "pending"},
+    "measurements": [{"value": 1.2}],
+    "notes": "first pass"
+}
+
+def item(record_id, document, **fields):
+    return {"record_id": record_id, "record_type": "inspection", "operation": "update", "entity_key": "INSP-1",
+            "checksum": document_checksum(document), **fields}
+
+class TestPatches:
+    """diff_documents/apply_patch round trips and patch-level conflicts"""
+    
+    def test_round_trip_with_nested_append_and_delete(self):
+        edited = {
+            "status": "review",
+            "checklist": {"guard": "ok", "belt": "pending"},
+            "measurements": [{"value": 1.2}, {"value": 1.4}]
+        }
+        patch = diff_documents(BASE, edited)
+        
+        assert patch == [
+            ["del", ["notes"]],
+            ["set", ["status"], "review"],
+            ["set", ["checklist", "guard"], "ok"],
+            ["append", ["measurements"], [{"value": 1.4}]]
+        ]
+        assert apply_patch(BASE, patch) == edited
+        # The base document is left as it was
+        assert BASE["checklist"]["guard"] == "pending" and len(BASE["measurements"]) == 1
+    
+    def test_conflicts_only_where_both_sides_change_a_path(self):
+        local = diff_documents(BASE, {**BASE, "checklist": {"guard": "ok", "belt": "pending"}, "notes": "same"})
+        remote = diff_documents(BASE, {**BASE, "checklist": {"guard": "failed", "belt": "ok"}, "notes": "same"})
+        
+        assert conflicting_paths(local, remote) == ["checklist.guard"]
+        # A parent replaced on one side overlaps every child change on the other
+        assert conflicting_paths(local, [["set", ["checklist"], {}]]) == ["checklist"]
+    
+    def test_merge_keeps_both_sides(self):
+        local = {**BASE, "status": "review", "notes": "belt loose", "measurements": [{"value": 1.2}, {"value": 1.4}]}
+        remote = {
+            **BASE, "status": "closed", "notes": "guard ok", "checklist": {"guard": "ok", "belt": "pending"},
+            "measurements": [{"value": 1.2}, {"value": 1.5}]
+        }
+        
+        assert merge_documents(BASE, local, remote, ("notes",)) == {
+            **remote, "notes": "guard ok\nbelt loose", "measurements": [{"value": 1.2}, {"value": 1.5}, {"value": 1.4}]
+        }
+        # A change only the local side made is applied
+        assert merge_documents(BASE, {**BASE, "status": "review"}, remote)["checklist"]["guard"] == "ok"
+        assert merge_documents(BASE, {**BASE, "status": "review"}, {**BASE, "notes": "x"})["status"] == "review"
+    
+    def test_unknown_operation_rejected(self):
+        with pytest.raises(ValueError):
+            apply_patch(BASE, [["move", ["status"], "x"]])
+
+class TestBatchEncoding:
+    """Tagged, compressed batches in MessagePack or JSON"""
+    
+    def test_round_trip(self):
+        items = [item("R-1", BASE, data=BASE)]
+        assert decode_batch(encode_batch(items)) == items
+    
+    def test_json_fallback_without_msgpack(self, monkeypatch):
+        monkeypatch.setattr(sync_payloads, "msgpack", None)
+        payload = encode_batch([{"a": 1}])
+        assert payload[:1] == b"J" and decode_batch(payload) == [{"a": 1}]
+    
+    @pytest.mark.parametrize("payload", [b"Mnot zlib", b"X" + zlib.compress(b"[]"), b"J" + zlib.compress(b"[]")[:-4]])
+    def test_corrupt_payload(self, payload):
+        with pytest.raises(ValueError):
+            decode_batch(payload)
+    
+    def test_inflation_is_capped(self):
+        payload = b"J" + zlib.compress(b"[" + b" " * 4096 + b"]")
+        
+        assert decode_batch(payload, max_size=4098) == []
+        with pytest.raises(ValueError, match="inflates"):
+            decode_batch(payload, max_size=4097)
+
+class TestSyncBatchReceiver:
+    """Documents are reassembled from patches against the server copy"""
+    
+    @pytest.fixture
+    def receiver(self, tmp_path):
+        receiver = SyncBatchReceiver(str(tmp_path / "server.db"))
+        receiver.receive(encode_batch([item("R-0", BASE, operation="create", data=BASE)]))
+        return receiver
+    
+    def test_patches_apply_in_order(self, receiver):
+        first = {**BASE, "status": "review"}
+        second = {**first, "notes": "done"}
+        results = receiver.receive(encode_batch([
+            item("R-1", first, base_checksum=document_checksum(BASE), patch=diff_documents(BASE, first)),
+            item("R-2", second, base_checksum=document_checksum(first), patch=diff_documents(first, second))
+        ]))
+        
+        assert [result["status"] for result in results] == ["success", "success"]
+        assert receiver.get_document("INSP-1") == second
+    
+    def test_stale_base_is_a_conflict_with_server_copy(self, receiver):
+        edited = {**BASE, "status": "closed"}
+        result, = receiver.receive(encode_batch([
+            item("R-1", edited, base_checksum="stale", patch=diff_documents(BASE, edited))
+        ]))
+        
+        assert result["status"] == "conflict" and result["remote_data"] == BASE
+        assert receiver.get_document("INSP-1") == BASE
+    
+    def test_missing_base_and_checksum_mismatch(self, receiver):
+        other = item("R-1", BASE, base_checksum="x", patch=[])
+        other["entity_key"] = "INSP-2"
+        wrong = item("R-2", BASE, base_checksum=document_checksum(BASE), patch=[["set", ["status"], "x"]])
+        
+        results = receiver.receive(encode_batch([other, wrong]))
+        
+        assert [result["status"] for result in results] == ["base_missing", "error"]
+        assert receiver.get_document("INSP-1") == BASE
+    
+    def test_whole_document_does_not_overwrite_a_different_copy(self, receiver):
+        edited = {**BASE, "status": "closed"}
+        
+        conflict, retry, restore = receiver.receive(encode_batch([
+            item("R-1", edited, data=edited),
+            item("R-2", BASE, data=BASE),
+            item("R-3", edited, data=edited, replace=True)
+        ]))
+        
+        assert conflict["status"] == "conflict" and conflict["remote_data"] == BASE
+        # The same content again is a retry, not a conflict
+        assert retry["status"] == "success"
+        # A base_missing resend restores the device's document
+        assert restore["status"] == "success" and receiver.get_document("INSP-1") == edited
+    
+    def test_delete(self, receiver):
+        result, = receiver.receive(encode_batch([item("R-1", {}, operation="delete")]))
+        assert result["status"] == "success" and receiver.get_document("INSP-1") is None
+    
+    def test_malformed_items_fail_alone(self, receiver):
+        edited = {**BASE, "status": "closed"}
+        no_key = item("R-2", BASE, data=BASE)
+        del no_key["entity_key"]
+        bad_patch = item("R-3", edited, base_checksum=document_checksum(BASE), patch=[["append", ["notes"], 5]])
+        
+        results = receiver.receive(encode_batch([
+            "not an item", no_key, bad_patch, item("R-4", BASE, patch=[]), item("R-5", BASE),
+            item("R-6", edited, base_checksum=document_checksum(BASE), patch=diff_documents(BASE, edited))
+        ]))
+        
+        assert [(result["record_id"], result["status"]) for result in results] == [
+            (None, "error"), ("R-2", "error"), ("R-3", "error"), ("R-4", "error"), ("R-5", "error"),
+            ("R-6", "success")
+        ]
+        assert results[1]["error"] == "Missing or invalid entity_key"
+        assert receiver.get_document("INSP-1") == edited
+    
+    def test_batch_must_be_a_list(self, receiver):
+        with pytest.raises(ValueError):
+            receiver.receive(encode_batch({"record_id": "R-1"}))
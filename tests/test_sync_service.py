@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Offline sync service
+Debounced connectivity probes and the background sync worker
+"""
+
+import asyncio
+import threading
+
+import httpx
+
+from core.offline.sync_service import OfflineSyncService
+
+class FakeEngine:
+    def __init__(self, fail_sweeps: int = 0):
+        self.sweeps = 0
+        self.synced = []
+        self.fail_sweeps = fail_sweeps
+    
+    async def sync_when_online(self):
+        self.sweeps += 1
+        if self.sweeps <= self.fail_sweeps:
+            raise RuntimeError("server error")
+    
+    async def sync_records(self, record_ids):
+        self.synced.append(list(record_ids))
+    
+    async def sync_media(self):
+        return {}
+
+class Server:
+    """Status endpoint that counts probes and can be taken down"""
+    
+    def __init__(self, online: bool = True):
+        self.online = online
+        self.probes = 0
+    
+    async def handle(self, request):
+        self.probes += 1
+        await asyncio.sleep(0.01)
+        return httpx.Response(200 if self.online else 503)
+
+async def started(service, server):
+    await service.start()
+    # The worker has not run yet; swap its session for one backed by the fake server
+    await service.http.aclose()
+    service.http = httpx.AsyncClient(transport=httpx.MockTransport(server.handle))
+
+async def wait_for(condition, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline
+        await asyncio.sleep(0.005)
+
+class TestConnectivity:
+    """Probes are shared, cached and backed off"""
+    
+    def test_concurrent_callers_share_one_probe(self):
+        server = Server()
+        service = OfflineSyncService(FakeEngine(), online_ttl=60)
+        
+        async def run():
+            await started(service, server)
+            results = await asyncio.gather(*(service.is_online() for _ in range(10)))
+            assert await service.is_online()
+            await service.stop()
+            return results
+        
+        assert asyncio.run(run()) == [True] * 10
+        # One probe for the burst; the worker's own check was answered from the cache
+        assert server.probes == 1
+    
+    def test_offline_answers_are_cached_with_growing_backoff(self):
+        service = OfflineSyncService(FakeEngine(), min_backoff=10, max_backoff=40)
+        server = Server(online=False)
+        
+        async def run():
+            service._loop = asyncio.get_running_loop()
+            service.http = httpx.AsyncClient(transport=httpx.MockTransport(server.handle))
+            assert not await service.is_online()
+            assert not await service.is_online()
+            delays = []
+            for failures in range(1, 6):
+                service.consecutive_failures = failures
+                delays.append(service._backoff_delay())
+            await service.http.aclose()
+            return delays
+        
+        delays = asyncio.run(run())
+        assert server.probes == 1
+        assert 8 <= delays[0] <= 10 and 16 <= delays[1] <= 20 and all(32 <= delay <= 40 for delay in delays[2:])
+
+class TestWorker:
+    """Start-up sweep, queued batches and clean shutdown"""
+    
+    def test_sweeps_then_syncs_queued_records(self):
+        engine = FakeEngine()
+        service = OfflineSyncService(engine, online_ttl=60, sweep_interval=60)
+        
+        async def run():
+            await started(service, Server())
+            await wait_for(lambda: engine.sweeps == 1)
+            service.enqueue("R-1")
+            # From another thread, e.g. a sync API handler
+            thread = threading.Thread(target=service.enqueue, args=("R-2",))
+            thread.start()
+            thread.join()
+            await wait_for(lambda: sum(map(len, engine.synced)) == 2)
+            await service.stop()
+        
+        asyncio.run(run())
+        assert sorted(record for batch in engine.synced for record in batch) == ["R-1", "R-2"]
+        assert not service.running and service.http is None
+    
+    def test_failed_sweep_backs_off_and_retries(self):
+        engine = FakeEngine(fail_sweeps=1)
+        service = OfflineSyncService(engine, online_ttl=60, min_backoff=0.01, sweep_interval=60)
+        
+        async def run():
+            await started(service, Server())
+            await wait_for(lambda: engine.sweeps == 2)
+            await service.stop()
+        
+        asyncio.run(run())
+        assert service.consecutive_failures == 1
+    
+    def test_enqueue_before_start_is_left_for_the_sweep(self):
+        service = OfflineSyncService(FakeEngine())
+        service.enqueue("R-1")
+        assert service.status() == {"running": False, "online": None, "consecutive_failures": 0, "queued": 0}
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Integration sync state
+Persisted change cursors and record hashes for delta syncs
+"""
+
+import asyncio
+
+import pytest
+
+from core.integrations.sync_state import HASH_LOOKUP_CHUNK, SyncCursor, SyncStateStore, record_hash
+from core.memory.connection_pool import close_connection_pool
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "sync_state.db")
+    yield path
+    close_connection_pool(path)
+
+class TestRecordHash:
+    """Content hashes ignore key order"""
+    
+    def test_key_order_and_content(self):
+        assert record_hash({"a": 1, "b": [1, 2]}) == record_hash({"b": [1, 2], "a": 1})
+        assert record_hash({"a": 1}) != record_hash({"a": 2})
+
+class TestSyncStateStore:
+    """Cursors and hashes per endpoint key"""
+    
+    def test_cursor_survives_a_new_store(self, db_path):
+        async def run():
+            store = SyncStateStore(db_path)
+            assert await store.load_cursor("c1/erp/orders") == SyncCursor()
+            await store.save_cursor("c1/erp/orders", SyncCursor(updated_since="2026-10-01T00:00:00", etag='"v7"'))
+            close_connection_pool(db_path)
+            return await SyncStateStore(db_path).load_cursor("c1/erp/orders")
+        
+        cursor = asyncio.run(run())
+        assert cursor.updated_since == "2026-10-01T00:00:00" and cursor.etag == '"v7"'
+        assert cursor.last_success is not None and not cursor.not_modified
+    
+    def test_changed_keys_across_lookup_chunks(self, db_path):
+        records = {f"R-{i}": {"id": i, "qty": i} for i in range(HASH_LOOKUP_CHUNK * 2 + 10)}
+        
+        async def run():
+            store = SyncStateStore(db_path)
+            hashes = {key: record_hash(record) for key, record in records.items()}
+            assert await store.changed_keys("ep", hashes) == set(hashes)
+            await store.remember_hashes("ep", list(hashes.items()))
+            
+            hashes["R-5"] = record_hash({"id": 5, "qty": 50})
+            hashes["R-1500"] = record_hash({"id": 1500, "qty": 0})
+            hashes["R-new"] = record_hash({"id": -1})
+            changed = await store.changed_keys("ep", hashes)
+            # Hashes are per endpoint
+            other = await store.changed_keys("other", {"R-0": hashes["R-0"]})
+            return changed, other
+        
+        changed, other = asyncio.run(run())
+        assert changed == {"R-5", "R-1500", "R-new"}
+        assert other == {"R-0"}
+    
+    def test_reset_forces_a_full_sync(self, db_path):
+        async def run():
+            store = SyncStateStore(db_path)
+            await store.save_cursor("ep", SyncCursor(delta_token="t-1"))
+            await store.remember_hashes("ep", [("R-1", record_hash({"id": 1}))])
+            await store.reset("ep")
+            return await store.load_cursor("ep"), await store.changed_keys("ep", {"R-1": record_hash({"id": 1})})
+        
+        cursor, changed = asyncio.run(run())
+        assert cursor == SyncCursor() and changed == {"R-1"}
+    
+    def test_schema_created_on_first_use_through_the_writer(self, db_path, monkeypatch):
+        store = SyncStateStore(db_path)
+        assert not store.pool.schema_ready
+        # First use goes through the async writer, never write_blocking
+        monkeypatch.setattr(store.pool, "write_blocking", None)
+        
+        async def run():
+            cursors = await asyncio.gather(*(store.load_cursor(f"ep-{n}") for n in range(3)))
+            return cursors, store.pool.schema_ready
+        
+        cursors, ready = asyncio.run(run())
+        assert cursors == [SyncCursor()] * 3 and ready
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Time-series store
+Chunked sample files that survive torn writes, unique chunk names and compaction
+"""
+
+import asyncio
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+from data.warehouse.data_warehouse import GringoDataWarehouse
+from data.warehouse.timeseries_store import ACTIVE_CHUNK, SAMPLE_DTYPE, TimeSeriesStore, to_epoch_us
+
+START = datetime(2024, 3, 18, 8, 0, 0)
+
+@pytest.fixture
+def store(tmp_path):
+    return TimeSeriesStore(tmp_path / "timeseries", chunk_size=4)
+
+def append_samples(store, count, start=START, value=1.0):
+    for n in range(count):
+        store.append("c1", "defect_rate", start + timedelta(seconds=n), value + n)
+    store.flush()
+
+class TestTimeSeriesStore:
+    """Appends, seals and reads per (client, metric) series"""
+    
+    def test_torn_sample_is_truncated_before_append(self, store):
+        append_samples(store, 2)
+        active = store._series_dir("c1", "defect_rate") / ACTIVE_CHUNK
+        with open(active, 'ab') as f:
+            f.write(b"\x01" * (SAMPLE_DTYPE.itemsize // 2))  # crash mid-write
+        
+        # Reads ignore the torn tail; the next flush cuts it off
+        assert len(store.range("c1", "defect_rate")[1]) == 2
+        append_samples(store, 1, start=START + timedelta(seconds=10), value=9.0)
+        
+        assert active.stat().st_size == 3 * SAMPLE_DTYPE.itemsize
+        assert store.range("c1", "defect_rate")[1].tolist() == [1.0, 2.0, 9.0]
+    
+    def test_sealed_chunks_with_equal_spans_keep_unique_names(self, store):
+        # Two full chunks of samples at the same instant share a time span
+        for _ in range(2):
+            for n in range(4):
+                store.append("c1", "defect_rate", START, float(n))
+            store.flush()
+        
+        chunks = sorted(path.name for path in store._series_dir("c1", "defect_rate").iterdir())
+        span = to_epoch_us(START)
+        assert chunks == [f"{span}_{span}_1.bin", f"{span}_{span}_2.bin"]
+        assert len(store.range("c1", "defect_rate")[1]) == 8
+    
+    def test_compaction_keeps_samples_and_sequence(self, store):
+        append_samples(store, 10)
+        assert store.compact(START + timedelta(days=1)) == 2
+        
+        names = sorted(path.name for path in store._series_dir("c1", "defect_rate").iterdir())
+        assert names[-1] == ACTIVE_CHUNK
+        assert [name.rsplit('_', 1)[1] for name in names[:-1]] == ["1.npz", "2.npz"]
+        assert store.range("c1", "defect_rate")[1].tolist() == [1.0 + n for n in range(10)]
+        
+        # New chunks continue the sequence after compacted ones
+        append_samples(store, 4, start=START + timedelta(minutes=5))
+        sequences = sorted(store._chunk_seq(path) for path in store._series_dir("c1", "defect_rate").iterdir()
+                           if store._is_chunk(path))
+        assert sequences == [1, 2, 3]
+    
+    def test_interrupted_compaction_reads_each_sample_once(self, store):
+        append_samples(store, 4)
+        sealed = next(path for path in store._series_dir("c1", "defect_rate").iterdir() if store._is_chunk(path))
+        raw = sealed.read_bytes()
+        store.compact(START + timedelta(days=1))
+        sealed.write_bytes(raw)  # crash after the .npz rename, before the .bin unlink
+        
+        assert len(store.range("c1", "defect_rate")[1]) == 4
+    
+    def test_aggregate_and_downsample(self, store):
+        append_samples(store, 6)
+        stats = store.aggregate("c1", "defect_rate")
+        assert stats == {'count': 6, 'min': 1.0, 'max': 6.0, 'mean': 3.5, 'sum': 21.0, 'last': 6.0}
+        
+        starts, means = store.downsample("c1", "defect_rate", START, START + timedelta(minutes=1), 3)
+        assert means.tolist() == [2.0, 5.0]
+        assert (starts - to_epoch_us(START)).tolist() == [0, 3_000_000]
+
+class TestDailyMetricStats:
+    """Day statistics come from the ingest rollup, not a scan of the day's samples"""
+    
+    def test_summary_statistics_from_rollup(self, tmp_path):
+        async def ingest():
+            warehouse = GringoDataWarehouse(str(tmp_path / "warehouse"))
+            await warehouse._storage_ready
+            now = datetime.now()
+            committed = warehouse.ingest_queue.add('metric_samples', [
+                ("c1", "defect_rate", value, (now + timedelta(microseconds=n)).isoformat(), "quality")
+                for n, value in enumerate([0.5, 0.1, 0.3])
+            ])
+            await warehouse.ingest_queue.wait(committed)
+            summary = await warehouse.get_daily_operations_summary("c1", now.strftime('%Y-%m-%d'))
+            await warehouse.close()
+            return summary
+        
+        stats = asyncio.run(ingest())['metric_statistics']['defect_rate']
+        assert stats['count'] == 3 and stats['last'] == 0.3
+        assert (stats['min'], stats['max']) == (0.1, 0.5)
+        assert stats['mean'] == pytest.approx(0.3)
+    
+    def test_backfill_from_existing_samples(self, tmp_path):
+        root = tmp_path / "warehouse"
+        store = TimeSeriesStore(root / "timeseries")
+        for n, value in enumerate([2.0, 4.0, 9.0]):
+            store.append("c1", "mttr", START + timedelta(hours=8 * n), value)
+        store.flush()
+        
+        async def open_warehouse():
+            warehouse = GringoDataWarehouse(str(root))
+            await warehouse._storage_ready
+            await warehouse.close()
+            return warehouse
+        
+        warehouse = asyncio.run(open_warehouse())
+        conn = sqlite3.connect(warehouse.operational_db)
+        rows = conn.execute(
+            "SELECT day, sample_count, min_value, max_value, sum_value, last_value FROM daily_metric_stats ORDER BY day"
+        ).fetchall()
+        conn.close()
+        assert rows == [("2024-03-18", 2, 2.0, 4.0, 6.0, 4.0), ("2024-03-19", 1, 9.0, 9.0, 9.0, 9.0)]
+
+class TestLegacyMetricImport:
+    """The one-time real_time_metrics import survives being interrupted"""
+    
+    def test_interrupted_import_is_not_duplicated(self, tmp_path):
+        root = tmp_path / "warehouse"
+        
+        async def open_warehouse():
+            warehouse = GringoDataWarehouse(str(root))
+            await warehouse._storage_ready
+            await warehouse.close()
+            return warehouse
+        
+        warehouse = asyncio.run(open_warehouse())
+        conn = sqlite3.connect(warehouse.operational_db)
+        conn.executemany(
+            "INSERT INTO real_time_metrics (client_id, metric_name, metric_value, timestamp, module_source) "
+            "VALUES ('c1', 'mttr', ?, ?, 'maintenance')",
+            [(float(n), (START + timedelta(minutes=n)).isoformat()) for n in range(5)]
+        )
+        # A crash after the first samples were written, before the import was stamped done
+        conn.execute("PRAGMA user_version = 1")
+        conn.commit()
+        conn.close()
+        (warehouse.timeseries.root / ".legacy_import").touch()
+        append_samples(warehouse.timeseries, 2)
+        warehouse.timeseries.append("c1", "mttr", START, 0.0)
+        warehouse.timeseries.flush()
+        
+        warehouse = asyncio.run(open_warehouse())
+        assert warehouse.timeseries.series() == [("c1", "mttr")]
+        assert list(warehouse.timeseries.range("c1", "mttr")[1]) == [0.0, 1.0, 2.0, 3.0, 4.0]
+
+class TestWarehouseMaintenance:
+    """Scheduled maintenance compacts cold metric chunks"""
+    
+    def test_run_maintenance_compacts_old_chunks(self, tmp_path):
+        async def maintain():
+            warehouse = GringoDataWarehouse(str(tmp_path / "warehouse"))
+            await warehouse._storage_ready
+            warehouse.timeseries.chunk_size = 4
+            append_samples(warehouse.timeseries, 9)
+            result = await warehouse.run_maintenance()
+            samples = warehouse.timeseries.range("c1", "defect_rate")[1]
+            await warehouse.close()
+            return result, samples
+        
+        result, samples = asyncio.run(maintain())
+        assert result == {'chunks_compacted': 2, 'partitions_archived': []}
+        assert list(samples) == [1.0 + n for n in range(9)]
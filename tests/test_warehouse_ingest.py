@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Warehouse ingest path
+Group-committed operations and metric samples, partition writes that are safe to retry
+"""
+
+import asyncio
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+from data.warehouse import data_warehouse
+from data.warehouse.data_warehouse import GringoDataWarehouse
+from data.warehouse.ingest_queue import IngestQueue
+
+COUNT = {'location': 'bay-3', 'items_counted': 120}
+
+def module_counts(warehouse, client_id):
+    conn = sqlite3.connect(warehouse.operational_db)
+    try:
+        return dict(conn.execute(
+            "SELECT module, SUM(operation_count) FROM daily_module_counts WHERE client_id = ? GROUP BY module",
+            (client_id,)
+        ).fetchall())
+    finally:
+        conn.close()
+
+def run_with_warehouse(tmp_path, scenario, **kwargs):
+    async def run():
+        warehouse = GringoDataWarehouse(str(tmp_path / "warehouse"), **kwargs)
+        await warehouse._storage_ready
+        try:
+            return await scenario(warehouse)
+        finally:
+            await warehouse.close()
+    return asyncio.run(run())
+
+class TestIngestRetries:
+    """Retried stores and batches neither duplicate operations nor their rollups"""
+    
+    def test_retried_store_is_stored_once(self, tmp_path):
+        async def store_twice(warehouse):
+            first = await warehouse.store_daily_operation("c1", "inventory", "stock_count", COUNT, "op-1")
+            second = await warehouse.store_daily_operation("c1", "inventory", "stock_count", COUNT, "op-1")
+            assert first == second == "op-1"
+            rows = await warehouse.query_operations("c1", datetime(2000, 1, 1))
+            return rows, module_counts(warehouse, "c1")
+        
+        rows, counts = run_with_warehouse(tmp_path, store_twice)
+        assert [row[0] for row in rows] == ["op-1"]
+        assert counts == {"inventory": 1}
+    
+    def test_batch_retried_after_rollup_failure_is_counted_once(self, tmp_path, monkeypatch):
+        rollups = data_warehouse.update_operational_rollups
+        failures = iter([True])
+        
+        def failing_rollups(conn, operations, samples):
+            if next(failures, False):
+                raise sqlite3.OperationalError("simulated rollup failure")
+            rollups(conn, operations, samples)
+        monkeypatch.setattr(data_warehouse, "update_operational_rollups", failing_rollups)
+        
+        async def store_with_retry(warehouse):
+            with pytest.raises(sqlite3.OperationalError):
+                await warehouse.store_daily_operation("c1", "inventory", "stock_count", COUNT, "op-1")
+            # The partition row was committed before the rollups failed
+            assert len(await warehouse.query_operations("c1", datetime(2000, 1, 1))) == 1
+            assert module_counts(warehouse, "c1") == {}
+            
+            await warehouse.store_daily_operation("c1", "inventory", "stock_count", COUNT, "op-1")
+            await warehouse.store_daily_operation("c1", "receiving", "stock_count", COUNT, "op-2")
+            return module_counts(warehouse, "c1")
+        
+        assert run_with_warehouse(tmp_path, store_with_retry) == {"inventory": 1, "receiving": 1}
+    
+    def test_samples_of_failed_batch_are_not_appended(self, tmp_path, monkeypatch):
+        def failing_rollups(conn, operations, samples):
+            raise sqlite3.OperationalError("simulated rollup failure")
+        monkeypatch.setattr(data_warehouse, "update_operational_rollups", failing_rollups)
+        
+        async def store(warehouse):
+            committed = warehouse.ingest_queue.add('metric_samples', [
+                ("c1", "defect_rate", 0.02, datetime.now().isoformat(), "quality")
+            ])
+            with pytest.raises(sqlite3.OperationalError):
+                await warehouse.ingest_queue.wait(committed)
+            return warehouse.timeseries.metrics("c1")
+        
+        assert run_with_warehouse(tmp_path, store) == []
+
+class TestIngestQueue:
+    """Group commits with on_batch inside and on_commit after the transaction"""
+    
+    def test_rows_commit_in_groups(self, tmp_path):
+        committed = []
+        
+        async def ingest():
+            queue = IngestQueue(
+                tmp_path / "ingest.db", {'items': "INSERT INTO items VALUES (?)"},
+                flush_interval_ms=10, on_commit=committed.append
+            )
+            await queue.run_on_writer(lambda: queue._connect().execute("CREATE TABLE items (n INTEGER)"))
+            futures = [queue.add('items', [(n,)]) for n in range(50)]
+            await queue.wait(*futures)
+            await queue.close()
+            return queue
+        
+        queue = asyncio.run(ingest())
+        assert queue.committed_rows == 50
+        assert queue.committed_batches == len(committed) == 1
+        conn = sqlite3.connect(tmp_path / "ingest.db")
+        assert conn.execute("SELECT COUNT(*) FROM items").fetchone()[0] == 50
+        conn.close()
+    
+    def test_on_commit_skipped_for_rolled_back_batch(self, tmp_path):
+        committed = []
+        
+        def failing_batch(conn, batch):
+            raise ValueError("rejected")
+        
+        async def ingest():
+            queue = IngestQueue(
+                tmp_path / "ingest.db",
+                on_batch=failing_batch, on_commit=committed.append
+            )
+            with pytest.raises(ValueError):
+                await queue.wait(queue.add('items', [(1,)]))
+            await queue.close()
+        
+        asyncio.run(ingest())
+        assert committed == []
+    
+    def test_on_commit_failure_does_not_fail_committed_batch(self, tmp_path):
+        def failing_append(batch):
+            raise OSError("time-series volume full")
+        
+        async def ingest():
+            queue = IngestQueue(
+                tmp_path / "ingest.db", {'items': "INSERT INTO items VALUES (?)"}, on_commit=failing_append
+            )
+            await queue.run_on_writer(lambda: queue._connect().execute("CREATE TABLE items (n INTEGER)"))
+            rows = await queue.add('items', [(1,), (2,)])
+            await queue.close()
+            return rows, queue.committed_rows, queue.on_commit_failures
+        
+        assert asyncio.run(ingest()) == (2, 2, 1)
+    
+    def test_full_buffer_flushes_before_the_interval(self, tmp_path):
+        async def ingest():
+            queue = IngestQueue(
+                tmp_path / "ingest.db", {'items': "INSERT INTO items VALUES (?)"},
+                flush_interval_ms=60000, max_batch_rows=10
+            )
+            await queue.run_on_writer(lambda: queue._connect().execute("CREATE TABLE items (n INTEGER)"))
+            first = queue.add('items', [(n,) for n in range(6)])
+            second = queue.add('items', [(n,) for n in range(6, 12)])
+            rows = await asyncio.wait_for(first, 5)
+            await queue.close()
+            return first is second, rows, queue.committed_batches
+        
+        assert asyncio.run(ingest()) == (True, 12, 1)
+    
+    def test_relaxed_durability_does_not_wait_or_raise(self, tmp_path):
+        def failing_batch(conn, batch):
+            raise ValueError("rejected")
+        
+        async def ingest():
+            queue = IngestQueue(
+                tmp_path / "ingest.db", durability='relaxed', on_batch=failing_batch
+            )
+            future = queue.add('items', [(1,)])
+            await queue.wait(future)
+            acknowledged_before_commit = not future.done()
+            await queue.close()
+            return acknowledged_before_commit, queue.committed_rows
+        
+        assert asyncio.run(ingest()) == (True, 0)
+    
+    def test_close_commits_buffered_rows(self, tmp_path):
+        async def ingest():
+            queue = IngestQueue(
+                tmp_path / "ingest.db", {'items': "INSERT INTO items VALUES (?)"}, flush_interval_ms=60000
+            )
+            await queue.run_on_writer(lambda: queue._connect().execute("CREATE TABLE items (n INTEGER)"))
+            queue.add('items', [(1,), (2,)])
+            await queue.close()
+            with pytest.raises(RuntimeError):
+                queue.add('items', [(3,)])
+            return queue.committed_rows
+        
+        assert asyncio.run(ingest()) == 2
+    
+    def test_run_in_transaction_rolls_back_on_error(self, tmp_path):
+        def insert_then_fail(conn, n):
+            conn.execute("INSERT INTO items VALUES (?)", (n,))
+            raise ValueError("rejected")
+        
+        async def ingest():
+            queue = IngestQueue(tmp_path / "ingest.db", {'items': "INSERT INTO items VALUES (?)"})
+            await queue.run_in_transaction(lambda conn: conn.execute("CREATE TABLE items (n INTEGER)"))
+            await queue.run_in_transaction(lambda conn, n: conn.execute("INSERT INTO items VALUES (?)", (n,)), 1)
+            with pytest.raises(ValueError):
+                await queue.run_in_transaction(insert_then_fail, 2)
+            count = await queue.run_in_transaction(lambda conn: conn.execute("SELECT COUNT(*) FROM items").fetchone()[0])
+            await queue.close()
+            return count
+        
+        assert asyncio.run(ingest()) == 1
+    
+    def test_unknown_durability(self, tmp_path):
+        with pytest.raises(ValueError):
+            IngestQueue(tmp_path / "ingest.db", durability='eventual')
+    
+    def test_table_without_statement_or_hook_rejected(self, tmp_path):
+        async def ingest():
+            queue = IngestQueue(tmp_path / "ingest.db", {'items': "INSERT INTO items VALUES (?)"})
+            with pytest.raises(ValueError):
+                queue.add('itmes', [(1,)])
+            await queue.close()
+        
+        asyncio.run(ingest())